@@ -25,10 +25,16 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import logging
 from pathlib import Path
 from random import randint
-logging.basicConfig(filename="minizinc-python.log", level=logging.DEBUG)
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import configure_logging, output_path, run_directory, run_id, write_summary
+from dlcore.anytime import stream_solutions
+from dlcore.portfolio import race
+from dlcore.flatzinc import CompiledInstance, time_split
+from dlcore.pipeline import run_concurrently
 import time
 import minizinc
 import datetime
@@ -59,9 +65,15 @@ class DiffLin:
         self.cp_solver_name = param["solver"]
         self.cp_solver = minizinc.Solver.lookup(self.cp_solver_name)   
         self.time_limit = param["timelimit"]
+        self.target = param["target"]
+        self.stall = param["stall"]
+        self.portfolio = param["portfolio"]
+        self.prune = param["prune"]
+        # configuration under which the winners of the solver portfolio are recorded
+        self.configuration = "aes " + " ".join(f"{name}={param[name]}" for name in ["RU", "RM", "RL", "RMU", "RML", "WU", "WM", "WL"])
         self.num_of_threads = param["np"]
         self.mzn_file_name = None
-        self.output_file_name = param["output"]
+        self.output_file_name = output_path(param["output"])
         self.mzn_file_name = "attack.mzn"
     
     #############################################################################################################################################
@@ -89,7 +101,7 @@ class DiffLin:
         print(f"Searching a distinguisher for {self.RD} rounds of AES ...")
         self.cp_model = minizinc.Model()
         self.cp_model.add_file(self.mzn_file_name)
-        self.cp_inst = minizinc.Instance(solver=self.cp_solver, model=self.cp_model)
+        self.cp_inst = CompiledInstance(solver=self.cp_solver, model=self.cp_model)
         self.cp_inst["RU"] = self.RU
         self.cp_inst["RM"] = self.RM
         self.cp_inst["RL"] = self.RL
@@ -98,16 +110,35 @@ class DiffLin:
         self.cp_inst["WL"] = self.WL
         self.cp_inst["RMU"] = self.RMU
         self.cp_inst["RML"] = self.RML
-        self.result = self.cp_inst.solve(timeout=time_limit, 
-                                         processes=self.num_of_threads, 
-                                         verbose=False, 
-                                         debug_output=Path("./debug_output.txt",
-                                         intermediate_solutions=True),
-                                         random_seed=randint(0, 100),
-                                         optimisation_level=2)
+        if self.portfolio is None:
+            self.result = stream_solutions(self.cp_inst, self.report_solution,
+                                           timeout=time_limit,
+                                           target=self.target,
+                                           stall=self.stall,
+                                           processes=self.num_of_threads,
+                                           verbose=False,
+                                           debug_output=Path(output_path("debug_output.txt")),
+                                           random_seed=randint(0, 100),
+                                           optimisation_level=2)
+        else:
+            self.result = race(self.cp_inst, self.report_solution,
+                               portfolio=self.portfolio,
+                               key=self.configuration,
+                               prune=self.prune,
+                               timeout=time_limit,
+                               target=self.target,
+                               stall=self.stall,
+                               processes=self.num_of_threads,
+                               verbose=False,
+                               debug_output=Path(output_path("debug_output.txt")),
+                               random_seed=randint(0, 100),
+                               optimisation_level=2)
         #############################################################################################################################################
         elapsed_time = time.time() - start_time
         print("Time used to find a distinguisher: {:0.02f} seconds".format(elapsed_time))
+        self.times = time_split(self.result.statistics, elapsed_time)
+        print("Time used to compile the model: {:0.02f} seconds{}, to solve it: {:0.02f} seconds".format(
+              self.times["compile_time"], " (cached)" if self.times["compile_cached"] else "", self.times["solve_time"]))
         print(f"Solver status: {self.result.status}")
         if minizinc.Status.has_solution(self.result.status) or self.result.status == minizinc.Status.ERROR:
             self.attack_summary, self.upper_trail, self.lower_trail = self.parse_minizinc_solution()
@@ -115,18 +146,16 @@ class DiffLin:
             output_buffer = io.StringIO()
             output_buffer.write("#"*50 + "\n")
             output_buffer.write(f"Upper trail:\n")
-            if self.RU + self.RMU >= 1:                                
-                self.diff, self.diff_trail, self.diff_effect_upper = self.find_differential_trail()
-                with redirect_stdout(output_buffer):
-                    self.diff.print_trail(self.diff_trail)
-            else:                
-                self.diff = None
-                self.diff_trail = None
-                self.diff_effect_upper = 0
-            if self.RML + self.RL >= 1:                
-                self.lin, self.lin_trail, self.lin_trail_weight = self.find_linear_trail()                
-            else:
-                self.lin_trail_weight = 0
+            # the differential and linear trails are independent, and solved concurrently (see dlcore/pipeline.py)
+            jobs = dict()
+            if self.RU + self.RMU >= 1:
+                jobs["upper"] = (find_differential_trail, (self.upper_trail, self.RU, self.RMU))
+            if self.RML + self.RL >= 1:
+                jobs["lower"] = (find_linear_trail, (self.lower_trail, self.RM, self.RML, self.RL))
+            results = run_concurrently(jobs)
+            self.diff_trail, self.diff_effect_upper, diff_trail_output = results.get("upper", (None, 0, ""))
+            self.lin_trail, self.lin_trail_weight, lin_trail_output = results.get("lower", (None, 0, ""))
+            output_buffer.write(diff_trail_output)
             output_buffer.write("#"*50 + "\n")               
             output_buffer.write(f"Sandwich {self.RM} rounds in the middle\n")
             if self.RU + self.RMU >= 1:
@@ -142,8 +171,7 @@ class DiffLin:
             output_buffer.write("#"*50 + "\n")                        
             output_buffer.write(f"Lower trail:\n")
             if self.RML + self.RL >= 1:
-                with redirect_stdout(output_buffer):
-                    self.lin.print_trail(self.lin_trail)                
+                output_buffer.write(lin_trail_output)
             output_buffer.write("#"*50 + "\n")            
             output_buffer.write(f"Differential effect of the upper differential trail: 2^({self.diff_effect_upper})\n")            
             output_buffer.write(f"Number of common active S-boxes in the middle      : {self.result['CM']}\n")
@@ -152,95 +180,28 @@ class DiffLin:
             print(self.attack_summary)
             draw = DrawDL(self, output_file_name=self.output_file_name)
             draw.generate_distinguisher_shape()
+            write_summary({"RU": self.RU, "RM": self.RM, "RL": self.RL, "RMU": self.RMU, "RML": self.RML, "WU": self.WU, "WM": self.WM, "WL": self.WL,
+                           "status": str(self.result.status), "objective": self.result.objective, "time": elapsed_time, **self.times,
+                           "PU": self.result["PU"], "CM": self.result["CM"], "CL": self.result["QL"]})
         elif self.result.status == minizinc.Status.UNSATISFIABLE:
             print("Model is unsatisfiable") 
         elif self.result.status == minizinc.Status.UNKNOWN:
             print("Unknown error!")
         else:
             print("Solving process was interrupted")
-    #############################################################################################################################################
-    #############################################################################################################################################
-    #  _____  _             _    ____                                _          _____             _  _      
-    # |  ___|(_) _ __    __| |  / ___| ___   _ __    ___  _ __  ___ | |_  ___  |_   _|_ __  __ _ (_)| | ___ 
-    # | |_   | || '_ \  / _` | | |    / _ \ | '_ \  / __|| '__|/ _ \| __|/ _ \   | | | '__|/ _` || || |/ __|
-    # |  _|  | || | | || (_| | | |___| (_) || | | || (__ | |  |  __/| |_|  __/   | | | |  | (_| || || |\__ \
-    # |_|    |_||_| |_| \__,_|  \____|\___/ |_| |_| \___||_|   \___| \__|\___|   |_| |_|   \__,_||_||_||___/
-    # Find concrete trails
-
-    def find_differential_trail(self):
-        """
-        Find concrete differential trail
-        """
-        params = {"nrounds" : self.RU + self.RMU,
-                "variant": 1,
-                "is_related_key": 0,
-                "mode" : 0,
-                "startweight" : 0,
-                "endweight" : 128,
-                "timelimit" : 60,
-                "numberoftrails" : 1,
-                "fixedVariables" : {}}
-        for r in range(self.RU + self.RMU + 1):
-            for row in range(4):
-                for col in range(4):
-                    if self.upper_trail["x"][r][row][col] == 0:
-                        params["fixedVariables"][f"x_{r}_{row}_{col}"] = "0"
-        diff = Diff(params)
-        diff.make_model()
-        diff_trail = diff.solve()
-        if self.RU > 0:
-            params = {"nrounds" : self.RU,
-                    "variant": 1,
-                    "is_related_key": 0,
-                    "mode" : 2,
-                    "startweight" : 0,
-                    "endweight" : 128,
-                    "timelimit" : 60,
-                    "numberoftrails" : 1,
-                    "fixedVariables" : {}}
-            params["fixedVariables"] = {"x_0": diff_trail["x_0"], f"x_{self.RU}": diff_trail[f"x_{self.RU}"]}        
-            diff = Diff(params)
-            diff.make_model()
-            diff_effect_upper = diff.solve()
-        else: 
-            diff_effect_upper = 0
-        return diff, diff_trail, diff_effect_upper
-    
-    def find_linear_trail(self):
+    def report_solution(self, result, count, elapsed):
         """
-        Find concrete linear trail
+        Report an improving solution as soon as the solver finds it
+
+        :param minizinc.Result result: the improving solution
+        :param int count: number of solutions found so far
+        :param float elapsed: seconds since the search started
         """
-        
-        params = {"nrounds" : self.RML + self.RL,
-                "mode" : 0,
-                "startweight" : 0,
-                "endweight" : 128,
-                "timelimit" : 60,
-                "numberoftrails" : 1,
-                "fixedVariables" : {}}
-        for r in range(self.RML + self.RL + 1):
-            for row in range(4):
-                for col in range(4):
-                    if self.lower_trail["x"][self.RM - self.RML + r][row][col] == 0:
-                        params["fixedVariables"][f"x_{r}_{row}_{col}"] = "0"
-        lin = Lin(params)
-        lin.make_model()
-        lin_trail = lin.solve()
-        if self.RL > 0:
-            params = {"nrounds" : self.RL,
-                    "mode" : 2,
-                    "startweight" : 0,
-                    "endweight" : 128,
-                    "timelimit" : 60,
-                    "numberoftrails" : 1,
-                    "fixedVariables" : {}}
-            params["fixedVariables"] = {"x_0": lin_trail[f"x_{self.RML}"], f"x_{self.RL}": lin_trail[f"x_{self.RML + self.RL}"]}        
-            lin = Lin(params)
-            lin.make_model()
-            lin_effect_lower = lin.solve()
-        else:
-            lin_effect_lower = 0
-        return lin, lin_trail, lin_effect_lower
+
+        self.result = result
+        print(f"Solution {count} found after {elapsed:0.02f} seconds, objective: {result.objective}")
+        self.attack_summary, self.upper_trail, self.lower_trail = self.parse_minizinc_solution()
+        print(self.attack_summary)
 
     #############################################################################################################################################
     #############################################################################################################################################
@@ -292,6 +253,107 @@ class DiffLin:
         attack_summary += "#"*50 + "\n"
         return attack_summary, upper_trail, lower_trail
 
+#############################################################################################################################################
+#############################################################################################################################################
+#  _____  _             _    ____                                _          _____             _  _      
+# |  ___|(_) _ __    __| |  / ___| ___   _ __    ___  _ __  ___ | |_  ___  |_   _|_ __  __ _ (_)| | ___ 
+# | |_   | || '_ \  / _` | | |    / _ \ | '_ \  / __|| '__|/ _ \| __|/ _ \   | | | '__|/ _` || || |/ __|
+# |  _|  | || | | || (_| | | |___| (_) || | | || (__ | |  |  __/| |_|  __/   | | | |  | (_| || || |\__ \
+# |_|    |_||_| |_| \__,_|  \____|\___/ |_| |_| \___||_|   \___| \__|\___|   |_| |_|   \__,_||_||_||___/
+# Find concrete trails
+
+def find_differential_trail(upper_trail, RU, RMU):
+    """
+    Find concrete differential trail
+    (solved in a worker process, concurrently with the linear trail, see dlcore/pipeline.py)
+
+    :return: differential trail, differential effect of the first RU rounds, and the printed trail
+    """
+
+    params = {"nrounds" : RU + RMU,
+            "variant": 1,
+            "is_related_key": 0,
+            "mode" : 0,
+            "startweight" : 0,
+            "endweight" : 128,
+            "timelimit" : 60,
+            "numberoftrails" : 1,
+            "fixedVariables" : {}}
+    for r in range(RU + RMU + 1):
+        for row in range(4):
+            for col in range(4):
+                if upper_trail["x"][r][row][col] == 0:
+                    params["fixedVariables"][f"x_{r}_{row}_{col}"] = "0"
+    # seed the solver with a fast instantiation of the truncated trail (see dlcore/warmstart.py)
+    params["warmstart"] = True
+    diff = Diff(params)
+    diff.make_model()
+    diff_trail = diff.solve()
+    if RU > 0:
+        params = {"nrounds" : RU,
+                "variant": 1,
+                "is_related_key": 0,
+                "mode" : 2,
+                "startweight" : 0,
+                "endweight" : 128,
+                "timelimit" : 60,
+                "numberoftrails" : 1,
+                "fixedVariables" : {}}
+        params["fixedVariables"] = {"x_0": diff_trail["x_0"], f"x_{RU}": diff_trail[f"x_{RU}"]}        
+        diff = Diff(params)
+        diff.make_model()
+        diff_effect_upper = diff.solve()
+    else: 
+        diff_effect_upper = 0
+    output_buffer = io.StringIO()
+    with redirect_stdout(output_buffer):
+        diff.print_trail(diff_trail)
+    return diff_trail, diff_effect_upper, output_buffer.getvalue()
+
+def find_linear_trail(lower_trail, RM, RML, RL):
+    """
+    Find concrete linear trail
+    (solved in a worker process, concurrently with the differential trail, see dlcore/pipeline.py)
+
+    :return: linear trail, squared correlation of the last RL rounds, and the printed trail
+    """
+
+    params = {"nrounds" : RML + RL,
+            "mode" : 0,
+            "startweight" : 0,
+            "endweight" : 128,
+            "timelimit" : 60,
+            "numberoftrails" : 1,
+            "fixedVariables" : {}}
+    for r in range(RML + RL + 1):
+        for row in range(4):
+            for col in range(4):
+                if lower_trail["x"][RM - RML + r][row][col] == 0:
+                    params["fixedVariables"][f"x_{r}_{row}_{col}"] = "0"
+    # seed the solver with a fast instantiation of the truncated trail (see dlcore/warmstart.py)
+    params["warmstart"] = True
+    lin = Lin(params)
+    lin.make_model()
+    lin_trail = lin.solve()
+    if RL > 0:
+        params = {"nrounds" : RL,
+                "mode" : 2,
+                "startweight" : 0,
+                "endweight" : 128,
+                "timelimit" : 60,
+                "numberoftrails" : 1,
+                "fixedVariables" : {}}
+        params["fixedVariables"] = {"x_0": lin_trail[f"x_{RML}"], f"x_{RL}": lin_trail[f"x_{RML + RL}"]}        
+        lin = Lin(params)
+        lin.make_model()
+        lin_effect_lower = lin.solve()
+    else:
+        lin_effect_lower = 0
+    output_buffer = io.StringIO()
+    with redirect_stdout(output_buffer):
+        lin.print_trail(lin_trail)
+    return lin_trail, lin_effect_lower, output_buffer.getvalue()
+
 #############################################################################################################################################
 #############################################################################################################################################
 #############################################################################################################################################
@@ -318,6 +380,10 @@ def loadparameters(args):
         "WL": 1,
         "np" : 8,
         "tl"  : -1,
+        "target" : None,
+        "stall" : None,
+        "portfolio" : None,
+        "prune" : None,
         "solver"  : "ortools",
         "output"  : "output.tex"}
 
@@ -342,6 +408,14 @@ def loadparameters(args):
         params["np"] = args.np
     if args.timelimit is not None:
         params["timelimit"] = args.timelimit
+    if args.target is not None:
+        params["target"] = args.target
+    if args.stall is not None:
+        params["stall"] = args.stall
+    if args.portfolio is not None:
+        params["portfolio"] = args.portfolio
+    if args.prune is not None:
+        params["prune"] = args.prune
     if args.solver is not None:
         params["solver"] = args.solver
     if args.output is not None:
@@ -371,16 +445,24 @@ def main():
     
     parser.add_argument("-np", type=int, default=8, help="Number of parallel threads")
     parser.add_argument("-tl", "--timelimit", type=int, default=60, help="Time limit in seconds")
+    parser.add_argument("--target", type=int, default=None, help="Stop as soon as the objective of the CP model reaches this value")
+    parser.add_argument("--stall", type=int, default=None, help="Stop when no improving solution is found within this many seconds after the previous one")
     # Fetch available solvers from MiniZinc
     available_solvers = [solver_name for solver_name in minizinc.default_driver.available_solvers().keys()]
     parser.add_argument("-sl", "--solver", default="cp-sat", type=str,
                         choices=available_solvers,
                         help="Choose a CP solver")  
+    parser.add_argument("-pf", "--portfolio", default=None, type=str,
+                        help="Race several solvers (and seeds), e.g., cp-sat,cp-sat:7,chuffed,gurobi (overrides --solver)")
+    parser.add_argument("--prune", type=int, default=None,
+                        help="Only race the given number of best solvers of the portfolio (according to the past winners)")
     parser.add_argument("-o", "--output", default="output.tex", type=str, help="Output file name")
 
     # Parse command line arguments and construct parameter list
     args = parser.parse_args()
     params = loadparameters(args)
+    configure_logging("minizinc-python.log")
+    print(f"Run ID: {run_id()}, outputs in {run_directory()}")
     dld = DiffLin(params)
     dld.search()
 
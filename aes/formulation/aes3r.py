@@ -31,6 +31,9 @@ from matplotlib.colors import LogNorm
 
 
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from dlcore import chains
 if os.path.exists('dlct.pkl'):
     with open('dlct.pkl', 'rb') as file:
         dlct = pickle.load(file)
@@ -48,14 +51,11 @@ else:
 def compute_table(di_range=2, lo_range=2**8):
     m = 8
     n = 8
-    big_dlct = [[0 for _ in range(2**n)] for _ in range(2**n)]
+    # big_dlct[di][lo] = sum_{a, b} ddt[di][a] * ddt[a][b] * dlct[b][lo], i.e., ddt @ ddt @ dlct
+    big_dlct = chains.connectivity_chain(ddt, dlct, 3).tolist()
     for di in range(di_range):
         for lo in range(lo_range):
-            s = 0
-            for a in range(2**n):
-                for b in range(2**n):
-                    s += ddt[di][a] * ddt[a][b] * dlct[b][lo]            
-            big_dlct[di][lo] = s            
+            s = big_dlct[di][lo]
             str_output = f"({di}, {lo}): "
             str_output += "{}".format(s)
             print(str_output)
@@ -22,6 +22,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import os
 import pickle
 import itertools
 from diff import Diff
@@ -46,16 +47,12 @@ if __name__ == '__main__':
     params["fixedVariables"][f"x_1_3_1"] = "00"    
     params["fixedVariables"][f"x_1_3_3"] = "00"
     
+    # The model is built once per process, and only the bounds of x_1_3_2 change between the values
+    diff_trails = Diff.scan(params, "x_1_3_2", range(256), processes=os.cpu_count() or 1)
     total_correlation = 0
-    for di in range(256):
-        params["fixedVariables"][f"x_1_3_2"] = hex(di)[2:].zfill(2)
-        diff = Diff(params)
-        diff.make_model()
-        diff_trail = diff.solve()        
+    for di, diff_trail in diff_trails.items():
         if diff_trail != None:
             print(diff_trail["total_weight"])
             total_correlation += big_dlct[di][0x9] * (2**(-1*float(diff_trail["total_weight"])))
     total_correlation = math.log2(abs(total_correlation))
-    print("-2^({:0.02})".format(total_correlation))
-
-
+    print("-2^({:0.02})".format(total_correlation))
\ No newline at end of file
@@ -36,6 +36,13 @@ import time
 from gurobipy import *
 import math
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from dlcore.milp import ModelBuilder, GREATER_EQUAL, EQUAL, constraint, equality, fix, sum_constraint, xor
+from dlcore.encoding import compile_inequalities, load_inequalities, sbox_placeholders
+from dlcore.clustering import WeightLayerEnumerator, DEFAULT_POOL_LIMIT
+from dlcore.cache import cached_solve
+from dlcore.scan import scan_cell
 import itertools
 import uuid
 
@@ -65,12 +72,17 @@ class Diff:
         self.time_limit = params["timelimit"]
         self.start_weight = params["startweight"]
         self.end_weight = params["endweight"]
+        self.convergence = params.get("convergence", None)
+        self.pool_limit = params.get("poollimit", DEFAULT_POOL_LIMIT)
+        self.processes = params.get("processes", 1)
+        self.threads = params.get("threads", None)
         self.fixed_variables = params['fixedVariables']
         self.mode = params['mode']
         self.number_of_trails = params["numberoftrails"]        
         self.eps = 1e-3
         self.big_m = 2*8
         self.lp_file_name = f"aes_{self.key_size}_nr_{self.nrounds}_{uuid.uuid4().hex}.lp"
+        self.dump_lp = params.get("dumplp", False)
         self.result_file_name = f"result_aes_{self.key_size}_nr_{self.nrounds}.txt"
         self.objective_function_terms = []
         self.master_key = [[[f"k_{row}_{column}_{bit}" for bit in range(8)] for column in range(self.Nk)] for row in range(4)]
@@ -104,11 +116,12 @@ class Diff:
         Output:	b0||b1||b2||b3||b4||b5||b6||b7; b0: msb
         """
                 
-        self.sbox_inequalities = {}
         self.sbox_probabilities = {"2": 7, "4": 6}
+        placeholders = sbox_placeholders(8, 8)
+        self.sbox_templates = dict()
         for pr in self.sbox_probabilities:
-            with open(os.path.join("ddt-encoding", f"s_{pr}.txt")) as fileobj:
-                self.sbox_inequalities[pr] = fileobj.readlines()
+            file_name = os.path.join("ddt-encoding", f"s_{pr}.txt")
+            self.sbox_templates[pr] = load_inequalities(file_name, placeholders, big_m=self.big_m)
         
         # We use SageMath to encode the MDS matrix of AES
         self.mds_constraints_template = \
@@ -208,6 +221,8 @@ class Diff:
         'a_00000 + a_00111 + a_01111 + a_10111 + a_11000 + b_11111 - 2 u_11111 = 0',
         'u_11111 <= 3',
         'u_11111 >= 0']
+        mds_placeholders = [f"{v}_{bin(i)[2:].zfill(5)}" for v in "abu" for i in range(32)]
+        self.mds_template = compile_inequalities(self.mds_constraints_template, mds_placeholders)
 
     @staticmethod
     def ordered_set(seq):
@@ -257,8 +272,7 @@ class Diff:
         a = b
         """
 
-        constraint = f"{a} - {b} = 0\n"
-        return constraint
+        return [equality(a, b)]
 
     def constraint_by_byte_equality(self, a, b):
         """
@@ -266,10 +280,7 @@ class Diff:
         to equality of two bytes
         """
 
-        constraints = ""
-        for bit in range(8):
-            constraints += f"{a[bit]} - {b[bit]} = 0\n"
-        return constraints
+        return [equality(a[bit], b[bit]) for bit in range(8)]
 
     def constraints_by_xor(self, a, b, c):
         """
@@ -281,11 +292,7 @@ class Diff:
         - a + b + c >= 0
         """
 
-        constraints = f"- {a} - {b} - {c} >= -2\n"
-        constraints += f"{a} + {b} - {c} >= 0\n"
-        constraints += f"{a} - {b} + {c} >= 0\n"
-        constraints += f"- {a} + {b} + {c} >= 0\n"
-        return constraints
+        return xor(a, b, c)
 
     def constraints_by_byte_xor(self, a, b, c):
         """
@@ -293,7 +300,7 @@ class Diff:
         a + b -> c
         """
 
-        constraints = ""
+        constraints = []
         for bit in range(8):
             constraints += self.constraints_by_xor(a[bit], b[bit], c[bit])
         return constraints
@@ -303,40 +310,29 @@ class Diff:
         Generate constraints modeling the DDT of S-box
 
         :return constraints encoding the DDT of S-box:
-        :rtype str:
+        :rtype list:
         """
 
-        constraints = ""
+        constraints = []
         indicator_variable = f"Q_{rn}_{row}_{column}"
         pr_indicators = []
         self.binary_variables.append(indicator_variable)
         # Link activeness indicator to input/output
-        sum_input = " + ".join(di)
-        sum_output = " + ".join(do)
-        constraints += f"{sum_input} - {indicator_variable} >= 0\n"
-        constraints += f"{sum_output} - {indicator_variable} >= 0\n"
+        constraints.append(constraint([1]*len(di) + [-1], list(di) + [indicator_variable], GREATER_EQUAL, 0))
+        constraints.append(constraint([1]*len(do) + [-1], list(do) + [indicator_variable], GREATER_EQUAL, 0))
         for i in range(8):
-            constraints += f"{indicator_variable} - {di[i]} >= 0\n"
-            constraints += f"{indicator_variable} - {do[i]} >= 0\n"
-       
+            constraints.append(constraint([1, -1], [indicator_variable, di[i]], GREATER_EQUAL, 0))
+            constraints.append(constraint([1, -1], [indicator_variable, do[i]], GREATER_EQUAL, 0))
+
         for q in self.sbox_probabilities.keys():
             q_indicator = f"q_{rn}_{row}_{column}_{q}"
             self.binary_variables.append(q_indicator)
-            self.objective_function_terms += [f"{self.sbox_probabilities[q]} {q_indicator}"]                            
+            self.objective_function_terms.append((self.sbox_probabilities[q], q_indicator))
             pr_indicators.append(q_indicator)
             assert(q_indicator in self.binary_variables)
-            for ineq in self.sbox_inequalities[q]:
-                for i in range(8):
-                    ineq = ineq.replace(f"a{i}", di[i])
-                    ineq = ineq.replace(f"b{i}", do[i])
-                ineq = ineq.split(' >= ')
-                lhs = f"{ineq[0]} - {self.big_m} {q_indicator}"
-                rhs = "{}".format(int(ineq[1]) - self.big_m)
-                ineq = f"{lhs} >= {rhs}\n"
-                constraints += ineq
+            constraints += self.sbox_templates[q].block(list(di) + list(do) + [q_indicator])
         # Link probability indicators to the activeness indicator
-        sum_pr = " + ".join(pr_indicators)
-        constraints += f"{sum_pr} - {indicator_variable} = 0\n"        
+        constraints.append(constraint([1]*len(pr_indicators) + [-1], pr_indicators + [indicator_variable], EQUAL, 0))
         return constraints
 
     def generate_constraints_by_sbox_ksch(self, row, column, di, do):
@@ -344,40 +340,29 @@ class Diff:
         Generate constraints modeling the DDT of S-box in the key schedule
 
         :return constraints encoding the DDT of S-box:
-        :rtype str:
+        :rtype list:
         """
 
-        constraints = ""
+        constraints = []
         indicator_variable = f"Qksch_{row}_{column}"
         pr_indicators = []
         self.binary_variables.append(indicator_variable)
         # Link activeness indicator to input/output
-        sum_input = " + ".join(di)
-        sum_output = " + ".join(do)
-        constraints += f"{sum_input} - {indicator_variable} >= 0\n"
-        constraints += f"{sum_output} - {indicator_variable} >= 0\n"
+        constraints.append(constraint([1]*len(di) + [-1], list(di) + [indicator_variable], GREATER_EQUAL, 0))
+        constraints.append(constraint([1]*len(do) + [-1], list(do) + [indicator_variable], GREATER_EQUAL, 0))
         for i in range(8):
-            constraints += f"{indicator_variable} - {di[i]} >= 0\n"
-            constraints += f"{indicator_variable} - {do[i]} >= 0\n"
-       
+            constraints.append(constraint([1, -1], [indicator_variable, di[i]], GREATER_EQUAL, 0))
+            constraints.append(constraint([1, -1], [indicator_variable, do[i]], GREATER_EQUAL, 0))
+
         for q in self.sbox_probabilities.keys():
             q_indicator = f"qksch_{row}_{column}_{q}"
             self.binary_variables.append(q_indicator)
-            self.objective_function_terms += [f"{self.sbox_probabilities[q]} {q_indicator}"]
+            self.objective_function_terms.append((self.sbox_probabilities[q], q_indicator))
             pr_indicators.append(q_indicator)
             assert(q_indicator in self.binary_variables)
-            for ineq in self.sbox_inequalities[q]:
-                for i in range(8):
-                    ineq = ineq.replace(f"a{i}", di[i])
-                    ineq = ineq.replace(f"b{i}", do[i])
-                ineq = ineq.split(' >= ')
-                lhs = f"{ineq[0]} - {self.big_m} {q_indicator}"
-                rhs = "{}".format(int(ineq[1]) - self.big_m)
-                ineq = f"{lhs} >= {rhs}\n"
-                constraints += ineq
+            constraints += self.sbox_templates[q].block(list(di) + list(do) + [q_indicator])
         # Link probability indicators to the activeness indicator
-        sum_pr = " + ".join(pr_indicators)
-        constraints += f"{sum_pr} - {indicator_variable} = 0\n"        
+        constraints.append(constraint([1]*len(pr_indicators) + [-1], pr_indicators + [indicator_variable], EQUAL, 0))
         return constraints
 
     def generate_constraints_by_mds(self, rn, column, mi, mo):
@@ -387,23 +372,15 @@ class Diff:
         :param rn int: round number        
         :param mi list: vector of input variables
         :param mo list: vector of output variables
-        :rtype: string
-        :return: constraints modeling MDS in string format
+        :rtype: list
+        :return: constraints modeling MDS as a list of linear constraints
         """
 
-        constraints = ""
         dummay_variables = [f"mds_{rn}_{column}_{bitn}" for bitn in range(32)]
         self.integer_variables.extend(dummay_variables)
         mi = [mi[byten][bitn] for byten in range(4) for bitn in range(8)]
         mo = [mo[byten][bitn] for byten in range(4) for bitn in range(8)]
-        for ineq in self.mds_constraints_template:
-            for i in range(32):
-                bin_index = bin(i)[2:].zfill(5)
-                ineq = ineq.replace(f"a_{bin_index}", mi[i])
-                ineq = ineq.replace(f"b_{bin_index}", mo[i])
-                ineq = ineq.replace(f"u_{bin_index}", dummay_variables[i])
-            constraints += ineq + "\n"
-        return constraints
+        return self.mds_template.block(mi + mo + dummay_variables)
 
     def generate_constraints_by_key_schedule(self):
         """
@@ -411,7 +388,7 @@ class Diff:
         in the related-key seeting
         """
 
-        constraints = ""
+        constraints = []
         for row in range(4):
             for column in range(self.Nk):
                 constraints += self.constraint_by_byte_equality(self.master_key[row][column], self.w[row][column])
@@ -457,9 +434,9 @@ class Diff:
         differential trail
         """
 
-        objective_function = "minimize\n"
-        objective_function += " + ".join(self.objective_function_terms) + "\n"        
-        return objective_function
+        coefficients = [term[0] for term in self.objective_function_terms]
+        variables = [term[1] for term in self.objective_function_terms]
+        return coefficients, variables
 
     def generate_constraints(self):
         """
@@ -467,7 +444,7 @@ class Diff:
         of differential trails through a reduced-round AES
         """
 
-        constraints = "subject to\n"
+        constraints = []
         plaintext = self.generate_state_variables(rn=0, prefix="p")
         if self.is_related_key == 1:
             constraints += self.generate_constraints_by_key_schedule()
@@ -495,28 +472,24 @@ class Diff:
         """
 
         self.binary_variables = self.ordered_set(self.binary_variables)
-        constraints = "Binary\n"
-        constraints += "\n".join(self.binary_variables) + "\n"
-        constraints += "General\n"
-        constraints += "\n".join(self.integer_variables) + "\n"
-        return constraints
+        return self.binary_variables, self.integer_variables
 
     def exclude_trivial_trail(self):
         """
         Exclude all-zero solution from the solution space
         """
-        constraint = ""
+        constraints = []
         plaintext = self.generate_state_variables(rn=0, prefix="p")
         input_diff = self.flatten_state(plaintext) + self.flatten_state(self.master_key)
-        constraint += " + ".join(input_diff) + " >= 1\n"
+        constraints.append(sum_constraint(input_diff, GREATER_EQUAL, 1))
         if self.is_related_key == 0:
-            constraint += " + ".join(self.flatten_state(self.master_key)) + " = 0\n"
+            constraints.append(sum_constraint(self.flatten_state(self.master_key), EQUAL, 0))
             for rn in range(self.nrounds + 1):
-                constraint += " + ".join(self.flatten_state(self.round_keys[rn])) + " = 0\n"                           
-        return constraint
+                constraints.append(sum_constraint(self.flatten_state(self.round_keys[rn]), EQUAL, 0))
+        return constraints
 
     def declare_fixed_variables(self):
-        lp_contents = ""
+        constraints = []
         for cond in self.fixed_variables.items():
             var = cond[0]
             val = cond[1]
@@ -526,35 +499,37 @@ class Diff:
                 state_vars = self.flatten_state(state_vars)
                 state_values = list(bin(int(val, 16))[2:].zfill(128))
                 for i in range(128):
-                    lp_contents += f"{state_vars[i]} = {state_values[i]}\n"
+                    constraints.append(fix(state_vars[i], state_values[i]))
             elif len(var) == 4:                
                 state_vars = [f"{var[0]}_{var[1]}_{var[2]}_{var[3]}_{bit}" for bit in range(8)]
                 if val != "X":
                     state_values = list(bin(int(val, 16))[2:].zfill(8))
                 for i in range(8):
-                    lp_contents += f"{state_vars[i]} = {state_values[i]}\n"
+                    constraints.append(fix(state_vars[i], state_values[i]))
             elif len(var) == 5:                
                 state_vars = f"{var[0]}_{var[1]}_{var[2]}_{var[3]}_{var[4]}"
                 state_values = val
-                lp_contents += f"{state_vars} = {state_values}\n"
+                constraints.append(fix(state_vars, state_values))
             else:
                 pass
-        return lp_contents
+        return constraints
 
     def make_model(self):
         """
         Build the MILP model to find the best differential trail
         """
 
-        lp_header = f"\\ Differential attack on {self.nrounds} rounds of AES-{self.key_size}\n"
-        lp_contents = self.generate_constraints()
-        lp_contents += self.exclude_trivial_trail()
-        lp_header += self.generate_objective_function()
-        lp_contents += self.declare_fixed_variables()
-        lp_contents += self.declare_binary_vars()
-        lp_contents = lp_header + lp_contents + "end"
-        with open(self.lp_file_name, "w") as lp_file:
-            lp_file.write(lp_contents)
+        builder = ModelBuilder(f"Differential attack on {self.nrounds} rounds of AES-{self.key_size}")
+        builder.add_constraints(self.generate_constraints())
+        builder.add_constraints(self.exclude_trivial_trail())
+        builder.set_objective(*self.generate_objective_function())
+        builder.add_constraints(self.declare_fixed_variables())
+        binary_variables, integer_variables = self.declare_binary_vars()
+        builder.declare_binary(binary_variables)
+        builder.declare_integer(integer_variables)
+        self.milp_model = builder.build()
+        if self.dump_lp:
+            builder.write_lp(self.milp_model, self.lp_file_name)
 
     def exclude_the_previous_sol(self):
         '''
@@ -574,10 +549,9 @@ class Diff:
         lhs = first_term - second_term
         self.milp_model.addConstr(lhs <= support - 1)
 
+    @cached_solve
     def solve(self):
         output = None
-        self.milp_model = read(self.lp_file_name)
-        os.remove(self.lp_file_name)
         if self.mode == 0:
             output = self.find_characteristic()
         elif self.mode == 1:
@@ -589,6 +563,23 @@ class Diff:
             print('Enter a number in [0, 1, 2], for the mode parameter please!')
         return output
 
+    @classmethod
+    def scan(cls, params, cell, values, processes=1):
+        """
+        Solve the model for every value of one byte, e.g., cell = x_1_3_2,
+        building the model only once per process (see dlcore/scan.py).
+        The search is find_characteristic in mode 0, and compute_differential_effect in mode 2.
+
+        :param dict params: parameters of the model (the scanned byte is not fixed)
+        :param str cell: name of the byte
+        :param values: values of the byte (integers)
+        :param int processes: number of worker processes the values are partitioned across
+        :return: dict mapping every value to the output of the search
+        """
+
+        method = {0: "find_characteristic", 2: "compute_differential_effect"}[params["mode"]]
+        return scan_cell(cls, params, cell, values, width=8, method=method, processes=processes)
+
     def parse_solver_output(self):
         """
         Extract the differential characteristic from the solver output
@@ -797,68 +788,30 @@ class Diff:
     def compute_differential_effect(self):
         """
         Compute the differential effect for a given input/output differences
-        Some general information about Gurobi:
-        PoolSolutions: It controls the size of the solution pool.
-        Changing this parameter won't affect the number of solutions that are found -
-        it simply determines how many of those are retained
-        You can use the PoolSearchMode parameter to control the approach used to find solutions.
-        In its default setting (0), the MIP search simply aims to find one optimal solution.
-        Setting the parameter to 2 causes the MIP to do a systematic search for the n best solutions.
-        With a setting of 2, it will find the n best solutions,
-        where n is determined by the value of the PoolSolutions parameter
-        SolCount: Number of solutions found during the most recent optimization.
-
-        Model status:
-        LOADED	1	Model is loaded, but no solution information is available.
-        OPTIMAL	2	Model was solved to optimality (subject to tolerances), and an optimal solution is available.
-        INFEASIBLE	3	Model was proven to be infeasible.
+        The trails are counted weight layer by weight layer (see dlcore/clustering.py).
+        The enumeration stops when the model has no more solutions, when the weight
+        exceeds end_weight, or when the last layer changes log2 of the probability
+        by less than the convergence threshold (if given).
         """
 
         if self.time_limit != None:
             self.milp_model.Params.TIME_LIMIT = self.time_limit
-        #self.milp_model.Params.PreSolve = 0 # Activating this flag causes the performance to be decreased, but the accuracy will be increased
-        self.milp_model.Params.PoolSearchMode = 2
-        self.milp_model.Params.PoolSolutions = 1
         self.milp_model.Params.OutputFlag = False
 
         self.milp_model.printStats()
 
-        # Consider the start_weight
-        obj = self.milp_model.getObjective()
-        if self.start_weight != None:
-            self.milp_model.addConstr(obj >= self.start_weight, 'start_weight_constraint')
-        time_start = time.time()
-        self.milp_model.optimize()
-        current_probability = 0
-        if (self.milp_model.Status == GRB.OPTIMAL):
-            self.total_weight = self.milp_model.objVal
-            diff_prob = 0
-            print('\n')
-            while (self.milp_model.Status == GRB.OPTIMAL and self.total_weight <= self.end_weight):
-                self.total_weight = self.milp_model.PoolObjVal
-                self.milp_model.Params.PoolSolutions = 2000000000 #GRB.MAXINT
-                temp_constraint = self.milp_model.addConstr(obj == self.total_weight, name='temp_constraint')
-                # self.milp_model.Params.PoolGap = 0
-                # self.milp_model.Params.PreSolve = 0
-                # self.milp_model.printStats()
-                self.milp_model.update()
-                self.milp_model.optimize()
-                diff_prob += math.pow(2, -self.total_weight) * self.milp_model.SolCount
-                print(f"Current weight: {self.total_weight}")
-                print(f"Number of trails: {self.milp_model.SolCount}")
-                current_probability = math.log(diff_prob, 2)
-                print(f"\tCurrent Probability: 2^({current_probability})")
-                elapsed_time = time.time() - time_start
-                print("Time used = %0.04f seconds\n" % elapsed_time)
-                self.milp_model.remove(temp_constraint)
-                self.milp_model.Params.PoolSolutions = 1
-                self.milp_model.addConstr(obj >= (self.total_weight + self.eps), name='temp_cond')
-                #self.milp_model.Params.PreSolve = 0
-                self.milp_model.optimize()
-        elif (self.milp_model.Status == GRB.INFEASIBLE):
-            print("The model is infeasible!")
-        else:
-            print("Unknown Error!")
+        enumerator = WeightLayerEnumerator(self.milp_model,
+                                           start_weight=self.start_weight,
+                                           end_weight=self.end_weight,
+                                           threshold=self.convergence,
+                                           pool_limit=self.pool_limit,
+                                           processes=self.processes,
+                                           threads=self.threads,
+                                           eps=self.eps)
+        current_probability = enumerator.run()
+        if current_probability is None:
+            return 0
+        self.total_weight = enumerator.weight
         return current_probability
 
     def compute_differential_effect_classic_method(self):
@@ -942,6 +895,18 @@ def loadparameters(args):
         if args.endweight is not None:
             params["endweight"] = args.endweight
 
+        if args.convergence is not None:
+            params["convergence"] = args.convergence
+
+        if args.poollimit is not None:
+            params["poollimit"] = args.poollimit
+
+        if args.processes is not None:
+            params["processes"] = args.processes
+
+        if args.threads is not None:
+            params["threads"] = args.threads
+
         if args.mode is not None:
             params["mode"] = args.mode
 
@@ -951,6 +916,9 @@ def loadparameters(args):
         if args.numberoftrails is not None:
             params["numberoftrails"] = args.numberoftrails
 
+        if args.dumplp:
+            params["dumplp"] = True
+
         return params
 
 def main():
@@ -968,6 +936,14 @@ def main():
                         help="Starting weight for the trail search.")
     parser.add_argument('--endweight', nargs=1, type=int,
                         help="Stop search after reaching endweight.")
+    parser.add_argument('--convergence', type=float,
+                        help="Stop when a new weight layer changes log2 of the probability by less than this value.")
+    parser.add_argument('--poollimit', type=int,
+                        help="Size of the solution pool used to enumerate the weight layers.")
+    parser.add_argument('--processes', type=int,
+                        help="Number of worker processes counting the weight layers in parallel (mode 2).")
+    parser.add_argument('--threads', type=int,
+                        help="Number of Gurobi threads of each worker process.")
     
     parser.add_argument('--nrounds', type=int, default=None,
                         help="The number of rounds for the cipher")        
@@ -989,6 +965,9 @@ def main():
     parser.add_argument('--numberoftrails', type=int, default=None,
                         help="Number of trails.")
 
+    parser.add_argument('--dumplp', action='store_true',
+                        help="Write the MILP model into an .lp file (for debugging).")
+
     # Parse command line arguments and construct parameter list.
     args = parser.parse_args()
     params = loadparameters(args)
@@ -64,6 +64,11 @@ import time
 from sage.all import *
 from sage.crypto.sboxes import SBox
 import itertools
+import sys
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from dlcore import tables, mzntables
+from dlcore.reduction import reduce_inequalities, describe
 
 # ESPRESO_BIN_PATH = os.path.join(os.environ['SAGE_ROOT'], 'local/bin/espresso')
 ESPRESO_BIN_PATH = os.path.join(os.getcwd(), 'espresso', 'build', 'espresso')
@@ -137,6 +142,7 @@ class SboxAnalyzer(SBox):
 
         super().__init__(lookuptable)
         SboxAnalyzer.sbox_counter += 1
+        self.lut = tables.lookup_table([self[x] for x in range(2**self.input_size())])
         if not os.path.exists(os.path.join(os.getcwd(), 'tmp')):
             os.makedirs(os.path.join(os.getcwd(), 'tmp'))
         self.truth_table_filename = os.path.join(os.getcwd(), 'tmp', 'tt_' + str(SboxAnalyzer.sbox_counter) + '.txt')
@@ -320,6 +326,41 @@ class SboxAnalyzer(SBox):
             milp_constraints.append("{}".format(lp_constraint))
         sat_clauses = ' & '.join(sat_clauses)
         return (sat_clauses, milp_constraints)
+
+    def reduce_constraints(self, milp_constraints, table="ddt", subtable=None, method="milp", time_limit=600):
+        """
+        Select a smallest subset of the given constraints (e.g., the output of ESPRESSO, or the
+        facets of the convex hull) which still cuts off every point outside the subtable,
+        by solving a set-cover MILP (with a greedy fallback, see dlcore/reduction.py)
+
+        :param milp_constraints list: candidate inequalities over a0, ..., b0, ... (valid for every point of the subtable)
+        :param table str: 'ddt', 'lat' (squared LAT), or 'dlct'
+        :param subtable: entry of the table defining the subtable (None: the star table, i.e., all nonzero entries)
+        :param method str: 'milp' or 'greedy'
+        :param time_limit int: time limit of the set-cover MILP in seconds
+        :return: the reduced list of inequalities
+        """
+
+        if table == "ddt":
+            if self._data_required_for_differential_analysis is None:
+                self._compute_data_for_differential_analysis()
+            values = self.ddt
+        elif table == "lat":
+            if self._data_required_for_linear_analysis is None:
+                self._compute_data_for_linear_analysis()
+            values = self._squared_lat
+        elif table == "dlct":
+            if self._data_required_for_difflin_analysis is None:
+                self._compute_data_for_difflin_analysis()
+            values = self._dlct
+        else:
+            raise ValueError("Invalid value for table! table must be in ['ddt', 'lat', 'dlct'].")
+        values = np.asarray(values)
+        valid = (values != 0) if subtable is None else (values == subtable)
+        placeholders = [f"a{i}" for i in range(self.input_size())] + [f"b{i}" for i in range(self.output_size())]
+        reduction = reduce_inequalities(milp_constraints, placeholders, valid, method=method, time_limit=time_limit)
+        print(describe(reduction))
+        return reduction.inequalities
         
     ###############################################################################################################
     ###############################################################################################################
@@ -338,8 +379,8 @@ class SboxAnalyzer(SBox):
         Compute the data required for differential analysis
         """
         
-        self.ddt = self.difference_distribution_table()
-        self._diff_spectrum = set([self.ddt[i][j] for i in range(2**self.input_size()) for j in range(2**self.output_size())]) - {0, 2**self.input_size()}
+        self.ddt = tables.difference_distribution_table(self.lut, self.output_size())
+        self._diff_spectrum = set(tables.spectrum(self.ddt)) - {0, 2**self.input_size()}
         self._diff_spectrum = sorted(list(self._diff_spectrum))
         self._len_diff_spectrum = len(self._diff_spectrum)
         self._diff_weights = [abs(float(log(d/(2**self.input_size()), 2))) for d in self._diff_spectrum]        
@@ -577,9 +618,9 @@ class SboxAnalyzer(SBox):
         """
         Compute the data required for linear analysis
         """
-        self.lat = self.linear_approximation_table(scale='correlation')
-        self._squared_lat = [[x**2 for x in y] for y in self.lat]
-        self._squared_correlation_spectrum = sorted(list(set(flatten(self._squared_lat)) - {0, 1}))
+        self.lat = tables.linear_approximation_table(self.lut, self.output_size(), scale='correlation')
+        self._squared_lat = self.lat**2
+        self._squared_correlation_spectrum = sorted(list(set(tables.spectrum(self._squared_lat)) - {0, 1}))
         self._linear_weights = [abs(float(log(x, 2))) for x in self._squared_correlation_spectrum]
         self._len_linear_weights = len(self._linear_weights)
         if self._len_linear_weights > 0:            
@@ -987,6 +1028,63 @@ class SboxAnalyzer(SBox):
         constraints += f"else ({last_condition})\nendif"
         return constraints
 
+    def generate_cp_table(self, propagation_dictionary, name, input_variables=None, output_variables=None):
+        """
+        Generates a MiniZinc predicate encoding the deterministic propagation as a table constraint
+        (a compact alternative of the if-elseif chain of generate_cp_constraints, see dlcore/mzntables.py)
+
+        :param dict propagation_dictionary: output of encode_deterministic_differential_behavior or encode_deterministic_linear_behavior
+        :param str name: name of the predicate
+        :param list input_variables: names of the input variables (msb first)
+        :param list output_variables: names of the output variables (msb first)
+        :return: the predicate as a string
+        """
+
+        m = self.input_size()
+        n = self.output_size()
+        a = [f"x{m - i - 1}" for i in range(m)] if input_variables is None else input_variables
+        b = [f"y{n - i - 1}" for i in range(n)] if output_variables is None else output_variables
+        if len(a) != m or len(b) != n:
+            raise ValueError(f"The size of input (output) variables should be {m} ({n})")
+        rows = mzntables.deterministic_tuples(propagation_dictionary, m, n, unknown=self.unknown)
+        parameters = [(v, range(self.unknown, self.one + 1)) for v in a + b]
+        return mzntables.table_predicate(name, parameters, rows)
+
+    def generate_cp_star_table(self, name, table="ddt", input_variables=None, output_variables=None):
+        """
+        Generates a MiniZinc predicate encoding the possible transitions of the *-DDT, *-LAT or *-DLCT as a table constraint
+
+        :param str name: name of the predicate
+        :param str table: "ddt", "lat" or "dlct"
+        :param list input_variables: names of the input variables (msb first)
+        :param list output_variables: names of the output variables (msb first)
+        :return: the predicate as a string
+        """
+
+        if table == "ddt":
+            if self._data_required_for_differential_analysis is None:
+                self._compute_data_for_differential_analysis()
+            values = self.ddt
+        elif table == "lat":
+            if self._data_required_for_linear_analysis is None:
+                self._compute_data_for_linear_analysis()
+            values = self.lat
+        elif table == "dlct":
+            if self._data_required_for_difflin_analysis is None:
+                self._compute_data_for_difflin_analysis()
+            values = self._dlct
+        else:
+            raise ValueError("table should be 'ddt', 'lat' or 'dlct'")
+        m = self.input_size()
+        n = self.output_size()
+        a = [f"x{m - i - 1}" for i in range(m)] if input_variables is None else input_variables
+        b = [f"y{n - i - 1}" for i in range(n)] if output_variables is None else output_variables
+        if len(a) != m or len(b) != n:
+            raise ValueError(f"The size of input (output) variables should be {m} ({n})")
+        rows = mzntables.star_tuples(values, m, n)
+        parameters = [(v, range(0, 2)) for v in a + b]
+        return mzntables.table_predicate(name, parameters, rows)
+
     ###############################################################################################################
     ###############################################################################################################
     ###############################################################################################################
@@ -1013,24 +1111,11 @@ class SboxAnalyzer(SBox):
     def _compute_data_for_difflin_analysis(self):
         """
         Compute the data required for differential-linear analysis
-        """        
-
-        input_size = self.input_size()
-        output_size = self.output_size()
-
-        dlct = [[0 for y in range(2**output_size)] for x in range(2**input_size)]
-        for diff in range(2**input_size):
-            for mask in range(2**output_size):
-                counter_0 = 0
-                counter_1 = 0
-                for data in range(2**input_size):
-                    if self.inner_product(mask, self[data]) == self.inner_product(mask, self[data ^ diff]):
-                        counter_0 += 1 
-                    else:
-                        counter_1 += 1
-                dlct[diff][mask] = counter_0 - counter_1
-        self._dlct = dlct
-        self._dlct_spectrum = sorted(list(set(flatten(self._dlct))))
+        (the DLCT is computed as the Walsh transform of the autocorrelations, see dlcore/tables.py)
+        """
+
+        self._dlct = tables.differential_linear_connectivity_table(self.lut, self.output_size())
+        self._dlct_spectrum = tables.spectrum(self._dlct)
         self._dlct_weights = [abs(float(log(abs(x), 2))) for x in self._dlct_spectrum if x != 0]
         self._len_dlct_weights = len(self._dlct_weights)
         self._data_required_for_difflin_analysis = "Data for linear analysis are computed and stored in memory."
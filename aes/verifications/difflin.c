@@ -145,14 +145,33 @@ int main(int argc, char *argv[])
     //##########################################################################################################################
     //##########################################################################################################################
     //##########################################################################################################################
-    int DEG1 = 0;
-    int DEG2 = 25;
+    // Default values, which can be overridden at compile time, e.g., -DDL_ROUNDS=<rounds> (see dlcore/verify.py)
+#ifndef DL_DEG1
+#define DL_DEG1 0
+#endif
+#ifndef DL_DEG2
+#define DL_DEG2 25
+#endif
+#ifndef DL_EXPERIMENTS
+#define DL_EXPERIMENTS 10
+#endif
+#ifndef DL_ROUNDS
+#define DL_ROUNDS 3
+#endif
+#ifndef DL_DP
+#define DL_DP "0000000000000000000000b400000000"
+#endif
+#ifndef DL_LC
+#define DL_LC "0000000032ab66980000000000000000"
+#endif
+    int DEG1 = DL_DEG1;
+    int DEG2 = DL_DEG2;
     uint64_t N1 = 1ULL << DEG1;
     uint64_t N2 = 1ULL << DEG2;
-    int NUMBER_OF_EXPERIMENTS = 10;   // Number of independent experiments
-    int NUMBER_OF_ROUNDS = 3;   // Number of rounds    
-    char DP_STR[] = "0000000000000000000000b400000000";
-    char LC_STR[] = "0000000032ab66980000000000000000";
+    int NUMBER_OF_EXPERIMENTS = DL_EXPERIMENTS;   // Number of independent experiments
+    int NUMBER_OF_ROUNDS = DL_ROUNDS;   // Number of rounds    
+    char DP_STR[] = DL_DP;
+    char LC_STR[] = DL_LC;
     //##########################################################################################################################
     
     uint8_t* input_difference = malloc(16*sizeof(uint8_t));
@@ -25,10 +25,18 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import logging
 from pathlib import Path
 from random import randint
-logging.basicConfig(filename="minizinc-python.log", level=logging.DEBUG)
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import configure_logging, output_path, run_directory, run_id, write_summary
+from dlcore.anytime import stream_solutions
+from dlcore.portfolio import race
+from dlcore.flatzinc import CompiledInstance, time_split
+from dlcore.cpsat import CpSatModel
+from dlct import compute_correlation, truncated_size
+import math
 import time
 import minizinc
 import datetime
@@ -63,11 +71,19 @@ class DiffLin:
         self.RML = param["RML"]
         self.RD = self.RU + self.RM + self.RL
         self.cp_solver_name = param["solver"]
-        self.cp_solver = minizinc.Solver.lookup(self.cp_solver_name)
+        if param["backend"] == "minizinc":
+            self.cp_solver = minizinc.Solver.lookup(self.cp_solver_name)
         self.time_limit = param["timelimit"]
+        self.target = param["target"]
+        self.stall = param["stall"]
+        self.portfolio = param["portfolio"]
+        self.prune = param["prune"]
+        self.backend = param["backend"]
+        # configuration under which the winners of the solver portfolio are recorded
+        self.configuration = "ascon " + " ".join(f"{name}={param[name]}" for name in ["RU", "RM", "RL", "RMU", "RML"])
         self.num_of_threads = param["np"]
         self.mzn_file_name = None
-        self.output_file_name = param["output"]
+        self.output_file_name = output_path(param["output"])
         self.mzn_file_name = "attack.mzn"
     
     #############################################################################################################################################
@@ -93,25 +109,53 @@ class DiffLin:
         start_time = time.time()
         #############################################################################################################################################
         print(f"Searching a distinguisher for {self.RD} rounds of Ascon ...")
-        self.cp_model = minizinc.Model()
-        self.cp_model.add_file(self.mzn_file_name)
-        self.cp_inst = minizinc.Instance(solver=self.cp_solver, model=self.cp_model)
-        self.cp_inst["RU"] = self.RU
-        self.cp_inst["RM"] = self.RM
-        self.cp_inst["RL"] = self.RL
-        self.cp_inst["RMU"] = self.RMU
-        self.cp_inst["RML"] = self.RML
-        self.cp_inst["offset"] = 0
-        self.result = self.cp_inst.solve(timeout=time_limit, 
-                                         processes=self.num_of_threads, 
-                                         verbose=False, 
-                                         debug_output=Path("./debug_output.txt",
-                                         intermediate_solutions=True),
-                                         random_seed=randint(0, 100))
-                                        #  optimisation_level=2)
+        if self.backend == "cpsat":
+            self.cp_model = self.build_cpsat_model()
+            self.result = self.cp_model.solve(self.report_solution,
+                                              timeout=time_limit,
+                                              target=self.target,
+                                              stall=self.stall,
+                                              num_workers=self.num_of_threads,
+                                              random_seed=randint(0, 100),
+                                              hint_key=self.configuration)
+        else:
+            self.cp_model = minizinc.Model()
+            self.cp_model.add_file(self.mzn_file_name)
+            self.cp_inst = CompiledInstance(solver=self.cp_solver, model=self.cp_model)
+            self.cp_inst["RU"] = self.RU
+            self.cp_inst["RM"] = self.RM
+            self.cp_inst["RL"] = self.RL
+            self.cp_inst["RMU"] = self.RMU
+            self.cp_inst["RML"] = self.RML
+            self.cp_inst["offset"] = 0
+            if self.portfolio is None:
+                self.result = stream_solutions(self.cp_inst, self.report_solution,
+                                               timeout=time_limit,
+                                               target=self.target,
+                                               stall=self.stall,
+                                               processes=self.num_of_threads,
+                                               verbose=False,
+                                               debug_output=Path(output_path("debug_output.txt")),
+                                               random_seed=randint(0, 100))
+                                              #  optimisation_level=2)
+            else:
+                self.result = race(self.cp_inst, self.report_solution,
+                                   portfolio=self.portfolio,
+                                   key=self.configuration,
+                                   prune=self.prune,
+                                   timeout=time_limit,
+                                   target=self.target,
+                                   stall=self.stall,
+                                   processes=self.num_of_threads,
+                                   verbose=False,
+                                   debug_output=Path(output_path("debug_output.txt")),
+                                   random_seed=randint(0, 100))
         #############################################################################################################################################
         elapsed_time = time.time() - start_time
         print("Time used to find a distinguisher: {:0.02f} seconds".format(elapsed_time))
+        self.times = time_split(self.result.statistics, elapsed_time)
+        print("Time used to compile the model: {:0.02f} seconds{}, to solve it: {:0.02f} seconds".format(
+              self.times["compile_time"], " (cached)" if self.times["compile_cached"] else "", self.times["solve_time"]))
         print(f"Solver status: {self.result.status}")
         if minizinc.Status.has_solution(self.result.status) or self.result.status == minizinc.Status.ERROR:
             self.attack_summary, self.upper_trail, self.lower_trail = self.parse_solution()
@@ -121,6 +165,13 @@ class DiffLin:
             print("-Log2(P)              ~= \t{:02d}".format(self.result["PU"]))
             print("-Log2(r)              ~= \t{:02d}".format(self.result["CM"]))
             print("-Log2(Q^2)            ~= \t{:02d}".format(self.result["CL"]))      
+            if self.middle_weight is not None:
+                print("-Log2(r) (DLCT)       ~= \t{:0.02f}".format(self.middle_weight))
+            write_summary({"RU": self.RU, "RM": self.RM, "RL": self.RL, "RMU": self.RMU, "RML": self.RML,
+                           "status": str(self.result.status), "objective": self.result.objective, "time": elapsed_time, **self.times,
+                           "PU": self.result["PU"], "CM": self.result["CM"], "CL": self.result["CL"],
+                           "estimate": -(self.result["PU"] + self.result["CM"] + self.result["CL"]),
+                           "CM_dlct": self.middle_weight})
         elif self.result.status == minizinc.Status.UNSATISFIABLE:
             print("Model is unsatisfiable") 
         elif self.result.status == minizinc.Status.UNKNOWN:
@@ -128,6 +179,112 @@ class DiffLin:
         else:
             print("Solving process was interrupted")
 
+    def report_solution(self, result, count, elapsed):
+        """
+        Report an improving solution as soon as the solver finds it
+
+        :param minizinc.Result result: the improving solution
+        :param int count: number of solutions found so far
+        :param float elapsed: seconds since the search started
+        """
+
+        self.result = result
+        print(f"Solution {count} found after {elapsed:0.02f} seconds, objective: {result.objective}")
+        self.attack_summary, self.upper_trail, self.lower_trail = self.parse_solution()
+        print(self.attack_summary)
+        draw = DrawDL(self, output_file_name=self.output_file_name)
+        draw.generate_distinguisher_shape()
+
+    def build_cpsat_model(self):
+        """
+        Build the model of attack.mzn directly with CP-SAT (no MiniZinc/FlatZinc in between)
+
+        :rtype CpSatModel:
+        """
+
+        RU, RM, RL, RMU, RML = self.RU, self.RM, self.RL, self.RMU, self.RML
+        rotation_dictionary = [[19, 28], [61, 39], [1, 6], [10, 17], [7, 41]]
+        model = CpSatModel(self.mzn_file_name)
+        add = model.model.Add
+
+        def column_of(state, column):
+            return [state[row][column] for row in range(5)]
+
+        def rotated(state, row, column, sign):
+            return [state[row][column],
+                    state[row][(column + sign*rotation_dictionary[row][0] + 64) % 64],
+                    state[row][(column + sign*rotation_dictionary[row][1] + 64) % 64]]
+
+        # EU
+        xu = model.array("xu", [RU + 1, 5, 64], 0, 1)
+        yu = model.array("yu", [RU, 5, 64], 0, 1)
+        pu = model.array("pu", [RU, 3, 64], 0, 1)
+        for r in range(RU):
+            for column in range(64):
+                model.table("sbox_diff", column_of(xu[r], column) + column_of(yu[r], column) + [pu[r][i][column] for i in range(3)])
+            for row in range(5):
+                for column in range(64):
+                    model.table("xor3", rotated(yu[r], row, column, -1) + [xu[r + 1][row][column]])
+        add(sum(sum(row) for row in xu[0]) != 0)
+        # EM (upper part)
+        xmu = model.array("xmu", [RM + 1, 5, 64], -1, 1)
+        ymu = model.array("ymu", [RM, 5, 64], -1, 1)
+        dmu = model.array("dmu", [RM, 64], 0, 1)
+        for row in range(5):
+            for column in range(64):
+                add(xmu[0][row][column] == xu[RU][row][column])
+        for r in range(RM):
+            for column in range(64):
+                predicate = "sbox_diff_star_table" if r < RMU else "sbox_diff_m_table"
+                model.table(predicate, column_of(xmu[r], column) + column_of(ymu[r], column) + [dmu[r][column]])
+            for row in range(5):
+                for column in range(64):
+                    predicate = "xor3" if r < RMU else "xor3_pr1"
+                    model.table(predicate, rotated(ymu[r], row, column, -1) + [xmu[r + 1][row][column]])
+        # EM (lower part)
+        xml = model.array("xml", [RM + 1, 5, 64], -1, 1)
+        yml = model.array("yml", [RM, 5, 64], -1, 1)
+        dml = model.array("dml", [RM, 64], 0, 1)
+        for r in range(RM):
+            for column in range(64):
+                predicate = "sbox_lin_m_table" if r < RM - RML else "sbox_lin_star_table"
+                model.table(predicate, column_of(yml[r], column) + column_of(xml[r], column) + [dml[r][column]])
+            for row in range(5):
+                for column in range(64):
+                    predicate = "xor3_pr1" if r < RM - RML else "xor3"
+                    model.table(predicate, rotated(xml[r + 1], row, column, 1) + [yml[r][row][column]])
+        # EL
+        xl = model.array("xl", [RL + 1, 5, 64], 0, 1)
+        yl = model.array("yl", [RL, 5, 64], 0, 1)
+        pl = model.array("pl", [RL, 2, 64], 0, 1)
+        for row in range(5):
+            for column in range(64):
+                add(xl[0][row][column] == xml[RM][row][column])
+        for r in range(RL):
+            for column in range(64):
+                model.table("sbox_lin", column_of(yl[r], column) + column_of(xl[r], column) + [pl[r][0][column], pl[r][1][column]])
+            for row in range(5):
+                for column in range(64):
+                    model.table("xor3", rotated(xl[r + 1], row, column, 1) + [yl[r][row][column]])
+        add(sum(sum(row) for row in xl[RL]) != 0)
+        # objective (offset = 0, see search())
+        PU = model.variable("PU", 0, 320)
+        CM = model.variable("CM", 0, 320 + 4*320)
+        CL = model.variable("CL", 0, 320)
+        NASM = model.variable("NASM", 0, 320)
+        add(PU == 4*sum(pu[r][0][column] for r in range(RU) for column in range(64)) +
+                  3*sum(pu[r][1][column] for r in range(RU) for column in range(64)) +
+                  2*sum(pu[r][2][column] for r in range(RU) for column in range(64)))
+        add(CM == sum(model.indicator([xmu[r][row][column], xml[r][row][column]], [(-1, 0, 1)]*2,
+                                      lambda u, l: (u, l) in [(-1, -1), (-1, 1), (1, -1)])
+                      for r in range(RM) for row in range(5) for column in range(64)))
+        add(NASM == sum(model.indicator([dmu[r][column], dml[r][column]], [(0, 1)]*2, lambda u, l: u + l == 2)
+                        for r in range(RM) for column in range(64)))
+        add(CL == 4*sum(pl[r][0][column] for r in range(RL) for column in range(64)) +
+                  2*sum(pl[r][1][column] for r in range(RL) for column in range(64)))
+        model.minimize(PU + CM + CL)
+        return model
+
     #############################################################################################################################################
     #############################################################################################################################################
     #  ____                           _    _             ____          _         _    _               
@@ -198,6 +355,9 @@ class DiffLin:
         attack_summary += f"Q^2: {self.result['CL']}\n"
         attack_summary += f"Number of effective S-boxes in the middle:       {self.result['NASM']}\n"
         attack_summary += f"Number of effective bit-positions in the middle: {self.result['CM']}\n"
+        self.middle_weight = self.compute_middle_weight()
+        if self.middle_weight is not None:
+            attack_summary += f"-Log2(r) evaluated by the DLCT:                  {self.middle_weight:0.2f}\n"
         attack_summary += "#"*50 + "\n"
         # print the upper trail
         attack_summary += "Upper trail:\n"
@@ -223,6 +383,31 @@ class DiffLin:
             attack_summary += "#"*50 + "\n\n"
         return attack_summary, upper_trail, lower_trail
 
+    def compute_middle_weight(self):
+        """
+        Evaluate -log2 of the absolute correlation of the middle part with the DLCT of the S-box.
+        Every S-box layer of the middle part is evaluated for the truncated input differences
+        xmu[r] and the (truncated) output masks yml[r], where the 64 S-boxes of all RM rounds
+        are evaluated at once (see compute_correlation in dlct.py). The result is exact for RM = 1,
+        and for RM > 1 it is the product of the correlations of the S-box layers.
+        Returns None if the correlation is zero.
+        """
+
+        if self.RM == 0:
+            return None
+        dxs = [[[self.result["xmu"][r][row][column] for row in range(5)] for column in range(64)] for r in range(self.RM)]
+        lys = [[[self.result["yml"][r][row][column] for row in range(5)] for column in range(64)] for r in range(self.RM)]
+        summations = compute_correlation(None, dxs, lys)
+        weight = 0
+        for r in range(self.RM):
+            if summations[r] == 0:
+                return None
+            number_of_terms = 1
+            for column in range(64):
+                number_of_terms *= truncated_size(dxs[r][column]) * truncated_size(lys[r][column]) * 2**5
+            weight += math.log2(number_of_terms) - math.log2(abs(summations[r]))
+        return weight
+
 #############################################################################################################################################
 #############################################################################################################################################
 #############################################################################################################################################
@@ -245,6 +430,11 @@ def loadparameters(args):
             "RML": 0,
             "np" : 8,
             "tl"  : -1,
+            "target" : None,
+            "stall" : None,
+            "portfolio" : None,
+            "prune" : None,
+            "backend" : "minizinc",
             "solver"  : "ortools",
             "output"  : "output.tex"}
 
@@ -263,6 +453,16 @@ def loadparameters(args):
         params["np"] = args.np
     if args.timelimit is not None:
         params["timelimit"] = args.timelimit
+    if args.target is not None:
+        params["target"] = args.target
+    if args.stall is not None:
+        params["stall"] = args.stall
+    if args.portfolio is not None:
+        params["portfolio"] = args.portfolio
+    if args.prune is not None:
+        params["prune"] = args.prune
+    if args.backend is not None:
+        params["backend"] = args.backend
     if args.solver is not None:
         params["solver"] = args.solver
     if args.output is not None:
@@ -288,16 +488,26 @@ def main():
     parser.add_argument("-RML", type=int, default=0, help="Number of rounds passed probabilistically at the end of EM")
     parser.add_argument("-np", type=int, default=8, help="Number of parallel threads")
     parser.add_argument("-tl", "--timelimit", type=int, default=36000, help="Time limit in seconds")
+    parser.add_argument("--target", type=int, default=None, help="Stop as soon as the objective of the CP model reaches this value")
+    parser.add_argument("--stall", type=int, default=None, help="Stop when no improving solution is found within this many seconds after the previous one")
     # Fetch available solvers from MiniZinc
-    available_solvers = [solver_name for solver_name in minizinc.default_driver.available_solvers().keys()]
+    available_solvers = [solver_name for solver_name in minizinc.default_driver.available_solvers().keys()] if minizinc.default_driver is not None else []
     parser.add_argument("-sl", "--solver", default="cp-sat", type=str,
                         choices=available_solvers,
                         help="Choose a CP solver")    
+    parser.add_argument("-pf", "--portfolio", default=None, type=str,
+                        help="Race several solvers (and seeds), e.g., cp-sat,cp-sat:7,chuffed,gurobi (overrides --solver)")
+    parser.add_argument("--prune", type=int, default=None,
+                        help="Only race the given number of best solvers of the portfolio (according to the past winners)")
+    parser.add_argument("-b", "--backend", default="minizinc", type=str, choices=["minizinc", "cpsat"],
+                        help="Solve attack.mzn through MiniZinc, or build the same model directly with OR-Tools CP-SAT")
     parser.add_argument("-o", "--output", default="output.tex", type=str, help="Output file name")
 
     # Parse command line arguments and construct parameter list
     args = parser.parse_args()
     params = loadparameters(args)
+    configure_logging("minizinc-python.log")
+    print(f"Run ID: {run_id()}, outputs in {run_directory()}")
     dld = DiffLin(params)
     dld.search()
 
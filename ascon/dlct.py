@@ -22,9 +22,17 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-from sage.all import *
-from sboxanalyzer import *
-import itertools
+import os
+import sys
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore import tables
+
+# S-box of Ascon (x0 is the msb of the input, i.e., row 0 of the state)
+ASCON_SBOX = [0x04, 0x0b, 0x1f, 0x14, 0x1a, 0x15, 0x09, 0x02, 0x1b, 0x05, 0x08, 0x12, 0x1d, 0x03, 0x06, 0x1c,
+              0x1e, 0x13, 0x07, 0x0e, 0x00, 0x0d, 0x11, 0x18, 0x10, 0x0c, 0x01, 0x19, 0x16, 0x0a, 0x0f, 0x17]
+
+_truncated_dlcts = dict()
 
 def binlist_to_int(L, n):
     """
@@ -32,6 +40,93 @@ def binlist_to_int(L, n):
     """
     return sum([L[i]*2**(n-1-i) for i in range(n)])
 
+def truncated_index(L):
+    """
+    Encode a truncated vector (entries in {0, 1, -1}, -1 = unknown) as
+    an integer in base 3 (digits 0, 1, 2 for 0, 1, -1).
+    """
+    index = 0
+    for x in L:
+        index = 3*index + (2 if x == -1 else x)
+    return index
+
+def truncated_membership_table(n):
+    """
+    M[t][x] = 1 if the n-bit value x matches the truncated vector with index t, and 0 otherwise.
+    """
+    M = np.ones((1, 1), dtype=np.int64)
+    for _ in range(n):
+        # append one trit (0, 1, or *) and one bit to every index
+        digit = np.array([[1, 0], [0, 1], [1, 1]], dtype=np.int64)
+        M = np.kron(M, digit)
+    return M
+
+def get_dlct(sa=None):
+    """
+    Return the DLCT as an ndarray together with the input and output sizes.
+    sa can be an SboxAnalyzer, a lookup table, or None (the S-box of Ascon).
+    """
+    if sa is None:
+        sa = ASCON_SBOX
+    if hasattr(sa, "differential_linear_connectivity_table"):
+        dlct = np.array(sa.differential_linear_connectivity_table(), dtype=np.int64)
+    else:
+        dlct = tables.differential_linear_connectivity_table(sa, tables.bit_length(len(sa)))
+    return dlct, tables.bit_length(dlct.shape[0]), tables.bit_length(dlct.shape[1])
+
+def truncated_dlct(sa=None):
+    """
+    T[t][u] = sum of dlct[dx][ly] over all dx matching the truncated difference with index t
+    and all ly matching the truncated mask with index u (computed once per DLCT).
+    """
+    dlct, m, n = get_dlct(sa)
+    key = (dlct.shape, dlct.tobytes())
+    if key not in _truncated_dlcts:
+        _truncated_dlcts[key] = truncated_membership_table(m) @ dlct @ truncated_membership_table(n).T
+    return _truncated_dlcts[key]
+
+def compute_correlation(sa, dxs, lys):
+    """
+    Compute the correlation for the middle part of DL distinguishers of Ascon
+    when it involves any number of S-boxes with truncated input differences dxs
+    and (truncated) output linear masks lys, i.e.,
+
+        sum_{d0 in DX0, ..., l0 in LY0, ...} dlct[d0][l0] * dlct[d1][l1] * ...
+
+    Since the S-boxes are independent, the sum of products is evaluated as the
+    product of the per-S-box partial sums, which are read from truncated_dlct(sa).
+
+    :param sa: SboxAnalyzer, lookup table, or None (the S-box of Ascon)
+    :param dxs: list of truncated input differences (one list of bits per S-box, -1 = unknown),
+                or a batch of such lists (shape: batch x S-boxes x input size)
+    :param lys: output linear masks, in the same shape as dxs
+    :return: the (exact) summation, or the list of summations for a batch
+    """
+    if len(dxs) == 0 or len(lys) == 0:
+        # no S-box in the middle part: empty product
+        return 1
+    table = truncated_dlct(sa)
+    dxs = np.asarray(dxs, dtype=np.int64)
+    lys = np.asarray(lys, dtype=np.int64)
+    batch = dxs.ndim == 3
+    if not batch:
+        dxs = dxs[None]
+        lys = lys[None]
+    powers = 3**np.arange(dxs.shape[-1] - 1, -1, -1)
+    dx_indices = np.where(dxs == -1, 2, dxs) @ powers
+    ly_indices = np.where(lys == -1, 2, lys) @ 3**np.arange(lys.shape[-1] - 1, -1, -1)
+    partial_sums = table[dx_indices, ly_indices].astype(object)
+    summations = [int(np.prod(row)) if len(row) > 0 else 1 for row in partial_sums]
+    if batch:
+        return summations
+    return summations[0]
+
+def truncated_size(L):
+    """
+    Return the number of binary vectors matching the truncated vector L
+    """
+    return 2**sum(1 for x in L if x == -1)
+
 def compute_correlation_1(sa, dx, ly):
     """
     Compute the correlation for the middle part of DL distinguishers of Ascon
@@ -39,14 +134,7 @@ def compute_correlation_1(sa, dx, ly):
     output linear mask ly.
     """
 
-    dlct = sa.differential_linear_connectivity_table()
-    DX = sa.truncated_to_binvectors(dx)
-    LY = sa.truncated_to_binvectors(ly)
-    summation = 0
-    for d in DX:
-        for l in LY:
-            summation += dlct[binlist_to_int(d, sa.m)][binlist_to_int(l, sa.n)]
-    return summation
+    return compute_correlation(sa, [dx], [ly])
 
 def compute_correlation_3(sa, dx0, dx1, dx2, ly0, ly1, ly2):
     """
@@ -55,21 +143,7 @@ def compute_correlation_3(sa, dx0, dx1, dx2, ly0, ly1, ly2):
     and fixed output linear masks (ly0, ly1, ly2).
     """
 
-    dlct = sa.differential_linear_connectivity_table()
-    DX0 = sa.truncated_to_binvectors(dx0)
-    DX1 = sa.truncated_to_binvectors(dx1)
-    DX2 = sa.truncated_to_binvectors(dx2)
-    l0 = binlist_to_int(ly0, sa.n)
-    l1 = binlist_to_int(ly1, sa.n)
-    l2 = binlist_to_int(ly2, sa.n)
-    summation = 0
-    for DX in itertools.product(*[DX0, DX1, DX2]):
-        d0 = binlist_to_int(DX[0], sa.m)
-        d1 = binlist_to_int(DX[1], sa.m)
-        d2 = binlist_to_int(DX[2], sa.m)
-        temp = dlct[d0][l0]*dlct[d1][l1]*dlct[d2][l2]
-        summation += temp
-    return summation
+    return compute_correlation(sa, [dx0, dx1, dx2], [ly0, ly1, ly2])
 
 def compute_correlation_6(sa, dx0, dx1, dx2, dx3, dx4, dx5, ly0, ly1, ly2, ly3, ly4, ly5):
     """
@@ -78,34 +152,13 @@ def compute_correlation_6(sa, dx0, dx1, dx2, dx3, dx4, dx5, ly0, ly1, ly2, ly3,
     and fixed output linear masks (ly0, ly1, ly2, ly3, ly4, ly5).
     """
 
-    dlct = sa.differential_linear_connectivity_table()
-    DX0 = sa.truncated_to_binvectors(dx0)
-    DX1 = sa.truncated_to_binvectors(dx1)
-    DX2 = sa.truncated_to_binvectors(dx2)
-    DX3 = sa.truncated_to_binvectors(dx3)
-    DX4 = sa.truncated_to_binvectors(dx4)
-    DX5 = sa.truncated_to_binvectors(dx5)
-    l0 = binlist_to_int(ly0, sa.n)
-    l1 = binlist_to_int(ly1, sa.n)
-    l2 = binlist_to_int(ly2, sa.n)
-    l3 = binlist_to_int(ly3, sa.n)
-    l4 = binlist_to_int(ly4, sa.n)
-    l5 = binlist_to_int(ly5, sa.n)
-    summation = 0
-    for DX in itertools.product(*[DX0, DX1, DX2, DX3, DX4, DX5]):
-        d0 = binlist_to_int(DX[0], sa.m)
-        d1 = binlist_to_int(DX[1], sa.m)
-        d2 = binlist_to_int(DX[2], sa.m)
-        d3 = binlist_to_int(DX[3], sa.m)
-        d4 = binlist_to_int(DX[4], sa.m)
-        d5 = binlist_to_int(DX[5], sa.m)
-        temp = dlct[d0][l0]*dlct[d1][l1]*dlct[d2][l2]*dlct[d3][l3]*dlct[d4][l4]*dlct[d5][l5]
-        summation += temp
-    return summation
+    return compute_correlation(sa, [dx0, dx1, dx2, dx3, dx4, dx5], [ly0, ly1, ly2, ly3, ly4, ly5])
     
 
 
 if __name__ == '__main__':
+    from sage.all import *
+    from sboxanalyzer import *
     from sage.crypto.sboxes import Ascon as sb
     sa = SboxAnalyzer(sb)
     dlct = sa.differential_linear_connectivity_table()
@@ -30,12 +30,83 @@ or Markov cipher assumption. The tool's primary function is to find some bounds
 for the security of CLEFIA against linear and differential-linear cryptanalysis.
 """
 
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import run_directory, run_id, write_summary
+from dlcore.candidates import distinct_solutions, rank_candidates, ranking_table, truncated_trail_key
 from argparse import ArgumentParser, RawTextHelpFormatter
 from truncdifflin import TruncatedDiffLin
 from diff import Diff
 from lin import Lin
 from plotdistinguisher import *
 
+def instantiate_upper_trail(upper_trail, RU):
+    """
+    Instantiate the truncated upper trail with a differential trail and compute its differential effect
+    (solved in a worker process, concurrently with the lower trail, see dlcore/pipeline.py)
+    """
+
+    time_limit = 10000
+    params = {"nrounds" : RU,
+              "mode" : 0,
+              "startweight" : 0,
+              "endweight" : 128,
+              "timelimit" : time_limit,
+              "numberoftrails" : 1,
+              "fixedVariables" : {}}
+    for r in range(RU + 1):
+        for bn in range(4):
+            for word in range(4):
+                byten = bn*4 + word
+                if upper_trail[f"x_{r}"][2*byten:2*(byten + 1)] == "00":
+                    for bit in range(8):
+                        params["fixedVariables"][f"x_{r}_{bn}_{word}_{bit}"] = "0"
+    # seed the solver with a fast instantiation of the truncated upper trail (see dlcore/warmstart.py)
+    params["warmstart"] = True
+    diff = Diff(params)
+    diff.make_model()
+    diff_upper_trail = diff.solve()
+    params["fixedVariables"] = {"x_0": diff_upper_trail["x_0"], f"x_{RU}": diff_upper_trail[f"x_{RU}"]}
+    params["mode"] = 2
+    diff = Diff(params)
+    diff.make_model()
+    diff_effect_upper = diff.solve()
+    return diff_upper_trail, diff_effect_upper
+
+def instantiate_lower_trail(lower_trail, RM, RL):
+    """
+    Instantiate the truncated lower trail with a linear trail and compute its squared correlation
+    (solved in a worker process, concurrently with the upper trail, see dlcore/pipeline.py)
+    """
+
+    time_limit = 10000
+    params = {"nrounds" : RL,
+              "mode" : 0,
+              "startweight" : 0,
+              "endweight" : 128,
+              "timelimit" : time_limit,
+              "numberoftrails" : 1,
+              "fixedVariables" : {}}
+    for r in range(RL + 1):
+        for bn in range(4):
+            for word in range(4):
+                byten = 4*bn + word
+                if lower_trail[f"x_{r + RM}"][2*byten:2*(byten + 1)] == "00":
+                    for bit in range(8):
+                        params["fixedVariables"][f"x_{r}_{bn}_{word}_{bit}"] = "0"
+    # seed the solver with a fast instantiation of the truncated lower trail (see dlcore/warmstart.py)
+    params["warmstart"] = True
+    lin = Lin(params)
+    lin.make_model()
+    lin_lower_trail = lin.solve()
+    params["fixedVariables"] = {"x_0": lin_lower_trail["x_0"], f"x_{RL}": lin_lower_trail[f"x_{RL}"]}
+    params["mode"] = 2
+    lin = Lin(params)
+    lin.make_model()
+    lin_effect_lower = lin.solve()
+    return lin_lower_trail, lin_effect_lower
+
 def main():
 
     # 7 rounds
@@ -88,78 +159,49 @@ def main():
     parser.add_argument('-tl', '--timelimit', type=int,
                         help="time limit in seconds")
     parser.add_argument('-ns', '--numofsols', type=int,
-                        help="number of solutions (currently disabled)")
+                        help="number of distinct truncated trails to instantiate and rank")
 
     # Parse command line arguments and construct parameter list.
     args = parser.parse_args()
     params = loadparameters(args)
+    print(f"Run ID: {run_id()}, outputs in {run_directory()}")
     RU, RM, RL = params["RU"], params["RM"], params["RL"]
+    numofsols = params["numofsols"]
     RMU, RML = params["RMU"], params["RML"]
     WU, WM, WL = params["WU"], params["WM"], params["WL"]
     
     tex_content = tex_init()
     ##############################################################################################
     ##############################################################################################
-    # Step1- Find a truncated differential-linear trail
+    # Step1- Find the numofsols best (pairwise non-equivalent) truncated differential-linear trails
     DL = TruncatedDiffLin(RU=RU, RL=RL, RM=RM, RMU=RMU, RML=RML, WU=WU, WL=WL, WM=WM)    
-    DL.find_truncated_difflin_trail()
-    upper_trail, middle_part, lower_trail = DL.parse_solver_output()
-    ##############################################################################################
+    DL.find_truncated_difflin_trail(number_of_solutions=numofsols)
+    candidates = distinct_solutions(DL.milp_model, DL.parse_solver_output,
+                                    key=lambda trail: truncated_trail_key(trail, RU, RM, RL),
+                                    number_of_solutions=numofsols)
     ##############################################################################################
-    # Step2- Instantiate the upper/lower truncated trails with real differential trails
-    diff_upper_trail = None
-    diff_effect_upper = 0
-    if RU > 0:
-        time_limit = 10000
-        params = {"nrounds" : DL.RU,
-                  "mode" : 0,
-                  "startweight" : 0,
-                  "endweight" : 128,
-                  "timelimit" : time_limit,
-                  "numberoftrails" : 1,
-                  "fixedVariables" : {}}
-        for r in range(DL.RU + 1):
-            for bn in range(4):
-                for word in range(4):
-                    byten = bn*4 + word
-                    if upper_trail[f"x_{r}"][2*byten:2*(byten + 1)] == "00":
-                        for bit in range(8):
-                            params["fixedVariables"][f"x_{r}_{bn}_{word}_{bit}"] = "0"
-        diff = Diff(params)
-        diff.make_model()
-        diff_upper_trail = diff.solve()
-        params["fixedVariables"] = {"x_0": diff_upper_trail["x_0"], f"x_{DL.RU}": diff_upper_trail[f"x_{DL.RU}"]}
-        params["mode"] = 2
-        diff = Diff(params)
-        diff.make_model()
-        diff_effect_upper = diff.solve()
     ##############################################################################################
-    lin_lower_trail = None
-    lin_effect_lower = 0
-    if RL > 0:
-        time_limit = 10000
-        params = {"nrounds" : DL.RL,
-                  "mode" : 0,
-                  "startweight" : 0,
-                  "endweight" : 128,
-                  "timelimit" : time_limit,
-                  "numberoftrails" : 1,
-                  "fixedVariables" : {}}
-        for r in range(DL.RL + 1):
-            for bn in range(4):
-                for word in range(4):
-                    byten = 4*bn + word
-                    if lower_trail[f"x_{r + DL.RM}"][2*byten:2*(byten + 1)] == "00":
-                        for bit in range(8):
-                            params["fixedVariables"][f"x_{r}_{bn}_{word}_{bit}"] = "0"
-        lin = Lin(params)
-        lin.make_model()
-        lin_lower_trail = lin.solve()
-        params["fixedVariables"] = {"x_0": lin_lower_trail["x_0"], f"x_{DL.RL}": lin_lower_trail[f"x_{DL.RL}"]}
-        params["mode"] = 2
-        lin = Lin(params)
-        lin.make_model()
-        lin_effect_lower = lin.solve()
+    # Step2- Instantiate the upper/lower truncated trails with real differential trails for every candidate
+    # All branches are independent, and solved concurrently (see dlcore/pipeline.py).
+    # The candidates are ranked by the bounds on the total correlation p*r*q^2
+    def candidate_jobs(candidate):
+        upper_trail, middle_part, lower_trail = candidate
+        jobs = dict()
+        if RU > 0:
+            jobs["upper"] = (instantiate_upper_trail, (upper_trail, RU))
+        if RL > 0:
+            jobs["lower"] = (instantiate_lower_trail, (lower_trail, RM, RL))
+        return jobs
+    def correlation_bounds(candidate, results):
+        total_weight = results.get("upper", (None, 0))[1] + results.get("lower", (None, 0))[1]
+        return (total_weight + (-4)*candidate[1]["as"], total_weight + (-6)*candidate[1]["as"])
+    ranking = rank_candidates(candidates, candidate_jobs, correlation_bounds)
+    if len(ranking) > 1:
+        print("Ranking of the candidates (log2):")
+        print(ranking_table(ranking, score_names=("upper_bound", "lower_bound")))
+    upper_trail, middle_part, lower_trail = ranking[0].trail
+    diff_upper_trail, diff_effect_upper = ranking[0].results.get("upper", (None, 0))
+    lin_lower_trail, lin_effect_lower = ranking[0].results.get("lower", (None, 0))
     ##############################################################################################
     ##############################################################################################
     # print out a summary of result on terminal
@@ -167,14 +209,14 @@ def main():
     print("Summary of the results:")
     print("Upper trail:")
     if diff_upper_trail != None:
-        diff.print_trail(trail=diff_upper_trail)
+        Diff.print_trail(trail=diff_upper_trail)
     print("#"*27)
     mactive_sboxes = middle_part["as"]
     print(f"Sandwich {RM} rounds in the middle with {mactive_sboxes} active S-boxes")
     print("#"*27)
     print("Lower trail:")
     if lin_lower_trail != None:
-        lin.print_trail(trail=lin_lower_trail)
+        Lin.print_trail(trail=lin_lower_trail)
     print("-"*27)
 
     total_weight = 0
@@ -188,13 +230,17 @@ def main():
     lower_bound = total_weight + (-6)*mactive_sboxes
     print("Total correlation = p*r*q^2 = 2^({:.2f}) x r x 2^({:.2f})".format(diff_effect_upper, lin_effect_lower))
     print("2^({:.2f}) <= Total correlation <= 2^({:.2f})".format(lower_bound, upper_bound))
+    write_summary({"RU": RU, "RM": RM, "RL": RL, "RMU": RMU, "RML": RML, "WU": WU, "WM": WM, "WL": WL, "status": "DONE",
+                   "PU": diff_effect_upper, "CM": mactive_sboxes, "CL": lin_effect_lower,
+                   "lower_bound": lower_bound, "upper_bound": upper_bound,
+                   "candidates": [{"solution": c.index, "upper_bound": c.score[0], "lower_bound": c.score[1]} for c in ranking]})
     print("To compute the accurate value of total correlation, r should be evaluated experimentally or using the DLCT framework")
 
     ##############################################################################################
     ##############################################################################################
     # plot distinguisher
     # if diff_upper_trail != None:
-    #     active_input_bits = diff.flatten_state([[4*i + j for j in range(4)] for i in range(16) if diff_upper_trail["x_0"][i] != "0"])
+    #     active_input_bits = Diff.flatten_state([[4*i + j for j in range(4)] for i in range(16) if diff_upper_trail["x_0"][i] != "0"])
     #     tex_content += tikz_mark_input_bits(active_input_bits, color="red")
     #     tex_content += tex_diff_trail(trail=diff_upper_trail, markpattern="markupperpath", direction="->")
     # else:
@@ -212,7 +258,7 @@ def main():
     #                                         upper_crossing_difference=[str(i) for i in range(16) if upper_trail[f"x_{RU + RM}"][i] != "0"],\
     #                                         markpattern="marklowerpath",\
     #                                         direction="<-")
-    #     active_output_bits = diff.flatten_state([[4*i + j for j in range(4)] for i in range(16) if lin_lower_trail[f"x_{RL}"][i] != "0"])
+    #     active_output_bits = Diff.flatten_state([[4*i + j for j in range(4)] for i in range(16) if lin_lower_trail[f"x_{RL}"][i] != "0"])
     #     tex_content += tikz_mark_output_bits(active_output_bits, color="blue")
     # else:
     #     active_output_bits = []
@@ -37,6 +37,13 @@ from gurobipy import *
 import math
 import uuid
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.milp import ModelBuilder, GREATER_EQUAL, EQUAL, constraint, equality, fix, sum_constraint, to_number, xor
+from dlcore.encoding import compile_inequalities, load_inequalities, sbox_placeholders
+from dlcore.clustering import WeightLayerEnumerator, DEFAULT_POOL_LIMIT
+from dlcore.cache import cached_solve
+from dlcore.warmstart import greedy_time_limit, warm_start
 
 class Lin:
     """
@@ -70,12 +77,19 @@ class Lin:
         self.time_limit = params["timelimit"]
         self.start_weight = params["startweight"]
         self.end_weight = params["endweight"]
+        self.convergence = params.get("convergence", None)
+        self.pool_limit = params.get("poollimit", DEFAULT_POOL_LIMIT)
+        self.processes = params.get("processes", 1)
+        self.threads = params.get("threads", None)
+        self.warm_start = params.get("warmstart", False)
+        self.warm_start_zeros = params.get("warmstartzeros", [])
         self.fixed_variables = params['fixedVariables']
         self.mode = params['mode']
         self.number_of_trails = params["numberoftrails"]
         self.eps = 1e-3
         self.big_m = 2*8        
         self.lp_file_name = f"clefia_nr_{self.nrounds}_{uuid.uuid4()}.lp"        
+        self.dump_lp = params.get("dumplp", False)
         self.result_file_name = f"clefia_nr_{self.nrounds}_{uuid.uuid4()}.result"
         self.binary_variables = []
         self.integer_variables = []
@@ -108,17 +122,14 @@ class Lin:
         p7 <--> -6
         """
 
-        self.sbox_inequalities = [0 for _ in range(2)]
-        self.sbox_inequalities[0] = dict()
-        self.sbox_inequalities[1] = dict()
         self.s0_correlations = {"10": "10", "8": "8", "6_830075": "6.830075", "6": "6", "5_356144": "5.356144", "4_830075": "4.830075", "4_385290": "4.385290"}
         self.s1_correlations = {"12": "12", "10": "10", "8_830075": "8.830075", "8": "8", "7_356144": "7.356144", "6_830075": "6.830075", "6_385290": "6.385290", "6": "6"}
-        for pr in self.s0_correlations.keys():
-            with open(os.path.join("lat-encoding", f"s0_{pr}.txt")) as fileobj:
-                self.sbox_inequalities[0][pr] = fileobj.readlines()
-        for pr in self.s1_correlations.keys():
-            with open(os.path.join("lat-encoding", f"s1_{pr}.txt")) as fileobj:
-                self.sbox_inequalities[1][pr] = fileobj.readlines()
+        placeholders = sbox_placeholders(8, 8)
+        self.sbox_templates = [dict(), dict()]
+        for sn, correlations in enumerate([self.s0_correlations, self.s1_correlations]):
+            for pr in correlations.keys():
+                file_name = os.path.join("lat-encoding", f"s{sn}_{pr}.txt")
+                self.sbox_templates[sn][pr] = load_inequalities(file_name, placeholders, big_m=self.big_m)
 
         self.mds0_constraints_template = [
             'a_00000 + a_01011 + a_01100 + a_01101 + a_01111 + a_10010 + a_10011 + a_10100 + a_10110 + a_11010 + a_11101 + a_11110 + a_11111 + b_00000 - 2 u_00000 = 0',
@@ -314,7 +325,10 @@ class Lin:
             'u_11110 >= 0',
             'a_00100 + a_00110 + a_01110 + a_10100 + a_11111 + b_11111 - 2 u_11111 = 0',
             'u_11111 <= 3',
-            'u_11111 >= 0']            
+            'u_11111 >= 0']
+        mds_placeholders = [f"{v}_{bin(i)[2:].zfill(5)}" for v in "abu" for i in range(32)]
+        self.mds0_template = compile_inequalities(self.mds0_constraints_template, mds_placeholders)
+        self.mds1_template = compile_inequalities(self.mds1_constraints_template, mds_placeholders)
 
     @staticmethod
     def ordered_set(seq):
@@ -412,8 +426,7 @@ class Lin:
         Generate constraints for equality
         a = b
         """
-        constraint = f"{a} - {b} = 0\n"
-        return constraint
+        return [equality(a, b)]
 
     def constraint_by_byte_equality(self, a, b):
         """
@@ -421,10 +434,7 @@ class Lin:
         to equality of two bytes
         """
 
-        constraints = ""
-        for bit in range(8):
-            constraints += f"{a[bit]} - {b[bit]} = 0\n"
-        return constraints
+        return [equality(a[bit], b[bit]) for bit in range(8)]
 
     def constraints_by_xor(self, a, b, c):
         """
@@ -436,11 +446,7 @@ class Lin:
         - a + b + c >= 0
         """
 
-        constraints = f"- {a} - {b} - {c} >= -2\n"
-        constraints += f"{a} + {b} - {c} >= 0\n"
-        constraints += f"{a} - {b} + {c} >= 0\n"
-        constraints += f"- {a} + {b} + {c} >= 0\n"
-        return constraints
+        return xor(a, b, c)
 
     def constraints_by_byte_xor(self, a, b, c):
         """
@@ -448,7 +454,7 @@ class Lin:
         a + b -> c
         """
 
-        constraints = ""
+        constraints = []
         for bit in range(8):
             constraints += self.constraints_by_xor(a[bit], b[bit], c[bit])
         return constraints
@@ -458,21 +464,19 @@ class Lin:
         Generate constraints modeling the DDT of S-box
 
         :return constraints encoding the DDT of S-box:
-        :rtype str:
+        :rtype list:
         """
 
-        constraints = ""
+        constraints = []
         indicator_variable = f"Q_{rn}_{bn}_{byten}"
         pr_indicators = []
         self.binary_variables.append(indicator_variable)
         # Link activeness indicator to input/output
-        sum_input = " + ".join(di)
-        sum_output = " + ".join(do)
-        constraints += f"{sum_input} - {indicator_variable} >= 0\n"
-        constraints += f"{sum_output} - {indicator_variable} >= 0\n"
+        constraints.append(constraint([1]*len(di) + [-1], list(di) + [indicator_variable], GREATER_EQUAL, 0))
+        constraints.append(constraint([1]*len(do) + [-1], list(do) + [indicator_variable], GREATER_EQUAL, 0))
         for i in range(8):
-            constraints += f"{indicator_variable} - {di[i]} >= 0\n"
-            constraints += f"{indicator_variable} - {do[i]} >= 0\n"
+            constraints.append(constraint([1, -1], [indicator_variable, di[i]], GREATER_EQUAL, 0))
+            constraints.append(constraint([1, -1], [indicator_variable, do[i]], GREATER_EQUAL, 0))
 
         if (bn == 0 and byten % 2 == 0) or (bn == 1 and byten % 2 == 1):
             for q in self.s0_correlations.keys():
@@ -480,33 +484,16 @@ class Lin:
                 self.binary_variables.append(q_indicator)
                 pr_indicators.append(q_indicator)
                 assert(q_indicator in self.binary_variables)
-                for ineq in self.sbox_inequalities[0][q]:
-                    for i in range(8):
-                        ineq = ineq.replace(f"a{i}", di[i])
-                        ineq = ineq.replace(f"b{i}", do[i])
-                    ineq = ineq.split(' >= ')
-                    lhs = f"{ineq[0]} - {self.big_m} {q_indicator}"
-                    rhs = "{}".format(int(ineq[1]) - self.big_m)
-                    ineq = f"{lhs} >= {rhs}\n"
-                    constraints += ineq
+                constraints += self.sbox_templates[0][q].block(list(di) + list(do) + [q_indicator])
         if (bn == 0 and byten % 2 == 1) or (bn == 1 and byten % 2 == 0):
             for q in self.s1_correlations.keys():
                 q_indicator = f"q_{rn}_{bn}_{byten}_{q}"
                 self.binary_variables.append(q_indicator)
                 pr_indicators.append(q_indicator)
                 assert(q_indicator in self.binary_variables)
-                for ineq in self.sbox_inequalities[1][q]:
-                    for i in range(8):
-                        ineq = ineq.replace(f"a{i}", di[i])
-                        ineq = ineq.replace(f"b{i}", do[i])
-                    ineq = ineq.split(' >= ')
-                    lhs = f"{ineq[0]} - {self.big_m} {q_indicator}"
-                    rhs = "{}".format(int(ineq[1]) - self.big_m)
-                    ineq = f"{lhs} >= {rhs}\n"
-                    constraints += ineq
+                constraints += self.sbox_templates[1][q].block(list(di) + list(do) + [q_indicator])
         # Link probability indicators to the activeness indicator
-        sum_pr = " + ".join(pr_indicators)
-        constraints += f"{sum_pr} - {indicator_variable} = 0\n"
+        constraints.append(constraint([1]*len(pr_indicators) + [-1], pr_indicators + [indicator_variable], EQUAL, 0))
         return constraints
 
     def generate_constraints_by_mds(self, rn, bn, mi, mo):
@@ -517,31 +504,19 @@ class Lin:
         :param bn int: branch number in {0, 1}
         :param mi list: vector of input variables
         :param mo list: vector of output variables
-        :rtype: string
-        :return: constraints modeling MDS in string format
+        :rtype: list
+        :return: constraints modeling MDS as a list of linear constraints
         """
 
-        constraints = ""
+        constraints = []
         dummay_variables = [f"mds_{rn}_{bn}_{bitn}" for bitn in range(32)]
         self.integer_variables.extend(dummay_variables)
         mi = [mi[byten][bitn] for byten in range(4) for bitn in range(8)]
         mo = [mo[byten][bitn] for byten in range(4) for bitn in range(8)]
         if bn == 0:
-            for ineq in self.mds0_constraints_template:
-                for i in range(32):
-                    bin_index = bin(i)[2:].zfill(5)
-                    ineq = ineq.replace(f"a_{bin_index}", mi[i])
-                    ineq = ineq.replace(f"b_{bin_index}", mo[i])
-                    ineq = ineq.replace(f"u_{bin_index}", dummay_variables[i])
-                constraints += ineq + "\n"
+            constraints += self.mds0_template.block(mi + mo + dummay_variables)
         elif bn == 1:
-            for ineq in self.mds1_constraints_template:
-                for i in range(32):
-                    bin_index = bin(i)[2:].zfill(5)
-                    ineq = ineq.replace(f"a_{bin_index}", mi[i])
-                    ineq = ineq.replace(f"b_{bin_index}", mo[i])
-                    ineq = ineq.replace(f"u_{bin_index}", dummay_variables[i])
-                constraints += ineq + "\n"
+            constraints += self.mds1_template.block(mi + mo + dummay_variables)
         return constraints
 
     def generate_objective_function(self):
@@ -552,21 +527,22 @@ class Lin:
         linear trail
         """
 
-        objective_function = "minimize\n"
-        objective_terms = []
+        coefficients = []
+        variables = []
         for rn in range(self.nrounds):
             for bn in range(2):
                 for byten in range(4):
                     if (bn == 0 and byten % 2 == 0) or (bn == 1 and byten % 2 == 1):
                         for q in self.s0_correlations.keys():
                             indicator = f"q_{rn}_{bn}_{byten}_{q}"
-                            objective_terms += [f"{self.s0_correlations[q]} {indicator}"]
+                            coefficients.append(to_number(self.s0_correlations[q]))
+                            variables.append(indicator)
                     elif (bn == 0 and byten % 2 == 1) or (bn == 1 and byten % 2 == 0):
                         for q in self.s1_correlations.keys():
                             indicator = f"q_{rn}_{bn}_{byten}_{q}"
-                            objective_terms += [f"{self.s1_correlations[q]} {indicator}"]
-        objective_function += " + ".join(objective_terms) + "\n"
-        return objective_function
+                            coefficients.append(to_number(self.s1_correlations[q]))
+                            variables.append(indicator)
+        return coefficients, variables
 
     def generate_constraints(self):
         """
@@ -574,7 +550,7 @@ class Lin:
         of linear trails through a reduced-round CLEFIA
         """
 
-        constraints = "subject to\n"
+        constraints = []
         for rn in range(self.nrounds):
             x_in = self.generate_round_x_variables(rn)
             x_out = self.generate_round_x_variables(rn + 1)
@@ -594,11 +570,7 @@ class Lin:
         """
 
         self.binary_variables = self.ordered_set(self.binary_variables)
-        constraints = "Binary\n"
-        constraints += "\n".join(self.binary_variables) + "\n"
-        constraints += "General\n"
-        constraints += "\n".join(self.integer_variables) + "\n"
-        return constraints
+        return self.binary_variables, self.integer_variables
 
     def exclude_trivial_trail(self):
         """
@@ -606,12 +578,10 @@ class Lin:
         """
 
         input_diff = self.flatten_state(self.generate_round_x_variables(0))
-        input_diff = " + ".join(input_diff)
-        constraint = f"{input_diff} >= 1\n"
-        return constraint
+        return [sum_constraint(input_diff, GREATER_EQUAL, 1)]
 
     def declare_fixed_variables(self):
-        lp_contents = ""
+        constraints = []
         for cond in self.fixed_variables.items():
             var = cond[0]
             val = cond[1]
@@ -622,36 +592,38 @@ class Lin:
                 state_vars = self.flatten_state(state_vars)
                 state_values = list(bin(int(val, 16))[2:].zfill(128))
                 for i in range(128):
-                    lp_contents += f"{state_vars[i]} = {state_values[i]}\n"
+                    constraints.append(fix(state_vars[i], state_values[i]))
             elif len(var) == 4:
                 assert(var[0] == "x")
                 state_vars = [f"x_{var[1]}_{var[2]}_{var[3]}_{bit}" for bit in range(8)]
                 state_values = list(bin(int(val, 16))[2:].zfill(8))
                 for i in range(8):
-                    lp_contents += f"{state_vars[i]} = {state_values[i]}\n"
+                    constraints.append(fix(state_vars[i], state_values[i]))
             elif len(var) == 5:
                 assert(var[0] == "x")
                 state_vars = f"x_{var[1]}_{var[2]}_{var[3]}_{var[4]}"
                 state_values = val
-                lp_contents += f"{state_vars} = {state_values}\n"
+                constraints.append(fix(state_vars, state_values))
             else:
                 pass
-        return lp_contents
+        return constraints
 
     def make_model(self):
         """
         Build the MILP model to find the best linear trail
         """
 
-        lp_contents = "\\ Linear attack on {} rounds of CLEFIA\n".format(self.nrounds)
-        lp_contents += self.generate_objective_function()
-        lp_contents += self.generate_constraints()
-        lp_contents += self.exclude_trivial_trail()
-        lp_contents += self.declare_fixed_variables()
-        lp_contents += self.declare_binary_vars()
-        lp_contents += "end"
-        with open(self.lp_file_name, "w") as lp_file:
-            lp_file.write(lp_contents)
+        builder = ModelBuilder(f"Linear attack on {self.nrounds} rounds of CLEFIA")
+        builder.set_objective(*self.generate_objective_function())
+        builder.add_constraints(self.generate_constraints())
+        builder.add_constraints(self.exclude_trivial_trail())
+        builder.add_constraints(self.declare_fixed_variables())
+        binary_variables, integer_variables = self.declare_binary_vars()
+        builder.declare_binary(binary_variables)
+        builder.declare_integer(integer_variables)
+        self.milp_model = builder.build()
+        if self.dump_lp:
+            builder.write_lp(self.milp_model, self.lp_file_name)
 
     def exclude_the_previous_sol(self):
         '''
@@ -671,10 +643,9 @@ class Lin:
         lhs = first_term - second_term
         self.milp_model.addConstr(lhs <= support - 1)
 
+    @cached_solve
     def solve(self):
         output = None
-        self.milp_model = read(self.lp_file_name)
-        os.remove(self.lp_file_name)
         if self.mode == 0:
             output = self.find_characteristic()
         elif self.mode == 1:
@@ -756,6 +727,9 @@ class Lin:
         # Consider the start_weight
         if self.start_weight != None:
             self.milp_model.addConstr(obj >= self.start_weight, 'start_weight_constraint')
+        # Seed the solver with a fast instantiation of the truncated trail
+        if self.warm_start:
+            warm_start(self.milp_model, self.warm_start_zeros, greedy_time_limit(self.time_limit))
         time_start = time.time()
         #m.setParam(GRB.Param.Threads, 16)
         self.milp_model.optimize()
@@ -830,68 +804,30 @@ class Lin:
     def compute_differential_effect(self):
         """
         Compute the linear effect for a given input/output differences
-        Some general information about Gurobi:
-        PoolSolutions: It controls the size of the solution pool.
-        Changing this parameter won't affect the number of solutions that are found -
-        it simply determines how many of those are retained
-        You can use the PoolSearchMode parameter to control the approach used to find solutions.
-        In its default setting (0), the MIP search simply aims to find one optimal solution.
-        Setting the parameter to 2 causes the MIP to do a systematic search for the n best solutions.
-        With a setting of 2, it will find the n best solutions,
-        where n is determined by the value of the PoolSolutions parameter
-        SolCount: Number of solutions found during the most recent optimization.
-
-        Model status:
-        LOADED	1	Model is loaded, but no solution information is available.
-        OPTIMAL	2	Model was solved to optimality (subject to tolerances), and an optimal solution is available.
-        INFEASIBLE	3	Model was proven to be infeasible.
+        The trails are counted weight layer by weight layer (see dlcore/clustering.py).
+        The enumeration stops when the model has no more solutions, when the weight
+        exceeds end_weight, or when the last layer changes log2 of the probability
+        by less than the convergence threshold (if given).
         """
 
         if self.time_limit != None:
             self.milp_model.Params.TIME_LIMIT = self.time_limit
-        #self.milp_model.Params.PreSolve = 0 # Activating this flag causes the performance to be decreased, but the accuracy will be increased
-        self.milp_model.Params.PoolSearchMode = 2
-        self.milp_model.Params.PoolSolutions = 1
         self.milp_model.Params.OutputFlag = False
 
         self.milp_model.printStats()
 
-        # Consider the start_weight
-        obj = self.milp_model.getObjective()
-        if self.start_weight != None:
-            self.milp_model.addConstr(obj >= self.start_weight, 'start_weight_constraint')
-        time_start = time.time()
-        self.milp_model.optimize()
-        current_probability = 0
-        if (self.milp_model.Status == GRB.OPTIMAL):
-            self.total_weight = self.milp_model.objVal
-            diff_prob = 0
-            print('\n')
-            while (self.milp_model.Status == GRB.OPTIMAL and self.total_weight <= self.end_weight):
-                self.total_weight = self.milp_model.PoolObjVal
-                self.milp_model.Params.PoolSolutions = 2000000000 #GRB.MAXINT
-                temp_constraint = self.milp_model.addConstr(obj == self.total_weight, name='temp_constraint')
-                # self.milp_model.Params.PoolGap = 0
-                # self.milp_model.Params.PreSolve = 0
-                # self.milp_model.printStats()
-                self.milp_model.update()
-                self.milp_model.optimize()
-                diff_prob += math.pow(2, -self.total_weight) * self.milp_model.SolCount
-                print(f"Current weight: {self.total_weight}")
-                print(f"Number of trails: {self.milp_model.SolCount}")
-                current_probability = math.log(diff_prob, 2)
-                print(f"\tCurrent Probability: 2^({current_probability})")
-                elapsed_time = time.time() - time_start
-                print("Time used = %0.04f seconds\n" % elapsed_time)
-                self.milp_model.remove(temp_constraint)
-                self.milp_model.Params.PoolSolutions = 1
-                self.milp_model.addConstr(obj >= (self.total_weight + self.eps), name='temp_cond')
-                #self.milp_model.Params.PreSolve = 0
-                self.milp_model.optimize()
-        elif (self.milp_model.Status == GRB.INFEASIBLE):
-            print("The model is infeasible!")
-        else:
-            print("Unknown Error!")
+        enumerator = WeightLayerEnumerator(self.milp_model,
+                                           start_weight=self.start_weight,
+                                           end_weight=self.end_weight,
+                                           threshold=self.convergence,
+                                           pool_limit=self.pool_limit,
+                                           processes=self.processes,
+                                           threads=self.threads,
+                                           eps=self.eps)
+        current_probability = enumerator.run()
+        if current_probability is None:
+            return 0
+        self.total_weight = enumerator.weight
         return current_probability
 
     def compute_differential_effect_classic_method(self):
@@ -967,6 +903,18 @@ def loadparameters(args):
         if args.endweight:
             params["endweight"] = args.endweight[0]
 
+        if args.convergence:
+            params["convergence"] = args.convergence[0]
+
+        if args.poollimit:
+            params["poollimit"] = args.poollimit[0]
+
+        if args.processes:
+            params["processes"] = args.processes[0]
+
+        if args.threads:
+            params["threads"] = args.threads[0]
+
         if args.mode:
             params["mode"] = args.mode[0]
 
@@ -993,6 +941,14 @@ def main():
                         help="Starting weight for the trail search.")
     parser.add_argument('--endweight', nargs=1, type=int,
                         help="Stop search after reaching endweight.")
+    parser.add_argument('--convergence', nargs=1, type=float,
+                        help="Stop when a new weight layer changes log2 of the probability by less than this value.")
+    parser.add_argument('--poollimit', nargs=1, type=int,
+                        help="Size of the solution pool used to enumerate the weight layers.")
+    parser.add_argument('--processes', nargs=1, type=int,
+                        help="Number of worker processes counting the weight layers in parallel (mode 2).")
+    parser.add_argument('--threads', nargs=1, type=int,
+                        help="Number of Gurobi threads of each worker process.")
     parser.add_argument('--nrounds', nargs=1, type=int,
                         help="The number of rounds for the cipher")
     parser.add_argument('--mode', nargs=1, type=int,
@@ -33,6 +33,9 @@ for the security of CLEFIA against differential and differential-linear cryptana
 import time
 import os
 from gurobipy import *
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import temporary_path
 
 class TruncDiffClefia:
     """
@@ -58,7 +61,7 @@ class TruncDiffClefia:
         self.dummy_var = "d"
         self.nrounds = nrounds
         self.milp_variables = []
-        self.lp_file_name = f"clefia_{nrounds}r.lp"
+        self.lp_file_name = temporary_path(f"clefia_{nrounds}r_", ".lp")
         self.permute_branches = [3, 0, 1, 2]
 
     @staticmethod
@@ -33,9 +33,13 @@ for the security of CLEFIA against linear and differential-linear cryptanalysis.
 from truncdiff import TruncDiffClefia
 from trunclin import TruncLinClefia
 import time
-import uuid
 import random
 from gurobipy import *
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import temporary_path
+from dlcore.candidates import configure_pool
 
 class TruncatedDiffLin(TruncDiffClefia, TruncLinClefia):
     """
@@ -67,8 +71,7 @@ class TruncatedDiffLin(TruncDiffClefia, TruncLinClefia):
         self.WU = WU
         self.WM = WM
         self.WL = WL
-        self.lp_file_name = f"clefia_{self.total_nrounds}_{RU}_{RM}_{RL}_{uuid.uuid4().hex}.lp"
-
+        self.lp_file_name = temporary_path(f"clefia_{self.total_nrounds}_{RU}_{RM}_{RL}_", ".lp")
     def constraint_by_xor(self, a, b, c):
         """
         operation:
@@ -257,9 +260,11 @@ class TruncatedDiffLin(TruncDiffClefia, TruncLinClefia):
         with open(self.lp_file_name, "w") as lpfile:
             lpfile.write(constraints)
 
-    def find_truncated_difflin_trail(self):
+    def find_truncated_difflin_trail(self, number_of_solutions=1):
         """
         Solve the constructed model minimizing the number of active S-boxes
+
+        :param int number_of_solutions: if larger than 1, collect the best solutions in the solution pool (see dlcore/candidates.py)
         """
 
         self.make_model()
@@ -267,11 +272,7 @@ class TruncatedDiffLin(TruncDiffClefia, TruncLinClefia):
         os.remove(self.lp_file_name)
         self.milp_model.setParam(GRB.Param.OutputFlag, True)
 
-        # self.milp_model.Params.PoolSearchMode = 2
-        # # Limit number of solutions
-        # self.milp_model.Params.PoolSolutions = 2
-        # # Choose solution number 1
-        # self.milp_model.Params.SolutionNumber = 0        
+        configure_pool(self.milp_model, number_of_solutions)
         self.milp_model.Params.Seed = random.randint(0, 100000)
         start_time = time.time()
         ###############################################################
@@ -32,8 +32,10 @@ for the security of CLEFIA against linear and differential-linear cryptanalysis.
 
 import time
 import os
-import uuid
 from gurobipy import *
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import temporary_path
 
 class TruncLinClefia:
     """
@@ -67,7 +69,7 @@ class TruncLinClefia:
         self.dummy_var = "d"
         self.nrounds = nrounds
         self.milp_variables = []        
-        self.lp_file_name = f"clefia_{nrounds}r_{uuid.uuid4()}.lp"        
+        self.lp_file_name = temporary_path(f"clefia_{nrounds}r_", ".lp")
         self.permute_branches = [3, 0, 1, 2]
 
     @staticmethod
@@ -52,12 +52,31 @@ unsigned int init_prng(unsigned int offset);
 // #######################################################################################################
 // #######################################################################################################
 // ############################## User must change only the following lines ##############################
-const int DEG1 = 0;
-const int DEG2 = 27;
-int NUMBER_OF_EXPERIMENTS = 5;   // Number of independent experiments
-int NUMBER_OF_ROUNDS = 7;   // Number of rounds
-char DP_STR[] = "000000000000000000080000d77e2bfc";
-char LC_STR[] = "381c8e920000000000000000f5000000";
+// Default values, which can be overridden at compile time, e.g., -DDL_ROUNDS=<rounds> (see dlcore/verify.py)
+#ifndef DL_DEG1
+#define DL_DEG1 0
+#endif
+#ifndef DL_DEG2
+#define DL_DEG2 27
+#endif
+#ifndef DL_EXPERIMENTS
+#define DL_EXPERIMENTS 5
+#endif
+#ifndef DL_ROUNDS
+#define DL_ROUNDS 7
+#endif
+#ifndef DL_DP
+#define DL_DP "000000000000000000080000d77e2bfc"
+#endif
+#ifndef DL_LC
+#define DL_LC "381c8e920000000000000000f5000000"
+#endif
+const int DEG1 = DL_DEG1;
+const int DEG2 = DL_DEG2;
+int NUMBER_OF_EXPERIMENTS = DL_EXPERIMENTS;   // Number of independent experiments
+int NUMBER_OF_ROUNDS = DL_ROUNDS;   // Number of rounds
+char DP_STR[] = DL_DP;
+char LC_STR[] = DL_LC;
 
 // 4 rounds
 // char DP_STR[] = "00000000000000100000000000000000";
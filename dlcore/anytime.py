@@ -0,0 +1,128 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Anytime CP searches: stream the improving solutions of a MiniZinc instance.
+
+Instance.solve() blocks until the solver proves optimality or hits the time
+limit, and only then returns the last solution. Here the search is driven
+through the asynchronous generator Instance.solutions() with
+intermediate_solutions=True instead, so that:
+
+  - every improving solution is passed to a handler as soon as the solver
+    reports it (e.g., to parse, print and draw the distinguisher found so far),
+  - the search stops as soon as the objective reaches a given target, or
+    when no improving solution has been found within a stall window (which
+    starts at the first solution, so that the flattening and a slow first
+    solution do not count),
+  - on an early stop the solver process is terminated (by raising
+    CancelledError inside the generator, which kills MiniZinc) and the best
+    solution found so far is returned.
+
+The returned minizinc.Result carries the best solution, the final status
+and the statistics, so that it can replace the result of Instance.solve().
+
+Example:
+
+    result = stream_solutions(instance, handler, timeout=timedelta(hours=4),
+                              target=20, stall=1800, processes=8)
+"""
+
+import asyncio
+import datetime
+import time
+import minizinc
+
+
+async def stream_async(instance, handler=None, timeout=None, target=None, stall=None, **kwargs):
+    """
+    Coroutine of stream_solutions(), e.g., to run several searches in one event loop
+    """
+
+    minimize = instance.method == minizinc.Method.MINIMIZE
+    if isinstance(stall, datetime.timedelta):
+        stall = stall.total_seconds()
+    start_time = time.time()
+    last_improvement = None
+    best = None
+    status = minizinc.Status.UNKNOWN
+    statistics = {}
+    count = 0
+    reason = None
+    generator = instance.solutions(time_limit=timeout, intermediate_solutions=True, **kwargs)
+    try:
+        while True:
+            try:
+                if stall is None or last_improvement is None:
+                    # the stall window starts at the first solution
+                    result = await generator.__anext__()
+                else:
+                    remaining = max(0, last_improvement + stall - time.time())
+                    result = await asyncio.wait_for(generator.__anext__(), remaining)
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                reason = "no improving solution within %0.02f seconds" % stall
+                break
+            statistics.update(result.statistics)
+            status = result.status
+            if result.solution is None:
+                continue
+            best = result
+            count += 1
+            last_improvement = time.time()
+            if handler is not None:
+                handler(result, count, last_improvement - start_time)
+            if target is not None and result.objective is not None and \
+                    (result.objective <= target if minimize else result.objective >= target):
+                reason = f"objective {result.objective} reached the target {target}"
+                break
+    finally:
+        if reason is not None:
+            # terminate the solver process (closing the generator does not)
+            try:
+                await generator.athrow(asyncio.CancelledError())
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await generator.aclose()
+    if reason is not None:
+        print(f"Search stopped early: {reason}")
+        status = minizinc.Status.SATISFIED if best is not None else minizinc.Status.UNKNOWN
+    return minizinc.Result(status, None if best is None else best.solution, statistics)
+
+
+def stream_solutions(instance, handler=None, timeout=None, target=None, stall=None, **kwargs):
+    """
+    Solve instance, passing every improving solution to handler as soon as it is found
+
+    :param minizinc.Instance instance: instance to solve
+    :param handler: function called as handler(result, count, elapsed) on every solution
+    :param datetime.timedelta timeout: time limit of the whole search (None: no limit)
+    :param target: stop as soon as the objective is at most (maximize: at least) target
+    :param float stall: stop when no improving solution is found within stall seconds
+                        after the last one (no limit before the first solution, see timeout)
+    :param kwargs: further arguments of Instance.solutions(), e.g., processes or random_seed
+    :return: minizinc.Result with the best solution found, the final status and the statistics
+    """
+
+    return asyncio.run(stream_async(instance, handler, timeout, target, stall, **kwargs))
@@ -0,0 +1,709 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Native branch-and-bound search of differential trails (Matsui's algorithm)
+for ciphers whose round function consists of 4-bit S-boxes and a linear
+layer, e.g., TWINE, WARP, LBlock, and PRESENT. No MILP solver is needed.
+
+A cipher is described by a NibbleCipher: the S-boxes of a round, the state
+nibbles they read, and the linear layer as routes of bits of the state and
+of the S-box outputs into the next state. The states are packed into Python
+integers (nibble i at bits 4*(n - 1 - i), as in the hexadecimal strings of
+the trails) and the linear layer is evaluated by table lookups.
+
+The search is a depth-first search over the rows of the DDT, sorted by
+weight, with the round-wise bounds B_k (the best weight of k rounds, see
+dlcore/bounds.py) pruning every partial trail whose weight plus the bound
+of the remaining rounds exceeds the current bound. If the input difference
+is not fixed, the nibbles of a state which are only XORed into the next state
+(e.g., the right half of a Feistel network) are kept "free" and resolved from
+the end of the trail, so the first round is enumerated S-box by S-box as in
+Matsui's algorithm. If the output difference is fixed, the S-box outputs of
+the last round are solved from it by linear algebra instead of enumerated.
+The branches of the first round can be distributed over worker processes.
+
+BranchAndBound mirrors the interface of the Diff classes: mode 0 finds the
+best trail (find_characteristic), and mode 2 counts the trails between fixed
+input and output differences weight by weight (compute_differential_effect).
+"""
+
+import os
+import sys
+import math
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.tables import difference_distribution_table
+from dlcore.bounds import round_bounds
+from dlcore.pipeline import run_concurrently
+
+EPS = 1e-9
+# check the time limit every TIME_CHECK_INTERVAL nodes
+TIME_CHECK_INTERVAL = 4096
+
+
+def nibble_routes(routes):
+    """
+    Expand routes of nibbles (source nibble, destination nibble) into routes of bits
+    """
+
+    return [(4*src + bit, 4*dst + bit) for src, dst in routes for bit in range(4)]
+
+
+class NibbleCipher:
+    """
+    Nibble-level description of the round function of a cipher
+    """
+
+    def __init__(self, key, state_size, sboxes, sbox_inputs, x_routes, y_routes):
+        """
+        :param str key: name of the model in the bound database, e.g., 'twine-diff'
+        :param int state_size: number of nibbles of the state
+        :param list sboxes: lookup tables of the S-boxes of a round
+        :param list sbox_inputs: the state nibble read by each S-box
+        :param list x_routes: (state bit, next state bit), i.e., the state bits XORed into the next state
+        :param list y_routes: (S-box output bit, next state bit), where bit 4*k + j is bit j of S-box k
+        Bit 0 of a nibble is its most significant bit.
+        """
+
+        self.key = key
+        self.state_size = state_size
+        self.sbox_inputs = list(sbox_inputs)
+        self.shifts = [4*(state_size - 1 - i) for i in range(state_size)]
+        top = 4*state_size - 1
+        self.x_tables = [[0]*16 for _ in range(state_size)]
+        for src, dst in x_routes:
+            for value in range(16):
+                if (value >> (3 - src % 4)) & 1:
+                    self.x_tables[src // 4][value] ^= 1 << (top - dst)
+        self.y_tables = [[0]*16 for _ in sboxes]
+        for src, dst in y_routes:
+            for value in range(16):
+                if (value >> (3 - src % 4)) & 1:
+                    self.y_tables[src // 4][value] ^= 1 << (top - dst)
+        # the nibbles which are not read by an S-box must be moved as a whole
+        # into one nibble of the next state, which is free if they are free
+        self.passive = [i for i in range(state_size) if i not in self.sbox_inputs]
+        self.free_targets = dict()
+        self.inverse_x_tables = dict()
+        for i in self.passive:
+            image = self.x_tables[i][0xf]
+            targets = [t for t in range(state_size) if (image >> self.shifts[t]) & 0xf]
+            if len(targets) != 1 or (image >> self.shifts[targets[0]]) != 0xf or \
+               len(set(self.x_tables[i])) != 16:
+                raise ValueError(f"nibble {i} is not moved into a single nibble of the next state")
+            self.free_targets[i] = 0xf << self.shifts[targets[0]]
+            self.inverse_x_tables[i] = {image: value for value, image in enumerate(self.x_tables[i])}
+        # DDT rows sorted by weight, and all transitions (including 0 -> 0) for free inputs
+        self.weights = []
+        self.rows = []
+        self.transitions = []
+        self.min_weights = []
+        for sbox in sboxes:
+            ddt = difference_distribution_table(sbox)
+            size = int(ddt[0][0])
+            weights = [[None if ddt[a][b] == 0 else -math.log2(ddt[a][b]/size) for b in range(16)] for a in range(16)]
+            rows = [sorted((w, b) for b, w in enumerate(weights[a]) if w is not None) for a in range(16)]
+            self.weights.append(weights)
+            self.rows.append(rows)
+            self.transitions.append(sorted((w, a, b) for a in range(16) for w, b in rows[a]))
+            self.min_weights.append(min(w for a in range(1, 16) for w, _ in rows[a]))
+        # no trail of a round is heavier than max_weight
+        self.max_weight = sum(max(w for row in rows for w, _ in row) for rows in self.rows)
+        # S-boxes of the next round (shift of their input nibble, minimum weight)
+        # whose input is touched by each S-box output and by each state nibble
+        self.slots = [(self.shifts[i], self.min_weights[k]) for k, i in enumerate(self.sbox_inputs)]
+        self.y_slots = [self.touched_slots(table[0xf]) for table in self.y_tables]
+        self.x_slots = [self.touched_slots(table[0xf]) for table in self.x_tables]
+        self._y_basis = self._basis()
+
+    def touched_slots(self, state):
+        """
+        Return the indices of the S-boxes whose input nibble contains a nonzero bit of the (packed) state
+        """
+
+        return [k for k, (shift, _) in enumerate(self.slots) if (state >> shift) & 0xf]
+
+    def _basis(self):
+        """
+        Echelon basis of the images of the S-box output bits, used to solve
+        the S-box outputs of the last round from a fixed output difference
+        """
+
+        sboxes = len(self.y_tables)
+        basis = dict()
+        for k in range(sboxes):
+            for bit in range(4):
+                image = self.y_tables[k][1 << (3 - bit)]
+                combination = 1 << (4*(sboxes - 1 - k) + 3 - bit)
+                for pivot in sorted(basis, reverse=True):
+                    if (image >> pivot) & 1:
+                        image ^= basis[pivot][0]
+                        combination ^= basis[pivot][1]
+                if image:
+                    basis[image.bit_length() - 1] = (image, combination)
+        return sorted(basis.items(), reverse=True)
+
+    def solve_outputs(self, difference):
+        """
+        Return the S-box outputs (packed) whose image is the given difference, or None
+        """
+
+        combination = 0
+        for pivot, (image, c) in self._y_basis:
+            if (difference >> pivot) & 1:
+                difference ^= image
+                combination ^= c
+        if difference:
+            return None
+        return combination
+
+    def nibble(self, state, i):
+        return (state >> self.shifts[i]) & 0xf
+
+    def to_hex(self, state):
+        return hex(state)[2:].zfill(self.state_size)
+
+
+class _TimeLimit(Exception):
+    pass
+
+
+class _Search:
+    """
+    Depth-first search of the trails over nrounds rounds with weight <= bound.
+    If count is False, the bound is lowered to the weight of every trail found,
+    so the search ends with the best trail; otherwise the trails with weight in
+    (lower, bound] are counted.
+    """
+
+    def __init__(self, cipher, nrounds, bounds, fixed, bound, count=False, lower=None,
+                 start_weight=None, deadline=None, split_round=None):
+        self.cipher = cipher
+        self.nrounds = nrounds
+        # rb[k]: lower bound of the weight of k rounds
+        self.rb = [0] + list(bounds)
+        self.fixed = fixed
+        self.bound = bound
+        self.count = count
+        self.lower = lower
+        self.start_weight = start_weight
+        self.deadline = deadline
+        self.split_round = split_round
+        self.branches = []
+        self.best = None
+        self.counts = dict()
+        self.nodes = 0
+        self.values = [0]*(nrounds + 1)
+        self.frees = [0]*(nrounds + 1)
+        self.outputs = [0]*nrounds
+        self.round_weights = [0]*nrounds
+        sboxes = len(cipher.sbox_inputs)
+        self.output_shifts = [4*(sboxes - 1 - k) for k in range(sboxes)]
+        self.input_mask = 0
+        for i in cipher.sbox_inputs:
+            self.input_mask |= 0xf << cipher.shifts[i]
+
+    def apply_fixed(self, r, value, free):
+        """
+        Check the fixed nibbles of the state r and resolve the free ones
+        """
+
+        if r not in self.fixed:
+            return value, free
+        mask, fixed_value = self.fixed[r]
+        if (value ^ fixed_value) & mask & ~free:
+            return None
+        return (value & ~mask) | fixed_value, free & ~mask
+
+    def run(self, value=0, free=None, r=0, weight=0, active=0):
+        if free is None:
+            free = (1 << (4*self.cipher.state_size)) - 1
+            value, free = self.apply_fixed(0, value, free)
+        try:
+            self._round(r, value, free, weight, active)
+        except _TimeLimit:
+            return False
+        return True
+
+    def _tick(self):
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % TIME_CHECK_INTERVAL == 0 and time.time() > self.deadline:
+            raise _TimeLimit()
+
+    def _round(self, r, value, free, weight, active):
+        if r == self.split_round:
+            self.branches.append((r, value, free, weight, active, list(self.values), list(self.frees),
+                                  list(self.outputs), list(self.round_weights)))
+            return
+        if r == self.nrounds:
+            self._leaf(value, free, weight, active)
+            return
+        self._tick()
+        cipher = self.cipher
+        remaining = self.rb[self.nrounds - r - 1]
+        if r == self.nrounds - 1 and free == 0 and self.nrounds in self.fixed and \
+           self.fixed[self.nrounds][0] == (1 << (4*cipher.state_size)) - 1:
+            self._last_round(r, value, weight, active)
+            return
+        if r == self.nrounds - 1 and not self.count and self.nrounds not in self.fixed and \
+           not self.start_weight and self._cheapest_last_round(r, value, free, weight, active):
+            return
+        # the part of the next state given by the known nibbles
+        known = 0
+        for i in range(cipher.state_size):
+            if not (free >> cipher.shifts[i]) & 0xf:
+                known ^= cipher.x_tables[i][(value >> cipher.shifts[i]) & 0xf]
+        next_free = 0
+        for i in cipher.passive:
+            if (free >> cipher.shifts[i]) & 0xf:
+                next_free |= cipher.free_targets[i]
+        choices = []
+        for k, i in enumerate(cipher.sbox_inputs):
+            if (free >> cipher.shifts[i]) & 0xf:
+                choices.append((k, i, None))
+            else:
+                a = (value >> cipher.shifts[i]) & 0xf
+                if a:
+                    choices.append((k, i, a))
+        # active S-boxes first, then the free ones
+        choices.sort(key=lambda choice: choice[2] is None)
+        minimum = [0]*(len(choices) + 1)
+        for j in range(len(choices) - 1, -1, -1):
+            k, _, a = choices[j]
+            minimum[j] = minimum[j + 1] + (cipher.min_weights[k] if a is not None else 0)
+        # a nibble of the next state which is read by an S-box is decided once the
+        # remaining S-boxes of this round do not touch it, and then the S-box adds
+        # its minimum weight to the bound of the next round (if the nibble is active)
+        decided = [[] for _ in range(len(choices) + 1)]
+        if r + 1 < self.nrounds:
+            last = [0]*len(cipher.slots)
+            for j, (k, i, a) in enumerate(choices):
+                for slot in cipher.y_slots[k]:
+                    last[slot] = j + 1
+                if a is None:
+                    for slot in cipher.x_slots[i]:
+                        last[slot] = j + 1
+            for slot, (shift, w) in enumerate(cipher.slots):
+                if not (next_free >> shift) & 0xf:
+                    decided[last[slot]].append((shift, w))
+        tails = (remaining, self.rb[self.nrounds - r - 2] if r + 1 < self.nrounds else 0)
+        self._sboxes(r, choices, minimum, decided, 0, value & ~free, known, 0, weight, 0, 0, active, tails, next_free, free)
+
+    def _sboxes(self, r, choices, minimum, decided, j, value, acc, outputs, weight, round_weight, next_weight,
+                active, tails, next_free, free):
+        for shift, w in decided[j]:
+            if (acc >> shift) & 0xf:
+                next_weight += w
+        # lower bound of the rounds after this one
+        remaining = max(tails[0], next_weight + tails[1])
+        if weight + round_weight + minimum[j] + remaining > self.bound + EPS:
+            return
+        cipher = self.cipher
+        if j == len(choices):
+            self.values[r] = value
+            self.frees[r] = free & ~self.input_mask
+            self.outputs[r] = outputs
+            self.round_weights[r] = round_weight
+            checked = self.apply_fixed(r + 1, acc & ~next_free, next_free)
+            if checked is not None:
+                self._round(r + 1, checked[0], checked[1], weight + round_weight, active)
+            return
+        k, i, a = choices[j]
+        y_table = cipher.y_tables[k]
+        shift = self.output_shifts[k]
+        if a is not None:
+            for w, b in cipher.rows[k][a]:
+                if weight + round_weight + w + minimum[j + 1] + remaining > self.bound + EPS:
+                    break
+                self._sboxes(r, choices, minimum, decided, j + 1, value, acc ^ y_table[b], outputs | (b << shift),
+                             weight, round_weight + w, next_weight, active + 1, tails, next_free, free)
+        else:
+            x_table = cipher.x_tables[i]
+            for w, a, b in cipher.transitions[k]:
+                if weight + round_weight + w + minimum[j + 1] + remaining > self.bound + EPS:
+                    break
+                self._sboxes(r, choices, minimum, decided, j + 1, value | (a << cipher.shifts[i]),
+                             acc ^ x_table[a] ^ y_table[b], outputs | (b << shift), weight, round_weight + w,
+                             next_weight, active + (a != 0), tails, next_free, free)
+
+    def _cheapest_last_round(self, r, value, free, weight, active):
+        """
+        Complete the trail with the cheapest transition of every active S-box of the
+        last round (the output difference is not fixed); return False if this gives
+        the trivial trail
+        """
+
+        cipher = self.cipher
+        acc = 0
+        next_free = 0
+        for i in range(cipher.state_size):
+            if not (free >> cipher.shifts[i]) & 0xf:
+                acc ^= cipher.x_tables[i][(value >> cipher.shifts[i]) & 0xf]
+            elif i in cipher.free_targets:
+                next_free |= cipher.free_targets[i]
+        outputs = 0
+        round_weight = 0
+        for k, i in enumerate(cipher.sbox_inputs):
+            a = (value >> cipher.shifts[i]) & 0xf
+            if a and not (free >> cipher.shifts[i]) & 0xf:
+                w, b = cipher.rows[k][a][0]
+                acc ^= cipher.y_tables[k][b]
+                outputs |= b << self.output_shifts[k]
+                round_weight += w
+                active += 1
+        acc &= ~next_free
+        if active == 0 and acc == 0 and next_free == 0:
+            return False
+        if weight + round_weight <= self.bound + EPS:
+            self.values[r] = value & ~free
+            self.frees[r] = free & ~self.input_mask
+            self.outputs[r] = outputs
+            self.round_weights[r] = round_weight
+            self._leaf(acc, next_free, weight + round_weight, active)
+        return True
+
+    def _last_round(self, r, value, weight, active):
+        """
+        Solve the S-box outputs of the last round from the fixed output difference
+        """
+
+        cipher = self.cipher
+        known = 0
+        for i in range(cipher.state_size):
+            known ^= cipher.x_tables[i][(value >> cipher.shifts[i]) & 0xf]
+        outputs = cipher.solve_outputs(self.fixed[self.nrounds][1] ^ known)
+        if outputs is None:
+            return
+        round_weight = 0
+        for k, i in enumerate(cipher.sbox_inputs):
+            a = (value >> cipher.shifts[i]) & 0xf
+            b = (outputs >> self.output_shifts[k]) & 0xf
+            w = cipher.weights[k][a][b]
+            if w is None:
+                return
+            round_weight += w
+            active += a != 0
+        if weight + round_weight > self.bound + EPS:
+            return
+        self.values[r] = value
+        self.frees[r] = 0
+        self.outputs[r] = outputs
+        self.round_weights[r] = round_weight
+        self._leaf(self.fixed[self.nrounds][1], 0, weight + round_weight, active)
+
+    def _leaf(self, value, free, weight, active):
+        if active == 0 and value == 0 and free == 0:
+            return
+        if self.start_weight is not None and weight < self.start_weight - EPS:
+            return
+        if self.count:
+            if self.lower is None or weight > self.lower + EPS:
+                key = round(weight, 6)
+                self.counts[key] = self.counts.get(key, 0) + 1
+            return
+        self.values[self.nrounds] = value
+        self.frees[self.nrounds] = free
+        self.best = (weight, self.resolve())
+        self.bound = weight - 2*EPS
+
+    def resolve(self):
+        """
+        Return the states of the current trail, with the free nibbles resolved backwards
+        """
+
+        cipher = self.cipher
+        states = list(self.values)
+        final_free = self.frees[self.nrounds]
+        if final_free and states[self.nrounds] == 0 and not any(self.outputs):
+            # a trail of weight 0 is nontrivial thanks to a free nibble only
+            states[self.nrounds] = final_free & -final_free
+        for r in range(self.nrounds - 1, -1, -1):
+            free = self.frees[r]
+            if not free:
+                continue
+            value = states[r]
+            image = 0
+            for i in range(cipher.state_size):
+                image ^= cipher.x_tables[i][(value >> cipher.shifts[i]) & 0xf]
+            for k in range(len(cipher.sbox_inputs)):
+                image ^= cipher.y_tables[k][(self.outputs[r] >> self.output_shifts[k]) & 0xf]
+            difference = image ^ states[r + 1]
+            for i in cipher.passive:
+                if (free >> cipher.shifts[i]) & 0xf:
+                    part = difference & cipher.free_targets[i]
+                    value |= cipher.inverse_x_tables[i][part] << cipher.shifts[i]
+            states[r] = value
+        return states, list(self.round_weights)
+
+
+def _search_branches(cipher, nrounds, bounds, fixed, branches, bound, count, lower, start_weight, deadline):
+    """
+    Continue the search from the given branches (run in a worker process)
+    """
+
+    search = _Search(cipher, nrounds, bounds, fixed, bound, count=count, lower=lower,
+                     start_weight=start_weight, deadline=deadline)
+    complete = True
+    for r, value, free, weight, active, values, frees, outputs, round_weights in branches:
+        search.values, search.frees, search.outputs, search.round_weights = values, frees, outputs, round_weights
+        complete = search.run(value, free, r, weight, active) and complete
+        if not complete:
+            break
+    return search.best, search.counts, complete
+
+
+class BranchAndBound:
+    """
+    Branch-and-bound counterpart of the Diff classes (modes 0 and 2)
+    """
+
+    def __init__(self, cipher, params):
+        """
+        :param NibbleCipher cipher: description of the round function
+        :param dict params: the parameters of the Diff class (nrounds, mode, startweight,
+                            endweight, convergence, timelimit, processes, fixedVariables)
+        """
+
+        self.cipher = cipher
+        self.params = params
+        self.nrounds = params["nrounds"]
+        self.mode = params.get("mode", 0)
+        self.time_limit = params.get("timelimit", None)
+        self.start_weight = params.get("startweight", None)
+        self.end_weight = params.get("endweight", None)
+        self.convergence = params.get("convergence", None)
+        self.processes = params.get("processes", None) or 1
+        self.fixed = self.parse_fixed_variables(params.get("fixedVariables", {}))
+        self.full_mask = (1 << (4*cipher.state_size)) - 1
+        self.bounds = None
+        self.total_weight = None
+        self.time_start = None
+
+    def parse_fixed_variables(self, fixed_variables):
+        """
+        Convert the fixed states (x_<round>) and nibbles (x_<round>_<nibble>) into masks and values
+        """
+
+        fixed = dict()
+        for name, value in fixed_variables.items():
+            parts = name.split("_")
+            if parts[0] != "x" or len(parts) not in [2, 3]:
+                raise ValueError(f"{name}: only states x_<round> and nibbles x_<round>_<nibble> can be fixed")
+            r = int(parts[1])
+            mask, fixed_value = fixed.get(r, (0, 0))
+            if len(parts) == 2:
+                mask, fixed_value = (1 << (4*self.cipher.state_size)) - 1, int(str(value), 16)
+            else:
+                shift = self.cipher.shifts[int(parts[2])]
+                mask |= 0xf << shift
+                fixed_value = (fixed_value & ~(0xf << shift)) | (int(str(value), 16) << shift)
+            fixed[r] = (mask, fixed_value)
+        return fixed
+
+    def make_model(self):
+        """
+        Load (or compute) the bounds B_1, ..., B_{nrounds - 1} used for pruning
+        """
+
+        self.bounds = round_bounds(self.cipher.key, self.nrounds, self.round_bound)
+
+    def round_bound(self, nrounds):
+        """
+        Return the best weight of nrounds rounds (or a lower bound if the time limit is reached)
+        and whether it is optimal
+        """
+
+        params = dict(self.params, nrounds=nrounds, mode=0, fixedVariables={},
+                      startweight=None, endweight=None)
+        search = BranchAndBound(self.cipher, params)
+        search.make_model()
+        search.time_start = time.time()
+        weight, _, optimal = search.best_trail()
+        if weight == int(weight):
+            weight = int(weight)
+        return weight, optimal
+
+    def search(self, bound, count=False, lower=None):
+        """
+        Search the trails with weight <= bound, splitting the branches of the first round
+        over the worker processes
+
+        :return: (best (weight, (states, round weights)) or None, counts per weight, complete)
+        """
+
+        deadline = None if self.time_limit is None else self.time_start + self.time_limit
+        arguments = (self.cipher, self.nrounds, self.bounds, self.fixed, bound, count, lower, self.start_weight, deadline)
+        # a single round is not split (its trails are completed before the branches are collected)
+        if self.processes <= 1 or self.nrounds < 2:
+            search = _Search(*arguments)
+            complete = search.run()
+            return search.best, search.counts, complete
+        splitter = _Search(*arguments, split_round=1)
+        complete = splitter.run()
+        branches = splitter.branches
+        jobs = dict()
+        for part in range(self.processes):
+            if branches[part::self.processes] != []:
+                jobs[f"branches_{part}"] = (_search_branches, (self.cipher, self.nrounds, self.bounds, self.fixed,
+                                                               branches[part::self.processes], bound, count, lower,
+                                                               self.start_weight, deadline))
+        if jobs == {}:
+            return None, dict(), complete
+        results = run_concurrently(jobs, processes=self.processes, gurobi=False).values()
+        best = None
+        counts = dict()
+        for part_best, part_counts, part_complete in results:
+            if part_best is not None and (best is None or part_best[0] < best[0]):
+                best = part_best
+            for weight, number in part_counts.items():
+                counts[weight] = counts.get(weight, 0) + number
+            complete = complete and part_complete
+        return best, counts, complete
+
+    def best_trail(self):
+        """
+        Raise the bound from B_{R-1} + B_1 until a trail is found
+
+        :return: (weight, trail, optimal), where weight is a lower bound and trail is None
+                 if the time limit is reached before a trail is found
+        """
+
+        proven = self.bounds[-1] + self.bounds[0] if self.nrounds > 1 else 0
+        estimate = proven if self.start_weight is None else max(proven, self.start_weight)
+        end_weight = self.nrounds*self.cipher.max_weight
+        if self.end_weight is not None:
+            end_weight = min(end_weight, self.end_weight)
+        while estimate <= end_weight + EPS:
+            best, _, complete = self.search(estimate)
+            if best is not None:
+                return best[0], best[1], complete
+            if not complete:
+                return proven, None, False
+            proven = estimate
+            estimate += 1
+        return None, None, True
+
+    def trail_dictionary(self, weight, trail):
+        """
+        Return the trail in the format of Diff.parse_solver_output
+        """
+
+        states, round_weights = trail
+        characteristic = dict()
+        for r in range(self.nrounds + 1):
+            characteristic[f"x_{r}"] = self.cipher.to_hex(states[r])
+        for r in range(self.nrounds):
+            characteristic[f"pr_{r}"] = f"-{round_weights[r]:g}"
+        characteristic["total_weight"] = "%0.02f" % weight
+        characteristic["nrounds"] = self.nrounds
+        return characteristic
+
+    @staticmethod
+    def print_trail(trail):
+        """
+        Print out the discovered differential characteristic
+        """
+
+        col_width = max(len(str(s)) for s in trail.values()) + 2
+        stroutput = "Rounds\t" + "x".ljust(col_width) + "pr".ljust(7)
+        stroutput += "\n" + "-"*len(stroutput) + "\n"
+        for r in range(trail["nrounds"] + 1):
+            stroutput += str(r) + '\t'
+            stroutput += trail.get(f"x_{r}", 'none').ljust(col_width)
+            stroutput += trail.get(f"pr_{r}", 'none').ljust(col_width)
+            stroutput += '\n'
+        stroutput += f"Weight: -{trail['total_weight']}" + "\n"
+        return stroutput
+
+    def solve(self):
+        output = None
+        if self.mode == 0:
+            output = self.find_characteristic()
+        elif self.mode == 2:
+            output = self.compute_differential_effect()
+        else:
+            print('The branch-and-bound backend supports the modes 0 and 2 only!')
+        return output
+
+    def find_characteristic(self):
+        """
+        Find the best differential trail
+        """
+
+        diff_trail = None
+        self.time_start = time.time()
+        weight, trail, optimal = self.best_trail()
+        if trail is not None:
+            self.total_weight = weight
+            print(f"\nThe probability of the best differential characteristic: 2^-({weight})")
+            print("\nDifferential trail:\n")
+            diff_trail = self.trail_dictionary(weight, trail)
+            print(self.print_trail(diff_trail))
+            if not optimal:
+                print("The time limit was reached, the trail may not be optimal")
+        elif optimal:
+            print("There is no trail within the weight range!")
+        else:
+            print(f"The time limit was reached, the weight of the best trail is at least {weight}")
+        print("Time used: %0.02f" % (time.time() - self.time_start))
+        return diff_trail
+
+    def compute_differential_effect(self):
+        """
+        Compute the differential effect for the fixed input/output differences
+        by counting the trails weight by weight, from the weight of the best trail
+        up to end_weight (or until a layer changes log2 of the probability by less
+        than the convergence threshold)
+        """
+
+        if 0 not in self.fixed or self.fixed[0][0] != self.full_mask:
+            raise ValueError("the differential effect requires a fixed input difference x_0")
+        self.time_start = time.time()
+        weight, trail, _ = self.best_trail()
+        if trail is None:
+            return 0
+        end_weight = math.inf if self.end_weight is None else self.end_weight
+        probability = 0
+        lower = None
+        upper = weight
+        print("\n")
+        while upper <= end_weight + EPS:
+            _, counts, complete = self.search(upper, count=True, lower=lower)
+            for weight in sorted(counts):
+                previous = probability
+                probability += math.pow(2, -weight)*counts[weight]
+                self.total_weight = weight
+                print(f"Current weight: {weight}")
+                print(f"Number of trails: {counts[weight]}")
+                print(f"\tCurrent Probability: 2^({math.log(probability, 2)})")
+                print("Time used = %0.04f seconds\n" % (time.time() - self.time_start))
+                if self.convergence is not None and previous > 0 and \
+                   math.log(probability, 2) - math.log(previous, 2) < self.convergence:
+                    print(f"Converged: the last layer contributed less than {self.convergence} to log2 of the probability\n")
+                    return math.log(probability, 2)
+            if not complete:
+                print("The time limit was reached, the probability is a lower bound")
+                break
+            lower = upper
+            upper += 1
+        return math.log(probability, 2)
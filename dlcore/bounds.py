@@ -0,0 +1,226 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Round-wise lower bounds of the trail weight (Matsui-style bounding).
+
+Let B_k be the minimum weight of a (nontrivial) k-round trail. A nontrivial
+trail over R rounds restricted to the rounds i, ..., j is a nontrivial trail
+over j - i + 1 rounds, since the rounds are bijective. Hence every R-round
+model may be tightened by the cuts
+
+    sum(weight of the rounds i, ..., j) >= B_{j - i + 1},    0 <= i <= j < R,
+
+which considerably strengthen the LP relaxation, both for the search of the
+best trail (mode 0) and for the enumeration of the weight layers in the
+computation of the differential (linear) effect.
+
+The bounds B_1, ..., B_{R-1} are computed once with the mode 0 of the same
+Diff/Lin class (whose models use the bounds of the shorter spans in turn) and
+stored in the JSON file .dlcache/bounds.json in the root of the repository, or
+in the file given by the environment variable DL_BOUND_DB. If a search is cut
+short by the time limit, the best bound proven by Gurobi (ObjBound) is stored,
+which is still a valid lower bound, and it is computed again (and improved) by
+the next run.
+"""
+
+import os
+import sys
+import json
+import math
+from argparse import ArgumentParser, RawTextHelpFormatter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.milp import constraint, GREATER_EQUAL
+from dlcore.runs import locked
+
+ROOT_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+DEFAULT_BOUND_FILE = os.path.join(ROOT_DIRECTORY, ".dlcache", "bounds.json")
+# Gurobi status codes: 2 = OPTIMAL
+OPTIMAL = 2
+EPS = 1e-6
+
+
+def bound_file():
+    """
+    Return the path of the bound database
+    """
+
+    return os.environ.get("DL_BOUND_DB", DEFAULT_BOUND_FILE)
+
+
+def load_bounds(file_name=None):
+    """
+    Return the content of the bound database, i.e., a dictionary
+    {key: {number of rounds: {"weight": ..., "optimal": ...}}}
+    """
+
+    file_name = file_name or bound_file()
+    if not os.path.exists(file_name):
+        return dict()
+    with open(file_name, "r") as fileobj:
+        return json.load(fileobj)
+
+
+def write_bounds(database, file_name):
+    temporary_file_name = f"{file_name}.{os.getpid()}"
+    with open(temporary_file_name, "w") as fileobj:
+        json.dump(database, fileobj, indent=2, sort_keys=True)
+    os.replace(temporary_file_name, file_name)
+
+
+def store_bound(key, nrounds, weight, optimal, file_name=None):
+    """
+    Store the lower bound of the weight of the nrounds-round trails.
+    A better bound stored in the meantime (e.g., by a concurrent run) is kept.
+
+    :param str key: name of the model, e.g., 'twine-diff'
+    :param int nrounds: number of rounds
+    :param weight: lower bound of the weight
+    :param bool optimal: whether the bound is the weight of the best trail
+    :return: the stored (weight, optimal)
+    """
+
+    file_name = file_name or bound_file()
+    with locked(file_name):
+        database = load_bounds(file_name)
+        entry = database.get(key, dict()).get(str(nrounds))
+        if entry is not None and not optimal:
+            if entry["optimal"]:
+                weight, optimal = entry["weight"], True
+            else:
+                weight = max(weight, entry["weight"])
+        database.setdefault(key, dict())[str(nrounds)] = {"weight": weight, "optimal": optimal}
+        write_bounds(database, file_name)
+    return weight, optimal
+
+
+def best_weight(cls, params, nrounds):
+    """
+    Return a lower bound of the weight of the nrounds-round trails and whether it is optimal
+
+    The bound is the weight of the best trail found with the mode 0 of cls,
+    or the best bound proven by Gurobi if the search reaches the time limit.
+
+    :param cls: Diff/Lin class of the cipher
+    :param dict params: parameters of the R-round instance
+    :param int nrounds: number of rounds of the sub-span
+    """
+
+    params = dict(params, nrounds=nrounds, mode=0, fixedVariables={},
+                  warmstart=False, dumplp=False, roundbounds=True)
+    instance = cls(params)
+    instance.make_model()
+    model = instance.milp_model
+    model.Params.OutputFlag = False
+    if params.get("timelimit") is not None:
+        model.Params.TimeLimit = params["timelimit"]
+    model.optimize()
+    # the objective functions have integral coefficients
+    weight = max(0, math.ceil(model.ObjBound - EPS))
+    return weight, model.Status == OPTIMAL
+
+
+def round_bounds(key, nrounds, compute):
+    """
+    Return [B_1, ..., B_{nrounds - 1}], computing (and storing) the missing bounds
+
+    :param str key: name of the model in the database, e.g., 'twine-diff'
+    :param int nrounds: number of rounds of the model
+    :param compute: function mapping k to (lower bound of the weight of k rounds, optimal)
+    :rtype list:
+    """
+
+    bounds = []
+    for k in range(1, nrounds):
+        entry = load_bounds().get(key, dict()).get(str(k))
+        if entry is None or not entry["optimal"]:
+            weight, optimal = store_bound(key, k, *compute(k))
+            print(f"Bound of {k} rounds ({key}): {weight}{'' if optimal else ' (time limit)'}")
+        else:
+            weight = entry["weight"]
+        bounds.append(weight)
+    return bounds
+
+
+def round_of_variable(variable):
+    """
+    Return the round of a variable named <prefix>_<round>_...
+    """
+
+    return int(variable.split("_")[1])
+
+
+def span_cuts(coefficients, variables, bounds, round_of=round_of_variable):
+    """
+    Generate the cuts sum(weight of the rounds i, ..., j) >= B_{j - i + 1}
+
+    :param list coefficients: coefficients of the objective function
+    :param list variables: variables of the objective function
+    :param list bounds: [B_1, B_2, ...]
+    :param round_of: function mapping a variable to its round
+    :return constraints:
+    :rtype list:
+    """
+
+    terms = dict()
+    for coefficient, variable in zip(coefficients, variables):
+        terms.setdefault(round_of(variable), []).append((coefficient, variable))
+    rounds = sorted(terms)
+    constraints = []
+    for i in range(len(rounds)):
+        span = []
+        for j in range(i, min(len(rounds), i + len(bounds))):
+            span += terms[rounds[j]]
+            bound = bounds[j - i]
+            if bound > 0:
+                constraints.append(constraint([c for c, _ in span], [v for _, v in span], GREATER_EQUAL, bound))
+    return constraints
+
+
+def main():
+    """
+    Inspect or clear the bound database, e.g., python3 dlcore/bounds.py --clear twine-diff
+    """
+
+    parser = ArgumentParser(description="Inspect or clear the database of round-wise lower bounds",
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument("-f", "--file", default=None, type=str,
+                        help="path of the database (default: $DL_BOUND_DB or .dlcache/bounds.json)")
+    parser.add_argument("-c", "--clear", nargs="*", default=None, type=str,
+                        help="remove the bounds of the given models (all models if none is given)")
+    args = parser.parse_args()
+    file_name = args.file or bound_file()
+    if args.clear is not None:
+        with locked(file_name):
+            database = load_bounds(file_name)
+            for key in (args.clear or list(database)):
+                database.pop(key, None)
+            write_bounds(database, file_name)
+    database = load_bounds(file_name)
+    print(f"Bounds: {file_name}")
+    for key in sorted(database):
+        entries = sorted(database[key].items(), key=lambda item: int(item[0]))
+        print(f"{key:24s} " + " ".join(f"{k}:{entry['weight']}{'' if entry['optimal'] else '*'}" for k, entry in entries))
+
+
+if __name__ == "__main__":
+    main()
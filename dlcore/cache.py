@@ -0,0 +1,341 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Persistent cache of solved sub-problems.
+
+The attacks solve the same sub-problems again and again, e.g., the best
+trail for a fixed activeness pattern, or the differential (linear) effect
+between fixed input and output differences (masks). The solve() methods of
+the Diff/Lin/Differential/Linear classes are wrapped by cached_solve, which
+stores the outcome in an SQLite database and returns it on the next call.
+
+The key of a sub-problem is the SHA-256 digest of
+    - the cipher (source file and class),
+    - the configuration of the instance, i.e., all JSON-serializable attributes
+      such as the number of rounds, mode, fixed variables, time limit, start and
+      end weights, and the inline S-box encodings,
+    - the arguments of solve(),
+    - the contents of the model code (the cipher source file, dlcore) and of the
+      encoding files (ddt-encoding/*, lat-encoding/*),
+so that modifying an encoding file or the model invalidates the stored results.
+
+The cache is disabled by default. Setting the environment variable DL_CACHE
+to 1 enables it with the database .dlcache/solutions.sqlite in the root of the
+repository; any other value (except 0) is taken as the path of the database.
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import functools
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+ROOT_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+DEFAULT_CACHE_FILE = os.path.join(ROOT_DIRECTORY, ".dlcache", "solutions.sqlite")
+ENCODING_DIRECTORIES = ["ddt-encoding", "lat-encoding"]
+MODEL_FILES = [os.path.join(ROOT_DIRECTORY, "dlcore", name) for name in ["milp.py", "encoding.py", "clustering.py"]]
+# attributes that do not change the outcome of a solve
+IGNORED_ATTRIBUTES = {"lp_file_name", "result_file_name", "model_filename", "dump_lp",
+                      "processes", "threads", "total_weight", "warm_start", "warm_start_zeros",
+                      "params", "round_bounds"}
+# a trail (mode 0) is only stored if the model ends in one of these states
+# (Gurobi status codes: 2 = OPTIMAL, 3 = INFEASIBLE)
+FINAL_STATUS = {2: "OPTIMAL", 3: "INFEASIBLE"}
+# an effect (mode 2) is not stored if the last solve was cut short
+# (9 = TIME_LIMIT, 10 = SOLUTION_LIMIT, 11 = INTERRUPTED), or if the count of
+# some weight layer is only a lower bound (model._truncated, see dlcore/clustering.py)
+INCOMPLETE_STATUS = [9, 10, 11]
+CACHED_MODES = [0, 2]
+
+_file_digests = dict()
+
+
+def cache_file():
+    """
+    Return the path of the database, or None if the cache is disabled
+    """
+
+    value = os.environ.get("DL_CACHE", "").strip()
+    if value in ["", "0"]:
+        return None
+    if value == "1":
+        return DEFAULT_CACHE_FILE
+    return os.path.abspath(value)
+
+
+def file_digest(file_name):
+    """
+    Return the SHA-256 digest of a file (cached as long as the file is not modified)
+    """
+
+    stat = os.stat(file_name)
+    key = (file_name, stat.st_mtime_ns, stat.st_size)
+    digest = _file_digests.get(key)
+    if digest is None:
+        with open(file_name, "rb") as fileobj:
+            digest = hashlib.sha256(fileobj.read()).hexdigest()
+        _file_digests[key] = digest
+    return digest
+
+
+def model_digests(source_file):
+    """
+    Return the digests of the files that determine the model built by source_file
+    """
+
+    digests = dict()
+    directory = os.path.dirname(source_file)
+    files = [source_file] + [f for f in MODEL_FILES if os.path.isfile(f)]
+    for encoding_directory in ENCODING_DIRECTORIES:
+        path = os.path.join(directory, encoding_directory)
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in sorted(os.listdir(path))
+                      if os.path.isfile(os.path.join(path, name))]
+    for file_name in files:
+        digests[os.path.relpath(file_name, ROOT_DIRECTORY)] = file_digest(file_name)
+    return digests
+
+
+def _is_serializable(value):
+    try:
+        json.dumps(value, sort_keys=True)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def configuration(solver):
+    """
+    Return the JSON-serializable attributes of a Diff/Lin/Differential/Linear object
+    """
+
+    return {name: value for name, value in sorted(vars(solver).items())
+            if name not in IGNORED_ATTRIBUTES and _is_serializable(value)}
+
+
+def problem_key(solver, arguments=None):
+    """
+    Return (key, description) of the sub-problem solved by solver.solve(**arguments)
+
+    :param solver: an instance of Diff, Lin, Differential, or Linear
+    :param dict arguments: keyword arguments of solve() which affect the outcome
+    :rtype tuple:
+    """
+
+    source_file = os.path.abspath(sys.modules[type(solver).__module__].__file__)
+    description = {"cipher": os.path.relpath(source_file, ROOT_DIRECTORY),
+                   "class": type(solver).__name__,
+                   "mode": getattr(solver, "mode", None),
+                   "configuration": configuration(solver),
+                   "arguments": arguments or dict()}
+    content = dict(description, files=model_digests(source_file))
+    key = hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+    return key, description
+
+
+class SolutionCache:
+    """
+    SQLite store of the solved sub-problems. The database can be shared by
+    several processes (e.g., the jobs of sweep.py).
+    """
+
+    def __init__(self, file_name=None):
+        self.file_name = file_name or cache_file() or DEFAULT_CACHE_FILE
+        directory = os.path.dirname(self.file_name)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.file_name, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS solutions ("
+                                "key TEXT PRIMARY KEY, cipher TEXT, class TEXT, mode INTEGER, "
+                                "description TEXT, status TEXT, output TEXT, solution TEXT, "
+                                "attributes TEXT, solve_time REAL, created REAL)")
+        self.connection.commit()
+
+    def get(self, key):
+        """
+        Return the stored entry as a dictionary, or None
+        """
+
+        row = self.connection.execute("SELECT status, output, solution, attributes, solve_time "
+                                      "FROM solutions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        status, output, solution, attributes, solve_time = row
+        return {"status": status,
+                "output": json.loads(output),
+                "solution": json.loads(solution) if solution is not None else None,
+                "attributes": json.loads(attributes),
+                "solve_time": solve_time}
+
+    def put(self, key, description, status, output, solution=None, attributes=None, solve_time=None):
+        """
+        Store the outcome of a sub-problem
+
+        :param str key: key returned by problem_key
+        :param dict description: description returned by problem_key
+        :param str status: final status of the solver, e.g., OPTIMAL
+        :param output: the return value of solve() (JSON-serializable)
+        :param dict solution: values of the nonzero variables (mode 0)
+        :param dict attributes: attributes set by solve(), e.g., total_weight
+        :param float solve_time: solve time in seconds
+        """
+
+        self.connection.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (key, description["cipher"], description["class"], description["mode"],
+                                 json.dumps(description, sort_keys=True), status, json.dumps(output),
+                                 json.dumps(solution) if solution is not None else None,
+                                 json.dumps(attributes or dict()), solve_time, time.time()))
+        self.connection.commit()
+
+    def entries(self):
+        """
+        Return the number of stored sub-problems per (cipher, class, mode, status)
+        """
+
+        return self.connection.execute("SELECT cipher, class, mode, status, COUNT(*) FROM solutions "
+                                       "GROUP BY cipher, class, mode, status ORDER BY cipher, class, mode").fetchall()
+
+    def clear(self, cipher=None):
+        """
+        Remove all entries (of the given cipher, e.g., twine/diff.py)
+        """
+
+        if cipher is None:
+            self.connection.execute("DELETE FROM solutions")
+        else:
+            self.connection.execute("DELETE FROM solutions WHERE cipher = ?", (cipher,))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def _model(solver):
+    model = getattr(solver, "milp_model", None)
+    if model is None:
+        model = getattr(solver, "model", None)
+    return model
+
+
+def _fix_solution(model, solution):
+    """
+    Fix every variable of model to its value in the stored solution,
+    so that the next optimize() reproduces the stored solution at no cost
+    """
+
+    for v in model.getVars():
+        value = solution.get(v.VarName, 0)
+        v.LB = value
+        v.UB = value
+    model.update()
+
+
+def cached_solve(solve):
+    """
+    Decorator of the solve() methods of Diff/Lin/Differential/Linear.
+    In mode 0, a cached feasible trail is reproduced by fixing the variables
+    to the stored solution before calling solve(), so that the trail is
+    printed and parsed (e.g., by parse_solver_output) as usual.
+    In mode 2, the stored effect is returned right away.
+    """
+
+    @functools.wraps(solve)
+    def wrapper(self, *args, **kwargs):
+        file_name = cache_file()
+        if file_name is None or getattr(self, "mode", None) not in CACHED_MODES or len(args) != 0:
+            return solve(self, *args, **kwargs)
+        arguments = {name: value for name, value in kwargs.items() if name != "log"}
+        key, description = problem_key(self, arguments)
+        cache = SolutionCache(file_name)
+        try:
+            entry = cache.get(key)
+            model = _model(self)
+            if entry is not None:
+                print(f"Cached {description['class']} (mode {self.mode}, {entry['status']}, "
+                      f"solved in {entry['solve_time']:0.02f} seconds)")
+                for name, value in entry["attributes"].items():
+                    setattr(self, name, value)
+                if self.mode == 0 and entry["solution"] is not None and model is not None:
+                    _fix_solution(model, entry["solution"])
+                    return solve(self, *args, **kwargs)
+                return entry["output"]
+            time_start = time.time()
+            output = solve(self, *args, **kwargs)
+            solve_time = time.time() - time_start
+            status = FINAL_STATUS.get(model.Status) if model is not None else None
+            if self.mode == 2 and getattr(model, "_truncated", False):
+                return output
+            if self.mode == 2 and output not in [None, False] and \
+                    (model is None or model.Status not in INCOMPLETE_STATUS):
+                status = status or "DONE"
+            if status is None or not _is_serializable(output):
+                return output
+            solution = None
+            if self.mode == 0 and model.SolCount > 0:
+                solution = dict()
+                for v in model.getVars():
+                    value = v.X
+                    if v.VType in "BI":
+                        value = int(round(value))
+                    if value != 0:
+                        solution[v.VarName] = value
+            attributes = dict()
+            if _is_serializable(getattr(self, "total_weight", None)):
+                attributes["total_weight"] = getattr(self, "total_weight", None)
+            cache.put(key, description, status, output, solution, attributes, solve_time)
+            return output
+        finally:
+            cache.close()
+
+    return wrapper
+
+
+def main():
+    """
+    Inspect or clear the cache, e.g., python3 dlcore/cache.py --clear
+    """
+
+    parser = ArgumentParser(description="Inspect or clear the cache of solved sub-problems",
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument("-f", "--file", default=None, type=str,
+                        help="path of the database (default: $DL_CACHE or .dlcache/solutions.sqlite)")
+    parser.add_argument("-c", "--clear", action="store_true", help="remove the stored entries")
+    parser.add_argument("--cipher", default=None, type=str,
+                        help="restrict --clear to one cipher, e.g., twine/diff.py")
+    args = parser.parse_args()
+    cache = SolutionCache(args.file)
+    if args.clear:
+        cache.clear(args.cipher)
+    print(f"Cache: {cache.file_name}")
+    for cipher, class_name, mode, status, count in cache.entries():
+        print(f"{cipher:24s} {class_name:14s} mode {mode}  {status:10s} {count}")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Multi-solution truncated search: the k best distinct truncated trails.
+
+Many truncated trails with the same (or almost the same) number of active
+S-boxes lead to very different differential effects and squared
+correlations once they are instantiated. configure_pool lets Gurobi collect
+the best solutions of the truncated model in its solution pool, and
+distinct_solutions parses them in order of objective value, keeping a
+single representative of every class of equivalent solutions. Two
+solutions are equivalent if they induce the same instantiation problems,
+i.e., if they agree on the rounds covered by EU and EL (see
+truncated_trail_key); pool solutions differing only in the middle rounds or
+in auxiliary variables are dropped in favour of the better one.
+rank_candidates then instantiates every candidate on a worker pool (see
+dlcore/pipeline.py) and sorts them by the resulting correlation estimate.
+"""
+
+import io
+import os
+import contextlib
+from collections import namedtuple
+from dlcore.pipeline import run_concurrently
+
+# Number of pool solutions collected per requested candidate, so that
+# enough distinct candidates remain after removing the equivalent ones
+POOL_FACTOR = 4
+
+Candidate = namedtuple("Candidate", ["score", "index", "trail", "results"])
+
+
+def configure_pool(model, number_of_solutions, factor=POOL_FACTOR):
+    """
+    Make Gurobi systematically search for the best solutions of model
+
+    :param model: gurobipy model (not optimized yet)
+    :param int number_of_solutions: number of distinct solutions requested
+    :param int factor: number of pool solutions collected per requested solution
+    """
+
+    if number_of_solutions <= 1:
+        return
+    model.Params.PoolSearchMode = 2
+    model.Params.PoolSolutions = factor*number_of_solutions
+
+
+def truncated_trail_key(trail, RU, RM, RL):
+    """
+    Identify the instantiation problems induced by a truncated trail
+
+    :param tuple trail: (upper_trail, middle_part, lower_trail) as returned by parse_solver_output
+    :param int RU: number of rounds covered by EU
+    :param int RM: number of rounds covered by EM
+    :param int RL: number of rounds covered by EL
+    :return: activeness patterns of the rounds covered by EU and EL
+    """
+
+    upper_trail, _, lower_trail = trail
+    return tuple(upper_trail[f"x_{r}"] for r in range(RU + 1)) + \
+           tuple(lower_trail[f"x_{RM + r}"] for r in range(RL + 1))
+
+
+def distinct_solutions(model, parse, key, number_of_solutions):
+    """
+    Parse the solutions in the pool of an optimized model in order of objective
+    value and keep the first number_of_solutions pairwise non-equivalent ones.
+    Only the output of the first (optimal) solution is printed.
+
+    :param model: optimized gurobipy model
+    :param parse: function parsing the solution selected by model.Params.SolutionNumber (read via Xn)
+    :param key: function mapping a parsed solution to its equivalence class
+    :param int number_of_solutions: maximum number of solutions to return
+    :return: list of parsed solutions
+    """
+
+    solutions = []
+    seen = set()
+    for solution_number in range(model.SolCount):
+        model.Params.SolutionNumber = solution_number
+        if solution_number == 0:
+            solution = parse()
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                solution = parse()
+        solution_key = key(solution)
+        if solution_key in seen:
+            continue
+        seen.add(solution_key)
+        solutions.append(solution)
+        if len(solutions) == number_of_solutions:
+            break
+    model.Params.SolutionNumber = 0
+    if len(solutions) > 1:
+        print(f"{len(solutions)} distinct truncated trails out of {model.SolCount} pool solutions")
+    return solutions
+
+
+def rank_candidates(candidates, jobs, score, processes=None, threads=None):
+    """
+    Instantiate every candidate in parallel, and sort the candidates by score (best first)
+
+    :param list candidates: truncated trails
+    :param jobs: function mapping a candidate to its dict of jobs, e.g., {"upper": (function, args)}
+    :param score: function(candidate, results) returning a sortable score (the higher the better), where
+                  results maps the job names of the candidate to their results
+    :param int processes: number of worker processes (default: number of cores, at least 2)
+    :param int threads: total number of Gurobi threads shared by the workers (default: number of cores)
+    :return: list of Candidate(score, index, trail, results)
+    """
+
+    all_jobs = dict()
+    for index, candidate in enumerate(candidates):
+        for name, job in jobs(candidate).items():
+            all_jobs[index, name] = job
+    if processes is None:
+        processes = max(2, os.cpu_count() or 1)
+    results = run_concurrently(all_jobs, processes=processes, threads=threads)
+    ranking = []
+    for index, candidate in enumerate(candidates):
+        candidate_results = {name: result for (i, name), result in results.items() if i == index}
+        ranking.append(Candidate(score(candidate, candidate_results), index, candidate, candidate_results))
+    ranking.sort(key=lambda c: c.score, reverse=True)
+    return ranking
+
+
+def ranking_table(ranking, score_names, effect_names=("upper", "lower")):
+    """
+    Format the ranking returned by rank_candidates as a text table
+
+    :param list ranking: list of Candidate
+    :param list score_names: column names of the score components (log2 values)
+    :param list effect_names: job names whose results are (trail, log2 effect)
+    :rtype str:
+    """
+
+    header = ["rank", "solution"] + list(effect_names) + list(score_names)
+    rows = []
+    for rank, candidate in enumerate(ranking):
+        row = [str(rank + 1), str(candidate.index)]
+        row += ["%0.02f" % candidate.results[name][1] if name in candidate.results else "-" for name in effect_names]
+        score = candidate.score if isinstance(candidate.score, tuple) else (candidate.score,)
+        row += ["%0.02f" % value for value in score]
+        rows.append(row)
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    lines = ["  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in [header] + rows]
+    return "\n".join(lines) + "\n"
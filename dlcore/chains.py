@@ -0,0 +1,190 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Connectivity chains, i.e., the tables of multi-round differential-linear
+distinguishers which are built by composing the DDT and DLCT of an S-box,
+e.g., the double, triple, ... DLCTs
+
+    ddlct = ddt @ dlct, tdlct = ddt @ ddt @ dlct, ...
+
+and the DDT of several rounds (ddt4 = ddt^4). The products are computed
+exactly: with float64 (BLAS) when every entry of the result is bounded by
+2^53, with int64 when it is bounded by 2^63, and with Python integers
+(dtype=object) otherwise. The results can be cached on disk (in
+.dlcache/tables, or in the directory given by DL_TABLE_CACHE), keyed by the
+digest of the factors.
+"""
+
+import os
+import hashlib
+import pickle
+import numpy as np
+
+ROOT_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+FLOAT_EXACT_BOUND = 2**53
+INT64_BOUND = 2**63 - 1
+
+
+def cache_directory():
+    """
+    Return the directory of the cached tables
+    """
+
+    return os.environ.get("DL_TABLE_CACHE", os.path.join(ROOT_DIRECTORY, ".dlcache", "tables"))
+
+
+def _as_integers(table):
+    """
+    Convert a table (e.g., nested lists of sage Integers) to int64, or to
+    Python integers (dtype=object) if some entries do not fit into int64
+    """
+
+    table = np.asarray(table)
+    if table.dtype != object:
+        return table.astype(np.int64)
+    entries = [int(x) for x in table.ravel()]
+    if max(abs(x) for x in entries) <= INT64_BOUND:
+        return np.array(entries, dtype=np.int64).reshape(table.shape)
+    return np.array(entries, dtype=object).reshape(table.shape)
+
+
+def _row_bound(table):
+    """
+    Return the maximum over the rows of sum(|entries|) as a Python integer
+    """
+
+    return max(sum(abs(int(x)) for x in row) for row in np.asarray(table, dtype=object))
+
+
+def multiply(a, b):
+    """
+    Exact product of two integer matrices
+    """
+
+    a = _as_integers(a)
+    b = _as_integers(b)
+    bound = _row_bound(a) * max(abs(int(x)) for x in b.ravel())
+    if a.dtype != object and b.dtype != object:
+        if bound < FLOAT_EXACT_BOUND:
+            return np.rint(a.astype(np.float64) @ b.astype(np.float64)).astype(np.int64)
+        if bound <= INT64_BOUND:
+            return a @ b
+    return np.asarray(a, dtype=object).dot(np.asarray(b, dtype=object))
+
+
+def chain(factors):
+    """
+    Exact product factors[0] @ factors[1] @ ... (from left to right)
+    """
+
+    factors = list(factors)
+    result = _as_integers(factors[0])
+    for factor in factors[1:]:
+        result = multiply(result, factor)
+    return result
+
+
+def power(matrix, exponent):
+    """
+    Exact matrix power by repeated squaring
+    """
+
+    matrix = _as_integers(matrix)
+    result = None
+    while exponent > 0:
+        if exponent & 1:
+            result = matrix if result is None else multiply(result, matrix)
+        exponent >>= 1
+        if exponent > 0:
+            matrix = multiply(matrix, matrix)
+    if result is None:
+        return np.eye(matrix.shape[0], dtype=np.int64)
+    return result
+
+
+def digest(*tables, **parameters):
+    """
+    Return the SHA-256 digest of the given tables and parameters
+    """
+
+    h = hashlib.sha256()
+    for table in tables:
+        table = np.asarray(table)
+        h.update(str(table.shape).encode())
+        h.update(repr(table.tolist()).encode() if table.dtype == object else table.astype(np.int64).tobytes())
+    h.update(repr(sorted(parameters.items())).encode())
+    return h.hexdigest()
+
+
+def cached(name, key, compute, use_cache=True):
+    """
+    Return compute(), stored in (and loaded from) the file <cache directory>/<name>-<key>.pkl
+
+    :param str name: name of the table, e.g., 'dlct3'
+    :param str key: digest of the inputs (see digest)
+    :param compute: function without arguments which computes the table
+    :param bool use_cache: if False, the table is computed and not stored
+    """
+
+    if not use_cache:
+        return compute()
+    file_name = os.path.join(cache_directory(), f"{name}-{key[:32]}.pkl")
+    if os.path.exists(file_name):
+        with open(file_name, "rb") as fileobj:
+            return pickle.load(fileobj)
+    table = compute()
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    temporary_file_name = f"{file_name}.{os.getpid()}"
+    with open(temporary_file_name, "wb") as fileobj:
+        pickle.dump(table, fileobj)
+    os.replace(temporary_file_name, file_name)
+    return table
+
+
+def ddt_power(ddt, rounds, use_cache=True):
+    """
+    Return the DDT of the given number of rounds (of the S-box alone), i.e., ddt^rounds
+    """
+
+    return cached(f"ddt{rounds}", digest(ddt, rounds=rounds),
+                  lambda: power(ddt, rounds), use_cache)
+
+
+def connectivity_chain(ddt, dlct, rounds, use_cache=True):
+    """
+    Return the DLCT of the given number of rounds, i.e., ddt^(rounds - 1) @ dlct,
+    e.g., rounds = 2 gives the double DLCT, and rounds = 3 the triple DLCT.
+    The entries are the correlations scaled by 2^(rounds*n).
+
+    :param ddt: DDT of the S-box (ndarray or nested lists)
+    :param dlct: DLCT of the S-box (ndarray or nested lists)
+    :param int rounds: number of rounds (>= 1)
+    :param bool use_cache: store the result on disk
+    :rtype ndarray:
+    """
+
+    if rounds < 1:
+        raise ValueError("The number of rounds should be at least 1")
+    return cached(f"dlct{rounds}", digest(ddt, dlct, rounds=rounds),
+                  lambda: multiply(power(ddt, rounds - 1), dlct), use_cache)
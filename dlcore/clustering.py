@@ -0,0 +1,409 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Weight-layer enumeration used to compute the differential (linear) effect.
+
+The former implementation fixed obj == w for every weight layer, asked
+Gurobi to keep up to 2^31 solutions in the pool only to read SolCount, and
+then solved the model once more with obj >= w + eps to find the next layer,
+i.e., every layer cost two full MIP solves. Here the model is solved with
+PoolSearchMode = 2 and a bounded pool: the n best solutions returned by one
+solve cover all the weight layers but the last one completely, so several
+layers are usually counted at once and the next solve starts from the last
+(possibly incomplete) layer. Only a layer that alone fills the pool is
+counted separately with obj == w, and the pool never holds more than
+pool_limit solutions on this path either: a part of the layer that fills
+the pool is split in two by the bounds of an integer variable on which two
+of its solutions differ, until every part fits into the pool.
+
+The enumeration stops when the model has no more solutions, when the
+weight exceeds end_weight (if given), or when the marginal contribution of
+the last layer to log2 of the probability drops below threshold (if given).
+
+With processes > 1, the layers are counted in parallel instead: the main
+process only finds the next weight (obj >= w + eps, a single optimal
+solution), and every layer obj == w is counted in its own worker process,
+which reads the model from an .mps file into its own Gurobi environment
+with a budget of threads threads. The results are merged in increasing
+order of weight, so that the running estimate and the convergence test are
+the same as in the sequential mode, and the counts still running when the
+enumeration stops are terminated.
+
+If a layer could not be counted completely (time limit, or more than
+max_pool_solutions solutions), its count is a lower bound, and the model
+is marked with model._truncated = True (see dlcore/cache.py).
+"""
+
+import math
+import os
+import shutil
+import tempfile
+import time
+import multiprocessing
+from collections import namedtuple
+
+DEFAULT_POOL_LIMIT = 10000
+MAX_POOL_SOLUTIONS = 2000000000
+
+# count is a lower bound if truncated is True (time limit, or the layer exceeded max_pool_solutions)
+WeightLayer = namedtuple("WeightLayer", ["weight", "count", "truncated"])
+
+
+class WeightLayerEnumerator:
+    """
+    Count the solutions of a gurobipy model layer by layer, where a layer is
+    the set of solutions with the same objective value w, and accumulate
+    sum(count(w) * 2^(-w)).
+    """
+
+    def __init__(self, model, start_weight=None, end_weight=None, threshold=None,
+                 pool_limit=DEFAULT_POOL_LIMIT, max_pool_solutions=MAX_POOL_SOLUTIONS,
+                 eps=1e-3, on_layer=None, verbose=True, processes=1, threads=None):
+        """
+        :param model: gurobipy model whose (minimization) objective is the weight
+        :param float start_weight: skip the layers with weight < start_weight
+        :param float end_weight: skip the layers with weight > end_weight (None: no bound)
+        :param float threshold: stop when the last layer changed log2 of the probability by less than threshold (None: never)
+        :param int pool_limit: maximum number of solutions kept in the solution pool
+        :param int max_pool_solutions: maximum number of solutions counted in a single layer
+        :param float eps: two weights closer than eps belong to the same layer
+        :param on_layer: called as on_layer(layer, log2_probability) after each layer
+        :param bool verbose: print the running estimate
+        :param int processes: number of worker processes counting the layers (1: sequential)
+        :param int threads: number of threads of each worker (None: Gurobi's default)
+        """
+
+        self.model = model
+        self.start_weight = start_weight
+        self.end_weight = end_weight
+        self.threshold = threshold
+        self.pool_limit = pool_limit
+        self.max_pool_solutions = max_pool_solutions
+        self.eps = eps
+        self.on_layer = on_layer
+        self.verbose = verbose
+        self.processes = processes if processes is not None else 1
+        self.threads = threads
+        self.layers = []
+        self.probability = 0
+        self.status = None
+        self.converged = False
+        self.number_of_solves = 0
+
+    @property
+    def log2_probability(self):
+        if self.probability == 0:
+            return None
+        return math.log(self.probability, 2)
+
+    @property
+    def weight(self):
+        """
+        Weight of the last counted layer
+        """
+
+        if self.layers == []:
+            return None
+        return self.layers[-1].weight
+
+    def _optimize(self, pool_solutions):
+        self.model.Params.PoolSolutions = pool_solutions
+        self.model.optimize()
+        self.number_of_solves += 1
+        self.status = self.model.Status
+        return self.status
+
+    def _pool_objective_values(self):
+        values = []
+        for i in range(self.model.SolCount):
+            self.model.Params.SolutionNumber = i
+            values.append(self.model.PoolObjVal)
+        return values
+
+    @property
+    def truncated(self):
+        """
+        True if the count of some layer is only a lower bound
+        """
+
+        return any(layer.truncated for layer in self.layers)
+
+    def _add_layer(self, weight, count, truncated):
+        """
+        Accumulate one layer and return False if the enumeration must stop
+        """
+
+        if self.end_weight is not None and weight > self.end_weight:
+            return False
+        contribution = math.pow(2, -weight) * count
+        previous = self.probability
+        self.probability += contribution
+        layer = WeightLayer(weight, count, truncated)
+        self.layers.append(layer)
+        if self.verbose:
+            print(f"Current weight: {weight}")
+            print(f"Number of trails: {count}" + (" (truncated)" if truncated else ""))
+            print(f"\tCurrent Probability: 2^({self.log2_probability})")
+            print("Time used = %0.04f seconds\n" % (time.time() - self.time_start))
+        if self.on_layer is not None:
+            self.on_layer(layer, self.log2_probability)
+        if self.threshold is not None and previous > 0:
+            if math.log(self.probability, 2) - math.log(previous, 2) < self.threshold:
+                self.converged = True
+                if self.verbose:
+                    print(f"Converged: the last layer contributed less than {self.threshold} to log2 of the probability\n")
+                return False
+        return True
+
+    def _count_single_layer(self, weight, obj):
+        """
+        Count the layer obj == weight when it does not fit into the pool
+        """
+
+        from gurobipy import GRB
+        if self.end_weight is not None and weight > self.end_weight:
+            return False
+        layer_constraint = self.model.addConstr(obj <= weight + self.eps/2, name="layer_constraint")
+        count, truncated, number_of_solves = count_solutions(self.model, self.pool_limit, self.max_pool_solutions)
+        self.number_of_solves += number_of_solves
+        self.status = self.model.Status
+        keep_going = count > 0 and self._add_layer(weight, count, truncated)
+        self.model.remove(layer_constraint)
+        return keep_going and self.status == GRB.OPTIMAL
+
+    def run(self):
+        """
+        Enumerate the weight layers
+
+        :return: log2 of the accumulated probability (None if no solution was found)
+        """
+
+        if self.processes > 1:
+            return self._run_parallel()
+        from gurobipy import GRB
+        self.time_start = time.time()
+        self.model.Params.PoolSearchMode = 2
+        obj = self.model.getObjective()
+        lower_bound = self.start_weight
+        lower_constraint = None
+        if self.verbose:
+            print("\n")
+        while True:
+            if lower_bound is not None:
+                if lower_constraint is None:
+                    lower_constraint = self.model.addConstr(obj >= lower_bound, name="lower_bound_constraint")
+                else:
+                    lower_constraint.RHS = lower_bound
+            if self._optimize(self.pool_limit) != GRB.OPTIMAL:
+                break
+            values = self._pool_objective_values()
+            exhausted = len(values) < self.pool_limit
+            # group the (sorted) pool into layers
+            groups = []
+            for i, value in enumerate(values):
+                if groups != [] and value - groups[-1][0] < self.eps:
+                    groups[-1][1].append(i)
+                else:
+                    groups.append((value, [i]))
+            if not exhausted:
+                # the last layer may be incomplete
+                if len(groups) == 1:
+                    weight = groups[0][0]
+                    if not self._count_single_layer(weight, obj):
+                        break
+                    lower_bound = weight + self.eps
+                    continue
+                groups.pop()
+            keep_going = True
+            for weight, solution_numbers in groups:
+                keep_going = self._add_layer(weight, len(solution_numbers), False)
+                if not keep_going:
+                    break
+            if exhausted or not keep_going:
+                break
+            lower_bound = groups[-1][0] + self.eps
+        if lower_constraint is not None:
+            self.model.remove(lower_constraint)
+        self.model.Params.PoolSolutions = 1
+        self.model._truncated = self.truncated
+        if self.layers == []:
+            if self.status == GRB.INFEASIBLE:
+                print("The model is infeasible!")
+            else:
+                print("Unknown Error!")
+        return self.log2_probability
+
+    def _run_parallel(self):
+        """
+        Find the weights in the main process and count each layer in a worker process
+        """
+
+        from gurobipy import GRB
+        self.time_start = time.time()
+        self.model.Params.PoolSearchMode = 0
+        model_dir = tempfile.mkdtemp(prefix="layers_")
+        model_file = os.path.join(model_dir, "model.mps")
+        self.model.write(model_file)
+        time_limit = self.model.Params.TimeLimit
+        if time_limit == GRB.INFINITY:
+            time_limit = None
+        obj = self.model.getObjective()
+        lower_bound = self.start_weight
+        lower_constraint = None
+        pending = []
+        if self.verbose:
+            print("\n")
+        pool = multiprocessing.get_context("spawn").Pool(self.processes)
+        try:
+            keep_going = True
+            while keep_going:
+                if lower_bound is not None:
+                    if lower_constraint is None:
+                        lower_constraint = self.model.addConstr(obj >= lower_bound, name="lower_bound_constraint")
+                    else:
+                        lower_constraint.RHS = lower_bound
+                if self._optimize(1) != GRB.OPTIMAL:
+                    break
+                weight = self.model.ObjVal
+                if self.end_weight is not None and weight > self.end_weight:
+                    break
+                pending.append((weight, pool.apply_async(count_layer, (model_file, weight, self.eps, self.threads, time_limit,
+                                                                       self.pool_limit, self.max_pool_solutions))))
+                lower_bound = weight + self.eps
+                # do not run too far ahead of the counted layers, the enumeration may converge
+                if len(pending) >= 2*self.processes:
+                    pending[0][1].wait()
+                keep_going = self._merge(pending, wait=False)
+            if keep_going:
+                self._merge(pending, wait=True)
+        finally:
+            # the layers still being counted are not needed anymore
+            pool.terminate()
+            pool.join()
+            shutil.rmtree(model_dir, ignore_errors=True)
+        if lower_constraint is not None:
+            self.model.remove(lower_constraint)
+        self.model._truncated = self.truncated
+        if self.layers == []:
+            if self.status == GRB.INFEASIBLE:
+                print("The model is infeasible!")
+            else:
+                print("Unknown Error!")
+        return self.log2_probability
+
+    def _merge(self, pending, wait):
+        """
+        Accumulate the finished layers in increasing order of weight
+        and return False if the enumeration must stop
+        """
+
+        while pending != [] and (wait or pending[0][1].ready()):
+            weight, result = pending.pop(0)
+            count, truncated = result.get()
+            if count == 0:
+                continue
+            if not self._add_layer(weight, count, truncated):
+                return False
+        return True
+
+
+def count_solutions(model, pool_limit=DEFAULT_POOL_LIMIT, max_solutions=MAX_POOL_SOLUTIONS):
+    """
+    Count the solutions of a model (restricted to a single weight layer)
+    without keeping more than pool_limit solutions in the pool: a part of the
+    solutions that fills the pool is split in two by the bounds of an integer
+    variable on which two of its solutions differ.
+
+    :return: (count, truncated, number of solves) where count is a lower bound if truncated is True
+    """
+
+    from gurobipy import GRB
+    pool_limit = max(pool_limit, 2)
+    model.Params.PoolSearchMode = 2
+    model.Params.PoolSolutions = pool_limit
+    variables = [v for v in model.getVars() if v.VType != GRB.CONTINUOUS]
+    bounds = list(zip(model.getAttr("LB", variables), model.getAttr("UB", variables)))
+    count = 0
+    truncated = False
+    number_of_solves = 0
+    # every part is given by its bounds, {index of the variable: (lower bound, upper bound)}
+    parts = [dict()]
+    while parts != []:
+        part = parts.pop()
+        for i, (lower, upper) in part.items():
+            variables[i].LB = lower
+            variables[i].UB = upper
+        model.optimize()
+        number_of_solves += 1
+        solutions = model.SolCount
+        split = None
+        if model.Status != GRB.OPTIMAL:
+            truncated = True
+        elif solutions >= pool_limit:
+            model.Params.SolutionNumber = 0
+            first = model.getAttr("Xn", variables)
+            model.Params.SolutionNumber = 1
+            second = model.getAttr("Xn", variables)
+            split = next((i for i in range(len(variables)) if round(first[i]) != round(second[i])), None)
+        if split is None:
+            count += solutions
+            truncated = truncated or solutions >= pool_limit
+        else:
+            lower, upper = part.get(split, bounds[split])
+            middle = min(round(first[split]), round(second[split]))
+            parts.append({**part, split: (lower, middle)})
+            parts.append({**part, split: (middle + 1, upper)})
+        for i in part:
+            variables[i].LB, variables[i].UB = bounds[i]
+        if truncated or count >= max_solutions:
+            truncated = truncated or parts != []
+            break
+    # the restored bounds are applied by the next optimize(), model.Status still refers to the last solve
+    return count, truncated, number_of_solves
+
+
+def count_layer(model_file, weight, eps=1e-3, threads=None, time_limit=None,
+                pool_limit=DEFAULT_POOL_LIMIT, max_pool_solutions=MAX_POOL_SOLUTIONS):
+    """
+    Count the solutions of the model stored in model_file with obj == weight
+    (executed in a worker process, with its own Gurobi environment)
+
+    :return: (count, truncated) where count is a lower bound if truncated is True
+    """
+
+    from gurobipy import Env, read
+    with Env(empty=True) as env:
+        env.setParam("OutputFlag", 0)
+        if threads is not None:
+            env.setParam("Threads", threads)
+        env.start()
+        model = read(model_file, env)
+        obj = model.getObjective()
+        model.addConstr(obj >= weight - eps/2)
+        model.addConstr(obj <= weight + eps/2)
+        if time_limit is not None:
+            model.Params.TimeLimit = time_limit
+        count, truncated, _ = count_solutions(model, pool_limit, max_pool_solutions)
+        model.dispose()
+    return count, truncated
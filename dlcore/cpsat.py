@@ -0,0 +1,327 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Direct OR-Tools CP-SAT models of the distinguisher searches.
+
+The MiniZinc path compiles attack.mzn into FlatZinc and runs the solver in a
+subprocess. CpSatModel builds the same model with the CP-SAT Python API
+instead:
+
+  - the S-box and XOR predicates of attack.mzn are tabulated by
+    dlcore/predicates.py and added as table constraints
+    (AddAllowedAssignments), so the semantics of the predicates are those of
+    the MiniZinc model, while there is no flattening at all,
+  - the arrays are registered under the names of attack.mzn (xu, yu, xmu,
+    ..., PU, CM, CL), and the solutions are returned as minizinc.Result
+    objects with these fields, so that parse_solution() and the drawers of
+    the ciphers work unchanged,
+  - every improving solution is passed to a handler from the in-process
+    solution callback, and the search stops when the objective reaches a
+    target or when no improving solution is found within a stall window
+    (as in dlcore/anytime.py),
+  - the best solution of a configuration is stored in
+    .dlcache/cpsat/ (or in $DL_CPSAT_HINTS, "0" disables it) and given to
+    the next search of the same configuration as a solution hint.
+
+The search runs with num_workers threads in the current process, so several
+models can be solved in parallel without any subprocess.
+"""
+
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import minizinc
+from dlcore.predicates import load_library
+
+ROOT_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+
+def hints_directory():
+    """
+    Return the directory of the stored solution hints (None: hints are disabled)
+    """
+
+    value = os.environ.get("DL_CPSAT_HINTS", "").strip()
+    if value == "0":
+        return None
+    return value or os.path.join(ROOT_DIRECTORY, ".dlcache", "cpsat")
+
+
+def hints_file(key):
+    """
+    Return the path of the solution hint of a configuration (None: hints are disabled)
+    """
+
+    directory = hints_directory()
+    if directory is None or key is None:
+        return None
+    return os.path.join(directory, hashlib.sha256(key.encode()).hexdigest()[:32] + ".json")
+
+
+class Solution:
+    """
+    Values of the variables of a CP-SAT solution, accessed like a MiniZinc solution (e.g., result["xu"])
+    """
+
+    def __init__(self, values, objective):
+        self.__dict__.update(values)
+        self.objective = objective
+
+    def __repr__(self):
+        return f"Solution(objective={self.objective})"
+
+
+class CpSatModel:
+    """
+    CP-SAT model whose variables are registered under the names of the MiniZinc model
+    """
+
+    def __init__(self, mzn_file_name):
+        """
+        :param str mzn_file_name: MiniZinc model whose predicates are used as table constraints
+        """
+
+        from ortools.sat.python import cp_model
+        self.cp_model = cp_model
+        self.model = cp_model.CpModel()
+        self.library = load_library(mzn_file_name)
+        self.arrays = dict()
+        self.objective = None
+
+    def array(self, name, shape, lower, upper):
+        """
+        Create an array of integer variables, e.g., array("xu", [RU + 1, 64], 0, 1)
+
+        :param str name: name of the array in the MiniZinc model
+        :param list shape: size of every dimension (all indices start at 0)
+        :param int lower: lower bound of the domain
+        :param int upper: upper bound of the domain
+        :return: nested lists of variables
+        """
+
+        def create(prefix, dimensions):
+            if not dimensions:
+                return self.model.NewIntVar(lower, upper, prefix)
+            return [create(f"{prefix}[{i}]", dimensions[1:]) for i in range(dimensions[0])]
+
+        self.arrays[name] = create(name, list(shape))
+        return self.arrays[name]
+
+    def variable(self, name, lower, upper):
+        """
+        Create a single integer variable, e.g., variable("PU", 0, 1000)
+        """
+
+        self.arrays[name] = self.model.NewIntVar(lower, upper, name)
+        return self.arrays[name]
+
+    def table(self, predicate, arguments, **fixed):
+        """
+        Constrain arguments by a predicate of the MiniZinc model, e.g., table("sbox_diff", [...], which=3)
+
+        :param str predicate: name of the predicate
+        :param list arguments: variables (or constants) for the parameters which are not fixed
+        :param fixed: values of the fixed parameters
+        """
+
+        self.model.AddAllowedAssignments(list(arguments), self.library.table(predicate, **fixed))
+
+    def relation(self, arguments, domains, condition):
+        """
+        Constrain arguments by a Python predicate, tabulated over the given domains
+
+        :param list arguments: variables
+        :param list domains: domain (iterable of values) of every argument
+        :param condition: function of the values of the arguments returning True for the allowed tuples
+        """
+
+        tuples = [values for values in itertools.product(*domains) if condition(*values)]
+        self.model.AddAllowedAssignments(list(arguments), tuples)
+
+    def indicator(self, arguments, domains, condition):
+        """
+        Return a 0-1 variable equal to condition(*arguments), i.e., bool2int(...) of the MiniZinc model
+
+        :param list arguments: variables
+        :param list domains: domain (iterable of values) of every argument
+        :param condition: function of the values of the arguments
+        """
+
+        variable = self.model.NewBoolVar("")
+        self.relation(list(arguments) + [variable], list(domains) + [(0, 1)],
+                      lambda *values: values[-1] == int(bool(condition(*values[:-1]))))
+        return variable
+
+    def minimize(self, expression):
+        """
+        Set the objective to minimize
+        """
+
+        self.objective = expression
+        self.model.Minimize(expression)
+
+    def _variables(self):
+        for name, array in self.arrays.items():
+            stack = [array]
+            while stack:
+                item = stack.pop()
+                if isinstance(item, list):
+                    stack.extend(item)
+                else:
+                    yield item
+
+    def load_hint(self, key):
+        """
+        Give the stored solution of a configuration to the solver as a hint
+
+        :return: objective of the stored solution (None if there is none)
+        """
+
+        file_name = hints_file(key)
+        if file_name is None or not os.path.exists(file_name):
+            return None
+        with open(file_name, "r") as fileobj:
+            stored = json.load(fileobj)
+        self.model.ClearHints()
+        for variable in self._variables():
+            if variable.Name() in stored["values"]:
+                self.model.AddHint(variable, stored["values"][variable.Name()])
+        return stored["objective"]
+
+    def store_hint(self, key, values, objective):
+        """
+        Store the best solution of a configuration, unless a better one is stored already
+        """
+
+        file_name = hints_file(key)
+        if file_name is None:
+            return
+        if os.path.exists(file_name):
+            with open(file_name, "r") as fileobj:
+                if json.load(fileobj)["objective"] <= objective:
+                    return
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        temporary_file_name = f"{file_name}.{os.getpid()}"
+        with open(temporary_file_name, "w") as fileobj:
+            json.dump({"key": key, "objective": objective, "values": values}, fileobj)
+        os.replace(temporary_file_name, file_name)
+
+    def solve(self, handler=None, timeout=None, target=None, stall=None, num_workers=None, random_seed=None,
+              hint_key=None, log=False):
+        """
+        Minimize the objective, passing every improving solution to handler as soon as it is found
+
+        :param handler: function called as handler(result, count, elapsed) on every solution
+        :param datetime.timedelta timeout: time limit of the whole search (None: no limit)
+        :param target: stop as soon as the objective is at most target
+        :param float stall: stop when no improving solution is found within stall seconds
+        :param int num_workers: number of search threads (None: CP-SAT's default)
+        :param int random_seed: random seed of the solver
+        :param str hint_key: configuration under which the best solution is stored and hinted (None: no hints)
+        :param bool log: print the search log of CP-SAT
+        :return: minizinc.Result with the best solution found, the final status and the statistics
+        """
+
+        cp_model = self.cp_model
+        if isinstance(timeout, datetime.timedelta):
+            timeout = timeout.total_seconds()
+        if isinstance(stall, datetime.timedelta):
+            stall = stall.total_seconds()
+        hint_objective = self.load_hint(hint_key)
+        if hint_objective is not None:
+            print(f"Solution hint with objective {hint_objective} loaded")
+        solver = cp_model.CpSolver()
+        if timeout is not None:
+            solver.parameters.max_time_in_seconds = timeout
+        if num_workers is not None:
+            solver.parameters.num_workers = num_workers
+        if random_seed is not None:
+            solver.parameters.random_seed = random_seed
+        solver.parameters.log_search_progress = log
+        arrays = self.arrays
+        variables = list(self._variables())
+        state = {"count": 0, "best": None, "values": None, "reason": None, "timer": None}
+        start_time = time.time()
+
+        def stop(reason):
+            state["reason"] = reason
+            solver.StopSearch()
+
+        def restart_timer():
+            if stall is None:
+                return
+            if state["timer"] is not None:
+                state["timer"].cancel()
+            state["timer"] = threading.Timer(stall, stop, ["no improving solution within %0.02f seconds" % stall])
+            state["timer"].daemon = True
+            state["timer"].start()
+
+        class Callback(cp_model.CpSolverSolutionCallback):
+            def on_solution_callback(self):
+                def value(item):
+                    return [value(entry) for entry in item] if isinstance(item, list) else self.Value(item)
+                objective = int(self.ObjectiveValue())
+                solution = Solution({name: value(array) for name, array in arrays.items()}, objective)
+                state["count"] += 1
+                state["best"] = solution
+                state["values"] = {variable.Name(): self.Value(variable) for variable in variables}
+                restart_timer()
+                if handler is not None:
+                    statistics = {"solutions": state["count"], "objective": objective}
+                    handler(minizinc.Result(minizinc.Status.SATISFIED, solution, statistics),
+                            state["count"], time.time() - start_time)
+                if target is not None and objective <= target:
+                    stop(f"objective {objective} reached the target {target}")
+
+        restart_timer()
+        try:
+            status = solver.Solve(self.model, Callback())
+        finally:
+            if state["timer"] is not None:
+                state["timer"].cancel()
+        statistics = {"solveTime": datetime.timedelta(seconds=solver.WallTime()),
+                      "solutions": state["count"],
+                      "conflicts": solver.NumConflicts(),
+                      "branches": solver.NumBranches(),
+                      "objectiveBound": solver.BestObjectiveBound()}
+        if state["best"] is not None:
+            statistics["objective"] = state["best"].objective
+            self.store_hint(hint_key, state["values"], state["best"].objective)
+        if state["reason"] is not None:
+            print(f"Search stopped early: {state['reason']}")
+        if status == cp_model.OPTIMAL:
+            result_status = minizinc.Status.OPTIMAL_SOLUTION
+        elif status == cp_model.FEASIBLE:
+            result_status = minizinc.Status.SATISFIED
+        elif status == cp_model.INFEASIBLE:
+            result_status = minizinc.Status.UNSATISFIABLE
+        elif status == cp_model.MODEL_INVALID:
+            result_status = minizinc.Status.ERROR
+        else:
+            result_status = minizinc.Status.UNKNOWN
+        return minizinc.Result(result_status, state["best"], statistics)
@@ -0,0 +1,101 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Shared loader for the S-box (and MDS) encodings.
+
+The encodings are either given inline as lists of inequalities, or stored in
+the ddt-encoding/*.txt and lat-encoding/*.txt files. Each of them is parsed
+only once per process into an InequalityTemplate (integer coefficient rows
+indexed by placeholder position) and kept in a module-level cache, so that
+building many sub-models (e.g., in attack.py) never parses an encoding twice.
+"""
+
+import os
+from dlcore.milp import InequalityTemplate
+
+_compiled_templates = dict()
+_loaded_templates = dict()
+
+
+def sbox_placeholders(input_size, output_size, weight_size=0):
+    """
+    Return the placeholder names used by SboxAnalyzer, i.e.,
+    a0, ..., b0, ..., p0, ... (a0 and b0 are the msb)
+    """
+
+    return [f"a{i}" for i in range(input_size)] + \
+           [f"b{i}" for i in range(output_size)] + \
+           [f"p{i}" for i in range(weight_size)]
+
+
+def compile_inequalities(inequalities, placeholders, big_m=None):
+    """
+    Compile a list of inequalities into an InequalityTemplate (cached)
+
+    :param list inequalities: inequalities in the .lp syntax, e.g., '- a0 + b1 >= -1'
+    :param list placeholders: placeholder names in the order they are instantiated
+    :param int big_m: if given, the template gets an extra indicator placeholder (see InequalityTemplate.with_indicator)
+    :rtype InequalityTemplate:
+    """
+
+    inequalities = tuple(ineq.strip() for ineq in inequalities if ineq.strip() != "")
+    key = (inequalities, tuple(placeholders), big_m)
+    template = _compiled_templates.get(key)
+    if template is None:
+        template = InequalityTemplate.from_strings(inequalities, placeholders)
+        if big_m is not None:
+            template = template.with_indicator(big_m)
+        _compiled_templates[key] = template
+    return template
+
+
+def load_inequalities(file_name, placeholders, big_m=None):
+    """
+    Load the inequalities stored in file_name (one per line) and compile them (cached).
+    The cache is invalidated when the file is modified.
+
+    :param str file_name: path of the encoding file, e.g., ddt-encoding/s_2.txt
+    :param list placeholders: placeholder names in the order they are instantiated
+    :param int big_m: if given, the template gets an extra indicator placeholder
+    :rtype InequalityTemplate:
+    """
+
+    path = os.path.abspath(file_name)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size, tuple(placeholders), big_m)
+    template = _loaded_templates.get(key)
+    if template is None:
+        with open(path, "r") as fileobj:
+            inequalities = fileobj.readlines()
+        template = compile_inequalities(inequalities, placeholders, big_m)
+        _loaded_templates[key] = template
+    return template
+
+
+def clear_cache():
+    """
+    Drop all cached templates
+    """
+
+    _compiled_templates.clear()
+    _loaded_templates.clear()
@@ -0,0 +1,296 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Parallel and cached generation of the S-box encodings with ESPRESSO.
+
+The Diff/Lin classes load one system of inequalities per probability
+(squared correlation) of the S-box, i.e., per subtable of the DDT (squared
+LAT), from ddt-encoding/<prefix>_<entry>.txt (lat-encoding/<prefix>_<weight>.txt).
+These files used to be produced one subtable at a time by
+SboxAnalyzer.minimized_diff_constraints/minimized_linear_constraints and
+copied by hand. generate_encodings computes the tables of the S-box with
+NumPy (dlcore/tables.py), minimizes all subtables concurrently (one ESPRESSO
+process per worker, see dlcore/pipeline.py), and writes the encoding
+directories. The minimized constraints are cached in .dlcache/encodings (or
+in the directory given by DL_ENCODING_CACHE), keyed by the lookup table,
+the table type, the subtable, and the ESPRESSO mode, so that re-encoding an
+S-box only minimizes the subtables that changed. Optionally, the output of
+ESPRESSO is further reduced to a smallest subset of inequalities cutting off
+the same points (see dlcore/reduction.py).
+
+Example (the DDT and LAT encodings of the S-box of TWINE):
+
+    python3 dlcore/espresso.py --sbox c,0,f,a,2,b,9,5,8,3,d,7,1,e,6,4 -t ddt lat -o twine
+"""
+
+import os
+import sys
+import math
+import shutil
+import tempfile
+import subprocess
+import time
+from argparse import ArgumentParser, RawTextHelpFormatter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore import tables
+from dlcore.chains import ROOT_DIRECTORY, digest
+from dlcore.pipeline import run_concurrently
+from dlcore.reduction import reduce_inequalities, describe
+
+ESPRESSO_BIN_PATH = os.environ.get("ESPRESSO") or shutil.which("espresso") or \
+                    os.path.join(os.getcwd(), 'espresso', 'build', 'espresso')
+TABLE_TYPES = {"ddt": "ddt-encoding", "lat": "lat-encoding"}
+
+# The options of SboxAnalyzer.simplify_by_espresso
+ESPRESSO_OPTIONS = [[],
+                    ["-Dexact", "-estrong", "-s", "-t", "-or"],
+                    ["-Dexact", "-estrong", "-s", "-t", "-of"],
+                    ["-Dexact", "-efast", "-s", "-t", "-or"],
+                    ["-Dexact", "-efast", "-s", "-t", "-of"],
+                    ["-Dexact", "-estrong", "-epos", "-s", "-t", "-of"],
+                    ["-Dmany", "-estrong", "-epos", "-s", "-t", "-of"],
+                    ["-Dmany", "-efast", "-epos", "-s", "-t", "-of"]]
+# Modes for which the ON-SET of the Boolean function is the subtable (reverse = 0 in SboxAnalyzer)
+ON_SET_MODES = [1, 3, 5, 6, 7]
+
+
+def cache_directory():
+    """
+    Return the directory of the cached encodings
+    """
+
+    return os.environ.get("DL_ENCODING_CACHE", os.path.join(ROOT_DIRECTORY, ".dlcache", "encodings"))
+
+
+def table_of(sbox, table):
+    """
+    Return the table whose subtables are encoded: the DDT, or the squared LAT (correlations)
+
+    :param list sbox: lookup table
+    :param str table: 'ddt' or 'lat'
+    """
+
+    if table == "ddt":
+        return tables.difference_distribution_table(sbox)
+    elif table == "lat":
+        return tables.linear_approximation_table(sbox, scale="absolute")**2
+    raise ValueError(f"Unknown table {table!r}")
+
+
+def subtables(sbox, table):
+    """
+    Return the entries of the table defining its subtables (0 and the trivial transition excluded)
+    """
+
+    values = table_of(sbox, table)
+    trivial = values[0][0]
+    return [entry for entry in tables.spectrum(values) if entry not in (0, trivial)]
+
+
+def weight(sbox, table, entry):
+    """
+    Return -log2 of the probability (squared correlation) of the subtable
+    """
+
+    trivial = table_of(sbox, table)[0][0]
+    return -math.log2(entry/trivial)
+
+
+def subtable_name(sbox, table, entry, digits=4):
+    """
+    Return the name of the subtable used in the encoding files, i.e., the DDT entry
+    (e.g., 2 for ddt-encoding/s_2.txt) or the weight of the squared correlation with
+    the decimal point replaced by '_' (e.g., 6_3853 for lat-encoding/s_6_3853.txt)
+    """
+
+    if table == "ddt":
+        return str(entry)
+    w = weight(sbox, table, entry)
+    if abs(w - round(w)) < 10**(-digits):
+        return str(int(round(w)))
+    return f"{w:.{digits}f}".replace(".", "_")
+
+
+def truth_table(sbox, table, entry, mode):
+    """
+    Return the input of ESPRESSO describing the subtable (the same Boolean function as SboxAnalyzer)
+
+    :return: (contents of the .pla file, names of the variables)
+    """
+
+    values = table_of(sbox, table)
+    n = tables.bit_length(values.shape[0])
+    m = tables.bit_length(values.shape[1])
+    reverse = 0 if mode in ON_SET_MODES else 1
+    variables = [f"a{i}" for i in range(n)] + [f"b{i}" for i in range(m)]
+    lines = [f".i {n + m}", ".o 1", ".ilb {0}".format(" ".join(variables)), ".ob F"]
+    for x in range(2**n):
+        x_bits = bin(x)[2:].zfill(n)
+        for y in range(2**m):
+            value = reverse ^ 1 if values[x][y] == entry else reverse
+            lines.append(f"{x_bits}{bin(y)[2:].zfill(m)}{value}")
+    lines.append(".e")
+    return "\n".join(lines) + "\n", variables
+
+
+def parse_espresso_output(text, variables):
+    """
+    Convert the cubes in the output of ESPRESSO into MILP constraints
+    (see SboxAnalyzer._parse_the_output_of_espresso)
+    """
+
+    lines = text.splitlines()
+    starting_point, end_point = 0, 0
+    for i, line in enumerate(lines):
+        if ".p" in line:
+            starting_point = i + 1
+        if ".e" in line:
+            end_point = i
+    constraints = []
+    for line in lines[starting_point:end_point]:
+        terms = []
+        rhs = 1
+        for variable, bit in zip(variables, line[0:len(variables)]):
+            if bit == '0':
+                terms.append(f"+ {variable}")
+            elif bit == '1':
+                terms.append(f"- {variable}")
+                rhs -= 1
+        constraint = " ".join(terms) + f" >= {rhs}"
+        constraints.append(constraint[2:] if constraint.startswith("+ ") else constraint)
+    return constraints
+
+
+def minimize_subtable(sbox, table, entry, mode=6, use_cache=True, reduction=None):
+    """
+    Minimize the Boolean function of one subtable with ESPRESSO (cached)
+
+    :param list sbox: lookup table
+    :param str table: 'ddt' or 'lat'
+    :param entry: entry of the table defining the subtable
+    :param int mode: ESPRESSO mode (see SboxAnalyzer.simplify_by_espresso)
+    :param bool use_cache: if False, the constraints are neither loaded from nor stored in the cache
+    :param str reduction: None, 'greedy', or 'milp' (see dlcore/reduction.py)
+    :return: list of constraints in the .lp syntax
+    """
+
+    if mode not in range(len(ESPRESSO_OPTIONS)):
+        raise ValueError("Invalid value for mode! mode must be in [0, 1, 2, 3, 4, 5, 6, 7].")
+    key = digest(tables.lookup_table(sbox), table=table, subtable=int(entry), mode=mode, reduction=reduction)
+    file_name = os.path.join(cache_directory(), f"{table}-{key[:32]}.txt")
+    if use_cache and os.path.exists(file_name):
+        with open(file_name, "r") as fileobj:
+            return [line.strip() for line in fileobj if line.strip() != ""]
+    contents, variables = truth_table(sbox, table, entry, mode)
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, "tt.txt")
+        with open(input_file, "w") as fileobj:
+            fileobj.write(contents)
+        output = subprocess.run([ESPRESSO_BIN_PATH, *ESPRESSO_OPTIONS[mode], input_file],
+                                stdout=subprocess.PIPE, text=True, check=True).stdout
+    constraints = parse_espresso_output(output, variables)
+    if reduction is not None:
+        result = reduce_inequalities(constraints, variables, table_of(sbox, table) == entry, method=reduction)
+        print(f"{table} subtable {entry}: {describe(result)}")
+        constraints = result.inequalities
+    if use_cache:
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        temporary_file_name = f"{file_name}.{os.getpid()}"
+        with open(temporary_file_name, "w") as fileobj:
+            fileobj.write("\n".join(constraints) + "\n")
+        os.replace(temporary_file_name, file_name)
+    return constraints
+
+
+def generate_encodings(sbox, table, directory, mode=6, prefix="s", digits=4, processes=None, use_cache=True,
+                       reduction=None):
+    """
+    Minimize all subtables of the DDT (squared LAT) of the S-box concurrently and write
+    them into <directory>/ddt-encoding (lat-encoding) in the layout loaded by the Diff/Lin classes
+
+    :param list sbox: lookup table
+    :param str table: 'ddt' or 'lat'
+    :param str directory: directory of the cipher, e.g., twine
+    :param int mode: ESPRESSO mode
+    :param str prefix: prefix of the file names, e.g., s0 for clefia/ddt-encoding/s0_2.txt
+    :param int digits: number of decimal digits of the weights in the names of the LAT subtables
+    :param int processes: number of worker processes (default: one per subtable)
+    :param bool use_cache: use the cache of minimized subtables
+    :param str reduction: None, 'greedy', or 'milp' (reduce the output of ESPRESSO, see dlcore/reduction.py)
+    :return: dict mapping the names of the subtables to their weights, e.g., {"2": 7, "4": 6}
+    """
+
+    entries = subtables(sbox, table)
+    names = {entry: subtable_name(sbox, table, entry, digits) for entry in entries}
+    jobs = {names[entry]: (minimize_subtable, (list(sbox), table, entry, mode, use_cache, reduction)) for entry in entries}
+    results = run_concurrently(jobs, processes=processes, threads=1)
+    output_directory = os.path.join(directory, TABLE_TYPES[table])
+    os.makedirs(output_directory, exist_ok=True)
+    weights = dict()
+    for entry in entries:
+        name = names[entry]
+        with open(os.path.join(output_directory, f"{prefix}_{name}.txt"), "w") as fileobj:
+            fileobj.write("\n".join(results[name]) + "\n")
+        weights[name] = round(weight(sbox, table, entry), digits)
+        print(f"{table} subtable {name}: {len(results[name])} constraints, weight {weights[name]}")
+    return weights
+
+
+def parse_sbox(text):
+    """
+    Parse an S-box given as comma- or space-separated hexadecimal numbers
+    """
+
+    return [int(x, 16) for x in text.replace(",", " ").split()]
+
+
+def main():
+    parser = ArgumentParser(description="Generate the DDT/LAT encodings of an S-box with ESPRESSO\n"
+                                        "Example:\n"
+                                        "python3 dlcore/espresso.py --sbox c,0,f,a,2,b,9,5,8,3,d,7,1,e,6,4 -t ddt lat -o twine",
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument("-s", "--sbox", type=str, required=True, help="lookup table (hexadecimal numbers)")
+    parser.add_argument("-t", "--tables", nargs="+", choices=list(TABLE_TYPES), default=list(TABLE_TYPES),
+                        help="tables to encode")
+    parser.add_argument("-o", "--output", type=str, default=".", help="directory of the cipher")
+    parser.add_argument("-m", "--mode", type=int, default=6, help="ESPRESSO mode (see SboxAnalyzer.simplify_by_espresso)")
+    parser.add_argument("-p", "--prefix", type=str, default="s", help="prefix of the file names")
+    parser.add_argument("-d", "--digits", type=int, default=4, help="decimal digits of the weights in the LAT file names")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: one per subtable)")
+    parser.add_argument("-r", "--reduce", choices=["greedy", "milp"], default=None,
+                        help="reduce the output of ESPRESSO to a smallest subset of inequalities (set cover)")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the cache of minimized subtables")
+    args = parser.parse_args()
+    sbox = parse_sbox(args.sbox)
+    start_time = time.time()
+    for table in args.tables:
+        weights = generate_encodings(sbox, table, args.output, mode=args.mode, prefix=args.prefix, digits=args.digits,
+                                     processes=args.jobs, use_cache=not args.no_cache,
+                                     reduction=args.reduce)
+        print(f"Weights of the {table} subtables: {weights}")
+    print("Elapsed time: %0.02f seconds" % (time.time() - start_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Experimental evaluation of differential-linear distinguishers.
+
+Given the input difference and the output mask of a distinguisher (as
+produced by the parse_solver_output()/parse_solution() methods of the
+cipher tools), the reduced-round cipher is run on large batches of
+plaintext pairs (p, p + dp) and the correlation of lc.(c + c') is estimated
+as by dldistinguisher() in the C programs of the verifications directories:
+the absolute value of the correlation is measured under every key and
+averaged over the keys, but without recompiling anything for every
+distinguisher. Unlike the C programs, the round keys are independent and
+uniformly random instead of being derived by the key schedule.
+
+The states are kept as NumPy arrays with one row per plaintext and one
+(uint8) column per cell, so that the S-box layers are table lookups and the
+nibble permutations are column gathers over the whole batch. Every batch
+is encrypted under its own round keys, and the batches are distributed over
+a pool of worker processes. The confidence interval is derived from the
+spread of the per-key absolute correlations (normal approximation).
+
+Example (from the root of the repository):
+
+    python3 dlcore/estimator.py twine -r 9 -dp 0000000000a00000 -lc 000000000000a000 -d 24
+"""
+
+import math
+import os
+import time
+import multiprocessing
+from abc import ABC, abstractmethod
+from argparse import ArgumentParser, RawTextHelpFormatter
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+import numpy as np
+
+DEFAULT_BATCH_DEGREE = 16
+
+POPCOUNT = np.array([bin(x).count("1") for x in range(256)], dtype=np.uint8)
+
+
+class BlockCipher(ABC):
+    """
+    Reduced-round cipher acting on a batch of states of shape (N, number_of_cells)
+    """
+
+    name = None
+    cell_size = 4
+    number_of_cells = 16
+
+    def parse(self, value):
+        """
+        Convert a difference/mask into a vector of cells
+
+        :param value: hex string in the format of the trails (first character is the first cell), or list of bits (msb first)
+        :rtype: numpy.ndarray
+        """
+
+        if not isinstance(value, str):
+            value = hex(int("".join(map(str, value)), 2))[2:]
+        value = value.strip().lower().removeprefix("0x").zfill(self.number_of_cells*self.cell_size//4)
+        if self.cell_size == 4:
+            cells = [int(c, 16) for c in value]
+        else:
+            cells = [int(value[2*i:2*i + 2], 16) for i in range(len(value)//2)]
+        if len(cells) != self.number_of_cells:
+            raise ValueError(f"{value!r} is not a state of {self.name}")
+        return np.array(cells, dtype=np.uint8)
+
+    def random_states(self, rng, number_of_states):
+        return rng.integers(0, 2**self.cell_size, size=(number_of_states, self.number_of_cells), dtype=np.uint8)
+
+    @abstractmethod
+    def round_keys(self, rng, rounds):
+        """
+        Generate independent round keys for rounds rounds
+        """
+
+    @abstractmethod
+    def encrypt(self, states, round_keys, rounds):
+        """
+        Encrypt a batch of states (the input array may be modified)
+        """
+
+
+class TWINE(BlockCipher):
+    """
+    See twine/verifications/twine.c
+    """
+
+    name = "twine"
+    sbox = np.array([0xc, 0x0, 0xf, 0xa, 0x2, 0xb, 0x9, 0x5, 0x8, 0x3, 0xd, 0x7, 0x1, 0xe, 0x6, 0x4], dtype=np.uint8)
+    # t[Pi[i]] = x[i]
+    permutation = [0x5, 0x0, 0x1, 0x4, 0x7, 0xc, 0x3, 0x8, 0xd, 0x6, 0x9, 0x2, 0xf, 0xa, 0xb, 0xe]
+    gather = np.argsort(permutation)
+
+    def round_keys(self, rng, rounds):
+        return rng.integers(0, 16, size=(rounds, 8), dtype=np.uint8)
+
+    def encrypt(self, states, round_keys, rounds):
+        for r in range(rounds):
+            states[:, 1::2] ^= self.sbox[states[:, 0::2] ^ round_keys[r]]
+            states = states[:, self.gather]
+        return states
+
+
+class WARP(BlockCipher):
+    """
+    See warp/verifications/warp.c (the 128-bit key is used as K0, K1 alternately)
+    """
+
+    name = "warp"
+    number_of_cells = 32
+    sbox = np.array([0xc, 0xa, 0xd, 0x3, 0xe, 0xb, 0xf, 0x7, 0x8, 0x9, 0x1, 0x5, 0x0, 0x2, 0x4, 0x6], dtype=np.uint8)
+    # state[perm[j]] = temp[j]
+    permutation = [31, 6, 29, 14, 1, 12, 21, 8, 27, 2, 3, 0, 25, 4, 23, 10,
+                   15, 22, 13, 30, 17, 28, 5, 24, 11, 18, 19, 16, 9, 20, 7, 26]
+    gather = np.argsort(permutation)
+    rc0 = [0x0, 0x0, 0x1, 0x3, 0x7, 0xf, 0xf, 0xf, 0xe, 0xd, 0xa, 0x5, 0xa, 0x5, 0xb, 0x6, 0xc, 0x9, 0x3, 0x6, 0xd,
+           0xb, 0x7, 0xe, 0xd, 0xb, 0x6, 0xd, 0xa, 0x4, 0x9, 0x2, 0x4, 0x9, 0x3, 0x7, 0xe, 0xc, 0x8, 0x1, 0x2]
+    rc1 = [0x4, 0xc, 0xc, 0xc, 0xc, 0xc, 0x8, 0x4, 0x8, 0x4, 0x8, 0x4, 0xc, 0x8, 0x0, 0x4, 0xc, 0x8, 0x4, 0xc, 0xc,
+           0x8, 0x4, 0xc, 0x8, 0x4, 0x8, 0x0, 0x4, 0x8, 0x0, 0x4, 0xc, 0xc, 0x8, 0x0, 0x0, 0x4, 0x8, 0x4, 0xc]
+
+    def round_keys(self, rng, rounds):
+        return rng.integers(0, 16, size=(2, 16), dtype=np.uint8)
+
+    def encrypt(self, states, round_keys, rounds):
+        for r in range(rounds):
+            states[:, 1::2] ^= self.sbox[states[:, 0::2]] ^ round_keys[r % 2]
+            states[:, 1] ^= self.rc0[r]
+            states[:, 3] ^= self.rc1[r]
+            states = states[:, self.gather]
+        return states
+
+
+class LBlock(BlockCipher):
+    """
+    See lblock/verifications/lblock.c; the cells are the bytes x[0], ..., x[7]
+    of the C implementation, i.e., the trails' hex strings in reverse byte order
+    """
+
+    name = "lblock"
+    cell_size = 8
+    number_of_cells = 8
+    sboxes = np.array([[14, 9, 15, 0, 13, 4, 10, 11, 1, 2, 8, 3, 7, 6, 12, 5],
+                       [4, 11, 14, 9, 15, 13, 0, 10, 7, 12, 5, 6, 2, 8, 1, 3],
+                       [1, 14, 7, 12, 15, 13, 0, 6, 11, 5, 9, 3, 2, 4, 8, 10],
+                       [7, 6, 8, 11, 0, 15, 3, 14, 9, 10, 12, 13, 5, 2, 4, 1],
+                       [14, 5, 15, 0, 7, 2, 12, 13, 1, 8, 4, 9, 11, 10, 6, 3],
+                       [2, 13, 11, 12, 15, 14, 0, 9, 7, 10, 6, 3, 1, 8, 4, 5],
+                       [11, 9, 4, 14, 0, 15, 10, 13, 6, 12, 5, 7, 3, 8, 1, 2],
+                       [13, 10, 15, 0, 14, 4, 9, 11, 2, 1, 8, 3, 7, 5, 12, 6]], dtype=np.uint8)
+    columns = np.arange(4)
+
+    def parse(self, value):
+        return super().parse(value)[::-1].copy()
+
+    def round_keys(self, rng, rounds):
+        return rng.integers(0, 256, size=(rounds, 4), dtype=np.uint8)
+
+    def encrypt(self, states, round_keys, rounds):
+        for r in range(rounds):
+            tmp = states[:, 4:] ^ round_keys[r]
+            low = self.sboxes[2*self.columns, tmp & 0x0f]
+            high = self.sboxes[2*self.columns + 1, tmp >> 4]
+            t = np.empty_like(tmp)
+            t[:, 0] = high[:, 0] ^ (high[:, 1] << 4)
+            t[:, 1] = low[:, 0] ^ (low[:, 1] << 4)
+            t[:, 2] = high[:, 2] ^ (high[:, 3] << 4)
+            t[:, 3] = low[:, 2] ^ (low[:, 3] << 4)
+            left = states[:, [3, 0, 1, 2]] ^ t
+            states = np.concatenate([states[:, 4:], left], axis=1)
+        return states
+
+
+class PRESENT(BlockCipher):
+    """
+    See present/verifications/difflin.c; the cells are the nibbles of the
+    64-bit state from the msb to the lsb, i.e., the hex digits of the state
+    """
+
+    name = "present"
+    sbox = np.array([12, 5, 6, 11, 9, 0, 10, 13, 3, 14, 15, 8, 4, 7, 1, 2], dtype=np.uint8)
+    # out_msb[j] = in_msb[Pbox[j]]
+    pbox = [(4*j) % 63 for j in range(63)] + [63]
+    columns = np.arange(16)
+    shifts = np.array([60 - 4*i for i in range(16)], dtype=np.uint64)
+
+    def __init__(self):
+        # sp_table[i][v]: 64-bit output of the P-layer when the S-box i (from the msb) outputs S(v) and the others 0
+        self.sp_table = np.zeros((16, 16), dtype=np.uint64)
+        for i in range(16):
+            for v in range(16):
+                word = int(self.sbox[v]) << (60 - 4*i)
+                out = 0
+                for j in range(64):
+                    out |= ((word >> (63 - self.pbox[j])) & 1) << (63 - j)
+                self.sp_table[i, v] = out
+
+    def round_keys(self, rng, rounds):
+        return rng.integers(0, 16, size=(rounds + 1, 16), dtype=np.uint8)
+
+    def encrypt(self, states, round_keys, rounds):
+        for r in range(rounds):
+            words = np.bitwise_xor.reduce(self.sp_table[self.columns, states ^ round_keys[r]], axis=1)
+            states = ((words[:, None] >> self.shifts) & np.uint64(0xf)).astype(np.uint8)
+        return states ^ round_keys[rounds]
+
+
+class SKINNY64(BlockCipher):
+    """
+    See skinny/verifications/verification.c (64-bit block); the cells are
+    stored row by row, and the round tweakeys (first two rows) are independent
+    """
+
+    name = "skinny"
+    sbox = np.array([12, 6, 9, 0, 1, 10, 2, 11, 3, 8, 5, 13, 4, 14, 7, 15], dtype=np.uint8)
+    # state_tmp[i] = state[P[i]]
+    shift_rows = [0, 1, 2, 3, 7, 4, 5, 6, 10, 11, 8, 9, 13, 14, 15, 12]
+    rc = [0x01, 0x03, 0x07, 0x0F, 0x1F, 0x3E, 0x3D, 0x3B, 0x37, 0x2F, 0x1E, 0x3C, 0x39, 0x33, 0x27, 0x0E,
+          0x1D, 0x3A, 0x35, 0x2B, 0x16, 0x2C, 0x18, 0x30, 0x21, 0x02, 0x05, 0x0B, 0x17, 0x2E, 0x1C, 0x38,
+          0x31, 0x23, 0x06, 0x0D, 0x1B, 0x36, 0x2D, 0x1A, 0x34, 0x29, 0x12, 0x24, 0x08, 0x11, 0x22, 0x04,
+          0x09, 0x13, 0x26, 0x0c, 0x19, 0x32, 0x25, 0x0a, 0x15, 0x2a, 0x14, 0x28, 0x10, 0x20]
+
+    def round_keys(self, rng, rounds):
+        return rng.integers(0, 16, size=(rounds, 8), dtype=np.uint8)
+
+    def encrypt(self, states, round_keys, rounds):
+        for r in range(rounds):
+            states = self.sbox[states]
+            states[:, 0] ^= self.rc[r] & 0xf
+            states[:, 4] ^= (self.rc[r] >> 4) & 0x3
+            states[:, 8] ^= 0x2
+            states[:, :8] ^= round_keys[r]
+            states = states[:, self.shift_rows]
+            row0, row1, row2, row3 = states[:, 0:4], states[:, 4:8], states[:, 8:12], states[:, 12:16]
+            row1 = row1 ^ row2
+            row2 = row2 ^ row0
+            row3 = row3 ^ row2
+            states = np.concatenate([row3, row0, row1, row2], axis=1)
+        return states
+
+
+CIPHERS = {cipher.name: cipher for cipher in [TWINE(), WARP(), LBlock(), PRESENT(), SKINNY64()]}
+
+
+def get_cipher(name):
+    try:
+        return CIPHERS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown cipher {name!r}, choose one of {', '.join(CIPHERS)}") from None
+
+
+def instantiate(pattern, golden_value):
+    """
+    Instantiate a truncated (nibble-wise) pattern such as '0010000000000100',
+    i.e., every active nibble takes the given golden value (list of 4 bits, msb first)
+    """
+
+    nibble = "%x" % int("".join(map(str, golden_value)), 2)
+    return "".join(nibble if c != "0" else "0" for c in pattern)
+
+
+class Estimate(namedtuple("Estimate", ["correlation", "lower", "upper", "pairs", "batches", "confidence", "time"])):
+    """
+    Empirical (average absolute) correlation together with its confidence interval [lower, upper]
+    """
+
+    @staticmethod
+    def log2(value):
+        return math.log2(abs(value)) if value != 0 else -math.inf
+
+    @property
+    def noise(self):
+        """
+        Expected average absolute correlation of a distinguisher with correlation 0,
+        i.e., sqrt(2/(pi*N)) for N pairs per key
+        """
+
+        return math.sqrt(2/(math.pi*self.pairs/self.batches))
+
+    @property
+    def is_significant(self):
+        """
+        True if the confidence interval lies above the noise level
+        """
+
+        return self.lower > self.noise
+
+    def __str__(self):
+        interval = "[{:.3e}, {:.3e}]".format(self.lower, self.upper)
+        result = "Experimental correlation: {:.3e} = 2^({:.2f}) using 2^({:.2f}) pairs and {} keys".format(
+                 self.correlation, self.log2(self.correlation), math.log2(self.pairs), self.batches)
+        result += "\n{:.0f}% confidence interval: {}".format(100*self.confidence, interval)
+        if not self.is_significant:
+            result += " (not above the noise level 2^({:.2f}), use more pairs)".format(self.log2(self.noise))
+        return result
+
+
+def run_batch(cipher_name, input_difference, output_mask, rounds, batch_size, seed):
+    """
+    Encrypt batch_size random pairs under one random key and return |sum((-1)^(lc.(c + c')))|
+    """
+
+    cipher = get_cipher(cipher_name)
+    rng = np.random.default_rng(seed)
+    round_keys = cipher.round_keys(rng, rounds)
+    plaintexts = cipher.random_states(rng, batch_size)
+    ciphertexts1 = cipher.encrypt(plaintexts ^ input_difference, round_keys, rounds)
+    ciphertexts0 = cipher.encrypt(plaintexts, round_keys, rounds)
+    parity = POPCOUNT[(ciphertexts0 ^ ciphertexts1) & output_mask].sum(axis=1) & 1
+    odd = int(np.count_nonzero(parity))
+    return abs(batch_size - 2*odd)
+
+
+def estimate_correlation(cipher, input_difference, output_mask, rounds, degree=20,
+                         batch_degree=DEFAULT_BATCH_DEGREE, processes=None, confidence=0.95, seed=None):
+    """
+    Estimate the correlation of a differential-linear distinguisher experimentally
+
+    :param str cipher: twine, warp, lblock, present or skinny (SKINNY-64)
+    :param input_difference: input difference (hex string or list of bits, see BlockCipher.parse)
+    :param output_mask: output mask (hex string or list of bits)
+    :param int rounds: number of rounds of the distinguisher
+    :param int degree: log2 of the number of pairs
+    :param int batch_degree: log2 of the number of pairs encrypted under the same key
+    :param int processes: number of worker processes (default: all cores)
+    :param float confidence: confidence level of the interval
+    :param int seed: seed of the random generator (default: fresh entropy)
+    :rtype: Estimate
+    """
+
+    start_time = time.time()
+    cipher_name = get_cipher(cipher).name
+    input_difference = get_cipher(cipher).parse(input_difference)
+    output_mask = get_cipher(cipher).parse(output_mask)
+    batch_degree = min(batch_degree, degree)
+    batch_size = 2**batch_degree
+    number_of_batches = 2**(degree - batch_degree)
+    seeds = np.random.SeedSequence(seed).spawn(number_of_batches)
+    if processes is None:
+        processes = os.cpu_count()
+    processes = max(1, min(processes, number_of_batches))
+    arguments = (cipher_name, input_difference, output_mask, rounds, batch_size)
+    if processes == 1:
+        sums = [run_batch(*arguments, s) for s in seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=processes,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            sums = list(executor.map(run_batch, *zip(*[arguments + (s,) for s in seeds])))
+    pairs = batch_size*number_of_batches
+    correlations = np.array(sums, dtype=np.float64)/batch_size
+    correlation = sum(sums)/pairs
+    if number_of_batches > 1:
+        standard_error = float(np.std(correlations, ddof=1))/math.sqrt(number_of_batches)
+    else:
+        standard_error = math.sqrt(max(1 - correlation**2, 0)/pairs)
+    z = NormalDist().inv_cdf((1 + confidence)/2)
+    return Estimate(correlation=correlation,
+                    lower=correlation - z*standard_error,
+                    upper=correlation + z*standard_error,
+                    pairs=pairs,
+                    batches=number_of_batches,
+                    confidence=confidence,
+                    time=time.time() - start_time)
+
+
+def main():
+    parser = ArgumentParser(description="Estimate the correlation of a differential-linear distinguisher experimentally\n"
+                                        "Example:\n"
+                                        "python3 dlcore/estimator.py twine -r 9 -dp 0000000000a00000 -lc 000000000000a000 -d 24",
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument("cipher", choices=list(CIPHERS), help="cipher")
+    parser.add_argument("-r", "--rounds", type=int, required=True, help="number of rounds")
+    parser.add_argument("-dp", "--difference", type=str, required=True, help="input difference (hex)")
+    parser.add_argument("-lc", "--mask", type=str, required=True, help="output mask (hex)")
+    parser.add_argument("-d", "--degree", type=int, default=20, help="log2 of the number of pairs")
+    parser.add_argument("-b", "--batch", type=int, default=DEFAULT_BATCH_DEGREE, help="log2 of the number of pairs per key")
+    parser.add_argument("-np", "--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("-cl", "--confidence", type=float, default=0.95, help="confidence level")
+    parser.add_argument("-s", "--seed", type=int, default=None, help="random seed")
+    args = parser.parse_args()
+    estimate = estimate_correlation(args.cipher, args.difference, args.mask, args.rounds, degree=args.degree,
+                                    batch_degree=args.batch, processes=args.processes,
+                                    confidence=args.confidence, seed=args.seed)
+    print(estimate)
+    print("Elapsed time: %0.02f seconds" % estimate.time)
+
+
+if __name__ == "__main__":
+    main()
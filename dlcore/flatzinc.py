@@ -0,0 +1,282 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Cached FlatZinc compilation of the CP models of attack.py.
+
+Every search used to flatten attack.mzn (and the files it includes, e.g.,
+the S-box predicates of serpent/sboxes.mzn) again, although the flattened
+model only depends on the model files (and the code added with add_string),
+the data (RU, RM, RL, ...), the solver (whose library redefines the global
+constraints), and the compiler optimisation level. CompiledInstance is a
+minizinc.Instance which
+
+  - compiles the instance once with `minizinc --compile` to a FlatZinc
+    model and an output model (.ozn), stored in .dlcache/flatzinc in the root
+    of the repository (or in the directory given by the environment
+    variable DL_FLATZINC_CACHE), under the SHA-256 digest of all of the above,
+  - solves the stored FlatZinc model directly on the next runs with the same
+    key, i.e., the solver starts immediately,
+  - reports the compile time as the statistic flatTime (0 on a cache hit,
+    plus flatCached = True), so that the run reports can split the time into
+    compiling and solving,
+  - compiles in a worker thread, so that the event loop keeps running, e.g.,
+    the backends of a portfolio (dlcore/portfolio.py) compile at once.
+
+The model interface (solve method and output variables) is still analysed
+from the original files, which only type-checks the model. Setting
+DL_FLATZINC_CACHE to 0 disables the cache.
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import datetime
+import threading
+import contextlib
+from pathlib import Path
+from argparse import ArgumentParser, RawTextHelpFormatter
+import minizinc
+from minizinc.json import MZNJSONEncoder
+
+ROOT_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+INCLUDE_PATTERN = re.compile(r'^\s*include\s+"([^"]+)"\s*;', re.MULTILINE)
+
+
+def cache_directory():
+    """
+    Return the directory of the cached FlatZinc models (None: caching is disabled)
+    """
+
+    value = os.environ.get("DL_FLATZINC_CACHE", "").strip()
+    if value == "0":
+        return None
+    return value or os.path.join(ROOT_DIRECTORY, ".dlcache", "flatzinc")
+
+
+def model_files(files):
+    """
+    Return the given model files and the local files they include (recursively)
+
+    Included files which are not found next to the including file (e.g.,
+    globals.mzn) belong to the MiniZinc library, which is identified by the
+    versions of MiniZinc and of the solver instead.
+    """
+
+    result = []
+    pending = [Path(file).resolve() for file in files]
+    while pending:
+        file = pending.pop(0)
+        if file in result:
+            continue
+        result.append(file)
+        if file.suffix != ".mzn":
+            continue
+        for name in INCLUDE_PATTERN.findall(file.read_text()):
+            included = (file.parent/name).resolve()
+            if included.exists():
+                pending.append(included)
+    return result
+
+
+def compile_key(files, data, solver, driver_version, optimisation_level, flags, fragments=()):
+    """
+    SHA-256 digest identifying a flattened instance
+
+    :param list files: model files (with the included local files)
+    :param dict data: values of the parameters
+    :param list fragments: model code added with add_string (contents of the generated fragment files)
+    :param minizinc.Solver solver: solver configuration
+    :param tuple driver_version: version of MiniZinc
+    :param int optimisation_level: compiler optimisation level
+    :param list flags: output flags of the compilation
+    """
+
+    digest = hashlib.sha256()
+    for file in files:
+        digest.update(file.name.encode())
+        digest.update(file.read_bytes())
+    digest.update(json.dumps(data, cls=MZNJSONEncoder, sort_keys=True).encode())
+    for fragment in fragments:
+        digest.update(fragment)
+    digest.update(json.dumps([solver.id, solver.version, list(driver_version), optimisation_level, flags]).encode())
+    return digest.hexdigest()
+
+
+class CompiledInstance(minizinc.Instance):
+    """
+    minizinc.Instance whose FlatZinc compilation is cached between the runs
+    """
+
+    def __init__(self, solver, model=None, driver=None):
+        # the original files are used until the instance is solved
+        self.flat_files = None
+        super().__init__(solver, model, driver)
+
+    @contextlib.contextmanager
+    def files(self):
+        if self.flat_files is None:
+            with super().files() as files:
+                yield files
+        else:
+            yield [self.flat_files[0]]
+
+    def output_flags(self):
+        """
+        Flags of the output model, which are those used by Instance.solutions()
+        """
+
+        flags = ["output-mode", "output-objective"]
+        if self.has_output_item:
+            flags.append("output-output-item")
+        return flags
+
+    def compile(self, optimisation_level=None):
+        """
+        Return the FlatZinc and output models of the instance, the compile time, and whether they were cached
+
+        :param int optimisation_level: compiler optimisation level
+        :rtype tuple: (Path of the .fzn file, Path of the .ozn file, seconds, cached)
+        """
+
+        directory = cache_directory()
+        flags = self.output_flags()
+        options = {"output-mode": "json"}
+        options.update({flag: True for flag in flags[1:]})
+        with super().files() as files:
+            local_files = [file for file in files if not os.path.basename(file).startswith(("mzn_data", "mzn_fragment"))]
+            # the generated fragment files have random names, only their contents identify the model
+            fragments = [Path(file).read_bytes() for file in files if os.path.basename(file).startswith("mzn_fragment")]
+            data = {key: value for key, value in self._data.items()}
+            key = compile_key(model_files(local_files), data, self._solver, self._driver.parsed_version,
+                              optimisation_level, flags, fragments)
+        if directory is not None:
+            fzn = Path(directory)/f"{key}.fzn"
+            ozn = Path(directory)/f"{key}.ozn"
+            if fzn.exists() and ozn.exists():
+                return fzn, ozn, 0.0, True
+        start_time = time.time()
+        with self.flat(optimisation_level=optimisation_level, **options) as (flat_fzn, flat_ozn, _):
+            elapsed = time.time() - start_time
+            if directory is None:
+                directory = os.path.join(ROOT_DIRECTORY, ".dlcache", "flatzinc-tmp")
+                # one file per thread: the backends of a portfolio may share the key
+                key = f"{key}-{os.getpid()}-{threading.get_ident()}"
+            os.makedirs(directory, exist_ok=True)
+            fzn = Path(directory)/f"{key}.fzn"
+            ozn = Path(directory)/f"{key}.ozn"
+            for source, target in [(flat_fzn.name, fzn), (flat_ozn.name, ozn)]:
+                temporary = f"{target}.{os.getpid()}-{threading.get_ident()}"
+                shutil.copyfile(source, temporary)
+                os.replace(temporary, target)
+        with open(Path(directory)/f"{key}.json", "w") as fileobj:
+            json.dump({"files": [str(file) for file in local_files], "data": data, "solver": self._solver.id,
+                       "optimisation_level": optimisation_level, "compile_time": elapsed},
+                      fileobj, cls=MZNJSONEncoder, indent=2)
+        return fzn, ozn, elapsed, False
+
+    async def solutions(self, *args, optimisation_level=None, **kwargs):
+        """
+        Instance.solutions() on the (cached) FlatZinc model of the instance
+
+        The model is analysed and compiled in a worker thread, since both run minizinc
+        synchronously and would block the other coroutines of the event loop.
+        """
+
+        def compile_model():
+            # analyse the model interface with the original files
+            _ = self.method
+            return self.compile(optimisation_level)
+
+        fzn, ozn, elapsed, cached = await asyncio.to_thread(compile_model)
+        if "time_limit" in kwargs and kwargs["time_limit"] is not None and not cached:
+            # the time limit covers the compilation as well
+            remaining = max(1, kwargs["time_limit"].total_seconds() - elapsed)
+            kwargs["time_limit"] = datetime.timedelta(seconds=remaining)
+        kwargs["ozn-file"] = str(ozn)
+        self.flat_files = (fzn, ozn)
+        try:
+            async for result in super().solutions(*args, **kwargs):
+                result.statistics["flatTime"] = datetime.timedelta(seconds=elapsed)
+                result.statistics["flatCached"] = cached
+                yield result
+        finally:
+            self.flat_files = None
+            if cache_directory() is None:
+                for file in [fzn, ozn, fzn.with_suffix(".json")]:
+                    if file.exists():
+                        os.remove(file)
+
+
+def time_split(statistics, elapsed):
+    """
+    Split the time of a search into compiling and solving
+
+    :param dict statistics: statistics of the result (flatTime, flatCached)
+    :param float elapsed: seconds used by the whole search
+    :return: dictionary with the compile time, the solve time, and whether the compiled model was cached
+    """
+
+    flat_time = statistics.get("flatTime", datetime.timedelta(0))
+    if isinstance(flat_time, datetime.timedelta):
+        flat_time = flat_time.total_seconds()
+    return {"compile_time": flat_time, "solve_time": max(0.0, elapsed - flat_time),
+            "compile_cached": bool(statistics.get("flatCached", False))}
+
+
+def main():
+    """
+    Inspect or clear the cache of FlatZinc models, e.g., python3 dlcore/flatzinc.py --clear
+    """
+
+    parser = ArgumentParser(description="Inspect or clear the cache of compiled (FlatZinc) CP models",
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument("-c", "--clear", action="store_true", help="remove all compiled models")
+    args = parser.parse_args()
+    directory = cache_directory()
+    if directory is None or not os.path.isdir(directory):
+        print("The cache of FlatZinc models is empty")
+        return
+    entries = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    if args.clear:
+        shutil.rmtree(directory)
+        print(f"Removed {len(entries)} compiled models from {directory}")
+        return
+    print(f"FlatZinc models: {directory}")
+    for name in entries:
+        with open(os.path.join(directory, name), "r") as fileobj:
+            entry = json.load(fileobj)
+        size = os.path.getsize(os.path.join(directory, name[:-len(".json")] + ".fzn")) if \
+            os.path.exists(os.path.join(directory, name[:-len(".json")] + ".fzn")) else 0
+        model = ", ".join(os.path.basename(file) for file in entry["files"])
+        data = " ".join(f"{key}={value}" for key, value in entry["data"].items())
+        print(f"{name[:12]}  {model:16s} {entry['solver']:28s} -O{entry['optimisation_level']}  "
+              f"{entry['compile_time']:8.02f} s  {size/2**20:8.02f} MB  {data}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+In-memory construction of the MILP models.
+
+A linear constraint is represented by a plain tuple
+
+    (coefficients, variables, sense, rhs)
+
+where coefficients and variables are tuples of the same length, variables
+are the names used in the former .lp files (e.g., x_0_1_3), and sense is
+one of '>=', '<=' and '='. The cipher classes produce lists of such tuples,
+and ModelBuilder turns them into a gurobipy model without writing or parsing
+any .lp file. Writing the .lp file is only kept as a debugging facility.
+
+The S-box and MDS encodings are compiled once into an InequalityTemplate,
+i.e., a sparse coefficient matrix over placeholder positions. The cipher
+classes pass them to ModelBuilder as blocks (InequalityTemplate.block), so
+that their rows are never expanded into tuples: ModelBuilder only maps the
+placeholders to column indices, and creates all variables and constraints
+at once with addMVar and addMConstr on a scipy.sparse matrix.
+"""
+
+import os
+import re
+import sys
+import time
+import json
+import resource
+import tempfile
+import importlib
+from argparse import ArgumentParser, RawTextHelpFormatter
+from array import array
+from collections import namedtuple
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import output_path
+
+GREATER_EQUAL = ">="
+LESS_EQUAL = "<="
+EQUAL = "="
+
+_sense_pattern = re.compile(r"(>=|=>|<=|=<|=)")
+_number_pattern = re.compile(r"^[+-]?(\d+(\.\d*)?|\.\d+)$")
+_normalized_sense = {">=": GREATER_EQUAL, "=>": GREATER_EQUAL,
+                     "<=": LESS_EQUAL, "=<": LESS_EQUAL,
+                     "=": EQUAL}
+# the sense characters of gurobipy (GRB.GREATER_EQUAL, GRB.LESS_EQUAL, GRB.EQUAL)
+_gurobi_sense = {GREATER_EQUAL: ">", LESS_EQUAL: "<", EQUAL: "="}
+
+
+def to_number(token):
+    """
+    Convert a numeric token to int if it is integral, and to float otherwise
+    """
+
+    value = float(token)
+    if value == int(value):
+        return int(value)
+    return value
+
+
+def parse_linear(text):
+    """
+    Parse a linear constraint written in the .lp syntax, e.g.,
+    '- a0 + 2 b1 - 2.4150 p0 >= -1', and return it as
+    (coefficients, variables, sense, rhs).
+    Variable names are matched as whole tokens, so that a1 is never
+    confused with the prefix of a10.
+    """
+
+    parts = _sense_pattern.split(text.strip())
+    if len(parts) != 3:
+        raise ValueError(f"Not a linear constraint: {text!r}")
+    lhs, sense, rhs = parts
+    coefficients = []
+    variables = []
+    sign = 1
+    coefficient = None
+    for token in lhs.replace("+", " + ").replace("*", " ").split():
+        if token == "+":
+            continue
+        elif token == "-":
+            sign = -sign
+        elif _number_pattern.match(token):
+            coefficient = to_number(token)
+        else:
+            if token.startswith("-"):
+                sign = -sign
+                token = token[1:]
+            coefficients.append(sign*(1 if coefficient is None else coefficient))
+            variables.append(token)
+            sign = 1
+            coefficient = None
+    return tuple(coefficients), tuple(variables), _normalized_sense[sense], to_number(rhs)
+
+
+def constraint(coefficients, variables, sense, rhs):
+    """
+    Create a linear constraint sum(coefficients[i]*variables[i]) sense rhs
+    """
+
+    return (tuple(coefficients), tuple(variables), sense, rhs)
+
+
+def equality(a, b):
+    """
+    a - b = 0
+    """
+
+    return ((1, -1), (a, b), EQUAL, 0)
+
+
+def fix(a, value):
+    """
+    a = value
+    """
+
+    return ((1,), (a,), EQUAL, int(value))
+
+
+def sum_constraint(variables, sense, rhs):
+    """
+    sum(variables) sense rhs
+    """
+
+    variables = tuple(variables)
+    return ((1,)*len(variables), variables, sense, rhs)
+
+
+def linear_terms(text):
+    """
+    Parse a linear expression such as '4 p0 + 2 p1' into (coefficients, variables)
+    """
+
+    coefficients, variables, _, _ = parse_linear(text + " >= 0")
+    return coefficients, variables
+
+
+class InequalityTemplate:
+    """
+    A system of linear constraints over a fixed list of placeholder
+    variables, compiled once into integer coefficient rows.
+    Instantiating the template only maps the placeholder indices to the
+    given variables, i.e., no string manipulation is involved.
+    """
+
+    def __init__(self, rows, placeholders):
+        """
+        :param list rows: list of (indices, coefficients, sense, rhs)
+        :param list placeholders: names of the placeholder variables
+        """
+
+        self.rows = rows
+        self.placeholders = tuple(placeholders)
+        self._compiled = None
+
+    @classmethod
+    def from_strings(cls, inequalities, placeholders):
+        """
+        Compile a list of constraints written in the .lp syntax over the given placeholders
+        """
+
+        position = {name: i for i, name in enumerate(placeholders)}
+        rows = []
+        for ineq in inequalities:
+            if ineq.strip() == "":
+                continue
+            coefficients, variables, sense, rhs = parse_linear(ineq)
+            try:
+                indices = tuple(position[v] for v in variables)
+            except KeyError as e:
+                raise ValueError(f"Unknown placeholder {e.args[0]} in {ineq!r}") from None
+            rows.append((indices, coefficients, sense, rhs))
+        return cls(rows, placeholders)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def with_indicator(self, big_m):
+        """
+        Return a new template with one extra placeholder q (appended to the end)
+        such that every inequality 'lhs >= rhs' is replaced by 'lhs - big_m q >= rhs - big_m',
+        i.e., the inequalities are only enforced when q = 1.
+        """
+
+        q = len(self.placeholders)
+        rows = []
+        for indices, coefficients, sense, rhs in self.rows:
+            assert(sense == GREATER_EQUAL)
+            rows.append((indices + (q,), coefficients + (-big_m,), sense, rhs - big_m))
+        return InequalityTemplate(rows, self.placeholders + ("q",))
+
+    def compiled(self):
+        """
+        Return the rows as arrays (row_lengths, indices, coefficients, senses, rhs, order),
+        where indices are placeholder positions and order lists the placeholders in order
+        of their first appearance in the rows (computed once)
+        """
+
+        if self._compiled is None:
+            order = tuple(dict.fromkeys(i for indices, _, _, _ in self.rows for i in indices))
+            self._compiled = (np.array([len(indices) for indices, _, _, _ in self.rows], dtype=np.int64),
+                              np.array([i for indices, _, _, _ in self.rows for i in indices], dtype=np.int32),
+                              np.array([c for _, coefficients, _, _ in self.rows for c in coefficients], dtype=np.float64),
+                              np.array([_gurobi_sense[sense] for _, _, sense, _ in self.rows], dtype="U1"),
+                              np.array([rhs for _, _, _, rhs in self.rows], dtype=np.float64),
+                              order)
+        return self._compiled
+
+    def block(self, variables):
+        """
+        Substitute the placeholders by the given variables without expanding the rows,
+        i.e., the result is only understood by ModelBuilder.add_constraints
+
+        :param list variables: variable names in the same order as the placeholders
+        :return: list containing one TemplateBlock
+        """
+
+        if len(variables) != len(self.placeholders):
+            raise ValueError(f"The template expects {len(self.placeholders)} variables, got {len(variables)}")
+        return [TemplateBlock(self, tuple(variables))]
+
+    def instantiate(self, variables):
+        """
+        Substitute the placeholders by the given variables
+
+        :param list variables: variable names in the same order as the placeholders
+        :return: list of linear constraints
+        """
+
+        return [(coefficients, tuple([variables[i] for i in indices]), sense, rhs)
+                for indices, coefficients, sense, rhs in self.rows]
+
+
+# a template applied to a tuple of variables (see InequalityTemplate.block)
+TemplateBlock = namedtuple("TemplateBlock", ["template", "variables"])
+
+
+# a xor b = c
+XOR_TEMPLATE = InequalityTemplate.from_strings(["- a - b - c >= -2",
+                                                "a + b - c >= 0",
+                                                "a - b + c >= 0",
+                                                "- a + b + c >= 0"], ["a", "b", "c"])
+
+
+def xor(a, b, c):
+    """
+    a + b = c
+    model:
+    - a - b - c >= -2
+      a + b - c >= 0
+      a - b + c >= 0
+    - a + b + c >= 0
+    """
+
+    return XOR_TEMPLATE.instantiate((a, b, c))
+
+
+def parity(variables):
+    """
+    Exclude the assignments of odd Hamming weight, i.e., the XOR
+    of all given variables is zero. For every subset S of odd size:
+    sum(x not in S) - sum(x in S) >= 1 - |S|
+    """
+
+    constraints = []
+    n = len(variables)
+    for mask in range(2**n):
+        signs = [-1 if (mask >> (n - 1 - i)) & 1 else 1 for i in range(n)]
+        negatives = signs.count(-1)
+        if negatives % 2 == 1:
+            constraints.append((tuple(signs), tuple(variables), GREATER_EQUAL, 1 - negatives))
+    return constraints
+
+
+class ModelBuilder:
+    """
+    Collect the objective function, constraints, and variable types of
+    an MILP model and create the corresponding gurobipy model directly.
+    The constraints are stored as sparse rows over column indices, which are
+    assigned to the variables when they first appear. As in the former .lp
+    files, the variables of the objective come first, followed by the other
+    variables in order of their first appearance in the constraints.
+    """
+
+    # number of coefficients passed to addMConstr at once
+    CHUNK_NONZEROS = 2**18
+
+    def __init__(self, name="model"):
+        self.name = name
+        self.objective = ((), ())
+        self.binary_variables = []
+        self.integer_variables = []
+        self._reset()
+
+    def _reset(self):
+        self._columns = dict()
+        # sparse rows, in the order they are added, as chunks of
+        # (row_lengths, columns, coefficients, senses, rhs)
+        self._chunks = []
+        self._pending = (array("q"), array("i"), array("d"), [], array("d"))
+        # set when a row may contain the same variable twice (its terms are then summed)
+        self._duplicates = False
+
+    def _column(self, name):
+        column = self._columns.get(name)
+        if column is None:
+            column = self._columns[name] = len(self._columns)
+        return column
+
+    def _flush(self):
+        lengths, columns, coefficients, senses, rhs = self._pending
+        if len(lengths) != 0:
+            self._chunks.append((np.frombuffer(lengths, dtype=np.int64), np.frombuffer(columns, dtype=np.int32),
+                                 np.frombuffer(coefficients, dtype=np.float64), np.array(senses, dtype="U1"),
+                                 np.frombuffer(rhs, dtype=np.float64)))
+            self._pending = (array("q"), array("i"), array("d"), [], array("d"))
+
+    def set_objective(self, coefficients, variables):
+        """
+        Set the (minimization) objective sum(coefficients[i]*variables[i])
+        """
+
+        self.objective = (tuple(coefficients), tuple(variables))
+
+    def add_constraints(self, constraints):
+        """
+        Add a list of constraints, i.e., (coefficients, variables, sense, rhs) tuples and TemplateBlocks
+        """
+
+        lengths, columns, coefficients, senses, rhs = self._pending
+        column = self._column
+        for c in constraints:
+            if type(c) is TemplateBlock:
+                self._flush()
+                lengths, columns, coefficients, senses, rhs = self._pending
+                row_lengths, indices, values, row_senses, row_rhs, order = c.template.compiled()
+                # register the columns in the order in which the variables appear in the rows
+                mapping = [0]*len(c.variables)
+                for i in order:
+                    mapping[i] = column(c.variables[i])
+                mapping = np.array(mapping, dtype=np.int32)
+                if len(set(c.variables)) != len(c.variables):
+                    self._duplicates = True
+                self._chunks.append((row_lengths, mapping[indices], values, row_senses, row_rhs))
+            else:
+                if len(set(c[1])) != len(c[1]):
+                    self._duplicates = True
+                lengths.append(len(c[1]))
+                columns.extend([column(v) for v in c[1]])
+                coefficients.extend(c[0])
+                senses.append(_gurobi_sense[c[2]])
+                rhs.append(c[3])
+
+    def declare_binary(self, variables):
+        self.binary_variables.extend(variables)
+
+    def declare_integer(self, variables):
+        self.integer_variables.extend(variables)
+
+    def _permutation(self):
+        """
+        Return the names of the variables in model order and the model position of every column
+        """
+
+        names = list(dict.fromkeys(self.objective[1]))
+        first = set(names)
+        names += [v for v in self._columns if v not in first]
+        seen = first.union(self._columns)
+        for v in self.binary_variables + self.integer_variables:
+            if v not in seen:
+                seen.add(v)
+                names.append(v)
+        position = {v: i for i, v in enumerate(names)}
+        permutation = np.array([position[v] for v in self._columns], dtype=np.int32)
+        return names, position, permutation
+
+    def build(self, env=None):
+        """
+        Create the gurobipy model. The stored constraints are released afterwards.
+
+        :param env: optional Gurobi environment
+        :return: gurobipy.Model
+        """
+
+        from gurobipy import Model, GRB
+        from scipy.sparse import csr_matrix
+        self._flush()
+        if env is None:
+            model = Model(self.name)
+        else:
+            model = Model(self.name, env=env)
+        names, position, permutation = self._permutation()
+        vtypes = np.full(len(names), GRB.CONTINUOUS, dtype="U1")
+        vtypes[[position[v] for v in self.integer_variables]] = GRB.INTEGER
+        vtypes[[position[v] for v in self.binary_variables]] = GRB.BINARY
+        x = model.addMVar(len(names), vtype=vtypes, name=names)
+        objective = np.zeros(len(names))
+        coefficients, variables = self.objective
+        np.add.at(objective, [position[v] for v in variables], coefficients)
+        x.Obj = objective
+        model.ModelSense = GRB.MINIMIZE
+        # the rows are added in groups of about CHUNK_NONZEROS coefficients, and every group
+        # is released once gurobipy has copied it, i.e., the rows are never all concatenated
+        chunks, duplicates = self._chunks, self._duplicates
+        self._reset()
+        chunks.reverse()
+        while chunks:
+            group = [chunks.pop()]
+            nonzeros = len(group[0][1])
+            while chunks and nonzeros < self.CHUNK_NONZEROS:
+                group.append(chunks.pop())
+                nonzeros += len(group[-1][1])
+            lengths, columns, values, senses, rhs = (np.concatenate(parts) for parts in zip(*group))
+            del group
+            indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=indptr[1:])
+            matrix = csr_matrix((values, permutation[columns], indptr), shape=(len(lengths), len(names)))
+            if duplicates:
+                matrix.sum_duplicates()
+            model.addMConstr(matrix, x, senses, rhs)
+            model.update()
+            del lengths, columns, values, senses, rhs, matrix
+        model.update()
+        return model
+
+    @staticmethod
+    def write_lp(model, lp_file_name):
+        """
+        Dump the model into an .lp file of the current run (only used for debugging)
+
+        :return: path of the written file (see dlcore/runs.py)
+        """
+
+        lp_file_name = output_path(lp_file_name)
+        model.write(lp_file_name)
+        return lp_file_name
+
+
+def same_model(first, second):
+    """
+    Check that two gurobipy models have the same variables, objective, and constraints (up to the order of the terms)
+    """
+
+    first.update()
+    second.update()
+    if [v.VarName for v in first.getVars()] != [v.VarName for v in second.getVars()]:
+        return False
+    for attribute in ["VType", "LB", "UB", "Obj"]:
+        if first.getAttr(attribute, first.getVars()) != second.getAttr(attribute, second.getVars()):
+            return False
+    for attribute in ["Sense", "RHS"]:
+        if first.getAttr(attribute, first.getConstrs()) != second.getAttr(attribute, second.getConstrs()):
+            return False
+    a = first.getA().tocsr()
+    b = second.getA().tocsr()
+    return a.shape == b.shape and (a != b).nnz == 0
+
+
+def main():
+    """
+    Timing check of the in-memory construction against the .lp round trip it replaces, e.g.,
+    python3 dlcore/milp.py clefia diff Diff -p '{"nrounds": 10}'
+    """
+
+    parser = ArgumentParser(description="Build the MILP model of a cipher in memory and compare it with an .lp write/read round trip\n"
+                                        "Example:\n"
+                                        "python3 dlcore/milp.py aes lin Lin -p '{\"nrounds\": 3}'",
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument("cipher", type=str, help="directory of the cipher, e.g., clefia")
+    parser.add_argument("module", type=str, help="module of the model, e.g., diff")
+    parser.add_argument("cls", type=str, help="class of the model, e.g., Diff")
+    parser.add_argument("-p", "--params", type=str, default="{}", help="parameters of the class (JSON), merged into the defaults")
+    args = parser.parse_args()
+    params = {"nrounds": 1, "rounds": 1, "mode": 0, "startweight": 0, "sweight": 0, "endweight": 128,
+              "timelimit": -1, "numberoftrails": 1, "fixedVariables": {}}
+    params.update(json.loads(args.params))
+    os.chdir(args.cipher)
+    sys.path.insert(0, os.getcwd())
+    from gurobipy import read
+    instance = getattr(importlib.import_module(args.module), args.cls)(params)
+    start_time = time.time()
+    instance.make_model()
+    build_time = time.time() - start_time
+    model = getattr(instance, "milp_model", None) or instance.model
+    model.update()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    print(f"In-memory construction: {build_time:0.02f} seconds, {model.NumVars} variables, "
+          f"{model.NumConstrs} constraints, {model.NumNZs} nonzeros, peak RSS {peak} MB")
+    with tempfile.TemporaryDirectory() as directory:
+        lp_file_name = os.path.join(directory, "model.lp")
+        start_time = time.time()
+        model.write(lp_file_name)
+        lp_model = read(lp_file_name)
+        lp_time = time.time() - start_time
+    print(f".lp write and read of the same model: {lp_time:0.02f} seconds")
+    print("The models are identical" if same_model(model, lp_model) else "The models differ!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+MiniZinc table constraints of the S-box propagation rules.
+
+The propagation rules of the S-boxes in the CP models were written as long
+if-then-elseif chains (e.g., the deterministic propagation of truncated
+differences and masks written by SboxAnalyzer.generate_cp_constraints) or
+as sets of inequalities. They flatten into many reified constraints, while
+a table (extensional) constraint over the inputs and outputs of the S-box
+gives the same solutions with domain-consistent propagation, e.g., in
+CP-SAT and Chuffed.
+
+Here:
+
+  - table_predicate() writes a MiniZinc predicate whose body is a single
+    table constraint over its parameters,
+  - deterministic_tuples() and star_tuples() turn the propagation
+    dictionaries and the *-DDT/*-LAT/*-DLCT of SboxAnalyzer into rows
+    (see SboxAnalyzer.generate_cp_table and generate_cp_star_table),
+  - main() tabulates the existing predicates of a model (with
+    dlcore/predicates.py) and writes <name>_table predicates with the same
+    parameters and solutions, e.g.,
+
+    python3 dlcore/mzntables.py serpent/attack.mzn -p "s[0-7]_(diff|lin)_(m|star)" -o serpent/sbox_tables.mzn
+
+The generated files start with include "table.mzn"; and are included by the
+attack models, which call the <name>_table predicates.
+"""
+
+import itertools
+import os
+import re
+import sys
+from argparse import ArgumentParser, RawTextHelpFormatter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.predicates import load_library
+
+
+def to_bits(value, size):
+    """
+    Return the bits of value, msb first
+    """
+
+    return [(value >> (size - 1 - i)) & 1 for i in range(size)]
+
+
+def deterministic_tuples(propagation_dictionary, input_size, output_size, unknown=-1):
+    """
+    Return the rows of the deterministic propagation of truncated patterns
+
+    :param dict propagation_dictionary: {truncated input: truncated output}, e.g., from SboxAnalyzer.encode_deterministic_differential_behavior()
+    :param int input_size: number of input bits
+    :param int output_size: number of output bits
+    :param int unknown: value of an unknown bit
+    :return: list of rows (input + output) covering every truncated input, the inputs which are not in the dictionary propagate to unknown outputs
+    """
+
+    rows = []
+    for truncated_input in itertools.product([unknown, 0, 1], repeat=input_size):
+        output = propagation_dictionary.get(truncated_input, [unknown]*output_size)
+        rows.append(tuple(truncated_input) + tuple(int(x) for x in output))
+    return rows
+
+
+def star_tuples(table, input_size, output_size):
+    """
+    Return the rows (input bits + output bits, msb first) of the possible transitions of a table, e.g., of the DDT, LAT or DLCT
+    """
+
+    return [tuple(to_bits(x, input_size) + to_bits(y, output_size))
+            for x in range(2**input_size) for y in range(2**output_size) if table[x][y] != 0]
+
+
+def table_predicate(name, parameters, rows, comment=None):
+    """
+    Return a MiniZinc predicate whose body is a table constraint
+
+    :param str name: name of the predicate
+    :param list parameters: list of (name, domain) where the domain is a range, e.g., ("x0", range(-1, 2))
+    :param list rows: allowed tuples of the parameters
+    :param str comment: comment written above the predicate
+    :rtype str:
+    """
+
+    declarations = ", ".join(f"var {domain.start}..{domain.stop - 1}: {parameter}" for parameter, domain in parameters)
+    variables = ", ".join(parameter for parameter, _ in parameters)
+    lines = [] if comment is None else [f"% {line}" for line in comment.splitlines()]
+    lines.append(f"predicate {name}({declarations}) =")
+    lines.append(f"    table([{variables}], array2d(1..{len(rows)}, 1..{len(parameters)}, [")
+    for i, row in enumerate(rows):
+        lines.append("        " + ", ".join(f"{value:2d}" for value in row) + ("," if i < len(rows) - 1 else ""))
+    lines.append("    ]));")
+    return "\n".join(lines) + "\n"
+
+
+def tabulate_model(file_name, patterns, suffix="_table"):
+    """
+    Return the table predicates of the predicates of a model matching one of the patterns
+
+    :param str file_name: MiniZinc model, e.g., serpent/attack.mzn
+    :param list patterns: regular expressions matched against the whole names of the predicates
+    :param str suffix: suffix of the names of the table predicates
+    :rtype str:
+    """
+
+    library = load_library(file_name)
+    names = [name for name in library.definitions
+             if not name.endswith(suffix) and any(re.fullmatch(pattern, name) for pattern in patterns)]
+    if not names:
+        raise ValueError(f"No predicate of {file_name} matches {patterns}")
+    predicates = []
+    for name in names:
+        parameters = library.parameter_domains(name)
+        if any(domain is None for _, domain in parameters):
+            raise ValueError(f"The predicate {name} has parameters without finite domain")
+        rows = library.table(name)
+        predicates.append(table_predicate(name + suffix, parameters, rows,
+                                          comment=f"{name} as a table ({len(rows)} rows)"))
+    return "\n".join(predicates)
+
+
+def main():
+    """
+    Write the table predicates of a model, e.g., python3 dlcore/mzntables.py knot/attack.mzn -p "sbox_.*_(m|star)" -o knot/sbox_tables.mzn
+    """
+
+    parser = ArgumentParser(description="Tabulate the S-box predicates of a MiniZinc model into table constraints",
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument("model", type=str, help="MiniZinc model, e.g., serpent/attack.mzn")
+    parser.add_argument("-p", "--predicates", nargs="+", required=True, type=str,
+                        help="names (regular expressions) of the predicates to tabulate")
+    parser.add_argument("-o", "--output", default=None, type=str, help="output file (default: standard output)")
+    args = parser.parse_args()
+    command = " ".join(["python3 dlcore/mzntables.py", args.model, "-p"] + [f'"{pattern}"' for pattern in args.predicates] +
+                       ([] if args.output is None else ["-o", args.output]))
+    content = f"% Generated by: {command}\n" \
+              f"% Every <name>_table predicate has the same parameters and solutions as <name>.\n\n" \
+              f'include "table.mzn";\n\n' + tabulate_model(args.model, args.predicates)
+    if args.output is None:
+        print(content, end="")
+    else:
+        with open(args.output, "w") as fileobj:
+            fileobj.write(content)
+        print(f"Table predicates written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Concurrent execution of the independent stages of an attack.
+
+Once the truncated DL trail is fixed, the instantiation of its upper part
+(differential trail and differential effect) and of its lower part (linear
+trail and squared correlation) do not depend on each other. The attack
+drivers describe such stages as jobs, i.e., module-level functions with
+their arguments, and run_concurrently solves every job in its own worker
+process (spawned, so that every worker has its own Gurobi environment).
+The cores are shared between the jobs running at the same time: each
+worker sets the Threads parameter of its default Gurobi environment to its
+share of the thread budget. The workers run under the same run ID as the
+driver (see dlcore/runs.py), so all outputs land in the same run directory.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dlcore.runs import run_id
+
+
+def thread_budget(threads=None, jobs=1):
+    """
+    Number of Gurobi threads of each of the jobs sharing threads threads (default: all cores)
+    """
+
+    if threads is None:
+        threads = os.cpu_count() or 1
+    return max(1, threads//max(1, jobs))
+
+
+def _init_worker(parent_run_id, threads):
+    """
+    Set the run ID and the Gurobi thread budget of a worker process
+    """
+
+    os.environ["DL_RUN_ID"] = parent_run_id
+    if threads is not None:
+        try:
+            import gurobipy
+            gurobipy.setParam("Threads", threads)
+        except ImportError:
+            pass
+
+
+def run_concurrently(jobs, processes=None, threads=None, gurobi=True):
+    """
+    Run independent jobs in parallel worker processes
+
+    :param dict jobs: maps a name to (function, args), where function is defined at module level (picklable)
+    :param int processes: number of worker processes (default: one per job)
+    :param int threads: total number of Gurobi threads shared by the workers (default: number of cores)
+    :param bool gurobi: set the Gurobi thread budget of the workers (False for jobs which do not use Gurobi)
+    :return: dict mapping the names of the jobs to the results of the functions
+    """
+
+    if processes is None:
+        processes = len(jobs)
+    processes = min(processes, len(jobs))
+    if processes <= 1:
+        return {name: function(*args) for name, (function, args) in jobs.items()}
+    with ProcessPoolExecutor(max_workers=processes,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker,
+                             initargs=(run_id(), thread_budget(threads, processes) if gurobi else None)) as executor:
+        futures = {name: executor.submit(function, *args) for name, (function, args) in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
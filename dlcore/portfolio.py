@@ -0,0 +1,339 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Solver portfolios for the CP searches of attack.py.
+
+Which MiniZinc backend (CP-SAT, Gurobi, Chuffed, ...) finds the best
+distinguisher first varies a lot with the cipher and the number of rounds.
+Here the same instance is raced on several backends (and random seeds) at
+once, in one event loop, and with the thread budget split between them:
+
+  - every solution that improves on the best one of the whole portfolio is
+    passed to the handler (see dlcore/anytime.py),
+  - as soon as one backend proves optimality (or infeasibility), or reaches
+    the objective target, the other ones are cancelled (MiniZinc is killed),
+  - otherwise the best incumbent at the time limit is returned.
+
+The backend that won (the one that proved optimality, or else the one that
+found the best objective first) is recorded, per configuration, in the JSON
+file .dlcache/portfolio.json in the root of the repository, or in the file
+given by the environment variable DL_PORTFOLIO_DB. Later runs try the
+backends in the order of their wins, and --prune n keeps only the n best of
+them once the configuration (or, failing that, the cipher) has a history.
+
+A portfolio is written as a comma-separated list of solver tags, optionally
+with a random seed, e.g., 'cp-sat,cp-sat:7,chuffed,gurobi'.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+from pathlib import Path
+from collections import namedtuple
+from argparse import ArgumentParser, RawTextHelpFormatter
+import minizinc
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.anytime import stream_async
+from dlcore.runs import locked
+
+ROOT_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+DEFAULT_STATISTICS_FILE = os.path.join(ROOT_DIRECTORY, ".dlcache", "portfolio.json")
+# statuses which end the race: nothing can be improved any more
+FINAL_STATUSES = (minizinc.Status.OPTIMAL_SOLUTION, minizinc.Status.UNSATISFIABLE, minizinc.Status.ALL_SOLUTIONS)
+
+Entry = namedtuple("Entry", ["solver", "seed"])
+
+
+def parse_portfolio(text):
+    """
+    Parse a portfolio, e.g., 'cp-sat,cp-sat:7,chuffed' -> [Entry('cp-sat', None), Entry('cp-sat', 7), ...]
+    """
+
+    entries = []
+    for item in text.split(","):
+        item = item.strip()
+        if item == "":
+            continue
+        solver, _, seed = item.partition(":")
+        entries.append(Entry(solver, int(seed) if seed != "" else None))
+    if len(entries) == 0:
+        raise ValueError(f"Empty portfolio: '{text}'")
+    return entries
+
+
+def label(entry):
+    """
+    Name of a portfolio entry in the statistics, e.g., 'cp-sat' or 'cp-sat:7'
+    """
+
+    return entry.solver if entry.seed is None else f"{entry.solver}:{entry.seed}"
+
+
+def statistics_file():
+    """
+    Return the path of the database of winner statistics
+    """
+
+    return os.environ.get("DL_PORTFOLIO_DB", DEFAULT_STATISTICS_FILE)
+
+
+def load_statistics(file_name=None):
+    """
+    Return the content of the statistics database, i.e., a dictionary
+    {configuration: {entry: {"runs": ..., "wins": ..., "optimal": ..., "time": ...}}}
+    """
+
+    file_name = file_name or statistics_file()
+    if not os.path.exists(file_name):
+        return dict()
+    with open(file_name, "r") as fileobj:
+        return json.load(fileobj)
+
+
+def store_race(key, entries, winner, optimal, elapsed, file_name=None):
+    """
+    Record the outcome of a race
+
+    :param str key: configuration, e.g., 'present RU=1 RM=9 RL=1 ...'
+    :param list entries: entries which took part in the race
+    :param Entry winner: entry which won (None if no entry found a solution)
+    :param bool optimal: whether the winner proved optimality (or infeasibility)
+    :param float elapsed: seconds until the winner finished (or the deadline)
+    """
+
+    file_name = file_name or statistics_file()
+    with locked(file_name):
+        database = load_statistics(file_name)
+        records = database.setdefault(key, dict())
+        for entry in entries:
+            record = records.setdefault(label(entry), {"runs": 0, "wins": 0, "optimal": 0, "time": 0.0})
+            record["runs"] += 1
+            if entry == winner:
+                record["wins"] += 1
+                record["optimal"] += int(optimal)
+                record["time"] += elapsed
+        write_statistics(database, file_name)
+
+
+def write_statistics(database, file_name):
+    temporary_file_name = f"{file_name}.{os.getpid()}"
+    with open(temporary_file_name, "w") as fileobj:
+        json.dump(database, fileobj, indent=2, sort_keys=True)
+    os.replace(temporary_file_name, file_name)
+
+
+def order_portfolio(key, entries, prune=None):
+    """
+    Sort the entries by their wins for the configuration key, and keep the prune best of them
+
+    The records of key are used if there are any, else the records of all
+    configurations of the same cipher (the first word of key) are summed up.
+    Entries without records keep their relative order after the other ones,
+    and nothing is pruned as long as there is no history at all.
+    """
+
+    database = load_statistics()
+    records = database.get(key)
+    if not records:
+        records = dict()
+        cipher = key.split()[0]
+        for other, other_records in database.items():
+            if other.split()[0] != cipher:
+                continue
+            for name, record in other_records.items():
+                total = records.setdefault(name, {"runs": 0, "wins": 0, "optimal": 0, "time": 0.0})
+                for field in total:
+                    total[field] += record[field]
+    if not records:
+        return list(entries)
+
+    def score(item):
+        position, entry = item
+        record = records.get(label(entry))
+        if record is None:
+            return (1, 0, 0, position)
+        mean_time = record["time"]/record["wins"] if record["wins"] > 0 else float("inf")
+        return (0, -record["wins"]/record["runs"], mean_time, position)
+
+    ordered = [entry for _, entry in sorted(enumerate(entries), key=score)]
+    if prune is not None:
+        ordered = ordered[:max(1, prune)]
+    return ordered
+
+
+def improves(objective, best, minimize):
+    """
+    Whether objective is better than best (None: no solution yet)
+    """
+
+    if best is None:
+        return True
+    if objective is None:
+        return False
+    return objective < best if minimize else objective > best
+
+
+async def race_async(instance, handler=None, portfolio=(), key=None, timeout=None, target=None, stall=None,
+                     processes=None, prune=None, **kwargs):
+    """
+    Coroutine of race()
+    """
+
+    entries = parse_portfolio(portfolio) if isinstance(portfolio, str) else list(portfolio)
+    if key is not None:
+        entries = order_portfolio(key, entries, prune)
+    minimize = instance.method == minizinc.Method.MINIMIZE
+    print("Portfolio: " + ", ".join(map(label, entries)))
+    share = None if processes is None else max(1, processes//len(entries))
+    debug_output = kwargs.pop("debug_output", None)
+    default_seed = kwargs.pop("random_seed", None)
+    start_time = time.time()
+    best = {"result": None, "entry": None, "found": None, "count": 0}
+
+    def report(entry):
+        def report_solution(result, count, elapsed):
+            if not improves(result.objective, best["result"].objective if best["result"] is not None else None, minimize):
+                return
+            best.update(result=result, entry=entry, found=elapsed, count=best["count"] + 1)
+            print(f"[{label(entry)}] improving solution after {elapsed:0.02f} seconds")
+            if handler is not None:
+                handler(result, best["count"], elapsed)
+        return report_solution
+
+    tasks = dict()
+    for entry in entries:
+        solver = minizinc.Solver.lookup(entry.solver)
+        options = dict(kwargs)
+        if share is not None and "-p" in solver.stdFlags:
+            options["processes"] = share
+        seed = entry.seed if entry.seed is not None else default_seed
+        if seed is not None and "-r" in solver.stdFlags:
+            options["random_seed"] = seed
+        if debug_output is not None:
+            path = Path(debug_output)
+            options["debug_output"] = path.with_name(f"{path.stem}-{label(entry).replace(':', '-')}{path.suffix}")
+        # the class of instance is kept, e.g., to compile with dlcore/flatzinc.py
+        child = type(instance)(solver, instance)
+        task = asyncio.create_task(stream_async(child, report(entry), timeout, target, stall, **options))
+        tasks[task] = entry
+
+    winner, status, statistics = None, minizinc.Status.UNKNOWN, dict()
+    outcomes = dict()
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                entry = tasks[task]
+                try:
+                    result = task.result()
+                except (minizinc.MiniZincError, NotImplementedError) as error:
+                    print(f"[{label(entry)}] failed: {error}")
+                    continue
+                outcomes[entry] = result
+                reached = target is not None and result.objective is not None and \
+                          (result.objective <= target if minimize else result.objective >= target)
+                if result.status in FINAL_STATUSES or reached:
+                    winner, status, statistics = entry, result.status, result.statistics
+                    if result.solution is not None:
+                        best.update(result=result, entry=entry)
+                    break
+            if winner is not None:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    elapsed = time.time() - start_time
+    optimal = winner is not None and status in FINAL_STATUSES
+    if winner is None:
+        # deadline (or stall window) reached by all entries: the best incumbent wins
+        winner = best["entry"]
+        status = minizinc.Status.SATISFIED if winner is not None else minizinc.Status.UNKNOWN
+        elapsed = best["found"] if winner is not None else elapsed
+        if winner in outcomes:
+            statistics = outcomes[winner].statistics
+    if winner is not None:
+        print(f"Portfolio winner: {label(winner)} ({status}, {elapsed:0.02f} seconds)")
+        if key is not None:
+            store_race(key, entries, winner, optimal, elapsed)
+    solution = best["result"].solution if best["result"] is not None else None
+    return minizinc.Result(status, solution, statistics)
+
+
+def race(instance, handler=None, portfolio=(), key=None, timeout=None, target=None, stall=None,
+         processes=None, prune=None, **kwargs):
+    """
+    Solve instance with several backends at once, and return the result of the winner
+
+    :param minizinc.Instance instance: instance to solve (the solver of each entry replaces its solver)
+    :param handler: function called as handler(result, count, elapsed) on every improving solution
+    :param portfolio: list of Entry, or a string such as 'cp-sat,chuffed,gurobi:3'
+    :param str key: configuration for the winner statistics (None: neither reorder nor record)
+    :param datetime.timedelta timeout: time limit of every backend
+    :param target: stop as soon as the objective is at most (maximize: at least) target
+    :param float stall: stop a backend when it finds no improving solution within stall seconds
+    :param int processes: number of threads, split evenly between the backends
+    :param int prune: keep only the prune best entries according to the statistics
+    :param kwargs: further arguments of Instance.solutions(), e.g., optimisation_level
+    :return: minizinc.Result with the best solution of the portfolio
+    """
+
+    return asyncio.run(race_async(instance, handler, portfolio, key, timeout, target, stall, processes, prune, **kwargs))
+
+
+def main():
+    """
+    Inspect or clear the winner statistics, e.g., python3 dlcore/portfolio.py --clear present
+    """
+
+    parser = ArgumentParser(description="Inspect or clear the winner statistics of the solver portfolios",
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument("-f", "--file", default=None, type=str,
+                        help="path of the database (default: $DL_PORTFOLIO_DB or .dlcache/portfolio.json)")
+    parser.add_argument("-c", "--clear", nargs="*", default=None, type=str,
+                        help="remove the statistics of the given ciphers or configurations (everything if none is given)")
+    args = parser.parse_args()
+    file_name = args.file or statistics_file()
+    if args.clear is not None:
+        with locked(file_name):
+            database = load_statistics(file_name)
+            for key in list(database):
+                if not args.clear or key in args.clear or key.split()[0] in args.clear:
+                    database.pop(key)
+            write_statistics(database, file_name)
+    database = load_statistics(file_name)
+    print(f"Statistics: {file_name}")
+    for key in sorted(database):
+        print(key)
+        for name, record in sorted(database[key].items(), key=lambda item: -item[1]["wins"]):
+            mean_time = record["time"]/record["wins"] if record["wins"] > 0 else 0
+            print(f"    {name:24s} wins: {record['wins']}/{record['runs']}, optimal: {record['optimal']}, "
+                  f"mean time: {mean_time:0.02f} seconds")
+
+
+if __name__ == "__main__":
+    main()
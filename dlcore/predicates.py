@@ -0,0 +1,439 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Tabulation of the predicates of the MiniZinc models.
+
+The S-box and XOR predicates of the attack.mzn files (and of the files they
+include, e.g., serpent/sboxes.mzn) are read by a small parser that supports
+the subset of MiniZinc used in these predicates: linear (in)equalities,
+/\ and \/, if-then-elseif-else-endif, table constraints (as written by
+dlcore/mzntables.py), and calls of exists, forall, sum, bool2int and of the
+other predicates. Every predicate is compiled into a Python function, and
+enumerating its arguments over their domains gives the set of allowed
+tuples, i.e., the predicate as a table (extensional) constraint. Hence, the
+CP-SAT builders (dlcore/cpsat.py) share the S-box encodings with the
+MiniZinc models instead of duplicating them.
+
+Arguments declared as var int (e.g., the index of the S-box in serpent) have
+no finite domain and must be fixed when the predicate is tabulated:
+
+    library = PredicateLibrary("serpent/attack.mzn")
+    tuples = library.table("sbox_diff", which=3)
+"""
+
+import functools
+import itertools
+import os
+import re
+
+TOKEN = re.compile(r"\s*(?:(\d+)|([A-Za-z_]\w*)|(/\\|\\/|==|!=|>=|<=|\.\.|[-+*=<>()\[\],:]))")
+COMPARISONS = {"=": "==", "==": "==", "!=": "!=", ">=": ">=", "<=": "<=", ">": ">", "<": "<"}
+BUILTINS = {"exists": "any", "forall": "all", "sum": "sum", "bool2int": "int", "abs": "abs", "min": "min", "max": "max"}
+
+
+def strip_comments(text):
+    """
+    Remove the block (/* ... */) and line (% ...) comments of a MiniZinc file
+    """
+
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.DOTALL)
+    return re.sub(r"%[^\n]*", "", text)
+
+
+def tokenize(text):
+    """
+    Split a MiniZinc expression into tokens
+    """
+
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            raise SyntaxError(f"Unsupported MiniZinc syntax: {text[position:position + 40]!r}")
+        tokens.append(match.group(match.lastindex))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent parser translating a MiniZinc expression into a Python expression
+    """
+
+    def __init__(self, text, names, constants):
+        self.tokens = tokenize(text)
+        self.position = 0
+        self.names = names
+        # the rows of the table constraints are stored in constants (the namespace of the compiled predicates)
+        self.constants = constants
+        self.calls = set()
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            raise SyntaxError(f"Expected {expected!r} but found {token!r}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        expression = self.disjunction()
+        if self.peek() is not None:
+            raise SyntaxError(f"Unexpected token {self.peek()!r}")
+        return expression
+
+    def disjunction(self):
+        terms = [self.conjunction()]
+        while self.peek() == "\\/":
+            self.take()
+            terms.append(self.conjunction())
+        return terms[0] if len(terms) == 1 else "(" + " or ".join(terms) + ")"
+
+    def conjunction(self):
+        terms = [self.comparison()]
+        while self.peek() == "/\\":
+            self.take()
+            # tolerate empty conjuncts, e.g., '/\ /\' left by commented constraints
+            if self.peek() == "/\\":
+                continue
+            terms.append(self.comparison())
+        return terms[0] if len(terms) == 1 else "(" + " and ".join(terms) + ")"
+
+    def comparison(self):
+        left = self.additive()
+        if self.peek() in COMPARISONS:
+            operator = COMPARISONS[self.take()]
+            right = self.additive()
+            return f"({left} {operator} {right})"
+        return left
+
+    def additive(self):
+        expression = self.multiplicative()
+        while self.peek() in ("+", "-"):
+            operator = self.take()
+            expression = f"({expression} {operator} {self.multiplicative()})"
+        return expression
+
+    def multiplicative(self):
+        expression = self.unary()
+        while self.peek() in ("*", "mod", "div"):
+            operator = self.take()
+            right = self.unary()
+            if operator == "*":
+                expression = f"({expression} * {right})"
+            else:
+                expression = f"_{operator}({expression}, {right})"
+        return expression
+
+    def unary(self):
+        if self.peek() == "-":
+            self.take()
+            return f"(-{self.unary()})"
+        if self.peek() == "not":
+            self.take()
+            return f"(not {self.unary()})"
+        return self.primary()
+
+    def primary(self):
+        token = self.take()
+        if token.isdigit():
+            return token
+        if token == "(":
+            expression = self.disjunction()
+            self.take(")")
+            return expression
+        if token == "[":
+            items = self.items("]")
+            return "[" + ", ".join(items) + "]"
+        if token == "true":
+            return "True"
+        if token == "false":
+            return "False"
+        if token == "if":
+            return self.conditional()
+        if token.isidentifier():
+            if token == "table" and self.peek() == "(":
+                return self.table()
+            if self.peek() == "(":
+                self.take()
+                arguments = self.items(")")
+                if token in BUILTINS:
+                    return f"{BUILTINS[token]}({', '.join(arguments)})"
+                self.calls.add(token)
+                return f"_predicate_{token}({', '.join(arguments)})"
+            if token not in self.names:
+                raise SyntaxError(f"Unknown identifier {token!r}")
+            return token
+        raise SyntaxError(f"Unexpected token {token!r}")
+
+    def items(self, closing):
+        items = []
+        while self.peek() != closing:
+            items.append(self.disjunction())
+            if self.peek() == ",":
+                self.take()
+        self.take(closing)
+        return items
+
+    def integer(self):
+        if self.peek() == "-":
+            self.take()
+            return -int(self.take())
+        return int(self.take())
+
+    def table(self):
+        # table([x, y, ...], array2d(1..k, 1..n, [...])), e.g., as written by dlcore/mzntables.py
+        self.take("(")
+        self.take("[")
+        variables = self.items("]")
+        self.take(",")
+        self.take("array2d")
+        self.take("(")
+        bounds = []
+        for _ in range(2):
+            lower = self.integer()
+            self.take("..")
+            bounds.append(self.integer() - lower + 1)
+            self.take(",")
+        self.take("[")
+        values = []
+        while self.peek() != "]":
+            values.append(self.integer())
+            if self.peek() == ",":
+                self.take()
+        self.take("]")
+        self.take(")")
+        self.take(")")
+        rows, columns = bounds
+        if columns != len(variables) or rows*columns != len(values):
+            raise SyntaxError("The size of the table does not match its variables")
+        name = f"_rows_{len(self.constants)}"
+        self.constants[name] = frozenset(tuple(values[i:i + columns]) for i in range(0, len(values), columns))
+        return f"(({', '.join(variables)},) in {name})"
+
+    def conditional(self):
+        # the branches of long if-elseif chains (e.g., written by SboxAnalyzer.generate_cp_constraints) are kept
+        # in a flat tuple, as nested conditional expressions exceed the nesting limit of the Python parser
+        branches = []
+        while True:
+            condition = self.disjunction()
+            self.take("then")
+            branches.append(f"({condition}, {self.disjunction()})")
+            token = self.take()
+            if token == "elseif":
+                continue
+            if token == "else":
+                alternative = self.disjunction()
+                self.take("endif")
+            elif token == "endif":
+                alternative = "True"
+            else:
+                raise SyntaxError(f"Unexpected token {token!r} in if-then-else")
+            return f"_if(({', '.join(branches)},), {alternative})"
+
+
+def _if(branches, alternative):
+    for condition, consequence in branches:
+        if condition:
+            return consequence
+    return alternative
+
+
+def _mod(a, b):
+    # MiniZinc's mod truncates towards zero (the result has the sign of a)
+    return a - b*int(a/b)
+
+
+def _div(a, b):
+    return int(a/b)
+
+
+def parse_parameter(text):
+    """
+    Parse a parameter declaration, e.g., 'var -1..1: x0' -> ('x0', range(-1, 2))
+
+    :return: the name and the domain (None for var int)
+    """
+
+    declaration, name = text.rsplit(":", 1)
+    declaration = declaration.replace("var", "", 1).strip()
+    match = re.fullmatch(r"(-?\d+)\s*\.\.\s*(-?\d+)", declaration)
+    if match is not None:
+        return name.strip(), range(int(match.group(1)), int(match.group(2)) + 1)
+    if declaration in ("int", "bool"):
+        return name.strip(), None
+    raise SyntaxError(f"Unsupported parameter declaration: {text.strip()!r}")
+
+
+def split_top_level(text, separator=","):
+    """
+    Split text at the separators that are not nested in brackets
+    """
+
+    parts = []
+    depth = 0
+    current = ""
+    for character in text:
+        if character in "([":
+            depth += 1
+        elif character in ")]":
+            depth -= 1
+        if character == separator and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += character
+    parts.append(current)
+    return parts
+
+
+class PredicateLibrary:
+    """
+    The predicates of a MiniZinc model (and of its local includes), compiled into Python functions
+
+    The predicates are compiled on first use, so that the predicates using
+    unsupported syntax (e.g., the round functions of a model) are never parsed.
+    """
+
+    def __init__(self, file_name):
+        """
+        :param str file_name: MiniZinc model, e.g., present/attack.mzn
+        """
+
+        self.file_name = os.path.abspath(file_name)
+        self.definitions = dict()
+        self.parameters = dict()
+        self.namespace = {"_mod": _mod, "_div": _div, "_if": _if}
+        self._load(self.file_name, set())
+
+    def _load(self, file_name, loaded):
+        if file_name in loaded:
+            return
+        loaded.add(file_name)
+        with open(file_name, "r") as file:
+            text = strip_comments(file.read())
+        for include in re.findall(r'^\s*include\s+"([^"]+)"\s*;', text, flags=re.MULTILINE):
+            path = os.path.join(os.path.dirname(file_name), include)
+            # files of the MiniZinc library (e.g., globals.mzn) do not define the predicates tabulated here
+            if os.path.isfile(path):
+                self._load(path, loaded)
+        for match in re.finditer(r"\bpredicate\s+(\w+)\s*\(", text):
+            depth = 1
+            position = match.end()
+            while depth > 0:
+                depth += {"(": 1, ")": -1}.get(text[position], 0)
+                position += 1
+            body_start = text.index("=", position) + 1
+            # the last item of a file may omit the semicolon
+            body_end = text.find(";", body_start) % (len(text) + 1)
+            self.definitions[match.group(1)] = (text[match.end():position - 1], " ".join(text[body_start:body_end].split()))
+
+    def _compile(self, name):
+        if name in self.parameters:
+            return
+        if name not in self.definitions:
+            raise KeyError(f"Unknown predicate {name}")
+        declarations, body = self.definitions[name]
+        parameters = [parse_parameter(item) for item in split_top_level(declarations)]
+        names = [parameter for parameter, _ in parameters]
+        parser = _Parser(body, set(names), self.namespace)
+        expression = parser.parse()
+        # the domains of the parameters constrain the arguments, as in MiniZinc
+        domains = [f"{domain.start} <= {parameter} <= {domain.stop - 1}"
+                   for parameter, domain in parameters if domain is not None]
+        if domains:
+            expression = f"({' and '.join(domains)} and {expression})"
+        self.parameters[name] = parameters
+        exec(f"def _predicate_{name}({', '.join(names)}):\n    return bool({expression})\n", self.namespace)
+        for callee in parser.calls:
+            self._compile(callee)
+
+    def __contains__(self, name):
+        return name in self.definitions
+
+    def function(self, name):
+        """
+        Return the predicate as a Python function of its arguments
+        """
+
+        self._compile(name)
+        return self.namespace[f"_predicate_{name}"]
+
+    def parameter_domains(self, name):
+        """
+        Return the parameters of a predicate as a list of (name, domain), the domain is None for var int
+        """
+
+        self._compile(name)
+        return self.parameters[name]
+
+    def arguments(self, name, **fixed):
+        """
+        Return the names of the arguments of the table of a predicate, i.e., the parameters that are not fixed
+        """
+
+        return [parameter for parameter, _ in self.parameter_domains(name) if parameter not in fixed]
+
+    @functools.lru_cache(maxsize=None)
+    def _table(self, name, fixed):
+        fixed = dict(fixed)
+        function = self.function(name)
+        parameters = self.parameter_domains(name)
+        free = []
+        for parameter, domain in parameters:
+            if parameter in fixed:
+                continue
+            if domain is None:
+                raise ValueError(f"The argument {parameter} of {name} has no finite domain and must be fixed")
+            free.append((parameter, domain))
+        tuples = []
+        for values in itertools.product(*[domain for _, domain in free]):
+            assignment = dict(zip([parameter for parameter, _ in free], values), **fixed)
+            if function(*[assignment[parameter] for parameter, _ in parameters]):
+                tuples.append(values)
+        return tuples
+
+    def table(self, name, **fixed):
+        """
+        Return the allowed tuples of a predicate
+
+        :param str name: name of the predicate
+        :param fixed: values of the fixed arguments, e.g., which=3
+        :return: list of tuples of the values of the other arguments (in the order of the parameters)
+        """
+
+        return self._table(name, tuple(sorted(fixed.items())))
+
+
+@functools.lru_cache(maxsize=None)
+def load_library(file_name):
+    """
+    Return the PredicateLibrary of a MiniZinc model (parsed only once per process)
+    """
+
+    return PredicateLibrary(os.path.abspath(file_name))
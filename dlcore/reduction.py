@@ -0,0 +1,230 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Reduction of the inequalities encoding a set of binary points (e.g., a
+subtable of the DDT/LAT of an S-box).
+
+The encodings produced by ESPRESSO are far from minimal for 8-bit S-boxes
+(e.g., 7967 inequalities for the 2-DDT of AES), and they are instantiated
+for every S-box of every round. Given a list of candidate inequalities which
+are all valid for the points of the set, reduce_inequalities selects a
+smallest subset which still cuts off every point outside the set, i.e., it
+solves the set-cover problem
+
+    minimize sum(z_c)  s.t.  sum(z_c : c cuts p) >= 1  for every invalid point p
+
+with Gurobi (started from the greedy cover), and falls back to the greedy
+cover (lazy greedy followed by the removal of redundant inequalities) when
+Gurobi is not available, cannot handle the model (e.g., size-limited
+license), or runs out of time. The coverage of each candidate is computed
+with NumPy and stored as a bit vector over the invalid points.
+"""
+
+import time
+import heapq
+from collections import namedtuple
+import numpy as np
+from dlcore.milp import InequalityTemplate, GREATER_EQUAL, LESS_EQUAL
+
+DEFAULT_TIME_LIMIT = 600
+# Number of candidates evaluated on all points at once
+CHUNK_SIZE = 256
+_popcount = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+Reduction = namedtuple("Reduction", ["inequalities", "candidates", "invalid_points", "method", "optimal",
+                                     "nonzeros_before", "nonzeros_after", "time"])
+
+
+def describe(reduction):
+    """
+    Return a human-readable report of a reduction (sizes per instantiated S-box)
+    """
+
+    return ("Reduced {} inequalities ({} nonzeros) to {} inequalities ({} nonzeros) "
+            "cutting off {} points [{}{}, {:0.02f} seconds]").format(
+                reduction.candidates, reduction.nonzeros_before,
+                len(reduction.inequalities), reduction.nonzeros_after,
+                reduction.invalid_points, reduction.method,
+                ", optimal" if reduction.optimal else "", reduction.time)
+
+
+def coefficient_matrix(inequalities, placeholders):
+    """
+    Convert the inequalities into A x >= b
+
+    :return: (A, b) as int64/float64 ndarrays
+    """
+
+    template = InequalityTemplate.from_strings(inequalities, placeholders)
+    a = np.zeros((len(template), len(placeholders)), dtype=np.int64)
+    b = np.zeros(len(template), dtype=np.float64)
+    for k, (indices, coefficients, sense, rhs) in enumerate(template.rows):
+        if sense == GREATER_EQUAL:
+            sign = 1
+        elif sense == LESS_EQUAL:
+            sign = -1
+        else:
+            raise ValueError("Only inequalities can be reduced")
+        np.add.at(a[k], list(indices), [sign*c for c in coefficients])
+        b[k] = sign*rhs
+    return a, b
+
+
+def binary_points(n):
+    """
+    Return all points of {0, 1}^n as the rows of a matrix (row i is the binary representation of i, msb first)
+    """
+
+    i = np.arange(2**n, dtype=np.int64)
+    return ((i[:, None] >> np.arange(n - 1, -1, -1)) & 1).astype(np.int8)
+
+
+def coverage(a, b, valid):
+    """
+    Compute which invalid points every inequality cuts off
+
+    :param ndarray a: coefficients (one row per inequality)
+    :param ndarray b: right-hand sides
+    :param ndarray valid: boolean mask of the valid points (indexed by the integer value of the point)
+    :return: packed bit vectors (one row per inequality) over the invalid points
+    """
+
+    points = binary_points(a.shape[1])
+    invalid_points = points[~valid]
+    valid_points = points[valid]
+    cover = []
+    for start in range(0, a.shape[0], CHUNK_SIZE):
+        chunk = a[start:start + CHUNK_SIZE].T
+        rhs = b[start:start + CHUNK_SIZE]
+        if valid_points.shape[0] > 0 and np.any(valid_points @ chunk < rhs - 1e-9):
+            k = start + int(np.nonzero(np.any(valid_points @ chunk < rhs - 1e-9, axis=0))[0][0])
+            raise ValueError(f"Inequality {k} cuts off a valid point")
+        cut = (invalid_points @ chunk) < rhs - 1e-9
+        cover.append(np.packbits(cut.T, axis=1))
+    return np.concatenate(cover, axis=0), invalid_points.shape[0]
+
+
+def _count(bits):
+    return int(_popcount[bits].sum())
+
+
+def greedy_cover(cover, number_of_points):
+    """
+    Lazy greedy set cover followed by the removal of redundant inequalities
+
+    :return: sorted list of the indices of the selected inequalities
+    """
+
+    uncovered = np.packbits(np.ones(number_of_points, dtype=bool))
+    heap = [(-_count(cover[k]), k) for k in range(cover.shape[0])]
+    heapq.heapify(heap)
+    selected = []
+    remaining = number_of_points
+    while remaining > 0:
+        if heap == []:
+            raise ValueError(f"The inequalities do not cut off {remaining} invalid points")
+        _, k = heapq.heappop(heap)
+        count = _count(cover[k] & uncovered)
+        if count == 0:
+            continue
+        if heap != [] and count < -heap[0][0]:
+            heapq.heappush(heap, (-count, k))
+            continue
+        selected.append(k)
+        uncovered &= ~cover[k]
+        remaining -= count
+    # drop the inequalities whose points are all cut off by others (the least useful first)
+    counts = np.zeros(number_of_points, dtype=np.int64)
+    for k in selected:
+        counts += np.unpackbits(cover[k], count=number_of_points)
+    for k in sorted(selected, key=lambda k: _count(cover[k])):
+        points = np.unpackbits(cover[k], count=number_of_points).astype(bool)
+        if np.all(counts[points] >= 2):
+            counts[points] -= 1
+            selected.remove(k)
+    return sorted(selected)
+
+
+def milp_cover(cover, number_of_points, start=None, time_limit=DEFAULT_TIME_LIMIT):
+    """
+    Solve the set-cover problem with Gurobi
+
+    :param list start: indices of a known cover (MIP start)
+    :return: (sorted list of the indices of the selected inequalities, optimality flag)
+    """
+
+    from gurobipy import Model, GRB, LinExpr
+    model = Model("set cover")
+    model.Params.OutputFlag = False
+    model.Params.TimeLimit = time_limit
+    z = model.addVars(cover.shape[0], vtype=GRB.BINARY, obj=1)
+    if start is not None:
+        for k in range(cover.shape[0]):
+            z[k].Start = int(k in start)
+    block = 8*CHUNK_SIZE
+    for first in range(0, cover.shape[1], block//8):
+        bits = np.unpackbits(cover[:, first:first + block//8], axis=1)
+        for j in range(bits.shape[1]):
+            if 8*first + j >= number_of_points:
+                break
+            candidates = np.nonzero(bits[:, j])[0]
+            model.addLConstr(LinExpr([1]*len(candidates), [z[int(k)] for k in candidates]), GRB.GREATER_EQUAL, 1)
+    model.optimize()
+    if model.SolCount == 0:
+        return None, False
+    selected = [k for k in range(cover.shape[0]) if z[k].X > 0.5]
+    return selected, model.Status == GRB.OPTIMAL
+
+
+def reduce_inequalities(inequalities, placeholders, valid, method="milp", time_limit=DEFAULT_TIME_LIMIT):
+    """
+    Select a small subset of the inequalities which still cuts off every invalid point
+
+    :param list inequalities: candidate inequalities in the .lp syntax (valid for all valid points)
+    :param list placeholders: variables of the inequalities, the first one being the msb of the point index
+    :param valid: boolean mask of length 2^len(placeholders) specifying the valid points
+    :param str method: 'milp' (set-cover MILP, with greedy fallback) or 'greedy'
+    :param int time_limit: time limit of the MILP in seconds
+    :rtype Reduction:
+    """
+
+    start_time = time.time()
+    inequalities = [ineq.strip() for ineq in inequalities if ineq.strip() != ""]
+    valid = np.asarray(valid, dtype=bool).ravel()
+    if valid.shape[0] != 2**len(placeholders):
+        raise ValueError(f"Expected a mask of {2**len(placeholders)} points, not {valid.shape[0]}")
+    a, b = coefficient_matrix(inequalities, placeholders)
+    cover, number_of_points = coverage(a, b, valid)
+    selected = greedy_cover(cover, number_of_points)
+    used_method, optimal = "greedy", False
+    if method == "milp":
+        try:
+            milp_selected, optimal = milp_cover(cover, number_of_points, start=set(selected), time_limit=time_limit)
+            if milp_selected is not None and len(milp_selected) <= len(selected):
+                selected, used_method = milp_selected, "milp"
+        except Exception as e:
+            print(f"Set-cover MILP failed ({e}), using the greedy cover")
+    nonzeros = np.count_nonzero(a, axis=1)
+    return Reduction([inequalities[k] for k in selected], len(inequalities), number_of_points, used_method, optimal,
+                     int(nonzeros.sum()), int(nonzeros[selected].sum()), time.time() - start_time)
@@ -0,0 +1,153 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Run isolation, so that several searches can share a working directory.
+
+Every process gets a run ID (taken from the DL_RUN_ID environment variable
+if it is set, so that a driver can assign IDs to its jobs). The outputs of
+a run (output.tex, debug_output.txt, minizinc-python.log, dumped models,
+summary.json) are written into its own directory runs/<run ID> (the parent directory
+can be changed by DL_RUN_DIR), and the temporary model files get unique
+names inside that directory.
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import logging
+import contextlib
+
+_run_id = None
+
+
+def run_id():
+    """
+    Return the ID of the current run, e.g., 20240101-120000-1a2b3c4d
+    """
+
+    global _run_id
+    if _run_id is None:
+        _run_id = os.environ.get("DL_RUN_ID") or \
+                  time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
+    return _run_id
+
+
+def new_run():
+    """
+    Forget the ID of the current run, so that the next call of run_id() starts
+    a new run (e.g., when a worker process executes several attacks in turn)
+    """
+
+    global _run_id
+    _run_id = None
+
+
+def run_directory():
+    """
+    Return the output directory of the current run (created on demand)
+    """
+
+    path = os.path.join(os.environ.get("DL_RUN_DIR", "runs"), run_id())
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def output_path(file_name):
+    """
+    Return the path of an output file of the current run.
+    Absolute paths, and paths with a directory component, are kept as they are.
+    """
+
+    if os.path.isabs(file_name) or os.path.dirname(file_name) != "":
+        return file_name
+    return os.path.join(run_directory(), file_name)
+
+
+def temporary_path(prefix, suffix):
+    """
+    Return a unique file name in the directory of the current run,
+    e.g., for an .lp file which is written and read back right away
+    (the file itself is not created)
+    """
+
+    return os.path.join(run_directory(), f"{prefix}{uuid.uuid4().hex}{suffix}")
+
+
+def configure_logging(file_name="minizinc-python.log", level=logging.DEBUG):
+    """
+    Log into a file of the current run, with the run ID in every record
+    """
+
+    logging.basicConfig(filename=output_path(file_name), level=level, force=True,
+                        format=f"%(asctime)s [{run_id()}] %(name)s %(levelname)s: %(message)s")
+
+
+@contextlib.contextmanager
+def locked(file_name):
+    """
+    Hold an exclusive lock on a shared file (through a lock file next to it), so that
+    concurrent runs do not lose each other's updates of, e.g., a JSON database
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    with open(f"{file_name}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_summary(summary, file_name="summary.json"):
+    """
+    Store the machine-readable summary of an attack in the run directory.
+    Besides the configuration (RU, RM, RL, ...) and the solver status, the
+    summary holds the following entries when the attack provides them:
+    PU, CM, CL (the quantities reported for the upper, middle, and lower parts),
+    estimate, lower_bound, upper_bound (log2 of the total correlation), and objective.
+
+    :param dict summary: JSON-serializable values
+    :return: path of the summary file
+    """
+
+    summary = dict(summary)
+    summary.setdefault("run_id", run_id())
+    path = output_path(file_name)
+    with open(path, "w") as fileobj:
+        json.dump(summary, fileobj, indent=4, default=str)
+    return path
+
+
+def read_summary(directory, file_name="summary.json"):
+    """
+    Read the summary written by write_summary into the given run directory (None if missing)
+    """
+
+    path = os.path.join(directory, file_name)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r") as fileobj:
+        return json.load(fileobj)
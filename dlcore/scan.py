@@ -0,0 +1,122 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Parametric re-solve of a model for all values of one fixed cell.
+
+Hybrid analytic/MILP formulas (e.g., aes/formulation/aes4r.py) sum the
+output of the same search over all values of a single cell, e.g., the
+difference of one byte. Instead of building a fresh model for every value,
+scan_cell builds the model once (per worker process) and only changes the
+bounds of the bits of the scanned cell between the solves, so that Gurobi
+keeps the model (and its presolve/parameter state) between the values.
+The values can be partitioned across worker processes (see
+dlcore/pipeline.py), each of which builds its own copy of the model.
+"""
+
+from dlcore.pipeline import run_concurrently
+
+# Constraints added by the search methods of the Diff/Lin classes on every call
+PER_SOLVE_CONSTRAINTS = ("start_weight_constraint",)
+
+
+def cell_variables(cell, width):
+    """
+    Return the names of the bits of a cell, e.g., x_1_3_2 -> x_1_3_2_0, ..., x_1_3_2_7 (msb first)
+    """
+
+    return [f"{cell}_{bit}" for bit in range(width)]
+
+
+def fix_cell(model, variables, value):
+    """
+    Fix the bits of a cell to the given value by changing their bounds
+    """
+
+    bits = bin(value)[2:].zfill(len(variables))
+    for name, bit in zip(variables, bits):
+        var = model.getVarByName(name)
+        var.LB = int(bit)
+        var.UB = int(bit)
+
+
+def reset_model(model):
+    """
+    Undo the changes made by the last search, so that the next value starts from the same model:
+    drop the per-solve constraints, and the cutoff set by a warm start (see dlcore/warmstart.py)
+    """
+
+    model.update()
+    for name in PER_SOLVE_CONSTRAINTS:
+        constraint = model.getConstrByName(name)
+        while constraint is not None:
+            model.remove(constraint)
+            model.update()
+            constraint = model.getConstrByName(name)
+    model.Params.Cutoff = float("inf")
+
+
+def scan_values(cls, params, cell, values, width, method):
+    """
+    Build the model of cls(params) once and run the given method for every value of the cell
+
+    :return: dict mapping every value to the output of the method
+    """
+
+    analysis = cls(params)
+    analysis.make_model()
+    variables = cell_variables(cell, width)
+    results = dict()
+    for value in values:
+        fix_cell(analysis.milp_model, variables, value)
+        results[value] = getattr(analysis, method)()
+        reset_model(analysis.milp_model)
+    return results
+
+
+def scan_cell(cls, params, cell, values, width, method, processes=1, threads=None):
+    """
+    Run a search for every value of one cell, building the model only once per worker
+
+    :param cls: Diff/Lin class (defined at module level, so that the workers can import it)
+    :param dict params: parameters of cls; the scanned cell must not be fixed in params["fixedVariables"]
+    :param str cell: name of the cell, e.g., x_1_3_2
+    :param values: values of the cell (integers)
+    :param int width: number of bits of the cell
+    :param str method: name of the search method, e.g., find_characteristic
+    :param int processes: number of worker processes the values are partitioned across
+    :param int threads: total number of Gurobi threads shared by the workers (default: number of cores)
+    :return: dict mapping every value to the output of the method (in the order of values)
+    """
+
+    values = list(values)
+    if cell in params.get("fixedVariables", {}):
+        params = dict(params)
+        params["fixedVariables"] = {k: v for k, v in params["fixedVariables"].items() if k != cell}
+    processes = max(1, min(processes, len(values)))
+    jobs = {part: (scan_values, (cls, params, cell, values[part::processes], width, method))
+            for part in range(processes)}
+    results = dict()
+    for part_results in run_concurrently(jobs, processes=processes, threads=threads).values():
+        results.update(part_results)
+    return {value: results[value] for value in values}
@@ -0,0 +1,409 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Batch sweeps over the configurations (RU, RM, RL, RMU, RML, WU, WM, WL)
+of the attack.py script of a cipher.
+
+The configurations are executed on a pool of worker processes which import
+attack.py (and the solver libraries) once and then run the main function of
+attack.py for one configuration after the other, so that the start-up cost
+is paid once per worker instead of once per configuration. Every job has its
+own run directory (see dlcore/runs.py) inside the directory of the sweep, and
+the summary.json files written by the jobs are collected into a single
+results table (sweep.csv). Each job gets its own thread (-np, only for the
+ciphers whose attack.py accepts it) and time (--timelimit) budget.
+
+Pruning (--prune, off by default) is a heuristic: adding rounds to EU or EL
+of a distinguisher cannot increase its correlation, so a configuration that
+only extends an evaluated one by outer rounds is skipped if the upper bound
+reported by the evaluated run does not beat the best-known distinguisher for
+the same number of rounds (--best, or the best lower bound reported so far by
+the sweep). The attacks do not prove bounds over all the distinguishers of a
+configuration (the reported bounds belong to the distinguisher they found),
+hence a skipped configuration may still contain a better distinguisher.
+Extensions have more rounds, so pruning only applies to sweeps over several
+numbers of rounds (not with --total). The configurations are scheduled in
+increasing order of the number of rounds, so that the bounds are available early.
+
+--smoke runs only the first configuration of the grid in a temporary
+directory and exits with status 1 if it fails, e.g., to check that a cipher
+works with the sweep.
+
+Example (from a cipher directory):
+
+    python3 sweep.py --total 16 -RM 8 9 10 -WU 2 -WM 1 -WL 2 --jobs 8 -np 4 -tl 600
+    python3 sweep.py -RU 1 -RM 1 -RL 1 --smoke
+"""
+
+import os
+import sys
+import csv
+import time
+import itertools
+import tempfile
+import traceback
+import importlib
+from argparse import ArgumentParser, RawTextHelpFormatter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dlcore.runs import run_id, new_run, read_summary
+
+PARAMETERS = ["RU", "RM", "RL", "RMU", "RML", "WU", "WM", "WL"]
+COLUMNS = PARAMETERS + ["status", "PU", "CM", "CL", "estimate", "lower_bound", "upper_bound", "objective", "time", "compile_time", "solve_time", "run_id"]
+
+
+def configurations(grid, total=None):
+    """
+    Enumerate the configurations of a grid
+
+    :param dict grid: maps the names in PARAMETERS to lists of values (missing: attack.py's default)
+    :param int total: only keep the configurations with RU + RM + RL = total
+    :rtype: list of dict
+    """
+
+    names = [name for name in PARAMETERS if grid.get(name) is not None]
+    configs = []
+    for values in itertools.product(*[grid[name] for name in names]):
+        config = dict(zip(names, values))
+        if total is not None and sum(config.get(r, 0) for r in ["RU", "RM", "RL"]) != total:
+            continue
+        if config.get("RMU", 0) + config.get("RML", 0) > config.get("RM", 0) > 0:
+            continue
+        configs.append(config)
+    configs.sort(key=lambda c: (number_of_rounds(c), c.get("RU", 0) + c.get("RL", 0)))
+    return configs
+
+
+def number_of_rounds(config):
+    return sum(config.get(r, 0) for r in ["RU", "RM", "RL"])
+
+
+def job_name(config):
+    return "_".join(f"{name}{value}" for name, value in config.items())
+
+
+def score(summary):
+    """
+    log2 of the correlation (higher is better) used for ranking
+    """
+
+    if summary is None:
+        return None
+    for key in ["upper_bound", "estimate"]:
+        if summary.get(key) is not None:
+            return summary[key]
+    if summary.get("objective") is not None:
+        return -summary["objective"]
+    return None
+
+
+def upper_bound(summary):
+    """
+    log2 of the upper bound reported by the run (None if unknown); it belongs to the
+    distinguisher found by the run, not to all the distinguishers of the configuration
+    """
+
+    if summary is None:
+        return None
+    return summary.get("upper_bound")
+
+
+def guaranteed(summary):
+    """
+    log2 of the lower bound reported by the run, i.e., a correlation that the
+    configuration achieves (None if unknown)
+    """
+
+    if summary is None:
+        return None
+    return summary.get("lower_bound")
+
+
+def extends(config, other):
+    """
+    Return True if config is obtained from other by adding rounds to EU and/or EL
+    """
+
+    if config == other:
+        return False
+    for name in PARAMETERS:
+        if name in ["RU", "RL"]:
+            if config.get(name, 0) < other.get(name, 0):
+                return False
+        elif config.get(name) != other.get(name):
+            return False
+    return True
+
+
+class Sweep:
+    """
+    Run attack.py for a list of configurations on a pool of worker processes
+    """
+
+    def __init__(self, cipher_dir, configs, jobs=1, threads=None, time_limit=None,
+                 best=None, prune=False, extra_args=None, sweep_dir=None):
+        """
+        :param str cipher_dir: directory containing attack.py
+        :param list configs: configurations (see configurations())
+        :param int jobs: number of jobs executed at the same time
+        :param int threads: number of threads of each job (-np)
+        :param int time_limit: time limit of each job in seconds (--timelimit)
+        :param float best: log2 of the correlation of the best-known distinguisher
+        :param bool prune: skip the configurations which are unlikely to beat the best-known distinguisher (heuristic)
+        :param list extra_args: further arguments passed to attack.py
+        :param str sweep_dir: directory of the sweep (default: runs/sweep-<run ID>)
+        """
+
+        self.cipher_dir = os.path.abspath(cipher_dir)
+        self.configs = configs
+        self.jobs = jobs
+        self.threads = threads
+        self.time_limit = time_limit
+        self.best = best
+        self.prune = prune
+        self.extra_args = extra_args if extra_args is not None else []
+        if sweep_dir is None:
+            sweep_dir = os.path.join(self.cipher_dir, "runs", f"sweep-{run_id()}")
+        self.sweep_dir = os.path.abspath(sweep_dir)
+        with open(os.path.join(self.cipher_dir, "attack.py"), "r") as fileobj:
+            self.attack_source = fileobj.read()
+        if threads is not None and not self.accepts("-np"):
+            raise ValueError(f"attack.py in {self.cipher_dir} has no option -np (number of threads)")
+        self.results = []
+
+    def accepts(self, option):
+        return f'"{option}"' in self.attack_source or f"'{option}'" in self.attack_source
+
+    def arguments(self, config):
+        arguments = []
+        for name, value in config.items():
+            if self.accepts(f"-{name}"):
+                arguments += [f"-{name}", str(value)]
+        if self.threads is not None:
+            arguments += ["-np", str(self.threads)]
+        if self.time_limit is not None:
+            arguments += ["--timelimit", str(self.time_limit)]
+        return arguments + self.extra_args
+
+    def summarize(self, config, returncode, elapsed):
+        """
+        Read the summary of a finished job (or describe its failure)
+        """
+
+        name = job_name(config)
+        summary = read_summary(os.path.join(self.sweep_dir, name))
+        if summary is None:
+            summary = {"status": f"FAILED ({returncode})", "time": elapsed}
+        summary.update(config)
+        summary["run_id"] = name
+        return summary
+
+    def best_known(self, total):
+        values = [guaranteed(result) for result in self.results
+                  if number_of_rounds(result) == total and guaranteed(result) is not None]
+        if self.best is not None:
+            values.append(self.best)
+        if values == []:
+            return None
+        return max(values)
+
+    def bound(self, config):
+        """
+        Upper bound on the score of config given by the finished configurations it extends
+        (heuristic, see upper_bound)
+        """
+
+        bounds = [upper_bound(result) for result in self.results
+                  if upper_bound(result) is not None and extends(config, {name: result[name] for name in config})]
+        if bounds == []:
+            return None
+        return min(bounds)
+
+    def pruned(self, config):
+        if not self.prune:
+            return False
+        bound = self.bound(config)
+        best = self.best_known(number_of_rounds(config))
+        return bound is not None and best is not None and bound <= best
+
+    def run(self):
+        os.makedirs(self.sweep_dir, exist_ok=True)
+        print(f"Sweep of {len(self.configs)} configurations in {self.sweep_dir}")
+        queue = list(self.configs)
+        running = dict()
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=load_attack,
+                                 initargs=(self.cipher_dir,)) as executor:
+            while queue != [] or running != {}:
+                while queue != [] and len(running) < self.jobs:
+                    config = queue.pop(0)
+                    if self.pruned(config):
+                        result = dict(config, status="PRUNED", run_id=job_name(config))
+                        self.results.append(result)
+                        print(f"{job_name(config)}: pruned (bound 2^({self.bound(config)}))")
+                        continue
+                    running[executor.submit(run_attack, self.arguments(config), job_name(config),
+                                            self.sweep_dir)] = config
+                if running == {}:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    config = running.pop(future)
+                    result = self.summarize(config, *future.result())
+                    self.results.append(result)
+                    print(f"{job_name(config)}: {result.get('status')}, score 2^({score(result)})")
+        self.write_table()
+        return self.results
+
+    def write_table(self, file_name="sweep.csv"):
+        """
+        Print the results (best first) and store them in sweep.csv
+        """
+
+        rows = sorted(self.results, key=lambda r: (score(r) is None, -(score(r) or 0)))
+        path = os.path.join(self.sweep_dir, file_name)
+        with open(path, "w", newline="") as fileobj:
+            writer = csv.DictWriter(fileobj, fieldnames=COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+        widths = {c: max([len(c)] + [len(format_value(r.get(c))) for r in rows]) for c in COLUMNS}
+        print(" ".join(c.ljust(widths[c]) for c in COLUMNS))
+        for row in rows:
+            print(" ".join(format_value(row.get(c)).ljust(widths[c]) for c in COLUMNS))
+        print(f"Results stored in {path}")
+        return path
+
+
+_attack = None
+
+
+def load_attack(cipher_dir):
+    """
+    Import the attack.py of cipher_dir once per worker process
+    """
+
+    global _attack
+    os.chdir(cipher_dir)
+    sys.path.insert(0, cipher_dir)
+    # a regular import (registered in sys.modules), so that the functions of attack.py
+    # can be pickled for the worker processes started by attack.py itself
+    _attack = importlib.import_module("attack")
+
+
+def run_attack(arguments, name, sweep_dir):
+    """
+    Run the main function of attack.py with the given command line arguments
+    in the current worker process, as the run name inside sweep_dir.
+    The output of the job (including the output of the solvers) goes to stdout.txt.
+
+    :return: (return code, elapsed time in seconds)
+    """
+
+    os.environ["DL_RUN_ID"] = name
+    os.environ["DL_RUN_DIR"] = sweep_dir
+    new_run()
+    job_dir = os.path.join(sweep_dir, name)
+    os.makedirs(job_dir, exist_ok=True)
+    start_time = time.time()
+    returncode = 0
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    with open(os.path.join(job_dir, "stdout.txt"), "w") as stdout:
+        os.dup2(stdout.fileno(), 1)
+        os.dup2(stdout.fileno(), 2)
+        sys.argv = ["attack.py"] + arguments
+        try:
+            _attack.main()
+        except SystemExit as error:
+            returncode = error.code if isinstance(error.code, int) else int(error.code is not None)
+        except Exception:
+            traceback.print_exc()
+            returncode = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+    return returncode, time.time() - start_time
+
+
+def format_value(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return "%0.2f" % value
+    return str(value)
+
+
+def main(cipher_dir):
+    """
+    Parse the arguments and run the sweep for the attack.py in cipher_dir
+    """
+
+    parser = ArgumentParser(description="Run attack.py for a grid of configurations and collect the results\n"
+                                        "Example:\n"
+                                        "python3 sweep.py --total 16 -RM 8 9 10 --jobs 8 -np 4 -tl 600",
+                            formatter_class=RawTextHelpFormatter)
+    for name in PARAMETERS:
+        parser.add_argument(f"-{name}", f"--{name}", nargs="+", type=int, default=None,
+                            help=f"values of {name} (default: the default of attack.py)")
+    parser.add_argument("-T", "--total", type=int, default=None,
+                        help="only keep the configurations with RU + RM + RL = total")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of configurations evaluated at the same time")
+    parser.add_argument("-np", type=int, default=None,
+                        help="number of threads of each job (only if attack.py accepts -np)")
+    parser.add_argument("-tl", "--timelimit", type=int, default=None, help="time limit of each job in seconds")
+    parser.add_argument("-b", "--best", type=float, default=None,
+                        help="log2 of the correlation of the best-known distinguisher (for --prune)")
+    parser.add_argument("--prune", action="store_true",
+                        help="heuristic: skip the configurations extending an evaluated one by outer rounds\n"
+                             "if its reported upper bound does not beat the best-known distinguisher\n"
+                             "(the reported bounds are not proven, a better distinguisher may be skipped;\n"
+                             "no effect with --total)")
+    parser.add_argument("--smoke", action="store_true",
+                        help="only run the first configuration in a temporary directory (exit status 1 if it fails)")
+    parser.add_argument("-d", "--sweepdir", type=str, default=None, help="directory of the sweep")
+    args, extra_args = parser.parse_known_args()
+    grid = {name: getattr(args, name) for name in PARAMETERS}
+    if args.total is not None:
+        for name in ["RU", "RM", "RL"]:
+            if grid[name] is None:
+                grid[name] = list(range(args.total + 1))
+    configs = configurations(grid, args.total)
+    sweep_dir = args.sweepdir
+    if args.smoke:
+        configs = configs[:1]
+        sweep_dir = tempfile.mkdtemp(prefix="sweep-smoke-")
+    try:
+        sweep = Sweep(cipher_dir, configs, jobs=1 if args.smoke else args.jobs, threads=args.np,
+                      time_limit=args.timelimit, best=args.best, prune=args.prune,
+                      extra_args=extra_args, sweep_dir=sweep_dir)
+    except ValueError as error:
+        parser.error(str(error))
+    results = sweep.run()
+    if args.smoke and (results == [] or str(results[0].get("status")).startswith("FAILED")):
+        sys.exit(1)
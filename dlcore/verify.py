@@ -0,0 +1,316 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Local driver for the C programs in the verifications directories.
+
+The programs are configured by constants (number of rounds, input
+difference, output mask, number of queries, ...) with default values in
+their headers, which are overridden here by -D flags. Every set of
+constants is compiled once into its own build directory
+
+    .dlcache/verifications/<program>-<hash of the constants and sources>
+
+so that running the same distinguisher again (or on more shards) does not
+recompile anything. The shards are the usual runs of the program with task
+IDs 0, ..., N - 1 (as in the SLURM array jobs), executed by a pool of local
+workers, each in its own directory inside the run directory (see
+dlcore/runs.py). The correlations reported by the shards for all of their
+experiments are parsed from the outputs and aggregated into the average
+correlation and its variance over the experiments.
+
+The input difference and output mask can be given directly, or read from
+the attack summary printed by attack.py (the char DP_STR[] = "..."
+and char LC_STR[] = "..." lines), e.g., from a cipher directory:
+
+    python3 attack.py ... | tee attack.txt
+    python3 verify.py -i attack.txt -r 10 --deg2 24 -n 16 -j 8
+"""
+
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import subprocess
+from argparse import ArgumentParser, RawTextHelpFormatter
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dlcore.cache import ROOT_DIRECTORY, file_digest
+from dlcore.runs import run_directory, run_id, write_summary
+
+BUILD_DIRECTORY = os.path.join(ROOT_DIRECTORY, ".dlcache", "verifications")
+SOURCE_EXTENSIONS = (".c", ".h", ".inc")
+GXX_FLAGS = ["-O3", "-fopenmp", "--std=c++11", "-w"]
+
+Verifier = namedtuple("Verifier", ["directory", "compiler", "sources", "flags"])
+
+VERIFIERS = {"aes": Verifier("aes", "gcc", ["difflin.c"],
+                             ["-O1", "-finline-functions", "-fomit-frame-pointer", "-funroll-loops", "-w",
+                              "-msse2", "-msse", "-march=native", "-maes"]),
+             "twine": Verifier("twine", "g++", ["difflin.c", "twine.c"], GXX_FLAGS),
+             "warp": Verifier("warp", "g++", ["difflin.c", "warp.c"], GXX_FLAGS),
+             "lblock": Verifier("lblock", "g++", ["difflin.c", "lblock.c"], GXX_FLAGS),
+             "clefia": Verifier("clefia", "g++", ["difflin.c"], GXX_FLAGS),
+             "simeck32": Verifier("simeck", "g++", ["difflin32.c"], GXX_FLAGS),
+             "simeck48": Verifier("simeck", "g++", ["difflin48.c"], GXX_FLAGS),
+             "simeck64": Verifier("simeck", "g++", ["difflin64.c"], GXX_FLAGS),
+             "skinny": Verifier("skinny", "g++", ["verification.c"], GXX_FLAGS)}
+
+_assignment = re.compile(r'char\s*\*?\s*(DP_STR|LC_STR|DC_STR|dp_str|dc_str|dk_str)\s*(\[\])?\s*=\s*"([0-9a-fA-F]*)"')
+_variant = re.compile(r"Variant = (\d+), Cell size = (\d+)")
+_names = {"DP_STR": "dp", "dp_str": "dp", "LC_STR": "lc", "DC_STR": "lc", "dc_str": "lc", "dk_str": "dk"}
+_total_queries = re.compile(r"^#Total Queries = .*= (\d+) \* (\d+) \* (\d+) = ")
+_absolute_correlation = re.compile(r"^(?:sum =|Absolute correlation:)\s*([0-9.eE+-]+)\s*$")
+_log_correlation = re.compile(r"^Correlation = 2\^\((-?[0-9.]+)\)\s*$")
+
+
+def parse_attack_summary(text):
+    """
+    Extract the C constants printed in an attack summary
+
+    :param str text: output of attack.py
+    :return: dict mapping 'middle' and/or 'distinguisher' to a dict with the keys dp, lc (and dk for SKINNY),
+             the SKINNY version is stored under the key 'version' if the summary reports it
+    """
+
+    parts = dict()
+    label = ""
+    for line in text.splitlines():
+        match = _assignment.search(line)
+        if match is None:
+            if line.strip() != "" and line.strip("# \t") != "":
+                label = line
+            match = _variant.search(line)
+            if match is not None:
+                variant, cell_size = int(match.group(1)), int(match.group(2))
+                parts["version"] = variant - 1 + (3 if cell_size == 8 else 0)
+            continue
+        part = "middle" if "middle" in label.lower() else "distinguisher"
+        parts.setdefault(part, dict())[_names[match.group(1)]] = match.group(3)
+    return parts
+
+
+def compile_flags(constants):
+    """
+    Turn the constants into -D flags (strings become C string literals)
+    """
+
+    flags = []
+    for name, value in sorted(constants.items()):
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = f'"{value}"'
+        flags.append(f"-D{name}={value}")
+    return flags
+
+
+def build(program, constants, build_root=BUILD_DIRECTORY):
+    """
+    Compile the verification program with the given constants, or reuse
+    an existing build with the same constants and sources
+
+    :param str program: key of VERIFIERS
+    :param dict constants: maps the macro names (DL_ROUNDS, DL_DP, ...) to their values
+    :return: path of the executable
+    """
+
+    verifier = VERIFIERS[program]
+    source_dir = os.path.join(ROOT_DIRECTORY, verifier.directory, "verifications")
+    command = [verifier.compiler] + verifier.flags + compile_flags(constants) + verifier.sources
+    digests = {name: file_digest(os.path.join(source_dir, name)) for name in sorted(os.listdir(source_dir))
+               if name.endswith(SOURCE_EXTENSIONS)}
+    key = hashlib.sha256(json.dumps({"command": command, "sources": digests}, sort_keys=True).encode()).hexdigest()
+    build_dir = os.path.join(build_root, f"{program}-{key[:16]}")
+    executable = os.path.join(build_dir, "difflin")
+    if os.path.isfile(executable):
+        return executable
+    os.makedirs(build_dir, exist_ok=True)
+    temporary = f"{executable}.{os.getpid()}"
+    result = subprocess.run(command + ["-o", temporary, "-lm"], cwd=source_dir, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to compile {program}:\n{' '.join(command)}\n{result.stderr}")
+    os.replace(temporary, executable)
+    with open(os.path.join(build_dir, "build.json"), "w") as fileobj:
+        json.dump({"command": command, "constants": constants, "sources": digests}, fileobj, indent=4)
+    return executable
+
+
+def parse_output(text, queries=None):
+    """
+    Parse the output of a verification program
+
+    :param str text: standard output of the program
+    :param int queries: number of queries per experiment, if the program does not print it
+    :return: list of (absolute correlation, queries), one entry per experiment
+    """
+
+    experiments = []
+    for line in text.splitlines():
+        line = line.strip()
+        match = _total_queries.match(line)
+        if match is not None:
+            queries = math.prod(int(g) for g in match.groups())
+            continue
+        match = _absolute_correlation.match(line)
+        if match is not None:
+            experiments.append((float(match.group(1))/queries, queries))
+            continue
+        match = _log_correlation.match(line)
+        if match is not None:
+            experiments.append((2**float(match.group(1)), queries))
+    return experiments
+
+
+Aggregate = namedtuple("Aggregate", ["correlation", "variance", "standard_error", "experiments", "queries"])
+
+
+def aggregate(experiments):
+    """
+    Average the absolute correlations of all experiments (weighted by the number of queries)
+
+    :param list experiments: list of (absolute correlation, queries)
+    :rtype: Aggregate
+    """
+
+    n = len(experiments)
+    if n == 0:
+        raise ValueError("No experiment to aggregate")
+    queries = sum(q for _, q in experiments)
+    correlation = sum(c*q for c, q in experiments)/queries
+    variance = sum((c - correlation)**2 for c, _ in experiments)/(n - 1) if n > 1 else 0.0
+    return Aggregate(correlation, variance, math.sqrt(variance/n), n, queries)
+
+
+def run_shard(executable, task_id, work_dir, queries=None):
+    """
+    Run one shard (task ID) of the verification program in its own directory
+    """
+
+    shard_dir = os.path.join(work_dir, f"shard_{task_id}")
+    os.makedirs(shard_dir, exist_ok=True)
+    result = subprocess.run([executable, str(task_id)], cwd=shard_dir, capture_output=True, text=True)
+    with open(os.path.join(shard_dir, "output.txt"), "w") as fileobj:
+        fileobj.write(result.stdout)
+    if result.returncode != 0:
+        raise RuntimeError(f"Shard {task_id} failed with exit code {result.returncode}:\n{result.stderr}")
+    return parse_output(result.stdout, queries)
+
+
+def verify(program, constants, shards=1, jobs=None, work_dir=None):
+    """
+    Build the verification program and run shards of it in parallel
+
+    :param str program: key of VERIFIERS
+    :param dict constants: maps the macro names to their values (see build)
+    :param int shards: number of shards (task IDs 0, ..., shards - 1)
+    :param int jobs: number of shards running at the same time (default: number of cores)
+    :param str work_dir: directory of the shards' outputs (default: inside the run directory)
+    :return: (Aggregate, list of the experiments of every shard)
+    """
+
+    executable = build(program, constants)
+    if work_dir is None:
+        work_dir = os.path.join(run_directory(), "verification")
+    os.makedirs(work_dir, exist_ok=True)
+    queries = None
+    if constants.get("DL_DEG1") is not None and constants.get("DL_DEG2") is not None:
+        queries = 2**(constants["DL_DEG1"] + constants["DL_DEG2"])
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        results = list(executor.map(lambda task_id: run_shard(executable, task_id, work_dir, queries), range(shards)))
+    return aggregate([e for shard in results for e in shard]), results
+
+
+def main(cipher_dir):
+    """
+    Parse the arguments and run the verification program of the cipher in cipher_dir
+    """
+
+    cipher = os.path.basename(os.path.abspath(cipher_dir))
+    parser = ArgumentParser(description="Build and run the verification program with the given distinguisher on local cores\n"
+                                        "Example:\n"
+                                        "python3 verify.py -i attack.txt -r 10 --deg2 24 -n 16 -j 8",
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument("-i", "--inputfile", type=str, default=None, help="attack summary printed by attack.py")
+    parser.add_argument("-p", "--part", choices=["distinguisher", "middle"], default=None,
+                        help="part of the attack summary to verify (default: distinguisher if available)")
+    parser.add_argument("-dp", "--difference", type=str, default=None, help="input difference (overrides the summary)")
+    parser.add_argument("-lc", "--mask", type=str, default=None, help="output mask (overrides the summary)")
+    parser.add_argument("-r", "--rounds", type=int, required=True, help="number of rounds")
+    parser.add_argument("--deg1", type=int, default=0, help="log2 of the number of bunches (keys) per experiment")
+    parser.add_argument("--deg2", type=int, default=20, help="log2 of the number of queries per bunch")
+    parser.add_argument("-e", "--experiments", type=int, default=1, help="number of experiments per shard")
+    parser.add_argument("-n", "--shards", type=int, default=os.cpu_count(), help="number of shards")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of shards running at the same time")
+    if cipher == "simeck":
+        parser.add_argument("-v", "--variant", type=int, choices=[32, 48, 64], default=32, help="block size of Simeck")
+    if cipher == "skinny":
+        parser.add_argument("-dk", "--tweakey", type=str, default=None, help="tweakey difference (overrides the summary)")
+        parser.add_argument("-v", "--version", type=int, default=None,
+                            help="SKINNY version (0 = 64-64, 1 = 64-128, 2 = 64-192, 3 = 128-128, 4 = 128-256, 5 = 128-384)")
+    args = parser.parse_args()
+
+    program = f"simeck{args.variant}" if cipher == "simeck" else cipher
+    if program not in VERIFIERS:
+        parser.error(f"There is no verification program for {cipher}")
+    values = dict()
+    version = None
+    if args.inputfile is not None:
+        with open(args.inputfile, "r") as fileobj:
+            parts = parse_attack_summary(fileobj.read())
+        version = parts.pop("version", None)
+        part = args.part or ("distinguisher" if "distinguisher" in parts else "middle")
+        if part not in parts:
+            parser.error(f"No {part} found in {args.inputfile}")
+        values = parts[part]
+    if args.difference is not None:
+        values["dp"] = args.difference
+    if args.mask is not None:
+        values["lc"] = args.mask
+    if "dp" not in values or "lc" not in values:
+        parser.error("The input difference and output mask are required (-i or -dp/-lc)")
+    constants = {"DL_ROUNDS": args.rounds, "DL_DP": values["dp"], "DL_LC": values["lc"],
+                 "DL_DEG1": args.deg1, "DL_DEG2": args.deg2, "DL_EXPERIMENTS": args.experiments}
+    if cipher == "skinny":
+        constants["DL_DK"] = args.tweakey or values.get("dk")
+        constants["DL_VERSION"] = args.version if args.version is not None else version
+
+    print(f"Run ID: {run_id()}, outputs in {run_directory()}")
+    start_time = time.time()
+    result, shards = verify(program, constants, shards=args.shards, jobs=args.jobs)
+    elapsed_time = time.time() - start_time
+    print(f"Input difference: {values['dp']}, output mask: {values['lc']}, rounds: {args.rounds}")
+    print(f"Shards: {args.shards}, experiments: {result.experiments}, total queries: 2^({math.log2(result.queries):.2f})")
+    if result.correlation > 0:
+        print(f"Average correlation = 2^({math.log2(result.correlation):.4f})")
+    else:
+        print("Average correlation = 0")
+    print(f"Variance over the experiments = {result.variance:.4e}, standard error = {result.standard_error:.4e}")
+    print("Elapsed time: %0.02f seconds" % elapsed_time)
+    write_summary({"program": program, "constants": constants, "shards": args.shards,
+                   "correlation": result.correlation, "variance": result.variance,
+                   "standard_error": result.standard_error, "experiments": result.experiments,
+                   "queries": result.queries, "results": shards, "time": elapsed_time},
+                  file_name="verification.json")
@@ -0,0 +1,168 @@
+"""
+MIT License
+
+Copyright (c) 2024 Hosein Hadipour
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+
+Warm start of the bit-level MILPs that instantiate a truncated trail.
+
+The truncated trail is passed to the bit-level models as zero-fixings of the
+inactive cells (in all rounds, or only at both ends of the trail), and the
+models used to start the branch-and-bound from scratch. Here, before the
+actual solve:
+
+  - the bits of the cells that are inactive in the truncated trail get the
+    hint 0 (VarHintVal), i.e., Gurobi branches towards the truncated
+    activity pattern without being restricted to it,
+  - a fast instantiation is computed on a copy of the model in which these
+    bits are fixed to 0, solved with MIPFocus = 1 and a small time limit
+    and optimality gap, so that the active S-boxes take (nearly) their
+    minimum-weight transitions,
+  - its solution becomes the MIP start of the model, and its weight the
+    cutoff, so that Gurobi only explores the nodes that can improve on it.
+
+The solution of the restricted copy is feasible for the original model,
+hence the optimum of the original model is never changed by the warm start.
+"""
+
+import math
+
+DEFAULT_TIME_LIMIT = 30
+DEFAULT_MIP_GAP = 0.05
+CUTOFF_TOLERANCE = 1e-4
+
+
+def greedy_time_limit(time_limit=None):
+    """
+    Time budget of the fast instantiation for a solve limited to time_limit seconds
+    """
+
+    if time_limit is None or time_limit < 0:
+        return DEFAULT_TIME_LIMIT
+    return min(DEFAULT_TIME_LIMIT, max(1, time_limit/10))
+
+
+def objective_value(model, solution, objective=None):
+    """
+    Evaluate the objective of model (or the given (coefficients, variables)) at solution
+
+    :param model: gurobipy.Model
+    :param dict solution: maps variable names to their values
+    :param tuple objective: optional (coefficients, variables) to evaluate instead
+    """
+
+    if objective is not None:
+        coefficients, variables = objective
+        return sum(c*solution[v] for c, v in zip(coefficients, variables))
+    expression = model.getObjective()
+    return expression.getConstant() + sum(expression.getCoeff(i)*solution[expression.getVar(i).VarName]
+                                          for i in range(expression.size()))
+
+
+def greedy_instantiation(model, zero_variables=(), time_limit=DEFAULT_TIME_LIMIT, objective=None, mip_gap=DEFAULT_MIP_GAP):
+    """
+    Quickly find a solution of model in which the zero_variables are all 0
+
+    :param model: gurobipy.Model (not modified)
+    :param list zero_variables: names of the variables fixed to 0 in the restricted copy (unknown names are ignored)
+    :param float time_limit: time limit of the restricted solve in seconds
+    :param tuple objective: optional (coefficients, variables) minimized instead of the objective of model
+    :param float mip_gap: relative optimality gap of the restricted solve
+    :return: (value of the minimized objective, solution as a dict) or None if no solution was found
+    """
+
+    from gurobipy import LinExpr, GRB
+    model.update()
+    restricted = model.copy()
+    restricted.Params.OutputFlag = False
+    restricted.Params.MIPFocus = 1
+    restricted.Params.MIPGap = mip_gap
+    restricted.Params.TimeLimit = time_limit
+    for name in zero_variables:
+        var = restricted.getVarByName(name)
+        if var is not None:
+            var.UB = 0
+    if objective is not None:
+        coefficients, variables = objective
+        restricted.setObjective(LinExpr(list(coefficients), [restricted.getVarByName(v) for v in variables]), GRB.MINIMIZE)
+    restricted.optimize()
+    if restricted.SolCount == 0:
+        return None
+    solution = {var.VarName: var.X for var in restricted.getVars()}
+    return restricted.ObjVal, solution
+
+
+def set_start(model, solution, cutoff=True):
+    """
+    Use solution as the MIP start of model, and its objective value (plus a tolerance) as the cutoff
+
+    :return: objective value of model at solution
+    """
+
+    for var in model.getVars():
+        value = solution.get(var.VarName)
+        if value is not None:
+            var.Start = round(value) if var.VType != "C" else value
+    value = objective_value(model, solution)
+    if cutoff:
+        model.Params.Cutoff = value + max(CUTOFF_TOLERANCE, CUTOFF_TOLERANCE*abs(value))
+    model.update()
+    return value
+
+
+def warm_start(model, zero_variables=(), time_limit=DEFAULT_TIME_LIMIT, cutoff=True):
+    """
+    Hint the zero_variables to 0, and seed model with the fast instantiation restricted to them
+
+    :param model: gurobipy.Model to be solved for its minimum objective value
+    :param list zero_variables: variables which are 0 in the truncated trail
+    :param float time_limit: time limit of the fast instantiation
+    :param bool cutoff: also set the weight of the fast instantiation as the cutoff
+    :return: weight of the fast instantiation, or None if it failed (then only the hints are set)
+    """
+
+    for name in zero_variables:
+        var = model.getVarByName(name)
+        if var is not None:
+            var.VarHintVal = 0
+    incumbent = greedy_instantiation(model, zero_variables, time_limit)
+    if incumbent is None:
+        print("Warm start: no instantiation of the truncated trail within %0.02f seconds" % time_limit)
+        return None
+    value = set_start(model, incumbent[1], cutoff=cutoff)
+    if math.isfinite(value):
+        print("Warm start: instantiation of the truncated trail with weight %0.02f" % value)
+    return value
+
+
+def truncated_zero_bits(pattern, name, cell_size, cells=None):
+    """
+    Names of the bit variables of the inactive cells in a truncated state
+
+    :param pattern: truncated state, e.g., '0101...' (one character per cell) or a list of 0/1
+    :param name: function mapping (cell, bit) to the variable name, e.g., lambda c, b: f"x_3_{c}_{b}"
+    :param int cell_size: number of bits per cell
+    :param list cells: optional subset of the cells to consider
+    """
+
+    if cells is None:
+        cells = range(len(pattern))
+    return [name(cell, bit) for cell in cells if str(pattern[cell]) == "0" for bit in range(cell_size)]
@@ -26,4 +26,5 @@ source "$HOME/dlvenv/bin/activate"
 pip install --upgrade pip
 pip install minizinc
 pip install sagemath  # Note: this is not the full SageMath system
-pip install gurobipy
\ No newline at end of file
+pip install gurobipy scipy
+pip install ortools
\ No newline at end of file
@@ -25,10 +25,16 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import logging
 from pathlib import Path
 from random import randint
-logging.basicConfig(filename="minizinc-python.log", level=logging.DEBUG)
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import configure_logging, output_path, run_directory, run_id, write_summary
+from dlcore.anytime import stream_solutions
+from dlcore.portfolio import race
+from dlcore.flatzinc import CompiledInstance, time_split
+from dlcore.cpsat import CpSatModel
 import time
 import minizinc
 import datetime
@@ -73,11 +79,19 @@ class DiffLin:
             if self.cp_solver_name == "ortools":
                 self.cp_solver_name = "com.google.ortools.sat"
         #################################################        
-        self.cp_solver = minizinc.Solver.lookup(self.cp_solver_name)
+        if param["backend"] == "minizinc":
+            self.cp_solver = minizinc.Solver.lookup(self.cp_solver_name)
         self.time_limit = param["timelimit"]
+        self.target = param["target"]
+        self.stall = param["stall"]
+        self.portfolio = param["portfolio"]
+        self.prune = param["prune"]
+        self.backend = param["backend"]
+        # configuration under which the winners of the solver portfolio are recorded
+        self.configuration = "knot " + " ".join(f"{name}={param[name]}" for name in ["RU", "RM", "RL", "RMU", "RML", "L", "nc"])
         self.num_of_threads = param["np"]
         self.mzn_file_name = None
-        self.output_file_name = param["output"]
+        self.output_file_name = output_path(param["output"])
         self.mzn_file_name = "attack.mzn"
     
     #############################################################################################################################################
@@ -103,27 +117,56 @@ class DiffLin:
         start_time = time.time()
         #############################################################################################################################################
         print(f"Searching a distinguisher for {self.RD} rounds of KNOT-{4*self.nc} ...")
-        self.cp_model = minizinc.Model()
-        self.cp_model.add_file(self.mzn_file_name)
-        self.cp_inst = minizinc.Instance(solver=self.cp_solver, model=self.cp_model)
-        self.cp_inst["RU"] = self.RU
-        self.cp_inst["RM"] = self.RM
-        self.cp_inst["RL"] = self.RL
-        self.cp_inst["RMU"] = self.RMU
-        self.cp_inst["RML"] = self.RML
-        self.cp_inst["nc"] = self.nc
-        self.cp_inst["is_limited"] = self.is_limited
-        self.cp_inst["offset"] = 0
-        self.result = self.cp_inst.solve(timeout=time_limit, 
-                                         processes=self.num_of_threads, 
-                                         verbose=False, 
-                                         debug_output=Path("./debug_output.txt",
-                                         intermediate_solutions=True),
-                                         random_seed=randint(0, 100),
-                                         optimisation_level=2)
+        if self.backend == "cpsat":
+            self.cp_model = self.build_cpsat_model()
+            self.result = self.cp_model.solve(self.report_solution,
+                                              timeout=time_limit,
+                                              target=self.target,
+                                              stall=self.stall,
+                                              num_workers=self.num_of_threads,
+                                              random_seed=randint(0, 100),
+                                              hint_key=self.configuration)
+        else:
+            self.cp_model = minizinc.Model()
+            self.cp_model.add_file(self.mzn_file_name)
+            self.cp_inst = CompiledInstance(solver=self.cp_solver, model=self.cp_model)
+            self.cp_inst["RU"] = self.RU
+            self.cp_inst["RM"] = self.RM
+            self.cp_inst["RL"] = self.RL
+            self.cp_inst["RMU"] = self.RMU
+            self.cp_inst["RML"] = self.RML
+            self.cp_inst["nc"] = self.nc
+            self.cp_inst["is_limited"] = self.is_limited
+            self.cp_inst["offset"] = 0
+            if self.portfolio is None:
+                self.result = stream_solutions(self.cp_inst, self.report_solution,
+                                               timeout=time_limit,
+                                               target=self.target,
+                                               stall=self.stall,
+                                               processes=self.num_of_threads,
+                                               verbose=False,
+                                               debug_output=Path(output_path("debug_output.txt")),
+                                               random_seed=randint(0, 100),
+                                               optimisation_level=2)
+            else:
+                self.result = race(self.cp_inst, self.report_solution,
+                                   portfolio=self.portfolio,
+                                   key=self.configuration,
+                                   prune=self.prune,
+                                   timeout=time_limit,
+                                   target=self.target,
+                                   stall=self.stall,
+                                   processes=self.num_of_threads,
+                                   verbose=False,
+                                   debug_output=Path(output_path("debug_output.txt")),
+                                   random_seed=randint(0, 100),
+                                   optimisation_level=2)
         #############################################################################################################################################
         elapsed_time = time.time() - start_time
         print("Time used to find a distinguisher: {:0.02f} seconds".format(elapsed_time))
+        self.times = time_split(self.result.statistics, elapsed_time)
+        print("Time used to compile the model: {:0.02f} seconds{}, to solve it: {:0.02f} seconds".format(
+              self.times["compile_time"], " (cached)" if self.times["compile_cached"] else "", self.times["solve_time"]))
         print(f"Solver status: {self.result.status}")
         if minizinc.Status.has_solution(self.result.status) or self.result.status == minizinc.Status.ERROR:
             self.attack_summary, self.upper_trail, self.lower_trail = self.parse_solution()
@@ -133,6 +176,10 @@ class DiffLin:
             print("-Log2(P)              ~= \t{:02d}".format(self.result["PU"]))
             print("-Log2(r)              ~= \t{:02d}".format(self.result["CM"]))
             print("-Log2(Q^2)            ~= \t{:02d}".format(self.result["CL"]))
+            write_summary({"RU": self.RU, "RM": self.RM, "RL": self.RL, "RMU": self.RMU, "RML": self.RML,
+                           "status": str(self.result.status), "objective": self.result.objective, "time": elapsed_time, **self.times,
+                           "PU": self.result["PU"], "CM": self.result["CM"], "CL": self.result["CL"],
+                           "estimate": -(self.result["PU"] + self.result["CM"] + self.result["CL"])})
         elif self.result.status == minizinc.Status.UNSATISFIABLE:
             print("Model is unsatisfiable") 
         elif self.result.status == minizinc.Status.UNKNOWN:
@@ -140,6 +187,110 @@ class DiffLin:
         else:
             print("Solving process was interrupted")
 
+    def report_solution(self, result, count, elapsed):
+        """
+        Report an improving solution as soon as the solver finds it
+
+        :param minizinc.Result result: the improving solution
+        :param int count: number of solutions found so far
+        :param float elapsed: seconds since the search started
+        """
+
+        self.result = result
+        print(f"Solution {count} found after {elapsed:0.02f} seconds, objective: {result.objective}")
+        self.attack_summary, self.upper_trail, self.lower_trail = self.parse_solution()
+        print(self.attack_summary)
+        draw = DrawDL(self, output_file_name=self.output_file_name)
+        draw.generate_distinguisher_shape()
+
+    def build_cpsat_model(self):
+        """
+        Build the model of attack.mzn directly with CP-SAT (no MiniZinc/FlatZinc in between)
+
+        :rtype CpSatModel:
+        """
+
+        RU, RM, RL, RMU, RML, nc = self.RU, self.RM, self.RL, self.RMU, self.RML, self.nc
+        rotation_dictionary = [0, 1, 8, 25]
+        model = CpSatModel(self.mzn_file_name)
+        add = model.model.Add
+
+        def column_of(state, column):
+            return [state[row][column] for row in range(4)]
+
+        # EU
+        xu = model.array("xu", [RU + 1, 4, nc], 0, 1)
+        yu = model.array("yu", [RU, 4, nc], 0, 1)
+        pu = model.array("pu", [RU, 2, nc], 0, 1)
+        for r in range(RU):
+            for column in range(nc):
+                model.table("sbox_diff", column_of(xu[r], column) + column_of(yu[r], column) + [pu[r][0][column], pu[r][1][column]])
+            for row in range(4):
+                for column in range(nc):
+                    add(xu[r + 1][row][column] == yu[r][row][(column + rotation_dictionary[row]) % nc])
+        add(sum(sum(row) for row in xu[0]) != 0)
+        # EM (upper part)
+        xmu = model.array("xmu", [RM + 1, 4, nc], -1, 1)
+        ymu = model.array("ymu", [RM, 4, nc], -1, 1)
+        dmu = model.array("dmu", [RM, nc], 0, 1)
+        for row in range(4):
+            for column in range(nc):
+                add(xmu[0][row][column] == xu[RU][row][column])
+        for r in range(RM):
+            for column in range(nc):
+                predicate = "sbox_diff_star_table" if r < RMU else "sbox_diff_m_table"
+                model.table(predicate, column_of(xmu[r], column) + column_of(ymu[r], column) + [dmu[r][column]])
+            for row in range(4):
+                for column in range(nc):
+                    add(xmu[r + 1][row][column] == ymu[r][row][(column + rotation_dictionary[row]) % nc])
+        # EM (lower part)
+        xml = model.array("xml", [RM + 1, 4, nc], -1, 1)
+        yml = model.array("yml", [RM, 4, nc], -1, 1)
+        dml = model.array("dml", [RM, nc], 0, 1)
+        for r in range(RM):
+            for column in range(nc):
+                predicate = "sbox_lin_m_table" if r < RM - RML else "sbox_lin_star_table"
+                model.table(predicate, column_of(yml[r], column) + column_of(xml[r], column) + [dml[r][column]])
+            for row in range(4):
+                for column in range(nc):
+                    add(xml[r + 1][row][column] == yml[r][row][(column + rotation_dictionary[row]) % nc])
+        # EL
+        xl = model.array("xl", [RL + 1, 4, nc], 0, 1)
+        yl = model.array("yl", [RL, 4, nc], 0, 1)
+        pl = model.array("pl", [RL, 2, nc], 0, 1)
+        for row in range(4):
+            for column in range(nc):
+                add(xl[0][row][column] == xml[RM][row][column])
+        for r in range(RL):
+            for column in range(nc):
+                model.table("sbox_lin", column_of(yl[r], column) + column_of(xl[r], column) + [pl[r][0][column], pl[r][1][column]])
+            for row in range(4):
+                for column in range(nc):
+                    add(xl[r + 1][row][column] == yl[r][row][(column + rotation_dictionary[row]) % nc])
+        add(sum(sum(row) for row in xl[RL]) != 0)
+        # objective (offset = 0, see search())
+        PU = model.variable("PU", 0, 4*nc + 5000)
+        CM = model.variable("CM", 0, 4*nc + 5000)
+        CL = model.variable("CL", 0, 4*nc + 5000)
+        NASM = model.variable("NASM", 0, 4*nc + 5000)
+        add(PU == 3*sum(pu[r][0][column] for r in range(RU) for column in range(nc)) +
+                  2*sum(pu[r][1][column] for r in range(RU) for column in range(nc)))
+        add(CM == sum(model.indicator([xmu[RM][row][column], xml[RM][row][column]], [(-1, 0, 1)]*2,
+                                      lambda u, l: (u, l) in [(-1, -1), (-1, 1), (1, -1)])
+                      for row in range(4) for column in range(nc)))
+        add(NASM == 2*sum(model.indicator([dmu[r][column], dml[r][column]], [(0, 1)]*2, lambda u, l: u + l == 2)
+                          for r in range(RM) for column in range(nc)))
+        add(CL == 4*sum(pl[r][0][column] for r in range(RL) for column in range(nc)) +
+                  2*sum(pl[r][1][column] for r in range(RL) for column in range(nc)))
+        if self.is_limited == 1:
+            for column in range(nc):
+                for row in range(2, 4):
+                    add(xu[0][row][column] == 0)
+                for row in range(1, 4):
+                    add(xl[RL][row][column] == 0)
+        model.minimize(nc*PU + CM + nc*CL)
+        return model
+
     #############################################################################################################################################
     #############################################################################################################################################
     #  ____                           _    _             ____          _         _    _               
@@ -268,6 +419,11 @@ def loadparameters(args):
               "nc": 64,
               "np" : 8,
               "tl"  : -1,
+              "target" : None,
+              "stall" : None,
+              "portfolio" : None,
+              "prune" : None,
+            "backend" : "minizinc",
               "solver"  : "ortools",
               "output"  : "output.tex"}
 
@@ -290,6 +446,16 @@ def loadparameters(args):
         params["np"] = args.np
     if args.timelimit is not None:
         params["timelimit"] = args.timelimit
+    if args.target is not None:
+        params["target"] = args.target
+    if args.stall is not None:
+        params["stall"] = args.stall
+    if args.portfolio is not None:
+        params["portfolio"] = args.portfolio
+    if args.prune is not None:
+        params["prune"] = args.prune
+    if args.backend is not None:
+        params["backend"] = args.backend
     if args.solver is not None:
         params["solver"] = args.solver
     if args.output is not None:
@@ -319,16 +485,26 @@ def main():
     parser.add_argument("-np", type=int, default=8, help="Number of parallel threads")
 
     parser.add_argument("-tl", "--timelimit", type=int, default=36000, help="Time limit in seconds")
+    parser.add_argument("--target", type=int, default=None, help="Stop as soon as the objective of the CP model reaches this value")
+    parser.add_argument("--stall", type=int, default=None, help="Stop when no improving solution is found within this many seconds after the previous one")
     # Fetch available solvers from MiniZinc
-    available_solvers = [solver_name for solver_name in minizinc.default_driver.available_solvers().keys()]
+    available_solvers = [solver_name for solver_name in minizinc.default_driver.available_solvers().keys()] if minizinc.default_driver is not None else []
     parser.add_argument("-sl", "--solver", default="cp-sat", type=str,
                         choices=available_solvers,
                         help="Choose a CP solver")  
+    parser.add_argument("-pf", "--portfolio", default=None, type=str,
+                        help="Race several solvers (and seeds), e.g., cp-sat,cp-sat:7,chuffed,gurobi (overrides --solver)")
+    parser.add_argument("--prune", type=int, default=None,
+                        help="Only race the given number of best solvers of the portfolio (according to the past winners)")
+    parser.add_argument("-b", "--backend", default="minizinc", type=str, choices=["minizinc", "cpsat"],
+                        help="Solve attack.mzn through MiniZinc, or build the same model directly with OR-Tools CP-SAT")
     parser.add_argument("-o", "--output", default="output.tex", type=str, help="Output file name")
 
     # Parse command line arguments and construct parameter list
     args = parser.parse_args()
     params = loadparameters(args)
+    configure_logging("minizinc-python.log")
+    print(f"Run ID: {run_id()}, outputs in {run_directory()}")
     dld = DiffLin(params)
     dld.search()
     udiff_effect = dld.compute_clustering_effect()
@@ -33,10 +33,15 @@ for the security of KNOT against differential and differential-linear cryptanaly
 from argparse import ArgumentParser, RawTextHelpFormatter
 import yaml
 import time
-from gurobipy import read
 from gurobipy import GRB
 import math
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.milp import ModelBuilder, GREATER_EQUAL, equality, fix, parity, sum_constraint
+from dlcore.encoding import compile_inequalities
+from dlcore.clustering import WeightLayerEnumerator, DEFAULT_POOL_LIMIT
+from dlcore.cache import cached_solve
 
 
 """
@@ -163,14 +168,19 @@ class Differential:
         self.mode = param['mode']
         self.start_weight = param['sweight']
         self.end_weight = param['endweight']
+        self.convergence = param.get("convergence", None)
+        self.pool_limit = param.get("poollimit", DEFAULT_POOL_LIMIT)
+        self.processes = param.get("processes", 1)
+        self.threads = param.get("threads", None)
         self.eps = 1e-3
         self.exact = exact #A Boolean variable indicating whether we model DDT or *-DDT        
         self.total_weight = None                
-        self.obj_func = ''
+        self.obj_func = ((), ())
         self.used_variables = []
         self.rotation = [0, 1, 8, 25]
         self.pr_weights = [3, 2]
         self.model_filename = f"KNOT-256-{self.no_rounds}r.lp"
+        self.dump_lp = param.get("dumplp", False)
 
         #######################################################################################################
         #######################################################################################################
@@ -258,21 +268,24 @@ class Differential:
                                 '- a1 - a2 + a3 + b0 - b1 + b2 + b3 >= -2',
                                 '- a1 - a2 - a3 + b0 - b1 - b2 + b3 >= -4',
                                 '- a1 - a2 + a3 + b0 - b1 - b2 - b3 >= -4']
-    
+        placeholders = [f"a{3 - row}" for row in range(4)] + [f"b{3 - row}" for row in range(4)]
+        self.sbox_star_template = compile_inequalities(self.sbox_star_model, placeholders)
+        placeholders += [f"p{i}" for i in range(2)]
+        self.sbox_exact_template = compile_inequalities(self.sbox_exact_model, placeholders)
+
     def create_objective_function(self):
         '''
         Create the objective function
         '''
         
+        coefficients = []
         minus_log2_p = []
         if self.exact:
             for round in range(self.no_rounds):
                 for column in range(self.ncolumns):
-                    minus_log2_p += [f"3 pr3_{round}_{column} + 2 pr2_{round}_{column}"]
-            lp_contents = ' + '.join(minus_log2_p)
-        else:
-            lp_contents = "0"        
-        return lp_contents
+                    coefficients += self.pr_weights
+                    minus_log2_p += [f"pr3_{round}_{column}", f"pr2_{round}_{column}"]
+        return coefficients, minus_log2_p
 
     def create_state_variables(self, r, s):
         '''
@@ -322,94 +335,77 @@ class Differential:
         The above inequalities are derived with QuineMcCluskey algorithm
         '''
 
-        lp_contents = ""
-        lp_contents += f"{b} - {a2} - {a1} - {a0} >= -2\n"
-        lp_contents += f"-1 {b} + {a2} - {a1} - {a0} >= -2\n"
-        lp_contents += f"-1 {b} - {a2} + {a1} - {a0} >= -2\n"
-        lp_contents += f"{b} + {a2} + {a1} - {a0} >= 0\n"
-        lp_contents += f"-1 {b} - {a2} - {a1} + {a0} >= -2\n"
-        lp_contents += f"{b} + {a2} - {a1} + {a0} >= 0\n"
-        lp_contents += f"{b} - {a2} + {a1} + {a0} >= 0\n"
-        lp_contents += f"-1 {b} + {a2} + {a1} + {a0} >= 0\n"
-        return lp_contents
+        return parity([b, a2, a1, a0])
     
     def equality(self, x, y):
         '''
         Generate the MILP constraints modeling the equality of two bits
         '''
 
-        lp_contents = f"{x} - {y} = 0\n"
-        return lp_contents
+        return [equality(x, y)]
 
     def linear_layer(self, y, x):
         '''
         Model the MixColumns
         '''
 
-        lp_contents = ""
+        constraints = []
         for row in range(4):
             for col in range(self.ncolumns):                
-                lp_contents += self.equality(x[row][col], y[row][(col + self.rotation[row])%self.ncolumns])
-        return lp_contents
+                constraints += self.equality(x[row][col], y[row][(col + self.rotation[row])%self.ncolumns])
+        return constraints
     
     def subcells_exact(self, x, y, p):
         '''
         Model the 4-bit S-box of KNOT-256 (exact)
         '''
 
-        lp_contents = ""      
-        
+        constraints = []
         for col in range(self.ncolumns):
-            for ineq in self.sbox_exact_model:
-                for row in range(4):
-                    ineq = ineq.replace(f"a{3 - row}", x[row][col])
-                    ineq = ineq.replace(f"b{3 - row}", y[row][col])
-                for i in range(2):
-                    ineq = ineq.replace(f"p{i}", p[col][i])
-                lp_contents += ineq + "\n"            
-        return lp_contents
+            xcol = [x[row][col] for row in range(4)]
+            ycol = [y[row][col] for row in range(4)]
+            constraints += self.sbox_exact_template.block(xcol + ycol + p[col])
+        return constraints
     
     def subcells_star(self, x, y):
         '''
         Model the 4-bit S-box of KNOT-256 (*-DDT)
         '''
 
-        lp_contents = ""        
+        constraints = []
         for col in range(self.ncolumns):
-            for ineq in self.sbox_star_model:
-                for row in range(4):
-                    ineq = ineq.replace(f"a{3 - row}", x[row][col])
-                    ineq = ineq.replace(f"b{3 - row}", y[row][col])
-                lp_contents += ineq + "\n"            
-        return lp_contents
+            xcol = [x[row][col] for row in range(4)]
+            ycol = [y[row][col] for row in range(4)]
+            constraints += self.sbox_star_template.block(xcol + ycol)
+        return constraints
 
     def knot_permutation(self):
         '''
         Generate the MILP constraints modeling the propagation of differences through the permutation
         '''
         
-        lp_contents = ""
+        constraints = []
         for r in range(self.no_rounds):
             x = self.create_state_variables(r, 'x')
             y = self.create_state_variables(r, 'y')
             if self.exact:
                 p = self.create_probability_variables(r)
-                lp_contents += self.subcells_exact(x, y, p)
+                constraints += self.subcells_exact(x, y, p)
             else:
-                lp_contents += self.subcells_star(x, y)
+                constraints += self.subcells_star(x, y)
             x_next = self.create_state_variables(r + 1, 'x')
-            lp_contents += self.linear_layer(y, x_next)
-        return lp_contents
+            constraints += self.linear_layer(y, x_next)
+        return constraints
     
     def exclude_trivial_trail(self):
-        lp_contents = ""
+        constraints = []
         x = self.create_state_variables(0, 'x')
         temp = self.flatten(x)
-        lp_contents += " + ".join(temp) + " >= 1\n"
-        return lp_contents
+        constraints.append(sum_constraint(temp, GREATER_EQUAL, 1))
+        return constraints
     
     def declare_fixed_variables(self):
-        lp_contents = ""
+        constraints = []
         for cond in self.fixed_variables.items():            
             var = cond[0]
             val = cond[1]
@@ -418,41 +414,34 @@ class Differential:
             state_vars = [f"{var[0]}_{var[1]}_{var[2]}_{i}" for i in range(self.ncolumns)]
             for i in range(self.ncolumns):
                 if val[i] != "?":
-                    lp_contents += f"{state_vars[i]} = {val[i]}\n"
-        return lp_contents
+                    constraints.append(fix(state_vars[i], val[i]))
+        return constraints
 
     def declare_variables_type(self):
         '''
-        Specifying variables' type in the LP file
+        Specifying variables' type in the MILP model
         '''
         
-        lp_contents = 'binary\n'
         self.used_variables = list(set(self.used_variables))
-        for var in self.used_variables:
-            lp_contents += var + '\n'            
-        lp_contents += "end\n"
-        return lp_contents
+        return self.used_variables
 
     def make_model(self):
         '''
         Generate the MILP model of Skinny-128-256 for differential cryptanalysis
         '''
         
-        lp_contents = ""
         print('Generating the MILP model ...')
-        lp_contents += "minimize\n"
+        builder = ModelBuilder(f"Differential analysis of KNOT-256 ({self.no_rounds} rounds)")
         self.obj_func = self.create_objective_function()
-        lp_contents += self.obj_func
-        lp_contents += "\nsubject to\n"
-        lp_contents += self.exclude_trivial_trail()
-        lp_contents += self.knot_permutation()
-        lp_contents += self.declare_fixed_variables()
-        lp_contents += self.declare_variables_type()
-        if os.path.exists(self.model_filename):
-            os.remove(self.model_filename)
-        with open(self.model_filename, 'w') as fileobj:
-            fileobj.write(lp_contents)
-        print(f"MILP model was written into {self.model_filename}\n")  
+        builder.set_objective(*self.obj_func)
+        builder.add_constraints(self.exclude_trivial_trail())
+        builder.add_constraints(self.knot_permutation())
+        builder.add_constraints(self.declare_fixed_variables())
+        builder.declare_binary(self.declare_variables_type())
+        self.model = builder.build()
+        if self.dump_lp:
+            lp_file_name = builder.write_lp(self.model, self.model_filename)
+            print(f"MILP model was written into {lp_file_name}\n")
 
     
     def find_characteristic(self):
@@ -548,69 +537,31 @@ class Differential:
     def compute_differential_effect(self, log=1):
         '''
         Compute the differential effect for a given input/output differences
-
-        Some general information about Gurobi:
-
-        PoolSolutions: It controls the size of the solution pool. Changing this parameter won't affect the number of solutions that are found - 
-        it simply determines how many of those are retained
-
-        You can use the PoolSearchMode parameter to control the approach used to find solutions. In its default setting (0), the MIP search simply aims to find one optimal solution. 
-        Setting the parameter to 2 causes the MIP to do a systematic search for the n best solutions. With a setting of 2, it will find the n best solutions, 
-        where n is determined by the value of the PoolSolutions parameter        
-
-        SolCount: Number of solutions found during the most recent optimization.
-        
-        Model status:
-        LOADED	1	Model is loaded, but no solution information is available.
-        OPTIMAL	2	Model was solved to optimality (subject to tolerances), and an optimal solution is available.
-        INFEASIBLE	3	Model was proven to be infeasible.
+        The trails are counted weight layer by weight layer (see dlcore/clustering.py).
+        The enumeration stops when the model has no more solutions, when the weight
+        exceeds end_weight, or when the last layer changes log2 of the probability
+        by less than the convergence threshold (if given).
         '''
-        
+
         status = False
         if self.time_limit != -1:
             self.model.Params.TIME_LIMIT = self.time_limit
-        #self.model.Params.PreSolve = 0 # Activating this flag causes the performance to be decreased        
-        self.model.Params.PoolSearchMode = 2
-        self.model.Params.PoolSolutions = 1
-        self.model.Params.OutputFlag = False                
-        obj = self.model.getObjective()
-        # Consider the start_weight
-        if self.start_weight != None:            
-            self.model.addConstr(obj >= self.start_weight, 'start_weight_constraint')       
-        time_start = time.time()
-        self.model.optimize()
-        if (self.model.Status == GRB.OPTIMAL):
-            status = True
-            self.total_weight = self.model.objVal
-            diff_prob = 0
-            print('\n')
-            while (self.model.Status == GRB.OPTIMAL and self.total_weight <= self.end_weight):
-                self.total_weight = self.model.objVal
-                self.model.Params.PoolSolutions = 2000000000 #GRB.MAXIN, Default value for PoolSolutions: 10                
-                temp_constraint = self.model.addConstr(obj == self.total_weight, name='temp_constraint')
-                self.model.update()
-                #self.model.Params.PreSolve = 1
-                self.model.optimize()
-                diff_prob += math.pow(2, -self.total_weight) * self.model.SolCount
-                time_end = time.time()
-                if log == 1:
-                    print('Current weight: %s' % str(self.total_weight))
-                    print('Number of trails: %s' % str(self.model.SolCount))
-                    print('\tCurrent Probability: 2^(' + str(math.log(diff_prob, 2)) + ')')
-                    print('Time used = %0.4f seconds\n' % (time_end - time_start))
-                self.model.remove(temp_constraint)
-                self.model.Params.PoolSolutions = 1                
-                self.model.addConstr(obj >= (self.total_weight + self.eps))
-                #self.model.Params.PreSolve = 0
-                self.model.optimize()
-        elif (self.model.Status == GRB.INFEASIBLE):
-            print('The model is infeasible!')
-            return status
-        else: 
-            print('Unknown Error!')
+        self.model.Params.OutputFlag = False
+        enumerator = WeightLayerEnumerator(self.model,
+                                           start_weight=self.start_weight,
+                                           end_weight=self.end_weight,
+                                           threshold=self.convergence,
+                                           pool_limit=self.pool_limit,
+                                           processes=self.processes,
+                                           threads=self.threads,
+                                           eps=self.eps,
+                                           verbose=(log == 1))
+        effect = enumerator.run()
+        if effect is None:
             return status
-        print("Total weight = {:0.02f}".format(math.log(diff_prob, 2)))
-        return math.log(diff_prob, 2)
+        self.total_weight = enumerator.weight
+        print("Total weight = {:0.02f}".format(effect))
+        return effect
             
     def compute_differential_effect_classic_method(self):
         status = False
@@ -666,8 +617,8 @@ class Differential:
         lhs = first_term - second_term
         self.model.addConstr(lhs <= support - 1)
 
+    @cached_solve
     def solve(self, log=1, solution_limit=None, mip_focus=None):        
-        self.model = read(self.model_filename)
         if solution_limit != None:
             self.model.Params.SolutionLimit = solution_limit
         if mip_focus != None:
@@ -682,7 +633,6 @@ class Differential:
             # self.compute_differential_effect_classic_method()
         else:
             print("mode should be in [0, 1, 2]")
-        os.remove(self.model_filename)
         return status
 
     def parse_solver_output(self):
@@ -786,9 +736,24 @@ def loadparameters(args):
     if args.endweight:
         params["endweight"] = args.endweight[0]
     
+    if args.convergence:
+        params["convergence"] = args.convergence[0]
+    
+    if args.poollimit:
+        params["poollimit"] = args.poollimit[0]
+    
+    if args.processes:
+        params["processes"] = args.processes[0]
+    
+    if args.threads:
+        params["threads"] = args.threads[0]
+    
     if args.timelimit:
         params["timelimit"] = args.timelimit[0]
 
+    if args.dumplp:
+        params["dumplp"] = True
+
     return params
 
 def main():
@@ -816,8 +781,18 @@ def main():
                         help="starting weight for the trail search")
     parser.add_argument("-ew", "--endweight", nargs=1, type=int,
                         help="ending weight for the trail search")
+    parser.add_argument("-cv", "--convergence", nargs=1, type=float,
+                        help="stop when a new weight layer changes log2 of the probability by less than this value")
+    parser.add_argument("-pl", "--poollimit", nargs=1, type=int,
+                        help="size of the solution pool used to enumerate the weight layers")
+    parser.add_argument("-np", "--processes", nargs=1, type=int,
+                        help="number of worker processes counting the weight layers in parallel (mode 2)")
+    parser.add_argument("-th", "--threads", nargs=1, type=int,
+                        help="number of Gurobi threads of each worker process")
     parser.add_argument("-t", "--timelimit", nargs=1, type=int,
-                        help="time limit for the search")       
+                        help="time limit for the search")
+    parser.add_argument("--dumplp", action="store_true",
+                        help="write the MILP model into an .lp file (for debugging)")       
 
     # Parse command line arguments and construct parameter list
     args = parser.parse_args()
@@ -29,6 +29,13 @@ or Markov cipher assumption. The tool's primary function is to find some bounds
 for the security of LBlock against differential linear and differential-linear cryptanalysis.
 """
 
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import run_directory, run_id, write_summary
+from dlcore.candidates import distinct_solutions, rank_candidates, ranking_table, truncated_trail_key
+from dlcore.warmstart import truncated_zero_bits
+from dlcore.estimator import estimate_correlation, instantiate
 from argparse import ArgumentParser, RawTextHelpFormatter
 from truncdifflin import TruncatedDL
 from diff import Diff
@@ -39,6 +46,85 @@ golden_value_diff = ["1", "0", "1", "0"]
 # golden_value_diff = ["0", "0", "1", "1"]
 golden_value_lin = ["0", "0", "0", "1"]
 
+def instantiate_upper_trail(trunc_upper_trail, RU):
+    """
+    Instantiate the truncated upper trail with a differential trail and compute its differential effect
+    (solved in a worker process, concurrently with the lower trail, see dlcore/pipeline.py)
+    """
+
+    time_limit = 18000
+    params = {"nrounds" : RU,
+              "mode" : 0,
+              "startweight" : 0,
+              "endweight" : 128,
+              "timelimit" : time_limit,
+              "numberoftrails" : 1,
+              "fixedVariables" : {}}
+    for nibble in range(16):
+        if trunc_upper_trail[f"x_0"][nibble] == "0":
+            for bit in range(4):
+                params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = "0"
+        if trunc_upper_trail[f"x_{RU}"][nibble] == "0":
+            for bit in range(4):
+                params["fixedVariables"][f"x_{RU}_{nibble}_{bit}"] = "0"
+        if trunc_upper_trail[f"x_{RU}"][nibble] == "1":
+            for bit in range(4):
+                params["fixedVariables"][f"x_{RU}_{nibble}_{bit}"] = golden_value_diff[bit]
+    # hint the inner rounds to the truncated upper trail, and seed the solver
+    # with a fast instantiation of it (see dlcore/warmstart.py)
+    params["warmstart"] = True
+    params["warmstartzeros"] = [v for r in range(1, RU)
+                                for v in truncated_zero_bits(trunc_upper_trail[f"x_{r}"], lambda nibble, bit: f"x_{r}_{nibble}_{bit}", 4)]
+    diff = Diff(params)
+    diff.make_model()
+    upper_trail = diff.solve()
+    params["fixedVariables"] = {"x_0": upper_trail["x_0"], f"x_{RU}": upper_trail[f"x_{RU}"]}
+    params["mode"] = 2
+    diff = Diff(params)
+    diff.make_model()
+    diff_effect_upper = diff.solve()
+    return upper_trail, diff_effect_upper
+
+def instantiate_lower_trail(trunc_lower_trail, RM, RL):
+    """
+    Instantiate the truncated lower trail with a linear trail and compute its squared correlation
+    (solved in a worker process, concurrently with the upper trail, see dlcore/pipeline.py)
+    """
+
+    time_limit = 18000
+    params = {"nrounds" : RL,
+              "mode" : 0,
+              "startweight" : 0,
+              "endweight" : 128,
+              "timelimit" : time_limit,
+              "numberoftrails" : 1,
+              "fixedVariables" : {}}
+    for nibble in range(16):
+        if trunc_lower_trail[f"x_{RM}"][nibble] == "0":
+            for bit in range(4):
+                params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = "0"
+        if trunc_lower_trail[f"x_{RM}"][nibble] == "1":
+            for bit in range(4):
+                params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = golden_value_lin[bit]
+        if trunc_lower_trail[f"x_{RM + RL}"][nibble] == "0":
+            for bit in range(4):
+                params["fixedVariables"][f"x_{RL}_{nibble}_{bit}"] = "0"
+    # hint the inner rounds to the truncated lower trail, and seed the solver
+    # with a fast instantiation of it (see dlcore/warmstart.py)
+    params["warmstart"] = True
+    params["warmstartzeros"] = [v for r in range(1, RL)
+                                for v in truncated_zero_bits(trunc_lower_trail[f"x_{RM + r}"], lambda nibble, bit: f"x_{r}_{nibble}_{bit}", 4)]
+    lin = Lin(params)
+    lin.make_model()
+    lower_trail = lin.solve()
+    params["fixedVariables"] = {"x_0": lower_trail["x_0"], f"x_{RL}": lower_trail[f"x_{RL}"]}
+    params["mode"] = 0
+    lin = Lin(params)
+    lin.make_model()
+    linear_trail = lin.solve()
+    lin_effect_lower = -1*float(linear_trail['total_weight'])
+    return lower_trail, lin_effect_lower
+
 def main():
 
     parser = ArgumentParser(description="This tool finds the nearly optimum differential-linear distinguisher\n"
@@ -66,87 +152,54 @@ def main():
     parser.add_argument('-tl', '--timelimit', type=int,
                         help="time limit in seconds")
     parser.add_argument('-ns', '--numofsols', type=int,
-                        help="number of solutions (currently disabled)")
+                        help="number of distinct truncated trails to instantiate and rank")
+    parser.add_argument('-e', '--experiment', type=int,
+                        help="log2 of the number of pairs to evaluate the distinguisher experimentally (0: disabled)")
 
     # Parse command line arguments and construct parameter list.
     args = parser.parse_args()
     params = loadparameters(args)
+    print(f"Run ID: {run_id()}, outputs in {run_directory()}")
     RU, RM, RL = params["RU"], params["RM"], params["RL"]
+    numofsols = params["numofsols"]
     RMU, RML = params["RMU"], params["RML"]
+    experiment = params["experiment"]
     WU, WM, WL = params["WU"], params["WM"], params["WL"]
 
     assert(RM > 0)
     # tex_content = tex_init()
     ##############################################################################################
     ##############################################################################################
-    # Step1- Find a truncated differential-linear trail
+    # Step1- Find the numofsols best (pairwise non-equivalent) truncated differential-linear trails
     DL = TruncatedDL(RU=RU, RL=RL, RM=RM, RMU=RMU, RML=RML, WU=WU, WL=WL, WM=WM)
     DL.iterative = False
-    DL.find_truncated_dl_trail()
-    trunc_upper_trail, middle_part, trunc_lower_trail = DL.parse_solver_output()
+    DL.find_truncated_dl_trail(number_of_solutions=numofsols)
+    candidates = distinct_solutions(DL.milp_model, DL.parse_solver_output,
+                                    key=lambda trail: truncated_trail_key(trail, RU, RM, RL),
+                                    number_of_solutions=numofsols)
     ##############################################################################################
     ##############################################################################################
-    # Step2- Instantiate the upper/lower truncated trails with real differential trails
-    upper_trail = None
-    diff_effect_upper = 0
-    if RU != 0:
-        time_limit = 18000
-        params = {"nrounds" : DL.RU,
-                  "mode" : 0,
-                  "startweight" : 0,
-                  "endweight" : 128,
-                  "timelimit" : time_limit,
-                  "numberoftrails" : 1,
-                  "fixedVariables" : {}}
-        for nibble in range(16):
-            if trunc_upper_trail[f"x_0"][nibble] == "0":
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = "0"
-            if trunc_upper_trail[f"x_{DL.RU}"][nibble] == "0":
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{DL.RU}_{nibble}_{bit}"] = "0"
-            if trunc_upper_trail[f"x_{DL.RU}"][nibble] == "1":
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{DL.RU}_{nibble}_{bit}"] = golden_value_diff[bit]
-        diff = Diff(params)
-        diff.make_model()
-        upper_trail = diff.solve()
-        params["fixedVariables"] = {"x_0": upper_trail["x_0"], f"x_{DL.RU}": upper_trail[f"x_{DL.RU}"]}
-        params["mode"] = 2
-        diff = Diff(params)
-        diff.make_model()
-        diff_effect_upper = diff.solve()
-    ##############################################################################################
-    lower_trail = None
-    lin_effect_lower = 0
-    if RL != 0:
-        time_limit = 18000
-        params = {"nrounds" : DL.RL,
-                  "mode" : 0,
-                  "startweight" : 0,
-                  "endweight" : 128,
-                  "timelimit" : time_limit,
-                  "numberoftrails" : 1,
-                  "fixedVariables" : {}}
-        for nibble in range(16):
-            if trunc_lower_trail[f"x_{DL.RM}"][nibble] == "0":
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = "0"
-            if trunc_lower_trail[f"x_{DL.RM}"][nibble] == "1":
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = golden_value_lin[bit]
-            if trunc_lower_trail[f"x_{DL.R1}"][nibble] == "0":
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{DL.RL}_{nibble}_{bit}"] = "0"
-        lin = Lin(params)
-        lin.make_model()
-        lower_trail = lin.solve()
-        params["fixedVariables"] = {"x_0": lower_trail["x_0"], f"x_{DL.RL}": lower_trail[f"x_{DL.RL}"]}
-        params["mode"] = 0
-        lin = Lin(params)
-        lin.make_model()
-        linear_trail = lin.solve()
-        lin_effect_lower = -1*float(linear_trail['total_weight'])
+    # Step2- Instantiate the upper/lower truncated trails with real differential trails for every candidate
+    # All branches are independent, and solved concurrently (see dlcore/pipeline.py).
+    # The candidates are ranked by the bounds on the total correlation p*r*q^2
+    def candidate_jobs(candidate):
+        trunc_upper_trail, middle_part, trunc_lower_trail = candidate
+        jobs = dict()
+        if RU != 0:
+            jobs["upper"] = (instantiate_upper_trail, (trunc_upper_trail, RU))
+        if RL != 0:
+            jobs["lower"] = (instantiate_lower_trail, (trunc_lower_trail, RM, RL))
+        return jobs
+    def correlation_bounds(candidate, results):
+        total_weight = results.get("upper", (None, 0))[1] + results.get("lower", (None, 0))[1]
+        return (total_weight + (-1)*candidate[1]["as"], total_weight + (-2)*candidate[1]["as"])
+    ranking = rank_candidates(candidates, candidate_jobs, correlation_bounds)
+    if len(ranking) > 1:
+        print("Ranking of the candidates (log2):")
+        print(ranking_table(ranking, score_names=("upper_bound", "lower_bound")))
+    trunc_upper_trail, middle_part, trunc_lower_trail = ranking[0].trail
+    upper_trail, diff_effect_upper = ranking[0].results.get("upper", (None, 0))
+    lower_trail, lin_effect_lower = ranking[0].results.get("lower", (None, 0))
     ##############################################################################################
     ##############################################################################################
     # print out a summary of result on terminal
@@ -154,14 +207,14 @@ def main():
     print("Summary of the results:")
     print("Upper trail:")
     if upper_trail != None:
-        diff.print_trail(diff_trail=upper_trail)
+        Diff.print_trail(diff_trail=upper_trail)
     print("#"*27)
     mactive_sboxes = middle_part["as"]
     print(f"Sandwich {RM} rounds in the middle with {mactive_sboxes} active S-boxes")
     print("#"*27)
     print("Lower trail:")
     if lower_trail != None:
-        lin.print_trail(diff_trail=lower_trail)
+        Lin.print_trail(diff_trail=lower_trail)
     print("-"*27)
     total_weight = 0
     if diff_effect_upper != 0:
@@ -174,6 +227,26 @@ def main():
     lower_bound = total_weight + (-2)*mactive_sboxes
     print("Total correlation = p*r*q^2 = 2^({:.2f}) x r x 2^({:.2f})".format(diff_effect_upper, lin_effect_lower))
     print("2^({:.2f}) <= Total correlation <= 2^({:.2f})".format(lower_bound, upper_bound))
+    summary = dict()
+    if experiment > 0:
+        # evaluate the whole distinguisher on 2^experiment pairs
+        if upper_trail != None:
+            input_difference = upper_trail["x_0"]
+        else:
+            input_difference = instantiate(trunc_upper_trail["x_0"], golden_value_diff)
+        if lower_trail != None:
+            output_mask = lower_trail[f"x_{RL}"]
+        else:
+            output_mask = instantiate(trunc_lower_trail[f"x_{RM + RL}"], golden_value_lin)
+        estimate = estimate_correlation("lblock", input_difference, output_mask, RU + RM + RL, degree=experiment)
+        print(f"Input difference: {input_difference}, output mask: {output_mask}")
+        print(estimate)
+        summary = {"experimental_correlation": estimate.correlation,
+                   "experimental_interval": [estimate.lower, estimate.upper], "experiment": experiment}
+    write_summary({"RU": RU, "RM": RM, "RL": RL, "RMU": RMU, "RML": RML, "WU": WU, "WM": WM, "WL": WL, "status": "DONE",
+                   "PU": diff_effect_upper, "CM": mactive_sboxes, "CL": lin_effect_lower,
+                   "lower_bound": lower_bound, "upper_bound": upper_bound,
+                   "candidates": [{"solution": c.index, "upper_bound": c.score[0], "lower_bound": c.score[1]} for c in ranking], **summary})
     print("To compute the accurate value of total correlation, evaluate 'r' either experimentally or by using the DLCT framework.")
 
     ##############################################################################################
@@ -199,7 +272,8 @@ def loadparameters(args):
                 "WM" : 2.2,
                 "WL" : 4,
                 "timelimit" : 1200,
-                "numofsols" : 1}
+                "numofsols" : 1,
+                "experiment" : 0}
 
     # Check if there is an input file specified
     if args.inputfile:
@@ -248,6 +322,9 @@ def loadparameters(args):
     if args.numofsols != None:
         params["numofsols"] = args.numofsols
 
+    if args.experiment != None:
+        params["experiment"] = args.experiment
+
     return params
 
 if __name__ == "__main__":
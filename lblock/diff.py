@@ -35,6 +35,14 @@ import time
 from gurobipy import *
 import math
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.milp import ModelBuilder, GREATER_EQUAL, equality, fix, sum_constraint, xor
+from dlcore.encoding import compile_inequalities, sbox_placeholders
+from dlcore.clustering import WeightLayerEnumerator, DEFAULT_POOL_LIMIT
+from dlcore.cache import cached_solve
+from dlcore.warmstart import greedy_time_limit, warm_start
+from dlcore.bnb import BranchAndBound, NibbleCipher, nibble_routes
 
 class Diff:
     """
@@ -62,6 +70,12 @@ class Diff:
         self.time_limit = params["timelimit"]
         self.start_weight = params["startweight"]
         self.end_weight = params["endweight"]
+        self.convergence = params.get("convergence", None)
+        self.pool_limit = params.get("poollimit", DEFAULT_POOL_LIMIT)
+        self.processes = params.get("processes", 1)
+        self.threads = params.get("threads", None)
+        self.warm_start = params.get("warmstart", False)
+        self.warm_start_zeros = params.get("warmstartzeros", [])
         self.fixed_variables = params['fixedVariables']
         self.mode = params['mode']
         self.number_of_trails = params["numberoftrails"]
@@ -69,6 +83,7 @@ class Diff:
 
         self.permute_nibbles = [2, 0, 3, 1, 6, 4, 7, 5]
         self.lp_file_name = f"lblock_nr_{self.nrounds}.lp"
+        self.dump_lp = params.get("dumplp", False)
         self.result_file_name = f"result_nr_{self.nrounds}.txt"
 
         self.milp_variables = []
@@ -397,6 +412,8 @@ class Diff:
                                     '- a0 - a1 + a2 + b0 - b1 - b2 - b3 - p0 + p1 >= -5',
                                     '- a0 - a1 + a2 - b0 + b1 - b2 - b3 - p0 + p1 >= -5',
                                     '- a1 + a3 - b0 + b2 - b3 >= -2']
+        self.sbox_templates = [compile_inequalities(ineqs, sbox_placeholders(4, 4, 2))
+                               for ineqs in self.sbox_inequalities]
 
     @staticmethod
     def ordered_set(seq):
@@ -477,8 +494,7 @@ class Diff:
         Generate constraints for equality
         a = b
         """
-        constraint = f"{a} - {b} = 0\n"
-        return constraint
+        return [equality(a, b)]
 
     def constraint_by_nibble_equality(self, a, b):
         """
@@ -486,10 +502,7 @@ class Diff:
         to equality of two nibbles
         """
 
-        constraints = ""
-        for bit in range(4):
-            constraints += f"{a[bit]} - {b[bit]} = 0\n"
-        return constraints
+        return [equality(a[bit], b[bit]) for bit in range(4)]
 
     def constraints_by_xor(self, a, b, c):
         """
@@ -501,11 +514,7 @@ class Diff:
         - a + b + c >= 0
         """
 
-        constraints = f"- {a} - {b} - {c} >= -2\n"
-        constraints += f"{a} + {b} - {c} >= 0\n"
-        constraints += f"{a} - {b} + {c} >= 0\n"
-        constraints += f"- {a} + {b} + {c} >= 0\n"
-        return constraints
+        return xor(a, b, c)
 
     def constraints_by_nibble_xor(self, a, b, c):
         """
@@ -513,7 +522,7 @@ class Diff:
         a + b -> c
         """
 
-        constraints = ""
+        constraints = []
         for bit in range(4):
             constraints += self.constraints_by_xor(a[bit], b[bit], c[bit])
         return constraints
@@ -528,20 +537,10 @@ class Diff:
         :param str[3] pr: probability of (di --> do) such that
                           hamming_weight(pr) = -log2(pr(di --> do))
         :return constraints encoding the DDT of S-box:
-        :rtype str:
-        """
-
-        constraints = ""
-        for ineq in self.sbox_inequalities[sbn]:
-            temp = ineq
-            for i in range(4):
-                temp = temp.replace(f"a{i}", di[i])
-            for i in range(4):
-                temp = temp.replace(f"b{i}", do[i])
-            for i in range(2):
-                temp = temp.replace(f"p{i}", pr[i])
-            constraints += temp + "\n"
-        return constraints
+        :rtype list:
+        """
+
+        return self.sbox_templates[sbn].block(list(di) + list(do) + list(pr))
 
     def generate_objective_function(self):
         """
@@ -551,14 +550,13 @@ class Diff:
         differential trail
         """
 
-        objective_function = "minimize\n"
+        coefficients = []
         weight = []
         for r in range(self.nrounds):
-            pr = [[f"3 pr_{r}_{nibble}_0 + 2 pr_{r}_{nibble}_1"] for nibble in range(8)]
-            weight += self.flatten_state(pr)
-        weight = " + ".join(weight)
-        objective_function += weight + "\n"
-        return objective_function
+            for nibble in range(8):
+                coefficients += [3, 2]
+                weight += [f"pr_{r}_{nibble}_0", f"pr_{r}_{nibble}_1"]
+        return coefficients, weight
 
     def generate_constraints(self):
         """
@@ -566,7 +564,7 @@ class Diff:
         of differential trails through a reduced-round LBlock
         """
 
-        constraints = "subject to\n"
+        constraints = []
         for rn in range(self.nrounds):
             x_in = self.generate_round_x_variables(rn)
             pr = self.generate_round_pr_variables(rn)
@@ -586,9 +584,7 @@ class Diff:
         """
 
         self.milp_variables = self.ordered_set(self.milp_variables)
-        constraints = "Binary\n"
-        constraints += "\n".join(self.milp_variables) + "\n"
-        return constraints
+        return self.milp_variables
 
     def exclude_trivial_trail(self):
         """
@@ -596,12 +592,10 @@ class Diff:
         """
 
         input_diff = self.flatten_state(self.generate_round_x_variables(0))
-        input_diff = " + ".join(input_diff)
-        constraint = f"{input_diff} >= 1\n"
-        return constraint
+        return [sum_constraint(input_diff, GREATER_EQUAL, 1)]
 
     def declare_fixed_variables(self):
-        lp_contents = ""
+        constraints = []
         for cond in self.fixed_variables.items():
             var = cond[0]
             val = cond[1]
@@ -612,34 +606,34 @@ class Diff:
                 state_vars = self.flatten_state(state_vars)
                 state_values = list(bin(int(val, 16))[2:].zfill(64))
                 for i in range(64):
-                    lp_contents += f"{state_vars[i]} = {state_values[i]}\n"
+                    constraints.append(fix(state_vars[i], state_values[i]))
             elif len(var) == 3:
                 assert(var[0] == "x")
                 state_vars = [f"x_{var[1]}_{var[2]}_{bit}" for bit in range(4)]
                 state_values = list(bin(int(val, 16))[2:].zfill(4))
                 for i in range(4):
-                    lp_contents += f"{state_vars[i]} = {state_values[i]}\n"
+                    constraints.append(fix(state_vars[i], state_values[i]))
             elif len(var) == 4:
                 assert(var[0] == "x")
-                lp_contents += f"{cond[0]} = {cond[1]}\n"
+                constraints.append(fix(cond[0], cond[1]))
             else:
                 pass
-        return lp_contents
+        return constraints
 
     def make_model(self):
         """
         Build the MILP model to find the best differential trail
         """
 
-        lp_contents = "\\ Differential attack on {} rounds of LBlock\n".format(self.nrounds)
-        lp_contents += self.generate_objective_function()
-        lp_contents += self.generate_constraints()
-        lp_contents += self.exclude_trivial_trail()
-        lp_contents += self.declare_fixed_variables()
-        lp_contents += self.declare_binary_vars()
-        lp_contents += "end"
-        with open(self.lp_file_name, "w") as lp_file:
-            lp_file.write(lp_contents)
+        builder = ModelBuilder(f"Differential attack on {self.nrounds} rounds of LBlock")
+        builder.set_objective(*self.generate_objective_function())
+        builder.add_constraints(self.generate_constraints())
+        builder.add_constraints(self.exclude_trivial_trail())
+        builder.add_constraints(self.declare_fixed_variables())
+        builder.declare_binary(self.declare_binary_vars())
+        self.milp_model = builder.build()
+        if self.dump_lp:
+            builder.write_lp(self.milp_model, self.lp_file_name)
 
     def exclude_the_previous_sol(self):
         '''
@@ -659,10 +653,9 @@ class Diff:
         lhs = first_term - second_term
         self.milp_model.addConstr(lhs <= support - 1)
 
+    @cached_solve
     def solve(self):
         output = None
-        self.milp_model = read(self.lp_file_name)
-        os.remove(self.lp_file_name)
         if self.mode == 0:
             output = self.find_characteristic()
         elif self.mode == 1:
@@ -737,6 +730,9 @@ class Diff:
         # Consider the start_weight
         if self.start_weight != None:
             self.milp_model.addConstr(obj >= self.start_weight, 'start_weight_constraint')
+        # Seed the solver with a fast instantiation of the truncated trail
+        if self.warm_start:
+            warm_start(self.milp_model, self.warm_start_zeros, greedy_time_limit(self.time_limit))
         time_start = time.time()
         #m.setParam(GRB.Param.Threads, 16)
         self.milp_model.optimize()
@@ -811,68 +807,30 @@ class Diff:
     def compute_differential_effect(self):
         """
         Compute the differential effect for a given input/output differences
-        Some general information about Gurobi:
-        PoolSolutions: It controls the size of the solution pool.
-        Changing this parameter won't affect the number of solutions that are found -
-        it simply determines how many of those are retained
-        You can use the PoolSearchMode parameter to control the approach used to find solutions.
-        In its default setting (0), the MIP search simply aims to find one optimal solution.
-        Setting the parameter to 2 causes the MIP to do a systematic search for the n best solutions.
-        With a setting of 2, it will find the n best solutions,
-        where n is determined by the value of the PoolSolutions parameter
-        SolCount: Number of solutions found during the most recent optimization.
-
-        Model status:
-        LOADED	1	Model is loaded, but no solution information is available.
-        OPTIMAL	2	Model was solved to optimality (subject to tolerances), and an optimal solution is available.
-        INFEASIBLE	3	Model was proven to be infeasible.
+        The trails are counted weight layer by weight layer (see dlcore/clustering.py).
+        The enumeration stops when the model has no more solutions, when the weight
+        exceeds end_weight, or when the last layer changes log2 of the probability
+        by less than the convergence threshold (if given).
         """
 
         if self.time_limit != None:
             self.milp_model.Params.TIME_LIMIT = self.time_limit
-        #self.milp_model.Params.PreSolve = 0 # Activating this flag causes the performance to be decreased, but the accuracy will be increased
-        self.milp_model.Params.PoolSearchMode = 2
-        self.milp_model.Params.PoolSolutions = 1
         self.milp_model.Params.OutputFlag = False
 
         self.milp_model.printStats()
 
-        # Consider the start_weight
-        obj = self.milp_model.getObjective()
-        if self.start_weight != None:
-            self.milp_model.addConstr(obj >= self.start_weight, 'start_weight_constraint')
-        time_start = time.time()
-        self.milp_model.optimize()
-        current_probability = 0
-        if (self.milp_model.Status == GRB.OPTIMAL):
-            self.total_weight = self.milp_model.objVal
-            diff_prob = 0
-            print('\n')
-            while (self.milp_model.Status == GRB.OPTIMAL and self.total_weight <= self.end_weight):
-                self.total_weight = self.milp_model.PoolObjVal
-                self.milp_model.Params.PoolSolutions = 2000000000 #GRB.MAXINT
-                temp_constraint = self.milp_model.addConstr(obj == self.total_weight, name='temp_constraint')
-                # self.milp_model.Params.PoolGap = 0
-                # self.milp_model.Params.PreSolve = 0
-                # self.milp_model.printStats()
-                self.milp_model.update()
-                self.milp_model.optimize()
-                diff_prob += math.pow(2, -self.total_weight) * self.milp_model.SolCount
-                print(f"Current weight: {self.total_weight}")
-                print(f"Number of trails: {self.milp_model.SolCount}")
-                current_probability = math.log(diff_prob, 2)
-                print(f"\tCurrent Probability: 2^({current_probability})")
-                elapsed_time = time.time() - time_start
-                print("Time used = %0.04f seconds\n" % elapsed_time)
-                self.milp_model.remove(temp_constraint)
-                self.milp_model.Params.PoolSolutions = 1
-                self.milp_model.addConstr(obj >= (self.total_weight + self.eps), name='temp_cond')
-                #self.milp_model.Params.PreSolve = 0
-                self.milp_model.optimize()
-        elif (self.milp_model.Status == GRB.INFEASIBLE):
-            print("The model is infeasible!")
-        else:
-            print("Unknown Error!")
+        enumerator = WeightLayerEnumerator(self.milp_model,
+                                           start_weight=self.start_weight,
+                                           end_weight=self.end_weight,
+                                           threshold=self.convergence,
+                                           pool_limit=self.pool_limit,
+                                           processes=self.processes,
+                                           threads=self.threads,
+                                           eps=self.eps)
+        current_probability = enumerator.run()
+        if current_probability is None:
+            return 0
+        self.total_weight = enumerator.weight
         return current_probability
 
     def compute_differential_effect_classic_method(self):
@@ -913,6 +871,27 @@ class Diff:
         else:
             print('Unknown Error!')
 
+def nibble_cipher():
+    """
+    Nibble-level description of the round function of LBlock (for the branch-and-bound backend)
+    """
+
+    sboxes = [[14, 9, 15, 0, 13, 4, 10, 11, 1, 2, 8, 3, 7, 6, 12, 5],
+              [4, 11, 14, 9, 15, 13, 0, 10, 7, 12, 5, 6, 2, 8, 1, 3],
+              [1, 14, 7, 12, 15, 13, 0, 6, 11, 5, 9, 3, 2, 4, 8, 10],
+              [7, 6, 8, 11, 0, 15, 3, 14, 9, 10, 12, 13, 5, 2, 4, 1],
+              [14, 5, 15, 0, 7, 2, 12, 13, 1, 8, 4, 9, 11, 10, 6, 3],
+              [2, 13, 11, 12, 15, 14, 0, 9, 7, 10, 6, 3, 1, 8, 4, 5],
+              [11, 9, 4, 14, 0, 15, 10, 13, 6, 12, 5, 7, 3, 8, 1, 2],
+              [13, 10, 15, 0, 14, 4, 9, 11, 2, 1, 8, 3, 7, 5, 12, 6]]
+    permute_nibbles = [2, 0, 3, 1, 6, 4, 7, 5]
+    # the left half goes through the S-boxes (nibble n through S_{7 - n}) and the permutation,
+    # and is XORed with the right half rotated by two nibbles; then the halves are swapped
+    x_routes = [(n, 8 + n) for n in range(8)] + [(8 + (n + 2) % 8, n) for n in range(8)]
+    y_routes = [(n, permute_nibbles[n]) for n in range(8)]
+    return NibbleCipher("lblock-diff", 16, [sboxes[7 - n] for n in range(8)], list(range(8)),
+                        nibble_routes(x_routes), nibble_routes(y_routes))
+
 def loadparameters(args):
         """
         Get parameters from the argument list and inputfile.
@@ -948,6 +927,18 @@ def loadparameters(args):
         if args.endweight:
             params["endweight"] = args.endweight[0]
 
+        if args.convergence:
+            params["convergence"] = args.convergence[0]
+
+        if args.poollimit:
+            params["poollimit"] = args.poollimit[0]
+
+        if args.processes:
+            params["processes"] = args.processes[0]
+
+        if args.threads:
+            params["threads"] = args.threads[0]
+
         if args.mode:
             params["mode"] = args.mode[0]
 
@@ -957,6 +948,12 @@ def loadparameters(args):
         if args.numberoftrails:
             params["numberoftrails"] = args.numberoftrails[0]
 
+        if args.dumplp:
+            params["dumplp"] = True
+
+        if args.backend:
+            params["backend"] = args.backend[0]
+
         return params
 
 def main():
@@ -974,6 +971,14 @@ def main():
                         help="Starting weight for the trail search.")
     parser.add_argument('--endweight', nargs=1, type=int,
                         help="Stop search after reaching endweight.")
+    parser.add_argument('--convergence', nargs=1, type=float,
+                        help="Stop when a new weight layer changes log2 of the probability by less than this value.")
+    parser.add_argument('--poollimit', nargs=1, type=int,
+                        help="Size of the solution pool used to enumerate the weight layers.")
+    parser.add_argument('--processes', nargs=1, type=int,
+                        help="Number of worker processes counting the weight layers in parallel (mode 2).")
+    parser.add_argument('--threads', nargs=1, type=int,
+                        help="Number of Gurobi threads of each worker process.")
     parser.add_argument('--nrounds', nargs=1, type=int,
                         help="The number of rounds for the cipher")
     parser.add_argument('--mode', nargs=1, type=int,
@@ -987,10 +992,19 @@ def main():
     parser.add_argument('--numberoftrails', nargs=1, type=int,
                         help="Number of trails.")
 
+    parser.add_argument('--backend', nargs=1, type=str, choices=["milp", "bnb"],
+                        help="milp = Gurobi (default)\n"
+                             "bnb = native branch-and-bound search (dlcore/bnb.py, modes 0 and 2)")
+    parser.add_argument('--dumplp', action='store_true',
+                        help="Write the MILP model into an .lp file (for debugging).")
+
     # Parse command line arguments and construct parameter list.
     args = parser.parse_args()
     params = loadparameters(args)
-    lblock = Diff(params)
+    if params.get("backend", "milp") == "bnb":
+        lblock = BranchAndBound(nibble_cipher(), params)
+    else:
+        lblock = Diff(params)
     lblock.make_model()
     lblock.solve()
 
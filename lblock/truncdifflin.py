@@ -33,6 +33,11 @@ from truncdiff import WordLBlockDiff
 from trunclin import WordLBlockLin
 import time
 from gurobipy import *
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import temporary_path
+from dlcore.candidates import configure_pool
 
 class TruncatedDL(WordLBlockDiff, WordLBlockLin):
     """
@@ -53,7 +58,7 @@ class TruncatedDL(WordLBlockDiff, WordLBlockLin):
         """
 
         super().__init__()
-        self.lp_file_name = f"lblock_{RU}_{RM}_{RL}.lp"
+        self.lp_file_name = temporary_path(f"lblock_{RU}_{RM}_{RL}_", ".lp")
         self.RU = RU
         self.RMU = RMU
         self.R0 = RU + RM
@@ -206,9 +211,11 @@ class TruncatedDL(WordLBlockDiff, WordLBlockLin):
         with open(self.lp_file_name, "w") as lpfile:
             lpfile.write(constraints)
 
-    def find_truncated_dl_trail(self):
+    def find_truncated_dl_trail(self, number_of_solutions=1):
         """
         Solve the constructed model minimizing the number of active S-boxes
+
+        :param int number_of_solutions: if larger than 1, collect the best solutions in the solution pool (see dlcore/candidates.py)
         """
 
         self.make_model()
@@ -216,11 +223,7 @@ class TruncatedDL(WordLBlockDiff, WordLBlockLin):
         os.remove(self.lp_file_name)
         self.milp_model.setParam(GRB.Param.OutputFlag, True)
 
-        self.milp_model.Params.PoolSearchMode = 2
-        # Limit number of solutions
-        self.milp_model.Params.PoolSolutions = 10
-        # Choose solution number 1
-        self.milp_model.Params.SolutionNumber = 0
+        configure_pool(self.milp_model, number_of_solutions)
 
         start_time = time.time()
         ###################
@@ -36,6 +36,9 @@ from statistics import mode
 import time
 import os
 from gurobipy import *
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import temporary_path
 
 class WordLBlockLin:
     """
@@ -60,7 +63,7 @@ class WordLBlockLin:
         self.dummy_var = "d"
         self.nrounds = nrounds
         self.milp_variables = []
-        self.lp_file_name = f"lblock_{nrounds}r.lp"
+        self.lp_file_name = temporary_path(f"lblock_{nrounds}r_", ".lp")
         self.permute_nibbles = [2, 0, 3, 1, 6, 4, 7, 5]
 
     @staticmethod
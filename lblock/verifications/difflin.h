@@ -52,13 +52,32 @@ unsigned int init_prng(unsigned int offset);
 // #######################################################################################################
 // #######################################################################################################
 // ############################## User must change only the following lines ##############################
-const int DEG1 = 0;
-const int DEG2 = 20;
-int NUMBER_OF_EXPERIMENTS = 4;   // Number of independent experiments
-int NUMBER_OF_ROUNDS = 10;   // Number of rounds
+// Default values, which can be overridden at compile time, e.g., -DDL_ROUNDS=<rounds> (see dlcore/verify.py)
+#ifndef DL_DEG1
+#define DL_DEG1 0
+#endif
+#ifndef DL_DEG2
+#define DL_DEG2 20
+#endif
+#ifndef DL_EXPERIMENTS
+#define DL_EXPERIMENTS 4
+#endif
+#ifndef DL_ROUNDS
+#define DL_ROUNDS 10
+#endif
+#ifndef DL_DP
+#define DL_DP "0000000a00000001"
+#endif
+#ifndef DL_LC
+#define DL_LC "0001000000b00000"
+#endif
+const int DEG1 = DL_DEG1;
+const int DEG2 = DL_DEG2;
+int NUMBER_OF_EXPERIMENTS = DL_EXPERIMENTS;   // Number of independent experiments
+int NUMBER_OF_ROUNDS = DL_ROUNDS;   // Number of rounds
 
-char DP_STR[] = "0000000a00000001";
-char LC_STR[] = "0001000000b00000";
+char DP_STR[] = DL_DP;
+char LC_STR[] = DL_LC;
 
 // #######################################################################################################
 // #######################################################################################################
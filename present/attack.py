@@ -25,10 +25,17 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import logging
 from pathlib import Path
 from random import randint
-logging.basicConfig(filename="minizinc-python.log", level=logging.DEBUG)
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import configure_logging, output_path, run_directory, run_id, write_summary
+from dlcore.anytime import stream_solutions
+from dlcore.portfolio import race
+from dlcore.flatzinc import CompiledInstance, time_split
+from dlcore.cpsat import CpSatModel
+from dlcore.estimator import estimate_correlation
 import time
 import minizinc
 import datetime
@@ -68,17 +75,26 @@ class DiffLin:
         self.RMU = param["RMU"]
         self.RML = param["RML"]
         self.RD = self.RU + self.RM + self.RL
+        self.experiment = param["experiment"]
         self.cp_solver_name = param["solver"]
         ##################################################
         if ortools_available:
             if self.cp_solver_name == "ortools":
                 self.cp_solver_name = "com.google.ortools.sat"
         #################################################       
-        self.cp_solver = minizinc.Solver.lookup(self.cp_solver_name)
+        if param["backend"] == "minizinc":
+            self.cp_solver = minizinc.Solver.lookup(self.cp_solver_name)
         self.time_limit = param["timelimit"]
+        self.target = param["target"]
+        self.stall = param["stall"]
+        self.portfolio = param["portfolio"]
+        self.prune = param["prune"]
+        self.backend = param["backend"]
+        # configuration under which the winners of the solver portfolio are recorded
+        self.configuration = "present " + " ".join(f"{name}={param[name]}" for name in ["RU", "RM", "RL", "RMU", "RML", "WU", "WM", "WL"])
         self.num_of_threads = param["np"]
         self.mzn_file_name = None
-        self.output_file_name = param["output"]
+        self.output_file_name = output_path(param["output"])
         self.mzn_file_name = "attack.mzn"
     
     #############################################################################################################################################
@@ -104,36 +120,76 @@ class DiffLin:
         start_time = time.time()
         #############################################################################################################################################
         print(f"Searching a distinguisher for {self.RD} rounds of PRESENT ...")
-        self.cp_model = minizinc.Model()
-        self.cp_model.add_file(self.mzn_file_name)
-        self.cp_inst = minizinc.Instance(solver=self.cp_solver, model=self.cp_model)
-        self.cp_inst["RU"] = self.RU
-        self.cp_inst["RM"] = self.RM
-        self.cp_inst["RL"] = self.RL
-        self.cp_inst["RMU"] = self.RMU
-        self.cp_inst["RML"] = self.RML
-        self.cp_inst["WU"] = self.WU
-        self.cp_inst["WM"] = self.WM
-        self.cp_inst["WL"] = self.WL
-        self.cp_inst["offset"] = 0
-        self.result = self.cp_inst.solve(timeout=time_limit, 
-                                         processes=self.num_of_threads, 
-                                         verbose=False, 
-                                         debug_output=Path("./debug_output.txt",
-                                         intermediate_solutions=True),
-                                         random_seed=randint(0, 100),
-                                         optimisation_level=2)
+        if self.backend == "cpsat":
+            self.cp_model = self.build_cpsat_model()
+            self.result = self.cp_model.solve(self.report_solution,
+                                              timeout=time_limit,
+                                              target=self.target,
+                                              stall=self.stall,
+                                              num_workers=self.num_of_threads,
+                                              random_seed=randint(0, 100),
+                                              hint_key=self.configuration)
+        else:
+            self.cp_model = minizinc.Model()
+            self.cp_model.add_file(self.mzn_file_name)
+            self.cp_inst = CompiledInstance(solver=self.cp_solver, model=self.cp_model)
+            self.cp_inst["RU"] = self.RU
+            self.cp_inst["RM"] = self.RM
+            self.cp_inst["RL"] = self.RL
+            self.cp_inst["RMU"] = self.RMU
+            self.cp_inst["RML"] = self.RML
+            self.cp_inst["WU"] = self.WU
+            self.cp_inst["WM"] = self.WM
+            self.cp_inst["WL"] = self.WL
+            self.cp_inst["offset"] = 0
+            if self.portfolio is None:
+                self.result = stream_solutions(self.cp_inst, self.report_solution,
+                                               timeout=time_limit,
+                                               target=self.target,
+                                               stall=self.stall,
+                                               processes=self.num_of_threads,
+                                               verbose=False,
+                                               debug_output=Path(output_path("debug_output.txt")),
+                                               random_seed=randint(0, 100),
+                                               optimisation_level=2)
+            else:
+                self.result = race(self.cp_inst, self.report_solution,
+                                   portfolio=self.portfolio,
+                                   key=self.configuration,
+                                   prune=self.prune,
+                                   timeout=time_limit,
+                                   target=self.target,
+                                   stall=self.stall,
+                                   processes=self.num_of_threads,
+                                   verbose=False,
+                                   debug_output=Path(output_path("debug_output.txt")),
+                                   random_seed=randint(0, 100),
+                                   optimisation_level=2)
         #############################################################################################################################################
         elapsed_time = time.time() - start_time
         print("Time used to find a distinguisher: {:0.02f} seconds".format(elapsed_time))
+        self.times = time_split(self.result.statistics, elapsed_time)
+        print("Time used to compile the model: {:0.02f} seconds{}, to solve it: {:0.02f} seconds".format(
+              self.times["compile_time"], " (cached)" if self.times["compile_cached"] else "", self.times["solve_time"]))
         print(f"Solver status: {self.result.status}")
         if minizinc.Status.has_solution(self.result.status) or self.result.status == minizinc.Status.ERROR:
             self.attack_summary, self.upper_trail, self.lower_trail = self.parse_solution()            
             diff_effect = self.compute_diff_effect()
             self.attack_summary = self.attack_summary + f"Diff. effect: 2^({diff_effect})\n"
+            summary = dict()
+            if self.experiment > 0:
+                # evaluate the whole distinguisher on 2^experiment pairs
+                estimate = estimate_correlation("present", self.upper_trail["x"][0], self.lower_trail["x"][self.RM + self.RL],
+                                                self.RD, degree=self.experiment)
+                self.attack_summary += str(estimate) + "\n"
+                summary = {"experimental_correlation": estimate.correlation,
+                           "experimental_interval": [estimate.lower, estimate.upper], "experiment": self.experiment}
             print(self.attack_summary)
             draw = DrawDL(self, output_file_name=self.output_file_name)
             draw.generate_distinguisher_shape()
+            write_summary({"RU": self.RU, "RM": self.RM, "RL": self.RL, "RMU": self.RMU, "RML": self.RML, "WU": self.WU, "WM": self.WM, "WL": self.WL,
+                           "status": str(self.result.status), "objective": self.result.objective, "time": elapsed_time, **self.times,
+                           "PU": self.result["PU"], "CM": self.result["CMW"], "CL": self.result["QL"], "diff_effect": diff_effect, **summary})
         elif self.result.status == minizinc.Status.UNSATISFIABLE:
             print("Model is unsatisfiable") 
         elif self.result.status == minizinc.Status.UNKNOWN:
@@ -141,6 +197,107 @@ class DiffLin:
         else:
             print("Solving process was interrupted")
 
+    def report_solution(self, result, count, elapsed):
+        """
+        Report an improving solution as soon as the solver finds it
+
+        :param minizinc.Result result: the improving solution
+        :param int count: number of solutions found so far
+        :param float elapsed: seconds since the search started
+        """
+
+        self.result = result
+        print(f"Solution {count} found after {elapsed:0.02f} seconds, objective: {result.objective}")
+        self.attack_summary, self.upper_trail, self.lower_trail = self.parse_solution()
+        print(self.attack_summary)
+        draw = DrawDL(self, output_file_name=self.output_file_name)
+        draw.generate_distinguisher_shape()
+
+    def build_cpsat_model(self):
+        """
+        Build the model of attack.mzn directly with CP-SAT (no MiniZinc/FlatZinc in between)
+
+        :rtype CpSatModel:
+        """
+
+        RU, RM, RL, RMU, RML = self.RU, self.RM, self.RL, self.RMU, self.RML
+        round_permutation = [16*(i % 4) + i//4 for i in range(64)]
+        model = CpSatModel(self.mzn_file_name)
+        add = model.model.Add
+        # EU
+        xu = model.array("xu", [RU + 1, 64], 0, 1)
+        yu = model.array("yu", [RU, 64], 0, 1)
+        pu = model.array("pu", [RU, 16, 2], 0, 1)
+        for r in range(RU):
+            for i in range(16):
+                model.table("sbox_diff_probabilistic", xu[r][4*i:4*i + 4] + yu[r][4*i:4*i + 4] + pu[r][i])
+            for i in range(64):
+                add(xu[r + 1][round_permutation[i]] == yu[r][i])
+        add(sum(xu[0]) != 0)
+        # EM (upper part)
+        xmu = model.array("xmu", [RM + 1, 64], -1, 1)
+        ymu = model.array("ymu", [RM, 64], -1, 1)
+        dmu = model.array("dmu", [RM, 16], 0, 1)
+        pmu = model.array("pmu", [RM, 16, 2], 0, 1)
+        for i in range(64):
+            add(xmu[0][i] == xu[RU][i])
+        for r in range(RM):
+            for i in range(16):
+                if r < RMU:
+                    model.table("sbox_diff_probabilistic", xmu[r][4*i:4*i + 4] + ymu[r][4*i:4*i + 4] + pmu[r][i])
+                else:
+                    model.table("sbox_diff_deterministic_table", xmu[r][4*i:4*i + 4] + ymu[r][4*i:4*i + 4])
+            for i in range(64):
+                add(ymu[r][i] == xmu[r + 1][round_permutation[i]])
+        # EM (lower part)
+        xml = model.array("xml", [RM + 1, 64], -1, 1)
+        yml = model.array("yml", [RM, 64], -1, 1)
+        dml = model.array("dml", [RM, 16], 0, 1)
+        pml = model.array("pml", [RM, 16, 2], 0, 1)
+        for r in range(RM):
+            for i in range(16):
+                if r < RM - RML:
+                    model.table("sbox_inv_lin_deterministic_table", yml[r][4*i:4*i + 4] + xml[r][4*i:4*i + 4])
+                else:
+                    model.table("sbox_inv_lin_probabilistic", yml[r][4*i:4*i + 4] + xml[r][4*i:4*i + 4] + pml[r][i])
+            for i in range(64):
+                add(yml[r][i] == xml[r + 1][round_permutation[i]])
+        for r in range(RM):
+            for i in range(16):
+                model.relation(ymu[r][4*i:4*i + 4] + [dmu[r][i]], [(-1, 0, 1)]*4 + [(0, 1)],
+                               lambda *values: values[4] == int(any(values[:4])))
+                model.relation(yml[r][4*i:4*i + 4] + [dml[r][i]], [(-1, 0, 1)]*4 + [(0, 1)],
+                               lambda *values: values[4] == int(any(values[:4])))
+        # EL
+        xl = model.array("xl", [RL + 1, 64], 0, 1)
+        yl = model.array("yl", [RL, 64], 0, 1)
+        pl = model.array("pl", [RL, 16, 2], 0, 1)
+        for i in range(64):
+            add(xml[RM][i] == xl[0][i])
+        for r in range(RL):
+            for i in range(16):
+                model.table("sbox_inv_lin_probabilistic", yl[r][4*i:4*i + 4] + xl[r][4*i:4*i + 4] + pl[r][i])
+            for i in range(64):
+                add(yl[r][i] == xl[r + 1][round_permutation[i]])
+        add(sum(xl[RL]) != 0)
+        # objective
+        PU = model.variable("PU", 0, 64)
+        QL = model.variable("QL", 0, 64)
+        CMB = model.variable("CMB", 0, 64*RM + 1000)
+        CMW = model.variable("CMW", 0, 64 + 1000)
+        PMU = model.variable("PMU", 0, 64)
+        QML = model.variable("QML", 0, 64)
+        add(PU == sum(3*pu[r][i][0] + 2*pu[r][i][1] for r in range(RU) for i in range(16)))
+        add(PMU == sum(3*pmu[r][i][0] + 2*pmu[r][i][1] for r in range(RM) for i in range(16)))
+        add(QL == sum(4*pl[r][i][0] + 2*pl[r][i][1] for r in range(RL) for i in range(16)))
+        add(QML == sum(4*pml[r][i][0] + 2*pml[r][i][1] for r in range(RM) for i in range(16)))
+        add(CMB == sum(model.indicator([ymu[r][i], yml[r][i]], [(-1, 0, 1)]*2, lambda u, l: (u, l) in [(-1, -1), (-1, 1), (1, -1)])
+                       for r in range(RM) for i in range(64)))
+        add(CMW == sum(model.indicator([dmu[r][i], dml[r][i]], [(0, 1)]*2, lambda u, l: u + l == 2)
+                       for r in range(RM) for i in range(16)))
+        model.minimize(self.WU*PU + self.WM*PMU + self.WM*CMW + self.WM*QML + self.WL*QL)
+        return model
+
     #############################################################################################################################################
     #############################################################################################################################################
     #   ____                                 _          ____   _   __   __                          _    _         _   _____   __   __              _   
@@ -260,8 +417,14 @@ def loadparameters(args):
             "RML": 0,
             "np" : 8,
             "tl"  : -1,
+            "target" : None,
+            "stall" : None,
+            "portfolio" : None,
+            "prune" : None,
+            "backend" : "minizinc",
             "solver"  : "ortools",
-            "output"  : "output.tex"}
+            "output"  : "output.tex",
+            "experiment" : 0}
 
     # Override parameters if they are set on command line
     if args.RU is not None:
@@ -284,10 +447,22 @@ def loadparameters(args):
         params["np"] = args.np
     if args.timelimit is not None:
         params["timelimit"] = args.timelimit
+    if args.target is not None:
+        params["target"] = args.target
+    if args.stall is not None:
+        params["stall"] = args.stall
+    if args.portfolio is not None:
+        params["portfolio"] = args.portfolio
+    if args.prune is not None:
+        params["prune"] = args.prune
+    if args.backend is not None:
+        params["backend"] = args.backend
     if args.solver is not None:
         params["solver"] = args.solver
     if args.output is not None:
         params["output"] = args.output
+    if args.experiment is not None:
+        params["experiment"] = args.experiment
 
     return params
 
@@ -312,16 +487,28 @@ def main():
     parser.add_argument("-RML", type=int, default=0, help="Number of rounds passed probabilistically at the end of EM")
     parser.add_argument("-np", type=int, default=8, help="Number of parallel threads")
     parser.add_argument("-tl", "--timelimit", type=int, default=1000, help="Time limit in seconds")
+    parser.add_argument("--target", type=int, default=None, help="Stop as soon as the objective of the CP model reaches this value")
+    parser.add_argument("--stall", type=int, default=None, help="Stop when no improving solution is found within this many seconds after the previous one")
     # Fetch available solvers from MiniZinc
-    available_solvers = [solver_name for solver_name in minizinc.default_driver.available_solvers().keys()]
+    available_solvers = [solver_name for solver_name in minizinc.default_driver.available_solvers().keys()] if minizinc.default_driver is not None else []
     parser.add_argument("-sl", "--solver", default="cp-sat", type=str,
                         choices=available_solvers,
                         help="Choose a CP solver")     
+    parser.add_argument("-pf", "--portfolio", default=None, type=str,
+                        help="Race several solvers (and seeds), e.g., cp-sat,cp-sat:7,chuffed,gurobi (overrides --solver)")
+    parser.add_argument("--prune", type=int, default=None,
+                        help="Only race the given number of best solvers of the portfolio (according to the past winners)")
+    parser.add_argument("-b", "--backend", default="minizinc", type=str, choices=["minizinc", "cpsat"],
+                        help="Solve attack.mzn through MiniZinc, or build the same model directly with OR-Tools CP-SAT")
     parser.add_argument("-o", "--output", default="output.tex", type=str, help="Output file name")
+    parser.add_argument("-e", "--experiment", default=0, type=int,
+                        help="log2 of the number of pairs to evaluate the distinguisher experimentally (0: disabled)")
 
     # Parse command line arguments and construct parameter list
     args = parser.parse_args()
     params = loadparameters(args)
+    configure_logging("minizinc-python.log")
+    print(f"Run ID: {run_id()}, outputs in {run_directory()}")
     dld = DiffLin(params)
     dld.search()
 
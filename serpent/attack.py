@@ -25,10 +25,16 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import logging
 from pathlib import Path
 from random import randint
-logging.basicConfig(filename="minizinc-python.log", level=logging.DEBUG)
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import configure_logging, output_path, run_directory, run_id, write_summary
+from dlcore.anytime import stream_solutions
+from dlcore.portfolio import race
+from dlcore.flatzinc import CompiledInstance, time_split
+from dlcore.cpsat import CpSatModel
 import time
 import minizinc
 import datetime
@@ -75,11 +81,19 @@ class DiffLin:
             if self.cp_solver_name == "ortools":
                 self.cp_solver_name = "com.google.ortools.sat"
         #################################################       
-        self.cp_solver = minizinc.Solver.lookup(self.cp_solver_name)
+        if param["backend"] == "minizinc":
+            self.cp_solver = minizinc.Solver.lookup(self.cp_solver_name)
         self.time_limit = param["timelimit"]
+        self.target = param["target"]
+        self.stall = param["stall"]
+        self.portfolio = param["portfolio"]
+        self.prune = param["prune"]
+        self.backend = param["backend"]
+        # configuration under which the winners of the solver portfolio are recorded
+        self.configuration = "serpent " + " ".join(f"{name}={param[name]}" for name in ["RU", "RM", "RL", "RMU", "RML", "offset", "WU", "WM", "WL", "NC"])
         self.num_of_threads = param["np"]
         self.mzn_file_name = None
-        self.output_file_name = param["output"]
+        self.output_file_name = output_path(param["output"])
         self.mzn_file_name = "attack.mzn"
     
     #############################################################################################################################################
@@ -105,35 +119,67 @@ class DiffLin:
         start_time = time.time()
         #############################################################################################################################################
         print(f"Searching a distinguisher for {self.RD} rounds of SERPENT ...")
-        self.cp_model = minizinc.Model()
-        self.cp_model.add_file(self.mzn_file_name)
-        self.cp_inst = minizinc.Instance(solver=self.cp_solver, model=self.cp_model)
-        self.cp_inst["RU"] = self.RU
-        self.cp_inst["RM"] = self.RM
-        self.cp_inst["RL"] = self.RL
-        self.cp_inst["RMU"] = self.RMU
-        self.cp_inst["RML"] = self.RML
-        self.cp_inst["NC"] = self.NC        
-        self.cp_inst["offset"] = self.offset
-        self.cp_inst["WU"] = self.WU
-        self.cp_inst["WM"] = self.WM
-        self.cp_inst["WL"] = self.WL
-        self.result = self.cp_inst.solve(timeout=time_limit, 
-                                         processes=self.num_of_threads, 
-                                         verbose=False, 
-                                         debug_output=Path("./debug_output.txt",
-                                         intermediate_solutions=True),
-                                         random_seed=randint(0, 100),
-                                         optimisation_level=2)
+        if self.backend == "cpsat":
+            self.cp_model = self.build_cpsat_model()
+            self.result = self.cp_model.solve(self.report_solution,
+                                              timeout=time_limit,
+                                              target=self.target,
+                                              stall=self.stall,
+                                              num_workers=self.num_of_threads,
+                                              random_seed=randint(0, 100),
+                                              hint_key=self.configuration)
+        else:
+            self.cp_model = minizinc.Model()
+            self.cp_model.add_file(self.mzn_file_name)
+            self.cp_inst = CompiledInstance(solver=self.cp_solver, model=self.cp_model)
+            self.cp_inst["RU"] = self.RU
+            self.cp_inst["RM"] = self.RM
+            self.cp_inst["RL"] = self.RL
+            self.cp_inst["RMU"] = self.RMU
+            self.cp_inst["RML"] = self.RML
+            self.cp_inst["NC"] = self.NC        
+            self.cp_inst["offset"] = self.offset
+            self.cp_inst["WU"] = self.WU
+            self.cp_inst["WM"] = self.WM
+            self.cp_inst["WL"] = self.WL
+            if self.portfolio is None:
+                self.result = stream_solutions(self.cp_inst, self.report_solution,
+                                               timeout=time_limit,
+                                               target=self.target,
+                                               stall=self.stall,
+                                               processes=self.num_of_threads,
+                                               verbose=False,
+                                               debug_output=Path(output_path("debug_output.txt")),
+                                               random_seed=randint(0, 100),
+                                               optimisation_level=2)
+            else:
+                self.result = race(self.cp_inst, self.report_solution,
+                                   portfolio=self.portfolio,
+                                   key=self.configuration,
+                                   prune=self.prune,
+                                   timeout=time_limit,
+                                   target=self.target,
+                                   stall=self.stall,
+                                   processes=self.num_of_threads,
+                                   verbose=False,
+                                   debug_output=Path(output_path("debug_output.txt")),
+                                   random_seed=randint(0, 100),
+                                   optimisation_level=2)
         #############################################################################################################################################
         elapsed_time = time.time() - start_time
         print("Time used to find a distinguisher: {:0.02f} seconds".format(elapsed_time))
+        self.times = time_split(self.result.statistics, elapsed_time)
+        print("Time used to compile the model: {:0.02f} seconds{}, to solve it: {:0.02f} seconds".format(
+              self.times["compile_time"], " (cached)" if self.times["compile_cached"] else "", self.times["solve_time"]))
         print(f"Solver status: {self.result.status}")
         if minizinc.Status.has_solution(self.result.status) or self.result.status == minizinc.Status.ERROR:
             self.attack_summary, self.upper_trail, self.lower_trail = self.parse_solution()
             print(self.attack_summary)
             draw = DrawDL(self, output_file_name=self.output_file_name)
             draw.generate_distinguisher_shape()
+            write_summary({"RU": self.RU, "RM": self.RM, "RL": self.RL, "RMU": self.RMU, "RML": self.RML, "WU": self.WU, "WM": self.WM, "WL": self.WL, "offset": self.offset,
+                           "status": str(self.result.status), "objective": self.result.objective, "time": elapsed_time, **self.times,
+                           "PU": self.result["PU"], "CM": self.result["CMBit"], "CL": self.result["QL"]})
         elif self.result.status == minizinc.Status.UNSATISFIABLE:
             print("Model is unsatisfiable") 
         elif self.result.status == minizinc.Status.UNKNOWN:
@@ -141,6 +187,159 @@ class DiffLin:
         else:
             print("Solving process was interrupted")
 
+    def report_solution(self, result, count, elapsed):
+        """
+        Report an improving solution as soon as the solver finds it
+
+        :param minizinc.Result result: the improving solution
+        :param int count: number of solutions found so far
+        :param float elapsed: seconds since the search started
+        """
+
+        self.result = result
+        print(f"Solution {count} found after {elapsed:0.02f} seconds, objective: {result.objective}")
+        self.attack_summary, self.upper_trail, self.lower_trail = self.parse_solution()
+        print(self.attack_summary)
+        draw = DrawDL(self, output_file_name=self.output_file_name)
+        draw.generate_distinguisher_shape()
+
+    def build_cpsat_model(self):
+        """
+        Build the model of attack.mzn directly with CP-SAT (no MiniZinc/FlatZinc in between)
+
+        :rtype CpSatModel:
+        """
+
+        RU, RM, RL, RMU, RML, NC, offset = self.RU, self.RM, self.RL, self.RMU, self.RML, self.NC, self.offset
+        model = CpSatModel(self.mzn_file_name)
+        add = model.model.Add
+
+        def column_of(state, column):
+            return [state[row][column] for row in range(4)]
+
+        def linear_layer(x, y, t, xor_2, xor_3):
+            # the linear layer of Serpent in the forward direction (y -> t -> x)
+            for column in range(NC):
+                model.table(xor_3, [y[0][(column + 13) % NC], y[1][column], y[2][(column + 3) % NC], t[1][column]])
+                if column > 28:
+                    model.table(xor_2, [y[2][(column + 3) % NC], y[3][column], t[3][column]])
+                else:
+                    model.table(xor_3, [y[0][(column + 13 + 3) % NC], y[2][(column + 3) % NC], y[3][column], t[3][column]])
+            for column in range(NC):
+                model.table(xor_3, [y[0][(column + 13) % NC], t[1][(column + 1) % NC], t[3][(column + 7) % NC], t[0][column]])
+                if column > 24:
+                    model.table(xor_2, [y[2][(column + 3) % NC], t[3][(column + 7) % NC], t[2][column]])
+                else:
+                    model.table(xor_3, [t[1][(column + 1 + 7) % NC], y[2][(column + 3) % NC], t[3][(column + 7) % NC], t[2][column]])
+            for column in range(NC):
+                add(x[0][column] == t[0][(column + 5) % NC])
+                add(x[1][column] == t[1][(column + 1) % NC])
+                add(x[2][column] == t[2][(column + 22) % NC])
+                add(x[3][column] == t[3][(column + 7) % NC])
+
+        def inverse_linear_layer(x, y, t, fork_2, fork_3):
+            # the linear layer of Serpent in the backward direction (x -> t -> y)
+            for column in range(NC):
+                if column < 7:
+                    model.table(fork_2, [x[1][column], x[0][(column - 5 + NC) % NC], t[1][column]])
+                else:
+                    model.table(fork_3, [x[1][column], x[2][(column - 22 - 7 + NC) % NC], x[0][(column - 5 + NC) % NC], t[1][column]])
+                model.table(fork_3, [x[3][column], x[2][(column - 22 + NC) % NC], x[0][(column - 5 + NC) % NC], t[3][column]])
+                if column < 3:
+                    model.table(fork_2, [x[0][(column - 5 + NC) % NC], y[1][column], t[0][column]])
+                else:
+                    model.table(fork_3, [x[0][(column - 5 + NC) % NC], y[3][(column - 3 + NC) % NC], y[1][column], t[0][column]])
+                model.table(fork_3, [x[2][(column - 22 + NC) % NC], y[3][column], y[1][column], t[2][column]])
+            for column in range(NC):
+                add(t[0][column] == y[0][(column + 13) % NC])
+                add(t[1][column] == y[1][(column + 1) % NC])
+                add(t[2][column] == y[2][(column + 3) % NC])
+                add(t[3][column] == y[3][(column + 7) % NC])
+
+        def activity(x, d):
+            for r in range(len(d)):
+                for column in range(NC):
+                    model.relation(column_of(x[r], column) + [d[r][column]], [(0, 1)]*5,
+                                   lambda *values: values[4] == int(sum(values[:4]) >= 1))
+
+        # EU
+        xu = model.array("xu", [RU + 1, 4, NC], 0, 1)
+        yu = model.array("yu", [RU, 4, NC], 0, 1)
+        tu = model.array("tu", [RU, 4, NC], 0, 1)
+        pu = model.array("pu", [RU, 2, NC], 0, 1)
+        du = model.array("du", [RU + 1, NC], 0, 1)
+        for r in range(RU):
+            for column in range(NC):
+                model.table("sbox_diff", column_of(xu[r], column) + column_of(yu[r], column) + [pu[r][0][column], pu[r][1][column]],
+                            which=(offset + r) % 8)
+        activity(xu, du)
+        for r in range(RU):
+            linear_layer(xu[r + 1], yu[r], tu[r], "xor_2", "xor_3")
+        add(sum(sum(row) for row in xu[0]) != 0)
+        # EM (upper part)
+        xmu = model.array("xmu", [RM + 1, 4, NC], -1, 1)
+        ymu = model.array("ymu", [RM, 4, NC], -1, 1)
+        tmu = model.array("tmu", [RM, 4, NC], -1, 1)
+        dmu = model.array("dmu", [RM, NC], 0, 1)
+        for row in range(4):
+            for column in range(NC):
+                add(xmu[0][row][column] == xu[RU][row][column])
+        for r in range(RM):
+            for column in range(NC):
+                predicate = "sbox_diff_star" if r < RMU else "sbox_diff_m"
+                model.table(predicate, column_of(xmu[r], column) + column_of(ymu[r], column) + [dmu[r][column]],
+                            which=(offset + RU + r) % 8)
+        for r in range(RM):
+            linear_layer(xmu[r + 1], ymu[r], tmu[r], "xor_2_m", "xor_3_m")
+        # EM (lower part)
+        xml = model.array("xml", [RM + 1, 4, NC], -1, 1)
+        yml = model.array("yml", [RM, 4, NC], -1, 1)
+        tml = model.array("tml", [RM, 4, NC], -1, 1)
+        dml = model.array("dml", [RM, NC], 0, 1)
+        for r in range(RM):
+            for column in range(NC):
+                if r < RM - RML:
+                    model.table("sbox_lin_m", column_of(yml[r], column) + column_of(xml[r], column) + [dml[r][column]],
+                                which=(offset + RU + r) % 8)
+                else:
+                    model.table("sbox_lin_star", column_of(xml[r], column) + column_of(yml[r], column) + [dml[r][column]],
+                                which=(offset + RU + r) % 8)
+        for r in range(RM):
+            inverse_linear_layer(xml[r + 1], yml[r], tml[r], "fork_2_m", "fork_3_m")
+        # EL
+        xl = model.array("xl", [RL + 1, 4, NC], 0, 1)
+        yl = model.array("yl", [RL, 4, NC], 0, 1)
+        tl = model.array("tl", [RL, 4, NC], 0, 1)
+        pl = model.array("pl", [RL, 2, NC], 0, 1)
+        dl = model.array("dl", [RL + 1, NC], 0, 1)
+        for row in range(4):
+            for column in range(NC):
+                add(xl[0][row][column] == xml[RM][row][column])
+        for r in range(RL):
+            for column in range(NC):
+                model.table("sbox_lin", column_of(xl[r], column) + column_of(yl[r], column) + [pl[r][0][column], pl[r][1][column]],
+                            which=(offset + r + RM + RU) % 8)
+        activity(xl, dl)
+        for r in range(RL):
+            inverse_linear_layer(xl[r + 1], yl[r], tl[r], "fork_2", "fork_3")
+        add(sum(sum(row) for row in xl[RL]) != 0)
+        # objective
+        PU = model.variable("PU", 0, 4*NC + 5000)
+        CMBit = model.variable("CMBit", 0, 4*NC + 5000)
+        QL = model.variable("QL", 0, 4*NC + 5000)
+        CMSbox = model.variable("CMSbox", 0, 4*NC + 5000)
+        add(PU == 3*sum(pu[r][0][column] for r in range(RU) for column in range(NC)) +
+                  2*sum(pu[r][1][column] for r in range(RU) for column in range(NC)))
+        add(CMBit == sum(model.indicator([ymu[r][row][column], yml[r][row][column]], [(-1, 0, 1)]*2,
+                                         lambda u, l: (u, l) in [(-1, -1), (-1, 1), (1, -1)])
+                         for r in range(RM) for row in range(4) for column in range(NC)))
+        add(CMSbox == 2*sum(model.indicator([dmu[r][column], dml[r][column]], [(0, 1)]*2, lambda u, l: u + l == 2)
+                            for r in range(RM) for column in range(NC)))
+        add(QL == 4*sum(pl[r][0][column] for r in range(RL) for column in range(NC)) +
+                  2*sum(pl[r][1][column] for r in range(RL) for column in range(NC)))
+        model.minimize(self.WU*PU + self.WM*CMBit + self.WL*QL)
+        return model
+
     #############################################################################################################################################
     #############################################################################################################################################
     #  ____                           _    _             ____          _         _    _               
@@ -272,6 +471,11 @@ def loadparameters(args):
               "NC": 64,
               "np" : 8,
               "tl"  : -1,
+              "target" : None,
+              "stall" : None,
+              "portfolio" : None,
+              "prune" : None,
+            "backend" : "minizinc",
               "solver"  : "ortools",
               "output"  : "output.tex"}
 
@@ -300,6 +504,16 @@ def loadparameters(args):
         params["np"] = args.np
     if args.timelimit is not None:
         params["timelimit"] = args.timelimit
+    if args.target is not None:
+        params["target"] = args.target
+    if args.stall is not None:
+        params["stall"] = args.stall
+    if args.portfolio is not None:
+        params["portfolio"] = args.portfolio
+    if args.prune is not None:
+        params["prune"] = args.prune
+    if args.backend is not None:
+        params["backend"] = args.backend
     if args.solver is not None:
         params["solver"] = args.solver
     if args.output is not None:
@@ -332,16 +546,26 @@ def main():
     parser.add_argument("-np", type=int, default=8, help="Number of parallel threads")
 
     parser.add_argument("-tl", "--timelimit", type=int, default=36000, help="Time limit in seconds")
+    parser.add_argument("--target", type=int, default=None, help="Stop as soon as the objective of the CP model reaches this value")
+    parser.add_argument("--stall", type=int, default=None, help="Stop when no improving solution is found within this many seconds after the previous one")
     # Fetch available solvers from MiniZinc
-    available_solvers = [solver_name for solver_name in minizinc.default_driver.available_solvers().keys()]
+    available_solvers = [solver_name for solver_name in minizinc.default_driver.available_solvers().keys()] if minizinc.default_driver is not None else []
     parser.add_argument("-sl", "--solver", default="cp-sat", type=str,
                         choices=available_solvers,
                         help="Choose a CP solver")  
+    parser.add_argument("-pf", "--portfolio", default=None, type=str,
+                        help="Race several solvers (and seeds), e.g., cp-sat,cp-sat:7,chuffed,gurobi (overrides --solver)")
+    parser.add_argument("--prune", type=int, default=None,
+                        help="Only race the given number of best solvers of the portfolio (according to the past winners)")
+    parser.add_argument("-b", "--backend", default="minizinc", type=str, choices=["minizinc", "cpsat"],
+                        help="Solve attack.mzn through MiniZinc, or build the same model directly with OR-Tools CP-SAT")
     parser.add_argument("-o", "--output", default="output.tex", type=str, help="Output file name")
 
     # Parse command line arguments and construct parameter list
     args = parser.parse_args()
     params = loadparameters(args)
+    configure_logging("minizinc-python.log")
+    print(f"Run ID: {run_id()}, outputs in {run_directory()}")
     dld = DiffLin(params)
     dld.search()
     # udiff_effect = dld.compute_clustering_effect()
@@ -25,10 +25,15 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import logging
 from pathlib import Path
 from random import randint
-logging.basicConfig(filename="minizinc-python.log", level=logging.DEBUG)
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import configure_logging, output_path, run_directory, run_id, write_summary
+from dlcore.anytime import stream_solutions
+from dlcore.portfolio import race
+from dlcore.flatzinc import CompiledInstance, time_split
 import time
 import minizinc
 import datetime
@@ -78,9 +83,15 @@ class DiffLin:
         #################################################
         self.cp_solver = minizinc.Solver.lookup(self.cp_solver_name)
         self.time_limit = param["timelimit"]
+        self.target = param["target"]
+        self.stall = param["stall"]
+        self.portfolio = param["portfolio"]
+        self.prune = param["prune"]
+        # configuration under which the winners of the solver portfolio are recorded
+        self.configuration = "simeck " + " ".join(f"{name}={param[name]}" for name in ["blocksize", "RU", "RM", "RL", "RMU", "RML", "WU", "WM", "WL"])
         self.num_of_threads = param["np"]
         self.mzn_file_name = None
-        self.output_file_name = param["output"]
+        self.output_file_name = output_path(param["output"])
         self.mzn_file_name = "attack.mzn"
     
     #############################################################################################################################################
@@ -108,7 +119,7 @@ class DiffLin:
         print(f"Searching a distinguisher for {self.RD} rounds of SIMECK-{self.blocksize} ...")
         self.cp_model = minizinc.Model()
         self.cp_model.add_file(self.mzn_file_name)
-        self.cp_inst = minizinc.Instance(solver=self.cp_solver, model=self.cp_model)
+        self.cp_inst = CompiledInstance(solver=self.cp_solver, model=self.cp_model)
         self.cp_inst["blocksize"] = self.blocksize
         self.cp_inst["RU"] = self.RU
         self.cp_inst["RM"] = self.RM
@@ -118,17 +129,36 @@ class DiffLin:
         self.cp_inst["WU"] = self.WU
         self.cp_inst["WM"] = self.WM
         self.cp_inst["WL"] = self.WL
-        self.result = self.cp_inst.solve(timeout=time_limit, 
-                                         processes=self.num_of_threads, 
-                                         verbose=False, 
-                                         debug_output=Path("./debug_output.txt",
-                                         intermediate_solutions=True),
-                                         random_seed=randint(0, 100),
-                                         optimisation_level=2)
+        if self.portfolio is None:
+            self.result = stream_solutions(self.cp_inst, self.report_solution,
+                                           timeout=time_limit,
+                                           target=self.target,
+                                           stall=self.stall,
+                                           processes=self.num_of_threads,
+                                           verbose=False,
+                                           debug_output=Path(output_path("debug_output.txt")),
+                                           random_seed=randint(0, 100),
+                                           optimisation_level=2)
+        else:
+            self.result = race(self.cp_inst, self.report_solution,
+                               portfolio=self.portfolio,
+                               key=self.configuration,
+                               prune=self.prune,
+                               timeout=time_limit,
+                               target=self.target,
+                               stall=self.stall,
+                               processes=self.num_of_threads,
+                               verbose=False,
+                               debug_output=Path(output_path("debug_output.txt")),
+                               random_seed=randint(0, 100),
+                               optimisation_level=2)
         #############################################################################################################################################
         elapsed_time = time.time() - start_time
         print(f"Solver status: {self.result.status}")
         print("Time used to find a distinguisher: {:0.02f} seconds".format(elapsed_time))
+        self.times = time_split(self.result.statistics, elapsed_time)
+        print("Time used to compile the model: {:0.02f} seconds{}, to solve it: {:0.02f} seconds".format(
+              self.times["compile_time"], " (cached)" if self.times["compile_cached"] else "", self.times["solve_time"]))
         if minizinc.Status.has_solution(self.result.status) or self.result.status == minizinc.Status.ERROR:
             self.attack_summary, self.upper_trail, self.lower_trail = self.parse_solution()
             self.attack_summary += "Time used to find a distinguisher: {:0.02f} seconds\n".format(elapsed_time)
@@ -142,6 +172,10 @@ class DiffLin:
             print(self.attack_summary)
             draw = Draw(self, output_file_name=self.output_file_name, attack_summary=self.attack_summary)
             draw.generate_distinguisher_shape()
+            write_summary({"RU": self.RU, "RM": self.RM, "RL": self.RL, "RMU": self.RMU, "RML": self.RML, "WU": self.WU, "WM": self.WM, "WL": self.WL,
+                           "status": str(self.result.status), "objective": self.result.objective, "time": elapsed_time, **self.times,
+                           "PU": self.result["PU"], "CM": self.result["CM"], "CL": self.result["CL"],
+                           "estimate": -(self.result["PU"] + self.result["CM"] + self.result["CL"]), "diff_effect": self.diff_effect})
         elif self.result.status == minizinc.Status.UNSATISFIABLE:
             print("Model is unsatisfiable") 
         elif self.result.status == minizinc.Status.UNKNOWN:
@@ -149,6 +183,22 @@ class DiffLin:
         else:
             print("Solving process was interrupted")
 
+    def report_solution(self, result, count, elapsed):
+        """
+        Report an improving solution as soon as the solver finds it
+
+        :param minizinc.Result result: the improving solution
+        :param int count: number of solutions found so far
+        :param float elapsed: seconds since the search started
+        """
+
+        self.result = result
+        print(f"Solution {count} found after {elapsed:0.02f} seconds, objective: {result.objective}")
+        self.attack_summary, self.upper_trail, self.lower_trail = self.parse_solution()
+        print(self.attack_summary)
+        draw = Draw(self, output_file_name=self.output_file_name, attack_summary=self.attack_summary)
+        draw.generate_distinguisher_shape()
+
     #############################################################################################################################################
     #############################################################################################################################################
     #  ____                           _    _             ____          _         _    _               
@@ -278,6 +328,10 @@ def loadparameters(args):
             "WL": 20,
             "np" : 8,
             "tl"  : -1,
+            "target" : None,
+            "stall" : None,
+            "portfolio" : None,
+            "prune" : None,
             "solver"  : "ortools",
             "output"  : "output.tex"}
 
@@ -304,6 +358,14 @@ def loadparameters(args):
         params["np"] = args.np
     if args.timelimit is not None:
         params["timelimit"] = args.timelimit
+    if args.target is not None:
+        params["target"] = args.target
+    if args.stall is not None:
+        params["stall"] = args.stall
+    if args.portfolio is not None:
+        params["portfolio"] = args.portfolio
+    if args.prune is not None:
+        params["prune"] = args.prune
     if args.solver is not None:
         params["solver"] = args.solver
     if args.output is not None:
@@ -334,16 +396,24 @@ def main():
 
     parser.add_argument("-np", type=int, default=8, help="Number of parallel threads")
     parser.add_argument("-tl", "--timelimit", type=int, default=2.5*36000, help="Time limit in seconds")
+    parser.add_argument("--target", type=int, default=None, help="Stop as soon as the objective of the CP model reaches this value")
+    parser.add_argument("--stall", type=int, default=None, help="Stop when no improving solution is found within this many seconds after the previous one")
     # Fetch available solvers from MiniZinc
     available_solvers = [solver_name for solver_name in minizinc.default_driver.available_solvers().keys()]
     parser.add_argument("-sl", "--solver", default="cp-sat", type=str,
                         choices=available_solvers,
                         help="Choose a CP solver")   
+    parser.add_argument("-pf", "--portfolio", default=None, type=str,
+                        help="Race several solvers (and seeds), e.g., cp-sat,cp-sat:7,chuffed,gurobi (overrides --solver)")
+    parser.add_argument("--prune", type=int, default=None,
+                        help="Only race the given number of best solvers of the portfolio (according to the past winners)")
     parser.add_argument("-o", "--output", default="output.tex", type=str, help="Output file name")
 
     # Parse command line arguments and construct parameter list
     args = parser.parse_args()
     params = loadparameters(args)
+    configure_logging("minizinc-python.log")
+    print(f"Run ID: {run_id()}, outputs in {run_directory()}")
     dld = DiffLin(params)
     dld.search()
 
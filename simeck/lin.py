@@ -25,12 +25,17 @@ SOFTWARE.
 """
 
 from argparse import ArgumentParser, RawTextHelpFormatter
-from numpy import diff
 import yaml
 import time
 from gurobipy import *
 import math
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.milp import ModelBuilder, GREATER_EQUAL, equality, fix, parity, sum_constraint
+from dlcore.encoding import compile_inequalities
+from dlcore.clustering import WeightLayerEnumerator, DEFAULT_POOL_LIMIT
+from dlcore.cache import cached_solve
 
 class Lin:
     """
@@ -49,6 +54,10 @@ class Lin:
         self.time_limit = params["timelimit"]
         self.start_weight = params["startweight"]
         self.end_weight = params["endweight"]
+        self.convergence = params.get("convergence", None)
+        self.pool_limit = params.get("poollimit", DEFAULT_POOL_LIMIT)
+        self.processes = params.get("processes", 1)
+        self.threads = params.get("threads", None)
         self.fixed_variables = params['fixedVariables']
         self.mode = params['mode']
         self.number_of_trails = params["numberoftrails"]
@@ -64,6 +73,8 @@ class Lin:
         self.left_rotation_a1 = 5
         self.left_rotation_a2 = 0
         self.lp_file_name = f"simeck_nr_{self.nrounds}.lp"
+        self.dump_lp = params.get("dumplp", False)
+        self.dump_lp = params.get("dumplp", False)
         self.result_file_name = f"simeck_nr_{self.nrounds}.txt"
 
         self.milp_variables = []
@@ -130,8 +141,7 @@ class Lin:
         Generate constraints for equality
         a = b
         """
-        constraint = f"{a} - {b} = 0\n"
-        return constraint
+        return [equality(a, b)]
 
     def xor(self, a, b, c):
         '''
@@ -139,12 +149,7 @@ class Lin:
         a xor b = c can be modeled with 4 inequalities (without definition of dummy variable) by removing all impossible vectors (a, b, c)
         '''
 
-        lp_contents = ""
-        lp_contents += f"{a} + {b} - {c} >= 0\n"                
-        lp_contents += f"{a} - {b} + {c} >= 0\n"
-        lp_contents += f"-1 {a} + {b} + {c} >= 0\n"        
-        lp_contents += f"-1 {a} - {b} - {c} >= -2\n"        
-        return lp_contents
+        return parity([a, b, c])
 
     def xor3(self, b, a2, a1, a0):
         '''
@@ -160,16 +165,7 @@ class Lin:
         The above inequalities are derived with QuineMcCluskey algorithm
         '''
 
-        lp_contents = ""
-        lp_contents += f"{b} - {a2} - {a1} - {a0} >= -2\n"
-        lp_contents += f"-1 {b} + {a2} - {a1} - {a0} >= -2\n"
-        lp_contents += f"-1 {b} - {a2} + {a1} - {a0} >= -2\n"
-        lp_contents += f"{b} + {a2} + {a1} - {a0} >= 0\n"
-        lp_contents += f"-1 {b} - {a2} - {a1} + {a0} >= -2\n"
-        lp_contents += f"{b} + {a2} - {a1} + {a0} >= 0\n"
-        lp_contents += f"{b} - {a2} + {a1} + {a0} >= 0\n"
-        lp_contents += f"-1 {b} + {a2} + {a1} + {a0} >= 0\n"
-        return lp_contents
+        return parity([b, a2, a1, a0])
     
     def generate_constraints_for_fork_4(self, a0, a1, a2, a3, b):
         """
@@ -220,24 +216,7 @@ class Lin:
         '- a0 - a1 - a2 - a3 - b0 >= -4']
         """
 
-        lp_contents = ""
-        lp_contents += f"- {a0} + {a1} + {a2} + {a3} + {b} >= 0\n"
-        lp_contents += f"{a0} - {a1} + {a2} + {a3} + {b} >= 0\n"
-        lp_contents += f"{a0} + {a1} - {a2} + {a3} + {b} >= 0\n"
-        lp_contents += f"- {a0} - {a1} - {a2} + {a3} + {b} >= -2\n"
-        lp_contents += f"{a0} + {a1} + {a2} - {a3} + {b} >= 0\n"
-        lp_contents += f"- {a0} - {a1} + {a2} - {a3} + {b} >= -2\n"
-        lp_contents += f"- {a0} + {a1} - {a2} - {a3} + {b} >= -2\n"
-        lp_contents += f"{a0} - {a1} - {a2} - {a3} + {b} >= -2\n"
-        lp_contents += f"{a0} + {a1} + {a2} + {a3} - {b} >= 0\n"
-        lp_contents += f"- {a0} - {a1} + {a2} + {a3} - {b} >= -2\n"
-        lp_contents += f"- {a0} + {a1} - {a2} + {a3} - {b} >= -2\n"
-        lp_contents += f"{a0} - {a1} - {a2} + {a3} - {b} >= -2\n"
-        lp_contents += f"- {a0} + {a1} + {a2} - {a3} - {b} >= -2\n"
-        lp_contents += f"{a0} - {a1} + {a2} - {a3} - {b} >= -2\n"
-        lp_contents += f"{a0} + {a1} - {a2} - {a3} - {b} >= -2\n"
-        lp_contents += f"- {a0} - {a1} - {a2} - {a3} - {b} >= -4\n"
-        return lp_contents
+        return parity([a0, a1, a2, a3, b])
 
 
     def constraints_by_and(self, li, lo, pr):
@@ -249,7 +228,7 @@ class Lin:
         :param str[3] pr: probability of (li --> lo) such that
                           hamming_weight(pr) = -log2(pr(li --> lo))
         :return constraints encoding the LAT squared of S-box (here it is a simple AND operation):
-        :rtype str:
+        :rtype list:
         sage: sb = [0, 0, 0, 1]
         sage: sa = SboxAnalyzer(sb)
         sage: lat = sa.linear_approximation_table(scale='correlation')
@@ -271,17 +250,9 @@ class Lin:
         """
         self.and_inequalities = ['- a0 + p0 >= 0', '- a1 + p0 >= 0', '- b0 + p0 >= 0', 'b0 - p0 >= 0']
 
-        constraints = ""
-        for ineq in self.and_inequalities:
-            temp = ineq
-            for i in range(2):
-                temp = temp.replace(f"a{i}", li[i])
-            for i in range(1):
-                temp = temp.replace(f"b{i}", lo[i])
-            for i in range(1):
-                temp = temp.replace(f"p{i}", pr[i])
-            constraints += temp + "\n"
-        return constraints
+        placeholders = [f"a{i}" for i in range(2)] + ["b0", "p0"]
+        template = compile_inequalities(self.and_inequalities, placeholders)
+        return template.block(list(li) + list(lo) + list(pr))
     
     def generate_objective_function(self):
         """
@@ -291,13 +262,10 @@ class Lin:
         linear trail
         """
 
-        objective_function = "minimize\n"
         weight = []
         for r in range(self.nrounds):
-            weight += [f"2 pr_{r}_{bit_position}" for bit_position in range(self.half_block_size)]
-        weight = " + ".join(weight)
-        objective_function += weight + "\n"
-        return objective_function
+            weight += [f"pr_{r}_{bit_position}" for bit_position in range(self.half_block_size)]
+        return [2]*len(weight), weight
 
     def generate_constraints(self):
         """
@@ -305,7 +273,7 @@ class Lin:
         of linear trails through a reduced-round SIMECK
         """
 
-        constraints = "subject to\n"
+        constraints = []
         for rn in range(self.nrounds):
             xl_in = self.generate_round_half_x_variables(prefix='xl', rn=rn)
             xr_in = self.generate_round_half_x_variables(prefix='xr', rn=rn)
@@ -332,9 +300,7 @@ class Lin:
         """
 
         self.milp_variables = self.ordered_set(self.milp_variables)
-        constraints = "Binary\n"
-        constraints += "\n".join(self.milp_variables) + "\n"
-        return constraints
+        return self.milp_variables
 
     def exclude_trivial_trail(self):
         """
@@ -343,12 +309,10 @@ class Lin:
 
         input_diff = self.generate_round_half_x_variables(prefix='xl', rn=0) +\
               self.generate_round_half_x_variables(prefix='xr', rn=0)
-        input_diff = " + ".join(input_diff)
-        constraint = f"{input_diff} >= 1\n"
-        return constraint
+        return [sum_constraint(input_diff, GREATER_EQUAL, 1)]
 
     def declare_fixed_variables(self):
-        lp_contents = ""
+        constraints = []
         for cond in self.fixed_variables.items():
             var = cond[0]
             val = cond[1]
@@ -361,29 +325,29 @@ class Lin:
                 state_vars = self.generate_round_half_x_variables(prefix=var[0], rn=var[1])               
                 state_values = list(bin(int(val, base=16))[2:].zfill(self.half_block_size))
                 for i in range(self.half_block_size):
-                    lp_contents += f"{state_vars[i]} = {state_values[i]}\n"                  
+                    constraints.append(fix(state_vars[i], state_values[i]))                  
             elif len(var) == 3:
                 assert(var[0] in ["xl", "xr"])
                 state_vars = f"x_{var[1]}_{var[2]}"
-                lp_contents += f"{state_vars} = {val}\n"
+                constraints.append(fix(state_vars, val))
             else:
                 pass
-        return lp_contents
+        return constraints
 
     def make_model(self):
         """
         Build the MILP model to find the best linear trail
         """
 
-        lp_contents = "\\ Linear attack on {} rounds of SIMECK\n".format(self.nrounds)
-        lp_contents += self.generate_objective_function()
-        lp_contents += self.generate_constraints()
-        lp_contents += self.exclude_trivial_trail()
-        lp_contents += self.declare_fixed_variables()
-        lp_contents += self.declare_binary_vars()
-        lp_contents += "end"
-        with open(self.lp_file_name, "w") as lp_file:
-            lp_file.write(lp_contents)
+        builder = ModelBuilder(f"Linear attack on {self.nrounds} rounds of SIMECK")
+        builder.set_objective(*self.generate_objective_function())
+        builder.add_constraints(self.generate_constraints())
+        builder.add_constraints(self.exclude_trivial_trail())
+        builder.add_constraints(self.declare_fixed_variables())
+        builder.declare_binary(self.declare_binary_vars())
+        self.milp_model = builder.build()
+        if self.dump_lp:
+            builder.write_lp(self.milp_model, self.lp_file_name)
 
     def exclude_the_previous_sol(self):
         '''
@@ -403,10 +367,9 @@ class Lin:
         lhs = first_term - second_term
         self.milp_model.addConstr(lhs <= support - 1)
 
+    @cached_solve
     def solve(self):
         output = None
-        self.milp_model = read(self.lp_file_name)
-        os.remove(self.lp_file_name)
         if self.mode == 0:
             output = self.find_characteristic()
         elif self.mode == 1:
@@ -557,68 +520,30 @@ class Lin:
     def compute_linear_effect(self):
         """
         Compute the linear effect for a given input/output differences
-        Some general information about Gurobi:
-        PoolSolutions: It controls the size of the solution pool.
-        Changing this parameter won't affect the number of solutions that are found -
-        it simply determines how many of those are retained
-        You can use the PoolSearchMode parameter to control the approach used to find solutions.
-        In its default setting (0), the MIP search simply aims to find one optimal solution.
-        Setting the parameter to 2 causes the MIP to lo a systematic search for the n best solutions.
-        With a setting of 2, it will find the n best solutions,
-        where n is determined by the value of the PoolSolutions parameter
-        SolCount: Number of solutions found during the most recent optimization.
-
-        Model status:
-        LOADED	1	Model is loaded, but no solution information is available.
-        OPTIMAL	2	Model was solved to optimality (subject to tolerances), and an optimal solution is available.
-        INFEASIBLE	3	Model was proven to be infeasible.
+        The trails are counted weight layer by weight layer (see dlcore/clustering.py).
+        The enumeration stops when the model has no more solutions, when the weight
+        exceeds end_weight, or when the last layer changes log2 of the probability
+        by less than the convergence threshold (if given).
         """
 
         if self.time_limit != None:
             self.milp_model.Params.TIME_LIMIT = self.time_limit
-        #self.milp_model.Params.PreSolve = 0 # Activating this flag causes the performance to be decreased, but the accuracy will be increased
-        self.milp_model.Params.PoolSearchMode = 2
-        self.milp_model.Params.PoolSolutions = 1
         self.milp_model.Params.OutputFlag = False
 
         self.milp_model.printStats()
 
-        # Consider the start_weight
-        obj = self.milp_model.getObjective()
-        if self.start_weight != None:
-            self.milp_model.addConstr(obj >= self.start_weight, 'start_weight_constraint')
-        time_start = time.time()
-        self.milp_model.optimize()
-        current_probability = 0
-        if (self.milp_model.Status == GRB.OPTIMAL):
-            self.total_weight = self.milp_model.objVal
-            diff_prob = 0
-            print('\n')
-            while (self.milp_model.Status == GRB.OPTIMAL and self.total_weight <= self.end_weight):
-                self.total_weight = self.milp_model.PoolObjVal
-                self.milp_model.Params.PoolSolutions = 2000000000 #GRB.MAXINT
-                temp_constraint = self.milp_model.addConstr(obj == self.total_weight, name='temp_constraint')
-                # self.milp_model.Params.PoolGap = 0
-                # self.milp_model.Params.PreSolve = 0
-                # self.milp_model.printStats()
-                self.milp_model.update()
-                self.milp_model.optimize()
-                diff_prob += math.pow(2, -self.total_weight) * self.milp_model.SolCount
-                print(f"Current weight: {self.total_weight}")
-                print(f"Number of trails: {self.milp_model.SolCount}")
-                current_probability = math.log(diff_prob, 2)
-                print(f"\tCurrent Probability: 2^({current_probability})")
-                elapsed_time = time.time() - time_start
-                print("Time used = %0.04f seconds\n" % elapsed_time)
-                self.milp_model.remove(temp_constraint)
-                self.milp_model.Params.PoolSolutions = 1
-                self.milp_model.addConstr(obj >= (self.total_weight + self.eps), name='temp_cond')
-                #self.milp_model.Params.PreSolve = 0
-                self.milp_model.optimize()
-        elif (self.milp_model.Status == GRB.INFEASIBLE):
-            print("The model is infeasible!")
-        else:
-            print("Unknown Error!")
+        enumerator = WeightLayerEnumerator(self.milp_model,
+                                           start_weight=self.start_weight,
+                                           end_weight=self.end_weight,
+                                           threshold=self.convergence,
+                                           pool_limit=self.pool_limit,
+                                           processes=self.processes,
+                                           threads=self.threads,
+                                           eps=self.eps)
+        current_probability = enumerator.run()
+        if current_probability is None:
+            return 0
+        self.total_weight = enumerator.weight
         return current_probability
 
     def compute_differential_effect_classic_method(self):
@@ -698,6 +623,18 @@ def loadparameters(args):
         if args.endweight:
             params["endweight"] = args.endweight[0]
 
+        if args.convergence:
+            params["convergence"] = args.convergence[0]
+
+        if args.poollimit:
+            params["poollimit"] = args.poollimit[0]
+
+        if args.processes:
+            params["processes"] = args.processes[0]
+
+        if args.threads:
+            params["threads"] = args.threads[0]
+
         if args.mode:
             params["mode"] = args.mode[0]
 
@@ -706,6 +643,9 @@ def loadparameters(args):
 
         if args.numberoftrails:
             params["numberoftrails"] = args.numberoftrails[0]
+        if args.dumplp:
+            params["dumplp"] = True
+
         return params
 
 def main():
@@ -730,6 +670,14 @@ def main():
                         help="Starting weight for the trail search.")
     parser.add_argument('--endweight', type=int, nargs=1,
                         help="Stop search after reaching endweight.")
+    parser.add_argument('--convergence', nargs=1, type=float,
+                        help="Stop when a new weight layer changes log2 of the probability by less than this value.")
+    parser.add_argument('--poollimit', nargs=1, type=int,
+                        help="Size of the solution pool used to enumerate the weight layers.")
+    parser.add_argument('--processes', nargs=1, type=int,
+                        help="Number of worker processes counting the weight layers in parallel (mode 2).")
+    parser.add_argument('--threads', nargs=1, type=int,
+                        help="Number of Gurobi threads of each worker process.")
     parser.add_argument('--mode', type=int, nargs=1,
                         choices=[0, 1, 2], help=
                         "0 = search characteristic for fixed round\n"
@@ -740,6 +688,9 @@ def main():
     parser.add_argument('--numberoftrails', type=int, nargs=1, 
                         help="Number of trails.")
 
+    parser.add_argument('--dumplp', action='store_true',
+                        help="Write the MILP model into an .lp file (for debugging).")
+
     # Parse command line arguments and construct parameter list.
     args = parser.parse_args()
     params = loadparameters(args)
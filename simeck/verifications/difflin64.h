@@ -50,13 +50,32 @@ double run_bunch_of_dldistinguishers(int R, int N1, uint64_t N2, uint64_t N3, ui
 // #######################################################################################################
 // ############################## User must change only the following lines ##############################
 const int NUMBER_OF_THREADS = 1; // Number of threads
-const int DEG1 = 2;              // Number of bunches per thread: N2 = 2^(DEG1)
-const int DEG2 = 30;             // Number of queries per bunch:  N3 = 2^(DEG2)
-int NUMBER_OF_EXPERIMENTS = 5;   // Number of independent experiments
+// Default values, which can be overridden at compile time, e.g., -DDL_ROUNDS=<rounds> (see dlcore/verify.py)
+#ifndef DL_DEG1
+#define DL_DEG1 2
+#endif
+#ifndef DL_DEG2
+#define DL_DEG2 30
+#endif
+#ifndef DL_EXPERIMENTS
+#define DL_EXPERIMENTS 5
+#endif
+#ifndef DL_ROUNDS
+#define DL_ROUNDS 16
+#endif
+#ifndef DL_DP
+#define DL_DP "0000000000000000000000001000000000000000000000000000000001010000"
+#endif
+#ifndef DL_LC
+#define DL_LC "0000000000000000000000000000111000000000000000000000000000000100"
+#endif
+const int DEG1 = DL_DEG1;              // Number of bunches per thread: N2 = 2^(DEG1)
+const int DEG2 = DL_DEG2;             // Number of queries per bunch:  N3 = 2^(DEG2)
+int NUMBER_OF_EXPERIMENTS = DL_EXPERIMENTS;   // Number of independent experiments
 
-int NUMBER_OF_ROUNDS = 16;       // Number of rounds
-const char *DP_STR = "0000000000000000000000001000000000000000000000000000000001010000";
-const char *LC_STR = "0000000000000000000000000000111000000000000000000000000000000100";
+int NUMBER_OF_ROUNDS = DL_ROUNDS;       // Number of rounds
+const char *DP_STR = DL_DP;
+const char *LC_STR = DL_LC;
 // uint32_t dp[] = {
 //     0x20646e,
 //     0x726963,
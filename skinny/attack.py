@@ -25,11 +25,19 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import logging
 import copy
 from random import randint
 from xml.dom.expatbuilder import parseString
-logging.basicConfig(filename="minizinc-python.log", level=logging.DEBUG)
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import configure_logging, output_path, run_directory, run_id, write_summary
+from dlcore.anytime import stream_solutions
+from dlcore.portfolio import race
+from dlcore.flatzinc import CompiledInstance, time_split
+from dlcore.estimator import estimate_correlation
+from dlcore.pipeline import run_concurrently
+from dlcore.warmstart import greedy_time_limit, warm_start
 import time
 import minizinc
 import datetime
@@ -74,6 +82,7 @@ class DL:
         self.WM = param["WM"]
         self.WL = param["WL"]
         self.RD = self.RU + self.RM + self.RL
+        self.experiment = param["experiment"]
         self.cp_solver_name = param["solver"]
         ##################################################
         if ortools_available:
@@ -82,9 +91,15 @@ class DL:
         #################################################        
         self.cp_solver = minizinc.Solver.lookup(self.cp_solver_name)
         self.time_limit = param["timelimit"]
+        self.target = param["target"]
+        self.stall = param["stall"]
+        self.portfolio = param["portfolio"]
+        self.prune = param["prune"]
+        # configuration under which the winners of the solver portfolio are recorded
+        self.configuration = "skinny " + " ".join(f"{name}={param[name]}" for name in ["variant", "cellsize", "is_related_tweakey", "RU", "RM", "RL", "RMU", "RML", "WU", "WM", "WL"])
         self.num_of_threads = param["np"]
         self.mzn_file_name = None
-        self.output_file_name = param["output"]
+        self.output_file_name = output_path(param["output"])
         self.mzn_file_name = "attack.mzn"
     #############################################################################################################################################
     #############################################################################################################################################
@@ -112,7 +127,7 @@ class DL:
         print("Searching for a truncated differential-linear trail...")
         self.cp_model = minizinc.Model()
         self.cp_model.add_file(self.mzn_file_name)
-        self.cp_inst = minizinc.Instance(solver=self.cp_solver, model=self.cp_model)
+        self.cp_inst = CompiledInstance(solver=self.cp_solver, model=self.cp_model)
         self.cp_inst["RU"] = self.RU
         self.cp_inst["RM"] = self.RM
         self.cp_inst["RL"] = self.RL
@@ -124,15 +139,33 @@ class DL:
         self.cp_inst["NPT"] = self.variant
         self.cp_inst["is_related_tweakey"] = self.is_related_tweakey
         self.cp_inst["cell_size"] = self.cell_size
-        self.result = self.cp_inst.solve(timeout=time_limit, 
-                                         processes=self.num_of_threads, 
-                                         verbose=False, 
-                                         debug_output=Path("./debug_output.txt",
-                                         intermediate_solutions=True),
-                                         random_seed=randint(0, 100))
-                                        #  optimisation_level=2)                                              
+        if self.portfolio is None:
+            self.result = stream_solutions(self.cp_inst, self.report_solution,
+                                           timeout=time_limit,
+                                           target=self.target,
+                                           stall=self.stall,
+                                           processes=self.num_of_threads,
+                                           verbose=False,
+                                           debug_output=Path(output_path("debug_output.txt")),
+                                           random_seed=randint(0, 100))
+        else:
+            self.result = race(self.cp_inst, self.report_solution,
+                               portfolio=self.portfolio,
+                               key=self.configuration,
+                               prune=self.prune,
+                               timeout=time_limit,
+                               target=self.target,
+                               stall=self.stall,
+                               processes=self.num_of_threads,
+                               verbose=False,
+                               debug_output=Path(output_path("debug_output.txt")),
+                               random_seed=randint(0, 100))
+                              #  optimisation_level=2)
         elapsed_time = time.time() - start_time
         print("Time used to find a truncated differential-linear trail: {:0.02f}".format(elapsed_time))
+        self.times = time_split(self.result.statistics, elapsed_time)
+        print("Time used to compile the model: {:0.02f} seconds{}, to solve it: {:0.02f} seconds".format(
+              self.times["compile_time"], " (cached)" if self.times["compile_cached"] else "", self.times["solve_time"]))
         print(self.result.status)
         if self.result.status == minizinc.Status.OPTIMAL_SOLUTION or self.result.status == minizinc.Status.SATISFIED or \
                             self.result.status == minizinc.Status.ALL_SOLUTIONS or self.result.status.UNKNOWN:
@@ -150,14 +183,42 @@ class DL:
             self.attack_summary += "log2(PU)                                       = {:0.2f}\n".format(self.P0)
             self.attack_summary += "log2(CM)                                       ~ -{:0.2f}\n".format(self.Pm/1.2)
             self.attack_summary += "log2(CL^2)                                     = {:0.2f}\n".format(self.P1)
+            summary = dict()
+            if self.experiment > 0:
+                # evaluate the whole distinguisher on 2^experiment pairs (single-key SKINNY-64 only)
+                if self.cell_size == 4 and self.is_related_tweakey == 0:
+                    estimate = estimate_correlation("skinny", self.upper_trail["x_0"], self.lower_trail[f"x_{self.RM + self.RL}"],
+                                                    self.RD, degree=self.experiment)
+                    self.attack_summary += str(estimate) + "\n"
+                    summary = {"experimental_correlation": estimate.correlation,
+                               "experimental_interval": [estimate.lower, estimate.upper], "experiment": self.experiment}
+                else:
+                    self.attack_summary += "The experimental evaluation only supports SKINNY-64 in the single-key setting\n"
             print(self.attack_summary)                    
             draw = DrawDL(self, output_file_name=self.output_file_name)
             draw.generate_attack_shape()
+            write_summary({"RU": self.RU, "RM": self.RM, "RL": self.RL, "RMU": self.RMU, "RML": self.RML, "WU": self.WU, "WM": self.WM, "WL": self.WL, "variant": self.variant,
+                           "status": str(self.result.status), "objective": self.result.objective, "time": elapsed_time, **self.times,
+                           "PU": self.P0, "CM": -self.Pm/1.2, "CL": self.P1,
+                           "estimate": self.P0 - self.Pm/1.2 + self.P1, **summary})
         elif self.result.status == minizinc.Status.UNSATISFIABLE:
             print("Model is unsatisfiable") 
         else:
             print("Solving process was interrupted")
     
+    def report_solution(self, result, count, elapsed):
+        """
+        Report an improving solution as soon as the solver finds it
+
+        :param minizinc.Result result: the improving solution
+        :param int count: number of solutions found so far
+        :param float elapsed: seconds since the search started
+        """
+
+        self.result = result
+        print(f"Solution {count} found after {elapsed:0.02f} seconds, objective: {result.objective}")
+        print(f"Active S-boxes: {result['P0']} (upper), {result['Pm']} (common), {result['P1']} (lower)")
+
     #############################################################################################################################################
     #############################################################################################################################################
     #############################################################################################################################################
@@ -190,49 +251,14 @@ class DL:
         distinguisher_io = dict()
         distinguisher_io[f"tku"] = ""
         distinguisher_io[f"tkl"] = ""            
-        print("#"*64)
-        print("UPPER TRAIL\n")
-        # instantiate the upper trail
-        params = copy.deepcopy(params_default)
-        params["rounds"] = self.RU + self.RM
-        if self.cell_size == 4:
-            # params["upperbound1"] = 4*self.result["P0m"]
-            params["upperbound2"] = 2.2*self.result["P0"]
-        else:
-            # params["upperbound1"] = 5*self.result["P0m"]
-            params["upperbound2"] = 4*self.result["P0"]
-        params["end_round"] = self.RU
-        for r in range(self.RU + self.RM + 1):
-            for cell in range(16):
-                if self.result["DXU"][r][cell] == 0:
-                    params["fixedVariables"][f"x_{r}_{cell}"] = "0"
-        for cell in range(16):
-            if self.result["DXU"][0][cell] == 1:
-                params["fixedVariables"][f"x_{0}_{cell}"] = "Y"
-        for r in range(self.RU + self.RM):
-            for cell in range(8):
-                if self.result["DSTKU"][r][cell] == 0:
-                    params["fixedVariables"][f"tk_{r}_{cell}"] = "0"
-        UDiff = Differential(params, exact=True)
-        UDiff.make_model()
-        status = UDiff.solve(solution_limit=None, mip_focus=0)
-        # compute the differential effect for upper trail
-        if status == False:
-            raise Exception("Failed to find a concrete upper trail!")
-        self.upper_trail = UDiff.parse_solver_output()
-        params = copy.deepcopy(params_default)
-        params["rounds"] = self.RU
-        params["mode"] = 2
-        params["fixedVariables"] = {"x_0": self.upper_trail["x_0"], f"x_{self.RU}": self.upper_trail[f"x_{self.RU}"]}
-        for z in range(self.variant):
-            params["fixedVariables"][f"tk{z+1}_0"] = self.upper_trail[f"tk{z+1}_0"]
-        if self.cell_size == 4:
-            params["upperbound1"] = 3*self.result["P0"]
-        else:
-            params["upperbound1"] = 4*self.result["P0"]
-        UDiffEffect = Differential(params)
-        UDiffEffect.make_model()
-        self.P0 = UDiffEffect.solve(log=0)
+        # the upper and lower trails are independent, and instantiated concurrently (see dlcore/pipeline.py)
+        jobs = {"upper": (instantiate_upper_trail, (params_default, self.RU, self.RM, self.variant, self.cell_size,
+                                                    self.result["P0"], self.result["DXU"], self.result["DSTKU"])),
+                "lower": (instantiate_lower_trail, (params_default, self.RM, self.RL, self.cell_size,
+                                                    self.result["P1"], self.result["DXL"], self.result["DSTKL"]))}
+        results = run_concurrently(jobs)
+        self.upper_trail, self.P0 = results["upper"]
+        self.lower_trail, self.P1 = results["lower"]
         # generate round tweakeys
         middle_part_up = dict()
         middle_part_up["tku"] = ""
@@ -243,51 +269,6 @@ class DL:
         # middle_part_up["tku"] = UDiff.generate_tweakey(self.RU + 1, fixed_round_tweakey, self.RU)
         middle_part_up["dxu"] = self.upper_trail[f"x_{self.RU}"]
         distinguisher_io["dxu"] = self.upper_trail[f"x_{0}"] 
-        ##########################
-        print("#"*64)
-        print("LOWER TRAIL\n")
-        # instantiate the lower trail
-        params = copy.deepcopy(params_default)
-        if self.RL == 0:
-            params["rounds"] = self.RM + self.RL + 1
-        else:
-            params["rounds"] = self.RM + self.RL
-        if self.cell_size == 4:
-            params["upperbound2"] = 2.4*self.result["P1"]
-        else:
-            params["upperbound2"] = 4*self.result["P1"]
-        params["start_round"] = self.RM
-        params["end_round"] = self.RM + self.RL
-        params["mode"] = 0
-        for r in range(self.RM + self.RL + 1):
-            for cell in range(16):
-                if self.result["DXL"][r][cell] == 0:
-                    params["fixedVariables"][f"x_{r}_{cell}"] = "0"
-        for cell in range(16):
-            if self.result["DXL"][self.RM + self.RL][cell] == 1:
-                params["fixedVariables"][f"x_{self.RM + self.RL}_{cell}"] = "Y"
-        for r in range(self.RM + self.RL):
-            for cell in range(8):
-                if self.result["DSTKL"][r][cell] == 0:
-                    params["fixedVariables"][f"tk_{r}_{cell}"] = "0"
-        LLinear = Linear(params, exact=True)
-        LLinear.make_model()
-        status = LLinear.solve(solution_limit=None, mip_focus=0)
-        # compute the differential effect for the lower trail
-        if status == False:
-            raise Exception("Failed to find a concrete lower trail!")
-        self.lower_trail = LLinear.parse_solver_output()
-        params = copy.deepcopy(params_default)
-        params["rounds"] = self.RL
-        params["mode"] = 2
-        params["fixedVariables"] = {"x_0": self.lower_trail[f"x_{self.RM}"], f"x_{self.RL}": self.lower_trail[f"x_{self.RM + self.RL}"]}
-        if self.cell_size == 4:           
-            params["upperbound1"] = 3*self.result["P1"]
-        else:
-            params["upperbound1"] = 4*self.result["P1"]
-        LLinEffect = Linear(params)
-        LLinEffect.make_model()
-        self.P1 = LLinEffect.solve(log=0)      
         middle_part_low = dict()       
         middle_part_low["dxl"] = self.lower_trail[f"x_{self.RM}"]
         distinguisher_io["dxl"] = self.lower_trail[f"x_{self.RM + self.RL}"]
@@ -305,6 +286,114 @@ class DL:
         attack_summary += "#"*64 + "\n"
         return attack_summary
 
+def instantiate_upper_trail(params_default, RU, RM, variant, cell_size, active_sboxes, DXU, DSTKU):
+    """
+    Instantiate the truncated upper trail (DXU, DSTKU) with a differential trail, and compute the
+    differential effect of its first RU rounds (solved in a worker process, concurrently with the
+    lower trail, see dlcore/pipeline.py)
+    """
+
+    print("#"*64)
+    print("UPPER TRAIL\n")
+    # instantiate the upper trail
+    params = copy.deepcopy(params_default)
+    params["rounds"] = RU + RM
+    if cell_size == 4:
+        # params["upperbound1"] = 4*P0m
+        params["upperbound2"] = 2.2*active_sboxes
+    else:
+        # params["upperbound1"] = 5*P0m
+        params["upperbound2"] = 4*active_sboxes
+    params["end_round"] = RU
+    for r in range(RU + RM + 1):
+        for cell in range(16):
+            if DXU[r][cell] == 0:
+                params["fixedVariables"][f"x_{r}_{cell}"] = "0"
+    for cell in range(16):
+        if DXU[0][cell] == 1:
+            params["fixedVariables"][f"x_{0}_{cell}"] = "Y"
+    for r in range(RU + RM):
+        for cell in range(8):
+            if DSTKU[r][cell] == 0:
+                params["fixedVariables"][f"tk_{r}_{cell}"] = "0"
+    UDiff = Differential(params, exact=True)
+    UDiff.make_model()
+    # a fast instantiation gives the MIP start and the cutoff (see dlcore/warmstart.py)
+    warm_start(UDiff.model, time_limit=greedy_time_limit(UDiff.time_limit))
+    status = UDiff.solve(solution_limit=None, mip_focus=0)
+    # compute the differential effect for upper trail
+    if status == False:
+        raise Exception("Failed to find a concrete upper trail!")
+    upper_trail = UDiff.parse_solver_output()
+    params = copy.deepcopy(params_default)
+    params["rounds"] = RU
+    params["mode"] = 2
+    params["fixedVariables"] = {"x_0": upper_trail["x_0"], f"x_{RU}": upper_trail[f"x_{RU}"]}
+    for z in range(variant):
+        params["fixedVariables"][f"tk{z+1}_0"] = upper_trail[f"tk{z+1}_0"]
+    if cell_size == 4:
+        params["upperbound1"] = 3*active_sboxes
+    else:
+        params["upperbound1"] = 4*active_sboxes
+    UDiffEffect = Differential(params)
+    UDiffEffect.make_model()
+    effect = UDiffEffect.solve(log=0)
+    return upper_trail, effect
+
+def instantiate_lower_trail(params_default, RM, RL, cell_size, active_sboxes, DXL, DSTKL):
+    """
+    Instantiate the truncated lower trail (DXL, DSTKL) with a linear trail, and compute the
+    squared correlation of its last RL rounds (solved in a worker process, concurrently with the
+    upper trail, see dlcore/pipeline.py)
+    """
+
+    print("#"*64)
+    print("LOWER TRAIL\n")
+    # instantiate the lower trail
+    params = copy.deepcopy(params_default)
+    if RL == 0:
+        params["rounds"] = RM + RL + 1
+    else:
+        params["rounds"] = RM + RL
+    if cell_size == 4:
+        params["upperbound2"] = 2.4*active_sboxes
+    else:
+        params["upperbound2"] = 4*active_sboxes
+    params["start_round"] = RM
+    params["end_round"] = RM + RL
+    params["mode"] = 0
+    for r in range(RM + RL + 1):
+        for cell in range(16):
+            if DXL[r][cell] == 0:
+                params["fixedVariables"][f"x_{r}_{cell}"] = "0"
+    for cell in range(16):
+        if DXL[RM + RL][cell] == 1:
+            params["fixedVariables"][f"x_{RM + RL}_{cell}"] = "Y"
+    for r in range(RM + RL):
+        for cell in range(8):
+            if DSTKL[r][cell] == 0:
+                params["fixedVariables"][f"tk_{r}_{cell}"] = "0"
+    LLinear = Linear(params, exact=True)
+    LLinear.make_model()
+    warm_start(LLinear.model, time_limit=greedy_time_limit(LLinear.time_limit))
+    status = LLinear.solve(solution_limit=None, mip_focus=0)
+    # compute the differential effect for the lower trail
+    if status == False:
+        raise Exception("Failed to find a concrete lower trail!")
+    lower_trail = LLinear.parse_solver_output()
+    params = copy.deepcopy(params_default)
+    params["rounds"] = RL
+    params["mode"] = 2
+    params["fixedVariables"] = {"x_0": lower_trail[f"x_{RM}"], f"x_{RL}": lower_trail[f"x_{RM + RL}"]}
+    if cell_size == 4:           
+        params["upperbound1"] = 3*active_sboxes
+    else:
+        params["upperbound1"] = 4*active_sboxes
+    LLinEffect = Linear(params)
+    LLinEffect.make_model()
+    effect = LLinEffect.solve(log=0)
+    return lower_trail, effect
+
 #############################################################################################################################################
 #############################################################################################################################################
 #############################################################################################################################################
@@ -334,8 +423,13 @@ def loadparameters(args):
               "WL" : 2,
               "np" : 8,
               "t"  : 1800000,
+              "target" : None,
+              "stall" : None,
+              "portfolio" : None,
+              "prune" : None,
               "solver"  : "gurobi",
-              "output"  : "output.tex"}
+              "output"  : "output.tex",
+              "experiment" : 0}
 
     # Override parameters if they are set on command line
     if args.variant is not None:
@@ -366,10 +460,20 @@ def loadparameters(args):
         params["np"] = args.np
     if args.timelimit is not None:
         params["timelimit"] = args.timelimit
+    if args.target is not None:
+        params["target"] = args.target
+    if args.stall is not None:
+        params["stall"] = args.stall
+    if args.portfolio is not None:
+        params["portfolio"] = args.portfolio
+    if args.prune is not None:
+        params["prune"] = args.prune
     if args.solver is not None:
         params["solver"] = args.solver
     if args.output is not None:
         params["output"] = args.output
+    if args.experiment is not None:
+        params["experiment"] = args.experiment
 
     return params
 
@@ -398,16 +502,26 @@ def main():
     parser.add_argument("-WL", type=int, default=2, help="Weight of Sboxes through E1")
     parser.add_argument("-np", type=int, default=8, help="Number of parallel threads")
     parser.add_argument("-t", "--timelimit", type=int, default=360000, help="Time limit in seconds")
+    parser.add_argument("--target", type=int, default=None, help="Stop as soon as the objective of the CP model reaches this value")
+    parser.add_argument("--stall", type=int, default=None, help="Stop when no improving solution is found within this many seconds after the previous one")
     # Fetch available solvers from MiniZinc
     available_solvers = [solver_name for solver_name in minizinc.default_driver.available_solvers().keys()]
     parser.add_argument("-sl", "--solver", default="cp-sat", type=str,
                         choices=available_solvers,
                         help="Choose a CP solver")     
+    parser.add_argument("-pf", "--portfolio", default=None, type=str,
+                        help="Race several solvers (and seeds), e.g., cp-sat,cp-sat:7,chuffed,gurobi (overrides --solver)")
+    parser.add_argument("--prune", type=int, default=None,
+                        help="Only race the given number of best solvers of the portfolio (according to the past winners)")
     parser.add_argument("-o", "--output", default="output.tex", type=str, help="Output file name")
+    parser.add_argument("-e", "--experiment", default=0, type=int,
+                        help="log2 of the number of pairs to evaluate the distinguisher experimentally (0: disabled)")
 
     # Parse command line arguments and construct parameter list
     args = parser.parse_args()
     params = loadparameters(args)
+    configure_logging("minizinc-python.log")
+    print(f"Run ID: {run_id()}, outputs in {run_directory()}")
     bmd = DL(params)
     bmd.search()
 
@@ -28,10 +28,16 @@ SOFTWARE.
 from argparse import ArgumentParser, RawTextHelpFormatter
 import yaml
 import time
-from gurobipy import read
 from gurobipy import GRB
 import math
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.milp import ModelBuilder, GREATER_EQUAL, LESS_EQUAL, EQUAL, constraint, equality, fix, parity, sum_constraint, to_number, xor
+from dlcore.encoding import compile_inequalities, sbox_placeholders
+from dlcore.clustering import WeightLayerEnumerator, DEFAULT_POOL_LIMIT
+from dlcore.cache import cached_solve
+from dlcore.bounds import span_cuts
 from copy import deepcopy
 
 
@@ -162,6 +168,10 @@ class Differential:
         self.upperbound2 = param['upperbound2']
         self.start_weight = param['sweight']
         self.end_weight = param['endweight']
+        self.convergence = param.get("convergence", None)
+        self.pool_limit = param.get("poollimit", DEFAULT_POOL_LIMIT)
+        self.processes = param.get("processes", 1)
+        self.threads = param.get("threads", None)
         self.time_limit = param['timelimit']        
         self.mode = param['mode']
         self.fixed_variables = param['fixedVariables']
@@ -170,11 +180,13 @@ class Differential:
         self.total_weight = None
         self.big_m = 2*8         
         self.eps = 1e-2
-        self.obj_func = ''
+        self.obj_func = ((), ())
         self.used_variables = []
         self.permuteation = [0x0, 0x1, 0x2, 0x3, 0x7, 0x4, 0x5, 0x6, 0xa, 0xb, 0x8, 0x9, 0xd, 0xe, 0xf, 0xc]
         self.tk_permutation = [0x9, 0xf, 0x8, 0xd, 0xa, 0xe, 0xc, 0xb, 0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0x6, 0x7]
         self.model_filename = f"SKINNY-{self.cellsize*16}-{self.cellsize*self.variant*16}-{self.rounds}r.lp"
+        self.dump_lp = param.get("dumplp", False)
+        self.round_bounds = param.get("roundbounds", False)
 
         # Precomputed constraints for the 8-bit S-box
         # a0, b0: msb
@@ -209,6 +221,11 @@ class Differential:
                             [0, 0, 0, 0, 1 , 2 , 3 , 6 , 9 , 12, 16, 21, 25, 31, 35, 40, 43, 47, 52, 57, 59 , 64],
                             [0, 0, 0, 0, 0 , 0 , 1 , 2 , 3 , 6 , 10, 13, 16, 19, 24, 27, 31, 35, 43, 45, 48 , 51],
                             [0, 0, 0, 0, 0 , 0 , 0 , 0 , 1 , 2 , 3 , 6 , 9 , 12, 16, 19, 21, 24, 30, 35, 39 , 41]]
+        placeholders = sbox_placeholders(8, 8)
+        self.sbox_templates_8bit = {pr: compile_inequalities(ineqs, placeholders, big_m=self.big_m)
+                                    for pr, ineqs in self.sbox_inequalties_8bit.items()}
+        placeholders = sbox_placeholders(4, 4, 2)
+        self.sbox_template_4bit = compile_inequalities(self.sbox_inequalties_4bit, placeholders)
     
     def create_objective_function(self, start_round=0, end_round=None):
         '''
@@ -217,7 +234,7 @@ class Differential:
         
         if end_round == None:
             end_round = self.rounds
-        lp_contents = ""
+        coefficients = []
         minus_log2_p = []
         if self.skipsb == 1:
             start_round = start_round + 1
@@ -225,19 +242,21 @@ class Differential:
             for r in range(start_round, end_round):
                 for cell_number in range(16):                
                     for pr in self.possible_probabilities[self.cellsize][0:self.accuracy_threshold]:
-                        minus_log2_p.append(pr.replace('_', '.') + ' ' + 'q' + pr + '_' + str(r) + '_' + str(cell_number))
+                        coefficients.append(to_number(pr.replace('_', '.')))
+                        minus_log2_p.append('q' + pr + '_' + str(r) + '_' + str(cell_number))
                     if self.exact == True:
                         for pr in self.possible_probabilities[self.cellsize][self.accuracy_threshold:]:
-                            minus_log2_p.append(pr.replace('_', '.') + ' ' + 'q' + pr + '_' + str(r) + '_' + str(cell_number))
+                            coefficients.append(to_number(pr.replace('_', '.')))
+                            minus_log2_p.append('q' + pr + '_' + str(r) + '_' + str(cell_number))
         elif self.cellsize == 4:
             for r in range(start_round, end_round):
                 for cell_number in range(16):
                     for pr in ["2", "3"]:
-                        minus_log2_p.append(f"{pr} q{pr}_{r}_{cell_number}")
+                        coefficients.append(int(pr))
+                        minus_log2_p.append(f"q{pr}_{r}_{cell_number}")
         else:
             raise Exception("Cell size should be 4 or 8")
-        lp_contents += ' + '.join(minus_log2_p)
-        return lp_contents
+        return coefficients, minus_log2_p
 
     def create_state_variables(self, r, s):
         '''
@@ -280,12 +299,7 @@ class Differential:
         a xor b = c can be modeled with 4 inequalities (without definition of dummy variable) by removing all impossible vectors (a, b, c)
         '''
 
-        lp_contents = ""
-        lp_contents += f"{a} + {b} - {c} >= 0\n"                
-        lp_contents += f"{a} - {b} + {c} >= 0\n"
-        lp_contents += f"-1 {a} + {b} + {c} >= 0\n"        
-        lp_contents += f"-1 {a} - {b} - {c} >= -2\n"        
-        return lp_contents
+        return xor(a, b, c)
 
     def xor3(self, b, a2, a1, a0):
         '''
@@ -301,38 +315,30 @@ class Differential:
         The above inequalities are derived with QuineMcCluskey algorithm
         '''
 
-        lp_contents = ""
-        lp_contents += f"{b} - {a2} - {a1} - {a0} >= -2\n"
-        lp_contents += f"-1 {b} + {a2} - {a1} - {a0} >= -2\n"
-        lp_contents += f"-1 {b} - {a2} + {a1} - {a0} >= -2\n"
-        lp_contents += f"{b} + {a2} + {a1} - {a0} >= 0\n"
-        lp_contents += f"-1 {b} - {a2} - {a1} + {a0} >= -2\n"
-        lp_contents += f"{b} + {a2} - {a1} + {a0} >= 0\n"
-        lp_contents += f"{b} - {a2} + {a1} + {a0} >= 0\n"
-        lp_contents += f"-1 {b} + {a2} + {a1} + {a0} >= 0\n"
-        return lp_contents
+        return parity([b, a2, a1, a0])
     
     def equality(self, x, y):
         '''
         Generate the MILP constraints modeling the equality of two bits
         '''
 
-        lp_contents = f"{x} - {y} = 0\n"
-        return lp_contents
+        if isinstance(y, int):
+            return [fix(x, y)]
+        return [equality(x, y)]
 
     def mix_columns(self, x, y):
         '''
         Model the MixColumns
         '''
 
-        lp_contents = ""
+        constraints = []
         for cell_number in range(4):            
             for bit_number in range(self.cellsize):
-                lp_contents += self.xor3(y[cell_number][bit_number], x[cell_number][bit_number], x[cell_number + 8][bit_number], x[cell_number + 12][bit_number])
-                lp_contents += self.equality(y[cell_number + 4][bit_number], x[cell_number][bit_number])
-                lp_contents += self.xor(x[cell_number + 4][bit_number], x[cell_number + 8][bit_number], y[cell_number + 8][bit_number])
-                lp_contents += self.xor(x[cell_number][bit_number], x[cell_number + 8][bit_number], y[cell_number + 12][bit_number])
-        return lp_contents
+                constraints += self.xor3(y[cell_number][bit_number], x[cell_number][bit_number], x[cell_number + 8][bit_number], x[cell_number + 12][bit_number])
+                constraints += self.equality(y[cell_number + 4][bit_number], x[cell_number][bit_number])
+                constraints += self.xor(x[cell_number + 4][bit_number], x[cell_number + 8][bit_number], y[cell_number + 8][bit_number])
+                constraints += self.xor(x[cell_number][bit_number], x[cell_number + 8][bit_number], y[cell_number + 12][bit_number])
+        return constraints
 
     def add_tweakey(self, tk, x, y):
         '''
@@ -340,14 +346,14 @@ class Differential:
         tk xor x = y
         '''
 
-        lp_contents = ""
+        constraints = []
         for cell_number in range(8):
             for bit_number in range(self.cellsize):
-                lp_contents += self.xor(tk[cell_number][bit_number], x[cell_number][bit_number], y[cell_number][bit_number])
+                constraints += self.xor(tk[cell_number][bit_number], x[cell_number][bit_number], y[cell_number][bit_number])
         for cell_number in range(8, 16):
             for bit_number in range(self.cellsize):
-                lp_contents += self.equality(x[cell_number][bit_number], y[cell_number][bit_number])
-        return lp_contents
+                constraints += self.equality(x[cell_number][bit_number], y[cell_number][bit_number])
+        return constraints
 
     def shift_rows(self, state):
         '''
@@ -380,75 +386,47 @@ class Differential:
         r: indicates the round number
         '''
 
-        lp_contents = ""
+        constraints = []
         for cell_number in range(16):
             q_byte_variables = []           
             for pr in self.possible_probabilities[self.cellsize][0:7]:
                 q = 'q' + pr + '_' + str(r) + '_' + str(cell_number)
                 q_byte_variables.append(q)
-                for ineq in self.sbox_inequalties_8bit[pr]:
-                    for i in range(8):
-                        ineq = ineq.replace('a' + str(i), x[cell_number][i])
-                        ineq = ineq.replace('b' + str(i), y[cell_number][i])
-                    # Big-M Method:
-                    ineq = ineq.split(' >= ')
-                    ineq = ineq[0] + ' - ' + str(self.big_m) + ' ' + q + ' >= ' + str(int(ineq[1]) - self.big_m) + '\n'
-                    # Indicator constraint:
-                    # ineq  = q + ' = 1'+ ' -> ' + ineq + '\n'                    
-                    lp_contents += ineq
+                constraints += self.sbox_templates_8bit[pr].block(x[cell_number] + y[cell_number] + [q])
             if self.exact == True:                            
                 for pr in self.possible_probabilities[self.cellsize][self.accuracy_threshold:]:
                     q = 'q' + pr + '_' + str(r) + '_' + str(cell_number)
                     q_byte_variables.append(q)
-                    for ineq in self.sbox_inequalties_8bit[pr]:
-                        for i in range(8):
-                            ineq = ineq.replace('a' + str(i), x[cell_number][i])
-                            ineq = ineq.replace('b' + str(i), y[cell_number][i])
-                        # Big-M method:
-                        ineq = ineq.split(' >= ')
-                        ineq = ineq[0] + ' - ' + str(self.big_m) + ' ' + q + ' >= ' + str(int(ineq[1]) - self.big_m) + '\n'
-                        # Indicator constraint:
-                        # ineq  = q + ' = 1'+ ' -> ' + ineq + '\n'
-                        lp_contents += ineq                        
+                    constraints += self.sbox_templates_8bit[pr].block(x[cell_number] + y[cell_number] + [q])
             # q = sum(qi)
             self.used_variables.extend(q_byte_variables)
             q_byte = 'q_' + str(r) + '_' + str(cell_number)
             self.used_variables.append(q_byte)
-            ineq = q_byte + ' - ' + ' - '.join(q_byte_variables) + ' = 0\n'            
-            lp_contents += ineq
+            constraints.append(constraint([1] + [-1]*len(q_byte_variables), [q_byte] + q_byte_variables, EQUAL, 0))
             # q[cell_number] >= x[cell_number][i] for i in range(8)
             for i in range(8):
-                ineq = q_byte + ' - ' + x[cell_number][i] + ' >= 0\n'                
-                lp_contents += ineq
+                constraints.append(constraint([1, -1], [q_byte, x[cell_number][i]], GREATER_EQUAL, 0))
             # sum(x[cell_number][i] for i in range(8)) >= q[cell_number]
-            ineq = ' + '.join(x[cell_number]) + ' - ' + q_byte + ' >= 0\n'            
-            lp_contents += ineq
+            constraints.append(constraint([1]*8 + [-1], x[cell_number] + [q_byte], GREATER_EQUAL, 0))
             # Model the bijectivity of Sbox (x = 0 => y = 0, y = 0 => x = 0)
-            ineq = '8 ' + ' + 8 '.join(y[cell_number]) + ' - ' + ' - '.join(x[cell_number]) + ' >= 0\n'            
-            lp_contents += ineq
-            ineq = '8 ' + ' + 8 '.join(x[cell_number]) + ' - ' + ' - '.join(y[cell_number]) + ' >= 0\n'            
-            lp_contents += ineq
-        return lp_contents
+            constraints.append(constraint([8]*8 + [-1]*8, y[cell_number] + x[cell_number], GREATER_EQUAL, 0))
+            constraints.append(constraint([8]*8 + [-1]*8, x[cell_number] + y[cell_number], GREATER_EQUAL, 0))
+        return constraints
     
     def subcells_4bit(self, x, y, r):
         '''
         Model the 4-bit S-box
         '''
 
-        lp_contents = ""
+        constraints = []
         for cell_number in range(16):
-            for ineq in self.sbox_inequalties_4bit:
-                for i in range(4):
-                    ineq = ineq.replace(f"a{i}", x[cell_number][i])
-                    ineq = ineq.replace(f"b{i}", y[cell_number][i])
-                ineq = ineq.replace("p0", f"q3_{r}_{cell_number}")
-                ineq = ineq.replace("p1", f"q2_{r}_{cell_number}")
-                lp_contents += ineq + "\n"
+            pr = [f"q3_{r}_{cell_number}", f"q2_{r}_{cell_number}"]
+            constraints += self.sbox_template_4bit.block(x[cell_number] + y[cell_number] + pr)
             self.used_variables.append(f"q3_{r}_{cell_number}")
             self.used_variables.append(f"q2_{r}_{cell_number}")            
-            lp_contents += '4 ' + ' + 4 '.join(y[cell_number]) + ' - ' + ' - '.join(x[cell_number]) + ' >= 0\n'
-            lp_contents += '4 ' + ' + 4 '.join(x[cell_number]) + ' - ' + ' - '.join(y[cell_number]) + ' >= 0\n'            
-        return lp_contents
+            constraints.append(constraint([4]*4 + [-1]*4, y[cell_number] + x[cell_number], GREATER_EQUAL, 0))
+            constraints.append(constraint([4]*4 + [-1]*4, x[cell_number] + y[cell_number], GREATER_EQUAL, 0))
+        return constraints
     
     def subcells(self, x, y, r, cellsize):
         '''
@@ -469,14 +447,14 @@ class Differential:
         (a[0], a[1], a[2], a[3], a[4], a[5], a[6], a[7]) -> (a[1], a[2], a[3], a[4], a[5], a[6], a[0] xor a[2]) = (b[0], b[1], b[2], b[3], b[4], b[5], b[6], b[7])
         '''
 
-        lp_contents = ""
+        constraints = []
         for i in range(self.cellsize - 1):
-            lp_contents += self.equality(a[i + 1], b[i])
+            constraints += self.equality(a[i + 1], b[i])
         if self.cellsize == 8:
-            lp_contents += self.xor(a[0], a[2], b[7])
+            constraints += self.xor(a[0], a[2], b[7])
         elif self.cellsize == 4:
-            lp_contents += self.xor(a[0], a[1], b[3])
-        return lp_contents
+            constraints += self.xor(a[0], a[1], b[3])
+        return constraints
 
     def lfsr_tk3(self, a, b):
         '''
@@ -487,14 +465,14 @@ class Differential:
         (a[0], a[1], a[2], a[3], a[4], a[5], a[6], a[7]) -> (a[7] xor a[1], a[0], a[1], a[2], a[3], a[4], a[5], a[6]) = (b[0], b[1], b[2], b[3], b[4], b[5], b[6], b[7])
         '''
         
-        lp_contents = ""        
+        constraints = []        
         for i in range(0, self.cellsize - 1):
-            lp_contents += self.equality(a[i], b[i + 1])
+            constraints += self.equality(a[i], b[i + 1])
         if self.cellsize == 8:
-            lp_contents += self.xor(a[7], a[1], b[0])
+            constraints += self.xor(a[7], a[1], b[0])
         elif self.cellsize == 4:
-            lp_contents += self.xor(a[3], a[0], b[0])
-        return lp_contents
+            constraints += self.xor(a[3], a[0], b[0])
+        return constraints
     
     def lfsr_tk4(self, a, b):
         '''
@@ -504,19 +482,19 @@ class Differential:
         (a[0], a[1], a[2], a[3]) -> (a[2], a[3], a[0] xor a[1], a[1] xor a[2]) = (b[0], b[1], b[2], b[3])
         '''
 
-        lp_contents = ""
-        lp_contents += self.xor(a[0], a[1], b[2])
-        lp_contents += self.xor(a[1], a[2], b[3])
-        lp_contents += self.equality(a[2], b[0])
-        lp_contents += self.equality(a[3], b[1])
-        return lp_contents
+        constraints = []
+        constraints += self.xor(a[0], a[1], b[2])
+        constraints += self.xor(a[1], a[2], b[3])
+        constraints += self.equality(a[2], b[0])
+        constraints += self.equality(a[3], b[1])
+        return constraints
 
     def tweakey_schedule(self):
         '''
         Model the difference propagation through the tweakey schedule
         '''
 
-        lp_contents = ""
+        constraints = []
         if self.variant >= 1:
             tk1 = self.create_state_variables(0, 'tk1')
         if self.variant >= 2:
@@ -531,16 +509,16 @@ class Differential:
         for cell_number in range(8):
             for bit_number in range(self.cellsize):
                 if self.variant == 0:
-                    lp_contents += self.equality(tk[cell_number][bit_number], 0) # single-tweakey differential analysis
+                    constraints += self.equality(tk[cell_number][bit_number], 0) # single-tweakey differential analysis
                 elif self.variant == 1:
-                    lp_contents += self.equality(tk[cell_number][bit_number], tk1[cell_number][bit_number])
+                    constraints += self.equality(tk[cell_number][bit_number], tk1[cell_number][bit_number])
                 elif self.variant == 2:
-                    lp_contents += self.xor(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number])
+                    constraints += self.xor(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number])
                 elif self.variant == 3:
-                    lp_contents += self.xor3(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number], tk3[cell_number][bit_number])
+                    constraints += self.xor3(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number], tk3[cell_number][bit_number])
                 elif self.variant == 4:
-                    lp_contents += self.xor(tk34[cell_number][bit_number], tk3[cell_number][bit_number], tk4[cell_number][bit_number])
-                    lp_contents += self.xor3(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number], tk34[cell_number][bit_number])
+                    constraints += self.xor(tk34[cell_number][bit_number], tk3[cell_number][bit_number], tk4[cell_number][bit_number])
+                    constraints += self.xor3(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number], tk34[cell_number][bit_number])
         for r in range(1, self.rounds):
             if self.variant >= 1:
                 ptk1 = self.permute_tweakey(tk1)
@@ -548,101 +526,101 @@ class Differential:
                 # tk1 = ptk1
                 for cell_number in range(16):
                     for bit_number in range(self.cellsize):
-                        lp_contents += self.equality(tk1[cell_number][bit_number], ptk1[cell_number][bit_number])
+                        constraints += self.equality(tk1[cell_number][bit_number], ptk1[cell_number][bit_number])
             if self.variant >= 2:
                 # Apply LFSR to the the first half of ptk2
                 ptk2 = self.permute_tweakey(tk2)
                 tk2 = self.create_state_variables(r, 'tk2')
                 for cell_number in range(8):
-                    lp_contents += self.lfsr_tk2(ptk2[cell_number], tk2[cell_number])
+                    constraints += self.lfsr_tk2(ptk2[cell_number], tk2[cell_number])
                 for cell_number in range(8, 16):
                     for bit_number in range(self.cellsize):
-                        lp_contents += self.equality(ptk2[cell_number][bit_number], tk2[cell_number][bit_number])
+                        constraints += self.equality(ptk2[cell_number][bit_number], tk2[cell_number][bit_number])
             if self.variant >= 3:
                 # Apply LFSR to the first half of ptk3
                 ptk3 = self.permute_tweakey(tk3)
                 tk3 = self.create_state_variables(r, 'tk3')
                 for cell_number in range(8):
-                    lp_contents += self.lfsr_tk3(ptk3[cell_number], tk3[cell_number])
+                    constraints += self.lfsr_tk3(ptk3[cell_number], tk3[cell_number])
                 for cell_number in range(8, 16):
                     for bit_number in range(self.cellsize):
-                        lp_contents += self.equality(ptk3[cell_number][bit_number], tk3[cell_number][bit_number])
+                        constraints += self.equality(ptk3[cell_number][bit_number], tk3[cell_number][bit_number])
             if self.variant >= 4:
                 # Apply the linear map to the first half of ptk4
                 ptk4 = self.permute_tweakey(tk4)
                 tk4 = self.create_state_variables(r, 'tk4')
                 tk34 = self.create_half_state_variables(r, 'tk34')
                 for cell_number in range(8):
-                    lp_contents += self.lfsr_tk4(ptk4[cell_number], tk4[cell_number])
+                    constraints += self.lfsr_tk4(ptk4[cell_number], tk4[cell_number])
                 for cell_number in range(8, 16):
                     for bit_number in range(self.cellsize):
-                        lp_contents += self.equality(ptk4[cell_number][bit_number], tk4[cell_number][bit_number])
+                        constraints += self.equality(ptk4[cell_number][bit_number], tk4[cell_number][bit_number])
             tk = self.create_half_state_variables(r, 'tk')
             # model the round tweakey generation: TK = FirstHalf(TK1) xor FirstHalf(TK2) xor FirstHalf(TK3) xor FirstHalf(TK4)
             for cell_number in range(8):
                 for bit_number in range(self.cellsize):
                     if self.variant == 0:
-                        lp_contents += self.equality(tk[cell_number][bit_number], 0)
+                        constraints += self.equality(tk[cell_number][bit_number], 0)
                     elif self.variant == 1:
-                        lp_contents += self.equality(tk[cell_number][bit_number], tk1[cell_number][bit_number])
+                        constraints += self.equality(tk[cell_number][bit_number], tk1[cell_number][bit_number])
                     elif self.variant == 2:
-                        lp_contents += self.xor(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number])
+                        constraints += self.xor(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number])
                     elif self.variant == 3:
-                        lp_contents += self.xor3(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number], tk3[cell_number][bit_number])
+                        constraints += self.xor3(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number], tk3[cell_number][bit_number])
                     elif self.variant == 4:
-                        lp_contents += self.xor(tk34[cell_number][bit_number], tk3[cell_number][bit_number], tk4[cell_number][bit_number])
-                        lp_contents += self.xor3(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number], tk34[cell_number][bit_number])
-        return lp_contents
+                        constraints += self.xor(tk34[cell_number][bit_number], tk3[cell_number][bit_number], tk4[cell_number][bit_number])
+                        constraints += self.xor3(tk[cell_number][bit_number], tk1[cell_number][bit_number], tk2[cell_number][bit_number], tk34[cell_number][bit_number])
+        return constraints
     
     def encryption(self):
         '''
         Generate the MILP constraints modeling the propagation of differences through the encryption data path
         '''
         
-        lp_contents = ""
+        constraints = []
         for r in range(self.rounds):
             x = self.create_state_variables(r, 'x')
             y = self.create_state_variables(r, 'y')
             z = self.create_state_variables(r, 'z')
             tk = self.create_half_state_variables(r, 'tk')
             x_next = self.create_state_variables(r + 1, 'x')
-            lp_contents += self.subcells(x, y, r, self.cellsize)
-            lp_contents += self.add_tweakey(tk, y, z)
+            constraints += self.subcells(x, y, r, self.cellsize)
+            constraints += self.add_tweakey(tk, y, z)
             pz = self.shift_rows(z)
-            lp_contents += self.mix_columns(pz, x_next)
-        return lp_contents
+            constraints += self.mix_columns(pz, x_next)
+        return constraints
     
     def exclude_trivial_trail(self):
-        lp_contents = ""
+        constraints = []
         x = self.create_state_variables(0, 'x')
         if self.variant == 0:
-            lp_contents += " + ".join(self.flatten(x)) + " >= 1\n"
+            constraints.append(sum_constraint(self.flatten(x), GREATER_EQUAL, 1))
         elif self.variant == 1:
             tk1 = self.create_state_variables(0, 'tk1')
             temp = self.flatten(x) + self.flatten(tk1)
-            lp_contents += " + ".join(temp) + " >= 1\n"
+            constraints.append(sum_constraint(temp, GREATER_EQUAL, 1))
         elif self.variant == 2:
             tk1 = self.create_state_variables(0, 'tk1')
             tk2 = self.create_state_variables(0, 'tk2')
             temp = self.flatten(x) + self.flatten(tk1) + self.flatten(tk2)
-            lp_contents += " + ".join(temp) + " >= 1\n"
+            constraints.append(sum_constraint(temp, GREATER_EQUAL, 1))
         elif self.variant == 3:
             tk1 = self.create_state_variables(0, 'tk1')
             tk2 = self.create_state_variables(0, 'tk2')
             tk3 = self.create_state_variables(0, 'tk3')
             temp = self.flatten(x) + self.flatten(tk1) + self.flatten(tk2) + self.flatten(tk3)
-            lp_contents += " + ".join(temp) + " >= 1\n"
+            constraints.append(sum_constraint(temp, GREATER_EQUAL, 1))
         elif self.variant == 4:
             tk1 = self.create_state_variables(0, 'tk1')
             tk2 = self.create_state_variables(0, 'tk2')
             tk3 = self.create_state_variables(0, 'tk3')
             tk4 = self.create_state_variables(0, 'tk4')
             temp = self.flatten(x) + self.flatten(tk1) + self.flatten(tk2) + self.flatten(tk3) + self.flatten(tk4)
-            lp_contents += " + ".join(temp) + " >= 1\n"
-        return lp_contents
+            constraints.append(sum_constraint(temp, GREATER_EQUAL, 1))
+        return constraints
     
     def declare_fixed_variables(self):
-        lp_contents = ""
+        constraints = []
         for cond in self.fixed_variables.items():            
             var = cond[0]
             val = cond[1]
@@ -653,87 +631,82 @@ class Differential:
                 if "X" not in val:
                     state_values = list(bin(int(val, 16))[2:].zfill(self.cellsize*16))
                     for i in range(self.cellsize*16):
-                        lp_contents += f"{state_vars[i]} = {state_values[i]}\n"
+                        constraints.append(fix(state_vars[i], state_values[i]))
                 else:
                     fixed_positions = [i for i in range(len(val)) if val[i] != "X"]
                     for i in fixed_positions:
                         cell_value = list(bin(int(val[i], 16))[2:].zfill(self.cellsize))
                         for j in range(self.cellsize):
-                            lp_contents += f"{state_vars[i*self.cellsize + j]} = {cell_value[j]}\n"
+                            constraints.append(fix(state_vars[i*self.cellsize + j], cell_value[j]))
                     
             elif len(var) == 3:
                 state_vars = [f"{var[0]}_{var[1]}_{var[2]}_{i}" for i in range(self.cellsize)]
                 if val != "Y":
                     state_values = list(bin(int(val, 16))[2:].zfill(self.cellsize))
                     for i in range(self.cellsize):
-                        lp_contents += f"{state_vars[i]} = {state_values[i]}\n"
+                        constraints.append(fix(state_vars[i], state_values[i]))
                 elif val == "Y":
-                    lp_contents += " + ".join(state_vars) + " >= 1\n"
+                    constraints.append(sum_constraint(state_vars, GREATER_EQUAL, 1))
             elif len(var) == 4:
-                lp_contents += f"{cond[0]} = {cond[1]}\n"
-        return lp_contents
+                constraints.append(fix(cond[0], cond[1]))
+        return constraints
 
     def declare_variables_type(self):
         '''
-        Specifying variables' type in the LP file
+        Specifying variables' type in the MILP model
         '''
         
-        lp_contents = 'binary\n'
         self.used_variables = list(set(self.used_variables))
-        for var in self.used_variables:
-            lp_contents += var + '\n'            
-        lp_contents += "end\n"
-        return lp_contents
+        return self.used_variables
 
     def make_model(self):
         '''
         Generate the MILP model of Skinny-128-256 for differential cryptanalysis
         '''
         
-        lp_contents = ""
         print('Generating the MILP model ...')
-        lp_contents += "minimize\n"
+        builder = ModelBuilder(f"SKINNY-{self.cellsize*16}-{self.cellsize*self.variant*16} differential {self.rounds} rounds")
         self.obj_func = self.create_objective_function()
-        lp_contents += self.obj_func
-        lp_contents += "\nsubject to\n"
+        builder.set_objective(*self.obj_func)
         if self.rounds <= 22:
             if self.skipsb:
                 if self.rounds >= 2:
-                    lp_contents += f"{self.obj_func} >= {2*self.lower_bound[self.variant][self.rounds - 2]}\n"                
+                    builder.add_constraints([constraint(*self.obj_func, GREATER_EQUAL, 2*self.lower_bound[self.variant][self.rounds - 2])])
             else:
-                lp_contents += f"{self.obj_func} >= {2*self.lower_bound[self.variant][self.rounds - 1]}\n"
+                builder.add_constraints([constraint(*self.obj_func, GREATER_EQUAL, 2*self.lower_bound[self.variant][self.rounds - 1])])
+        if self.round_bounds:
+            # bound the weight of every sub-span of rounds (at least 2 per active S-box)
+            spans = max(0, min(self.rounds - 1 - self.skipsb, len(self.lower_bound[self.variant])))
+            bounds = [2*b for b in self.lower_bound[self.variant][:spans]]
+            builder.add_constraints(span_cuts(*self.obj_func, bounds, round_of=lambda v: int(v.split("_")[-2])))
         if self.upperbound1 != None:
-            lp_contents += f"{self.obj_func} <= {self.upperbound1}\n"
+            builder.add_constraints([constraint(*self.obj_func, LESS_EQUAL, self.upperbound1)])
         if self.start_round != None and self.end_round != None and self.upperbound2 != None:
             halfway_weight = self.create_objective_function(start_round=self.start_round, end_round = self.end_round)
-            lp_contents += f"{halfway_weight} <= {self.upperbound2}\n"
-        lp_contents += self.exclude_trivial_trail()
-        lp_contents += self.tweakey_schedule()
-        lp_contents += self.encryption()
-        lp_contents += self.declare_fixed_variables()
-        lp_contents += self.declare_variables_type() 
-        if os.path.exists(self.model_filename):
-            os.remove(self.model_filename)
-        with open(self.model_filename, 'w') as fileobj:
-            fileobj.write(lp_contents)
-        print(f"MILP model was written into {self.model_filename}\n")
+            builder.add_constraints([constraint(*halfway_weight, LESS_EQUAL, self.upperbound2)])
+        builder.add_constraints(self.exclude_trivial_trail())
+        builder.add_constraints(self.tweakey_schedule())
+        builder.add_constraints(self.encryption())
+        builder.add_constraints(self.declare_fixed_variables())
+        builder.declare_binary(self.declare_variables_type())
+        self.model = builder.build()
+        if self.dump_lp:
+            lp_file_name = builder.write_lp(self.model, self.model_filename)
+            print(f"MILP model was written into {lp_file_name}\n")
     
     def generate_tweakey(self, total_rounds, fixed_round_tweakey, target_round):
         '''
         Generate the tweakey schedule for the given number of rounds
         '''
         
-        lp_contents = "subject to\n"
         self.used_variables = []
         self.fixed_variables = fixed_round_tweakey
         self.rounds = total_rounds
-        lp_contents += self.tweakey_schedule()
-        lp_contents += self.declare_fixed_variables()
-        lp_contents += self.declare_variables_type()
-        with open("temp.lp", "w") as fileobj:
-            fileobj.write(lp_contents)
-        milp_model = read("temp.lp")
-        os.remove("temp.lp")
+        builder = ModelBuilder("tweakey schedule")
+        builder.add_constraints(self.tweakey_schedule())
+        builder.add_constraints(self.declare_fixed_variables())
+        builder.declare_binary(self.declare_variables_type())
+        milp_model = builder.build()
         milp_model.Params.OutputFlag = False
         milp_model.optimize()
         characteristic = ""
@@ -850,69 +823,31 @@ class Differential:
     def compute_differential_effect(self, log=1):
         '''
         Compute the differential effect for a given input/output differences
-
-        Some general information about Gurobi:
-
-        PoolSolutions: It controls the size of the solution pool. Changing this parameter won't affect the number of solutions that are found - 
-        it simply determines how many of those are retained
-
-        You can use the PoolSearchMode parameter to control the approach used to find solutions. In its default setting (0), the MIP search simply aims to find one optimal solution. 
-        Setting the parameter to 2 causes the MIP to do a systematic search for the n best solutions. With a setting of 2, it will find the n best solutions, 
-        where n is determined by the value of the PoolSolutions parameter        
-
-        SolCount: Number of solutions found during the most recent optimization.
-        
-        Model status:
-        LOADED	1	Model is loaded, but no solution information is available.
-        OPTIMAL	2	Model was solved to optimality (subject to tolerances), and an optimal solution is available.
-        INFEASIBLE	3	Model was proven to be infeasible.
+        The trails are counted weight layer by weight layer (see dlcore/clustering.py).
+        The enumeration stops when the model has no more solutions, when the weight
+        exceeds end_weight, or when the last layer changes log2 of the probability
+        by less than the convergence threshold (if given).
         '''
-        
+
         status = False
         if self.time_limit != -1:
             self.model.Params.TIME_LIMIT = self.time_limit
-        #self.model.Params.PreSolve = 0 # Activating this flag causes the performance to be decreased        
-        self.model.Params.PoolSearchMode = 2
-        self.model.Params.PoolSolutions = 1
-        self.model.Params.OutputFlag = False                
-        obj = self.model.getObjective()
-        # Consider the start_weight
-        if self.start_weight != None:            
-            self.model.addConstr(obj >= self.start_weight, 'start_weight_constraint')       
-        time_start = time.time()
-        self.model.optimize()
-        if (self.model.Status == GRB.OPTIMAL):
-            status = True
-            self.total_weight = self.model.objVal
-            diff_prob = 0
-            print('\n')
-            while (self.model.Status == GRB.OPTIMAL and self.total_weight <= self.end_weight):
-                self.total_weight = self.model.objVal
-                self.model.Params.PoolSolutions = 2000000000 #GRB.MAXIN, Default value for PoolSolutions: 10                
-                temp_constraint = self.model.addConstr(obj == self.total_weight, name='temp_constraint')
-                self.model.update()
-                #self.model.Params.PreSolve = 1
-                self.model.optimize()
-                diff_prob += math.pow(2, -self.total_weight) * self.model.SolCount
-                time_end = time.time()
-                if log == 1:
-                    print('Current weight: %s' % str(self.total_weight))
-                    print('Number of trails: %s' % str(self.model.SolCount))
-                    print('\tCurrent Probability: 2^(' + str(math.log(diff_prob, 2)) + ')')
-                    print('Time used = %0.4f seconds\n' % (time_end - time_start))
-                self.model.remove(temp_constraint)
-                self.model.Params.PoolSolutions = 1                
-                self.model.addConstr(obj >= (self.total_weight + self.eps))
-                #self.model.Params.PreSolve = 0
-                self.model.optimize()
-        elif (self.model.Status == GRB.INFEASIBLE):
-            print('The model is infeasible!')
-            return status
-        else: 
-            print('Unknown Error!')
+        self.model.Params.OutputFlag = False
+        enumerator = WeightLayerEnumerator(self.model,
+                                           start_weight=self.start_weight,
+                                           end_weight=self.end_weight,
+                                           threshold=self.convergence,
+                                           pool_limit=self.pool_limit,
+                                           processes=self.processes,
+                                           threads=self.threads,
+                                           eps=self.eps,
+                                           verbose=(log == 1))
+        effect = enumerator.run()
+        if effect is None:
             return status
-        print("Total weight = {:0.02f}".format(math.log(diff_prob, 2)))
-        return math.log(diff_prob, 2)
+        self.total_weight = enumerator.weight
+        print("Total weight = {:0.02f}".format(effect))
+        return effect
             
     def compute_differential_effect_classic_method(self):
         status = False
@@ -968,8 +903,8 @@ class Differential:
         lhs = first_term - second_term
         self.model.addConstr(lhs <= support - 1)
 
+    @cached_solve
     def solve(self, log=1, solution_limit=None, mip_focus=None):        
-        self.model = read(self.model_filename)
         if solution_limit != None:
             self.model.Params.SolutionLimit = solution_limit
         if mip_focus != None:
@@ -984,7 +919,6 @@ class Differential:
             #self.compute_differential_effect_classic_method()
         else:
             print("mode should be in [0, 1, 2]")
-        os.remove(self.model_filename)
         return status
 
     def parse_solver_output(self):
@@ -1152,9 +1086,27 @@ def loadparameters(args):
     if args.endweight:
         params["endweight"] = args.endweight[0]
     
+    if args.convergence:
+        params["convergence"] = args.convergence[0]
+    
+    if args.poollimit:
+        params["poollimit"] = args.poollimit[0]
+    
+    if args.processes:
+        params["processes"] = args.processes[0]
+    
+    if args.threads:
+        params["threads"] = args.threads[0]
+    
     if args.timelimit:
         params["timelimit"] = args.timelimit[0]
 
+    if args.dumplp:
+        params["dumplp"] = True
+
+    if args.roundbounds:
+        params["roundbounds"] = True
+
     return params
 
 def main():
@@ -1194,8 +1146,20 @@ def main():
                         help="starting weight for the trail search")
     parser.add_argument("-ew", "--endweight", nargs=1, type=int,
                         help="ending weight for the trail search")
+    parser.add_argument("-cv", "--convergence", nargs=1, type=float,
+                        help="stop when a new weight layer changes log2 of the probability by less than this value")
+    parser.add_argument("-pl", "--poollimit", nargs=1, type=int,
+                        help="size of the solution pool used to enumerate the weight layers")
+    parser.add_argument("-np", "--processes", nargs=1, type=int,
+                        help="number of worker processes counting the weight layers in parallel (mode 2)")
+    parser.add_argument("-th", "--threads", nargs=1, type=int,
+                        help="number of Gurobi threads of each worker process")
     parser.add_argument("-t", "--timelimit", nargs=1, type=int,
-                        help="time limit for the search")       
+                        help="time limit for the search")
+    parser.add_argument("-rb", "--roundbounds", action="store_true",
+                        help="bound the weight of every sub-span of rounds by the number of active S-boxes")
+    parser.add_argument("--dumplp", action="store_true",
+                        help="write the MILP model into an .lp file (for debugging)")       
 
     # Parse command line arguments and construct parameter list
     args = parser.parse_args()
@@ -28,10 +28,15 @@ SOFTWARE.
 from argparse import ArgumentParser, RawTextHelpFormatter
 import yaml
 import time
-from gurobipy import read
 from gurobipy import GRB
 import math
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.milp import ModelBuilder, GREATER_EQUAL, LESS_EQUAL, EQUAL, constraint, equality, fix, parity, sum_constraint, to_number, xor
+from dlcore.encoding import compile_inequalities, sbox_placeholders
+from dlcore.clustering import WeightLayerEnumerator, DEFAULT_POOL_LIMIT
+from dlcore.cache import cached_solve
 from copy import deepcopy
 
 
@@ -162,6 +167,10 @@ class Linear:
         self.upperbound2 = param['upperbound2']
         self.start_weight = param['sweight']
         self.end_weight = param['endweight']
+        self.convergence = param.get("convergence", None)
+        self.pool_limit = param.get("poollimit", DEFAULT_POOL_LIMIT)
+        self.processes = param.get("processes", 1)
+        self.threads = param.get("threads", None)
         self.time_limit = param['timelimit']
         self.mode = param['mode']
         self.fixed_variables = param['fixedVariables']
@@ -170,10 +179,11 @@ class Linear:
         self.total_weight = None
         self.big_m = 2*8         
         self.eps = 1e-2
-        self.obj_func = ''
+        self.obj_func = ((), ())
         self.used_variables = []
         self.permuteation = [0x0, 0x1, 0x2, 0x3, 0x7, 0x4, 0x5, 0x6, 0xa, 0xb, 0x8, 0x9, 0xd, 0xe, 0xf, 0xc]        
         self.model_filename = f"SKINNY-{self.cellsize*16}-{self.cellsize*self.variant*16}-{self.rounds}r.lp"
+        self.dump_lp = param.get("dumplp", False)
 
         # We used SboxAnalyzer to encode the linear behavior of the 4-bit S-box of SKINNY
         # a0, b0: msb
@@ -330,7 +340,12 @@ class Linear:
                                         'a1 + b0 - b2 + b3 - p1 >= -1',
                                         'a0 + a1 - a3 - b0 - b3 + p0 >= -2',
                                         'a1 - a3 + b0 + b2 - b3 + p0 >= -1',
-                                        'a0 + a3 + b2 + b3 + p0 - p1 >= 0']     
+                                        'a0 + a3 + b2 + b3 + p0 - p1 >= 0']
+        placeholders = sbox_placeholders(8, 8)
+        self.sbox_templates_8bit = {pr: compile_inequalities(ineqs, placeholders, big_m=self.big_m)
+                                    for pr, ineqs in self.sbox_inequalties_8bit.items()}
+        placeholders = sbox_placeholders(4, 4, 2)
+        self.sbox_template_4bit = compile_inequalities(self.sbox_inequalties_4bit, placeholders)
     
     def create_objective_function(self, start_round=0, end_round=None):
         '''
@@ -339,7 +354,7 @@ class Linear:
         
         if end_round == None:
             end_round = self.rounds
-        lp_contents = ""
+        coefficients = []
         minus_log2_p = []
         if self.skipsb == 1:
             start_round = start_round + 1
@@ -347,19 +362,21 @@ class Linear:
             for r in range(start_round, end_round):
                 for cell_number in range(16):                
                     for pr in self.possible_sq_corr[self.cellsize][0:self.accuracy_threshold]:
-                        minus_log2_p.append(pr.replace('_', '.') + ' ' + 'q' + pr + '_' + str(r) + '_' + str(cell_number))
+                        coefficients.append(to_number(pr.replace('_', '.')))
+                        minus_log2_p.append('q' + pr + '_' + str(r) + '_' + str(cell_number))
                     if self.exact == True:
                         for pr in self.possible_sq_corr[self.cellsize][self.accuracy_threshold:]:
-                            minus_log2_p.append(pr.replace('_', '.') + ' ' + 'q' + pr + '_' + str(r) + '_' + str(cell_number))
+                            coefficients.append(to_number(pr.replace('_', '.')))
+                            minus_log2_p.append('q' + pr + '_' + str(r) + '_' + str(cell_number))
         elif self.cellsize == 4:
             for r in range(start_round, end_round):
                 for cell_number in range(16):
                     for pr in ["2", "4"]:
-                        minus_log2_p.append(f"{pr} q{pr}_{r}_{cell_number}")
+                        coefficients.append(int(pr))
+                        minus_log2_p.append(f"q{pr}_{r}_{cell_number}")
         else:
             raise Exception("Cell size should be 4 or 8")
-        lp_contents += ' + '.join(minus_log2_p)
-        return lp_contents
+        return coefficients, minus_log2_p
 
     def create_state_variables(self, r, s):
         '''
@@ -402,12 +419,7 @@ class Linear:
         a xor b = c can be modeled with 4 inequalities (without definition of dummy variable) by removing all impossible vectors (a, b, c)
         '''
 
-        lp_contents = ""
-        lp_contents += f"{a} + {b} - {c} >= 0\n"                
-        lp_contents += f"{a} - {b} + {c} >= 0\n"
-        lp_contents += f"-1 {a} + {b} + {c} >= 0\n"        
-        lp_contents += f"-1 {a} - {b} - {c} >= -2\n"        
-        return lp_contents
+        return xor(a, b, c)
 
     def xor3(self, b, a2, a1, a0):
         '''
@@ -423,24 +435,16 @@ class Linear:
         The above inequalities are derived with QuineMcCluskey algorithm
         '''
 
-        lp_contents = ""
-        lp_contents += f"{b} - {a2} - {a1} - {a0} >= -2\n"
-        lp_contents += f"-1 {b} + {a2} - {a1} - {a0} >= -2\n"
-        lp_contents += f"-1 {b} - {a2} + {a1} - {a0} >= -2\n"
-        lp_contents += f"{b} + {a2} + {a1} - {a0} >= 0\n"
-        lp_contents += f"-1 {b} - {a2} - {a1} + {a0} >= -2\n"
-        lp_contents += f"{b} + {a2} - {a1} + {a0} >= 0\n"
-        lp_contents += f"{b} - {a2} + {a1} + {a0} >= 0\n"
-        lp_contents += f"-1 {b} + {a2} + {a1} + {a0} >= 0\n"
-        return lp_contents
+        return parity([b, a2, a1, a0])
     
     def equality(self, x, y):
         '''
         Generate the MILP constraints modeling the equality of two bits
         '''
 
-        lp_contents = f"{x} - {y} = 0\n"
-        return lp_contents
+        if isinstance(y, int):
+            return [fix(x, y)]
+        return [equality(x, y)]
 
     def mix_columns(self, x, y):
         '''
@@ -448,14 +452,14 @@ class Linear:
         Modeling the propagation from right to left
         '''
 
-        lp_contents = ""
+        constraints = []
         for cell_number in range(4):            
             for bit_number in range(self.cellsize):
-                lp_contents += self.xor3(y[cell_number][bit_number], x[cell_number][bit_number], x[cell_number + 4][bit_number], x[cell_number + 12][bit_number])
-                lp_contents += self.equality(y[cell_number + 4][bit_number], x[cell_number + 8][bit_number])
-                lp_contents += self.xor3(y[cell_number + 8][bit_number], x[cell_number][bit_number], x[cell_number + 8][bit_number], x[cell_number + 12][bit_number])
-                lp_contents += self.equality(y[cell_number + 12][bit_number], x[cell_number][bit_number])
-        return lp_contents
+                constraints += self.xor3(y[cell_number][bit_number], x[cell_number][bit_number], x[cell_number + 4][bit_number], x[cell_number + 12][bit_number])
+                constraints += self.equality(y[cell_number + 4][bit_number], x[cell_number + 8][bit_number])
+                constraints += self.xor3(y[cell_number + 8][bit_number], x[cell_number][bit_number], x[cell_number + 8][bit_number], x[cell_number + 12][bit_number])
+                constraints += self.equality(y[cell_number + 12][bit_number], x[cell_number][bit_number])
+        return constraints
 
     def shift_rows(self, state):
         '''
@@ -477,75 +481,47 @@ class Linear:
         r: indicates the round number
         '''
 
-        lp_contents = ""
+        constraints = []
         for cell_number in range(16):
             q_byte_variables = []           
             for pr in self.possible_sq_corr[self.cellsize][0:7]:
                 q = 'q' + pr + '_' + str(r) + '_' + str(cell_number)
                 q_byte_variables.append(q)
-                for ineq in self.sbox_inequalties_8bit[pr]:
-                    for i in range(8):
-                        ineq = ineq.replace('a' + str(i), x[cell_number][i])
-                        ineq = ineq.replace('b' + str(i), y[cell_number][i])
-                    # Big-M Method:
-                    ineq = ineq.split(' >= ')
-                    ineq = ineq[0] + ' - ' + str(self.big_m) + ' ' + q + ' >= ' + str(int(ineq[1]) - self.big_m) + '\n'
-                    # Indicator constraint:
-                    # ineq  = q + ' = 1'+ ' -> ' + ineq + '\n'                    
-                    lp_contents += ineq
+                constraints += self.sbox_templates_8bit[pr].block(x[cell_number] + y[cell_number] + [q])
             if self.exact == True:                            
                 for pr in self.possible_sq_corr[self.cellsize][self.accuracy_threshold:]:
                     q = 'q' + pr + '_' + str(r) + '_' + str(cell_number)
                     q_byte_variables.append(q)
-                    for ineq in self.sbox_inequalties_8bit[pr]:
-                        for i in range(8):
-                            ineq = ineq.replace('a' + str(i), x[cell_number][i])
-                            ineq = ineq.replace('b' + str(i), y[cell_number][i])
-                        # Big-M method:
-                        ineq = ineq.split(' >= ')
-                        ineq = ineq[0] + ' - ' + str(self.big_m) + ' ' + q + ' >= ' + str(int(ineq[1]) - self.big_m) + '\n'
-                        # Indicator constraint:
-                        # ineq  = q + ' = 1'+ ' -> ' + ineq + '\n'
-                        lp_contents += ineq                        
+                    constraints += self.sbox_templates_8bit[pr].block(x[cell_number] + y[cell_number] + [q])
             # q = sum(qi)
             self.used_variables.extend(q_byte_variables)
             q_byte = 'q_' + str(r) + '_' + str(cell_number)
             self.used_variables.append(q_byte)
-            ineq = q_byte + ' - ' + ' - '.join(q_byte_variables) + ' = 0\n'            
-            lp_contents += ineq
+            constraints.append(constraint([1] + [-1]*len(q_byte_variables), [q_byte] + q_byte_variables, EQUAL, 0))
             # q[cell_number] >= x[cell_number][i] for i in range(8)
             for i in range(8):
-                ineq = q_byte + ' - ' + x[cell_number][i] + ' >= 0\n'                
-                lp_contents += ineq
+                constraints.append(constraint([1, -1], [q_byte, x[cell_number][i]], GREATER_EQUAL, 0))
             # sum(x[cell_number][i] for i in range(8)) >= q[cell_number]
-            ineq = ' + '.join(x[cell_number]) + ' - ' + q_byte + ' >= 0\n'            
-            lp_contents += ineq
+            constraints.append(constraint([1]*8 + [-1], x[cell_number] + [q_byte], GREATER_EQUAL, 0))
             # Model the bijectivity of Sbox (x = 0 => y = 0, y = 0 => x = 0)
-            ineq = '8 ' + ' + 8 '.join(y[cell_number]) + ' - ' + ' - '.join(x[cell_number]) + ' >= 0\n'            
-            lp_contents += ineq
-            ineq = '8 ' + ' + 8 '.join(x[cell_number]) + ' - ' + ' - '.join(y[cell_number]) + ' >= 0\n'            
-            lp_contents += ineq
-        return lp_contents
+            constraints.append(constraint([8]*8 + [-1]*8, y[cell_number] + x[cell_number], GREATER_EQUAL, 0))
+            constraints.append(constraint([8]*8 + [-1]*8, x[cell_number] + y[cell_number], GREATER_EQUAL, 0))
+        return constraints
     
     def subcells_4bit(self, x, y, r):
         '''
         Model the 4-bit S-box
         '''
 
-        lp_contents = ""
+        constraints = []
         for cell_number in range(16):
-            for ineq in self.sbox_inequalties_4bit:
-                for i in range(4):
-                    ineq = ineq.replace(f"a{i}", x[cell_number][i])
-                    ineq = ineq.replace(f"b{i}", y[cell_number][i])
-                ineq = ineq.replace("p0", f"q4_{r}_{cell_number}")
-                ineq = ineq.replace("p1", f"q2_{r}_{cell_number}")
-                lp_contents += ineq + "\n"
+            pr = [f"q4_{r}_{cell_number}", f"q2_{r}_{cell_number}"]
+            constraints += self.sbox_template_4bit.block(x[cell_number] + y[cell_number] + pr)
             self.used_variables.append(f"q4_{r}_{cell_number}")
             self.used_variables.append(f"q2_{r}_{cell_number}")            
-            lp_contents += '4 ' + ' + 4 '.join(y[cell_number]) + ' - ' + ' - '.join(x[cell_number]) + ' >= 0\n'
-            lp_contents += '4 ' + ' + 4 '.join(x[cell_number]) + ' - ' + ' - '.join(y[cell_number]) + ' >= 0\n'            
-        return lp_contents
+            constraints.append(constraint([4]*4 + [-1]*4, y[cell_number] + x[cell_number], GREATER_EQUAL, 0))
+            constraints.append(constraint([4]*4 + [-1]*4, x[cell_number] + y[cell_number], GREATER_EQUAL, 0))
+        return constraints
     
     def subcells(self, x, y, r, cellsize):
         '''
@@ -562,40 +538,40 @@ class Linear:
         Generate the MILP constraints modeling the addition of the tweakey
         """
         
-        lp_contents = ""
+        constraints = []
         for cell_number in range(16):
             for bit_number in range(self.cellsize):
-                lp_contents += self.equality(z[cell_number][bit_number], y[cell_number][bit_number])
+                constraints += self.equality(z[cell_number][bit_number], y[cell_number][bit_number])
                 if cell_number <= 7:
-                    lp_contents += self.equality(tk[cell_number][bit_number], y[cell_number][bit_number])
-        return lp_contents
+                    constraints += self.equality(tk[cell_number][bit_number], y[cell_number][bit_number])
+        return constraints
     
     def encryption(self):
         '''
         Generate the MILP constraints modeling the propagation of linear approximations through the encryption data path
         '''
         
-        lp_contents = ""
+        constraints = []
         for r in range(self.rounds):
             x = self.create_state_variables(r, 'x')
             y = self.create_state_variables(r, 'y')
             z = self.create_state_variables(r, 'z')
             tk = self.create_half_state_variables(r, 'tk')
             x_next = self.create_state_variables(r + 1, 'x')
-            lp_contents += self.subcells(x, y, r, self.cellsize)
-            lp_contents += self.add_tweakey(tk, y, z)
+            constraints += self.subcells(x, y, r, self.cellsize)
+            constraints += self.add_tweakey(tk, y, z)
             pz = self.shift_rows(z)
-            lp_contents += self.mix_columns(x_next, pz)
-        return lp_contents
+            constraints += self.mix_columns(x_next, pz)
+        return constraints
     
     def exclude_trivial_trail(self):
-        lp_contents = ""
+        constraints = []
         x = self.create_state_variables(0, 'x')
-        lp_contents += " + ".join(self.flatten(x)) + " >= 1\n"
-        return lp_contents
+        constraints.append(sum_constraint(self.flatten(x), GREATER_EQUAL, 1))
+        return constraints
     
     def declare_fixed_variables(self):
-        lp_contents = ""
+        constraints = []
         for cond in self.fixed_variables.items():            
             var = cond[0]
             val = cond[1]
@@ -606,63 +582,57 @@ class Linear:
                 if "X" not in val:
                     state_values = list(bin(int(val, 16))[2:].zfill(self.cellsize*16))
                     for i in range(self.cellsize*16):
-                        lp_contents += f"{state_vars[i]} = {state_values[i]}\n"
+                        constraints.append(fix(state_vars[i], state_values[i]))
                 else:
                     fixed_positions = [i for i in range(len(val)) if val[i] != "X"]
                     for i in fixed_positions:
                         cell_value = list(bin(int(val[i], 16))[2:].zfill(self.cellsize))
                         for j in range(self.cellsize):
-                            lp_contents += f"{state_vars[i*self.cellsize + j]} = {cell_value[j]}\n"
+                            constraints.append(fix(state_vars[i*self.cellsize + j], cell_value[j]))
                     
             elif len(var) == 3:
                 state_vars = [f"{var[0]}_{var[1]}_{var[2]}_{i}" for i in range(self.cellsize)]
                 if val != "Y":
                     state_values = list(bin(int(val, 16))[2:].zfill(self.cellsize))
                     for i in range(self.cellsize):
-                        lp_contents += f"{state_vars[i]} = {state_values[i]}\n"
+                        constraints.append(fix(state_vars[i], state_values[i]))
                 elif val == "Y":
-                    lp_contents += " + ".join(state_vars) + " >= 1\n"
+                    constraints.append(sum_constraint(state_vars, GREATER_EQUAL, 1))
             elif len(var) == 4:
-                lp_contents += f"{cond[0]} = {cond[1]}\n"
-        return lp_contents
+                constraints.append(fix(cond[0], cond[1]))
+        return constraints
 
     def declare_variables_type(self):
         '''
-        Specifying variables' type in the LP file
+        Specifying variables' type in the MILP model
         '''
         
-        lp_contents = 'binary\n'
         self.used_variables = list(set(self.used_variables))
-        for var in self.used_variables:
-            lp_contents += var + '\n'            
-        lp_contents += "end\n"
-        return lp_contents
+        return self.used_variables
 
     def make_model(self):
         '''
         Generate the MILP model of SKINNY for linear cryptanalysis
         '''
         
-        lp_contents = ""
         print('Generating the MILP model ...')
-        lp_contents += "minimize\n"
+        builder = ModelBuilder(f"SKINNY-{self.cellsize*16}-{self.cellsize*self.variant*16} linear {self.rounds} rounds")
         self.obj_func = self.create_objective_function()
-        lp_contents += self.obj_func
-        lp_contents += "\nsubject to\n"        
+        builder.set_objective(*self.obj_func)
         if self.upperbound1 != None:
-            lp_contents += f"{self.obj_func} <= {self.upperbound1}\n"
+            builder.add_constraints([constraint(*self.obj_func, LESS_EQUAL, self.upperbound1)])
         if self.start_round != None and self.end_round != None and self.upperbound2 != None:
             halfway_weight = self.create_objective_function(start_round=self.start_round, end_round = self.end_round)
-            lp_contents += f"{halfway_weight} <= {self.upperbound2}\n"
-        lp_contents += self.exclude_trivial_trail()
-        lp_contents += self.encryption()
-        lp_contents += self.declare_fixed_variables()
-        lp_contents += self.declare_variables_type() 
-        if os.path.exists(self.model_filename):
-            os.remove(self.model_filename)
-        with open(self.model_filename, 'w') as fileobj:
-            fileobj.write(lp_contents)
-        print(f"MILP model was written into {self.model_filename}\n") 
+            builder.add_constraints([constraint(*halfway_weight, LESS_EQUAL, self.upperbound2)])
+        builder.add_constraints(self.exclude_trivial_trail())
+        builder.add_constraints(self.encryption())
+        builder.add_constraints(self.declare_fixed_variables())
+        builder.declare_binary(self.declare_variables_type())
+        self.model = builder.build()
+        if self.dump_lp:
+            lp_file_name = builder.write_lp(self.model, self.model_filename)
+            print(f"MILP model was written into {lp_file_name}\n")
+
 
     
     def find_characteristic(self):
@@ -758,69 +728,31 @@ class Linear:
     def compute_differential_effect(self, log=1):
         '''
         Compute the differential effect for a given input/output linear approximations
-
-        Some general information about Gurobi:
-
-        PoolSolutions: It controls the size of the solution pool. Changing this parameter won't affect the number of solutions that are found - 
-        it simply determines how many of those are retained
-
-        You can use the PoolSearchMode parameter to control the approach used to find solutions. In its default setting (0), the MIP search simply aims to find one optimal solution. 
-        Setting the parameter to 2 causes the MIP to do a systematic search for the n best solutions. With a setting of 2, it will find the n best solutions, 
-        where n is determined by the value of the PoolSolutions parameter        
-
-        SolCount: Number of solutions found during the most recent optimization.
-        
-        Model status:
-        LOADED	1	Model is loaded, but no solution information is available.
-        OPTIMAL	2	Model was solved to optimality (subject to tolerances), and an optimal solution is available.
-        INFEASIBLE	3	Model was proven to be infeasible.
+        The trails are counted weight layer by weight layer (see dlcore/clustering.py).
+        The enumeration stops when the model has no more solutions, when the weight
+        exceeds end_weight, or when the last layer changes log2 of the probability
+        by less than the convergence threshold (if given).
         '''
-        
+
         status = False
         if self.time_limit != -1:
             self.model.Params.TIME_LIMIT = self.time_limit
-        #self.model.Params.PreSolve = 0 # Activating this flag causes the performance to be decreased        
-        self.model.Params.PoolSearchMode = 2
-        self.model.Params.PoolSolutions = 1
-        self.model.Params.OutputFlag = False                
-        obj = self.model.getObjective()
-        # Consider the start_weight
-        if self.start_weight != None:            
-            self.model.addConstr(obj >= self.start_weight, 'start_weight_constraint')       
-        time_start = time.time()
-        self.model.optimize()
-        if (self.model.Status == GRB.OPTIMAL):
-            status = True
-            self.total_weight = self.model.objVal
-            diff_prob = 0
-            print('\n')
-            while (self.model.Status == GRB.OPTIMAL and self.total_weight <= self.end_weight):
-                self.total_weight = self.model.objVal
-                self.model.Params.PoolSolutions = 2000000000 #GRB.MAXIN, Default value for PoolSolutions: 10                
-                temp_constraint = self.model.addConstr(obj == self.total_weight, name='temp_constraint')
-                self.model.update()
-                #self.model.Params.PreSolve = 1
-                self.model.optimize()
-                diff_prob += math.pow(2, -self.total_weight) * self.model.SolCount
-                time_end = time.time()
-                if log == 1:
-                    print('Current weight: %s' % str(self.total_weight))
-                    print('Number of trails: %s' % str(self.model.SolCount))
-                    print('\tCurrent Probability: 2^(' + str(math.log(diff_prob, 2)) + ')')
-                    print('Time used = %0.4f seconds\n' % (time_end - time_start))
-                self.model.remove(temp_constraint)
-                self.model.Params.PoolSolutions = 1                
-                self.model.addConstr(obj >= (self.total_weight + self.eps))
-                #self.model.Params.PreSolve = 0
-                self.model.optimize()
-        elif (self.model.Status == GRB.INFEASIBLE):
-            print('The model is infeasible!')
-            return status
-        else: 
-            print('Unknown Error!')
+        self.model.Params.OutputFlag = False
+        enumerator = WeightLayerEnumerator(self.model,
+                                           start_weight=self.start_weight,
+                                           end_weight=self.end_weight,
+                                           threshold=self.convergence,
+                                           pool_limit=self.pool_limit,
+                                           processes=self.processes,
+                                           threads=self.threads,
+                                           eps=self.eps,
+                                           verbose=(log == 1))
+        effect = enumerator.run()
+        if effect is None:
             return status
-        print("Total weight = {:0.02f}".format(math.log(diff_prob, 2)))
-        return math.log(diff_prob, 2)
+        self.total_weight = enumerator.weight
+        print("Total weight = {:0.02f}".format(effect))
+        return effect
             
     def compute_differential_effect_classic_method(self):
         status = False
@@ -876,8 +808,8 @@ class Linear:
         lhs = first_term - second_term
         self.model.addConstr(lhs <= support - 1)
 
+    @cached_solve
     def solve(self, log=1, solution_limit=None, mip_focus=None):        
-        self.model = read(self.model_filename)
         if solution_limit != None:
             self.model.Params.SolutionLimit = solution_limit
         if mip_focus != None:
@@ -892,7 +824,6 @@ class Linear:
             #self.compute_differential_effect_classic_method()
         else:
             print("mode should be in [0, 1, 2]")
-        os.remove(self.model_filename)
         return status
 
     def parse_solver_output(self):
@@ -1026,9 +957,24 @@ def loadparameters(args):
     if args.endweight:
         params["endweight"] = args.endweight[0]
     
+    if args.convergence:
+        params["convergence"] = args.convergence[0]
+    
+    if args.poollimit:
+        params["poollimit"] = args.poollimit[0]
+    
+    if args.processes:
+        params["processes"] = args.processes[0]
+    
+    if args.threads:
+        params["threads"] = args.threads[0]
+    
     if args.timelimit:
         params["timelimit"] = args.timelimit[0]
 
+    if args.dumplp:
+        params["dumplp"] = True
+
     return params
 
 def main():
@@ -1068,8 +1014,18 @@ def main():
                         help="starting weight for the trail search")
     parser.add_argument("-ew", "--endweight", nargs=1, type=int,
                         help="ending weight for the trail search")
+    parser.add_argument("-cv", "--convergence", nargs=1, type=float,
+                        help="stop when a new weight layer changes log2 of the probability by less than this value")
+    parser.add_argument("-pl", "--poollimit", nargs=1, type=int,
+                        help="size of the solution pool used to enumerate the weight layers")
+    parser.add_argument("-np", "--processes", nargs=1, type=int,
+                        help="number of worker processes counting the weight layers in parallel (mode 2)")
+    parser.add_argument("-th", "--threads", nargs=1, type=int,
+                        help="number of Gurobi threads of each worker process")
     parser.add_argument("-t", "--timelimit", nargs=1, type=int,
-                        help="time limit for the search")       
+                        help="time limit for the search")
+    parser.add_argument("--dumplp", action="store_true",
+                        help="write the MILP model into an .lp file (for debugging)")       
 
     # Parse command line arguments and construct parameter list
     args = parser.parse_args()
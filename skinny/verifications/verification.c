@@ -42,7 +42,10 @@ typedef unsigned long long int UINT64;
 // #define DEBUG 1
 #define STEP ((1 << 10) - 1)
 #define Nthreads 1         // Number of parallel threads utilized in this program
-#define NumOfExperiments 5 // Number of independent experiments
+#ifndef DL_EXPERIMENTS
+#define DL_EXPERIMENTS 5
+#endif
+#define NumOfExperiments DL_EXPERIMENTS // Number of independent experiments
 
 // Table that encodes the parameters of the various Skinny versions:
 // (block size, key size, number of rounds)
@@ -832,21 +835,43 @@ int main(int argc, char *argv[])
     // #######################################################################################################
     // #######################################################################################################
     // ############################## User must change only the following lines ##############################
-    int R = 8;   // Number of rounds
-    int ver = 2; // Determine the version:
+    // Default values, which can be overridden at compile time, e.g., -DDL_ROUNDS=<rounds> (see dlcore/verify.py)
+#ifndef DL_ROUNDS
+#define DL_ROUNDS 8
+#endif
+#ifndef DL_VERSION
+#define DL_VERSION 2
+#endif
+#ifndef DL_DK
+#define DL_DK "000000000000000000000000000000000000000000000000"
+#endif
+#ifndef DL_DP
+#define DL_DP "000000000000000a"
+#endif
+#ifndef DL_LC
+#define DL_LC "0000300030003000"
+#endif
+#ifndef DL_DEG1
+#define DL_DEG1 0
+#endif
+#ifndef DL_DEG2
+#define DL_DEG2 20
+#endif
+    int R = DL_ROUNDS;   // Number of rounds
+    int ver = DL_VERSION; // Determine the version:
                  // [0 = Skinny-64-64]
                  // [1 = Skinny-64-128]
                  // [2 = Skinny-64-192]
                  // [3 = Skinny-128-128]
                  // [4 = Skinny-128-256]
                  // [5 = Skinny-128-384]
-    char dk_str[] = "000000000000000000000000000000000000000000000000";
-    char dp_str[]  = "000000000000000a";
-    char dc_str[]  = "0000300030003000";
+    char dk_str[] = DL_DK;
+    char dp_str[]  = DL_DP;
+    char dc_str[]  = DL_LC;
     // ########################## Number of queries #########################
     int N1 = Nthreads; // Number of paralle threads : N1
-    int deg1 = 0;
-    int deg2 = 20;
+    int deg1 = DL_DEG1;
+    int deg2 = DL_DEG2;
     UINT64 N2 = 1 << deg1; // Number of bunches per threads: N2 = 2^(deg1)
     UINT64 N3 = 1 << deg2; // Number of queries per bunches: N3 = 2^(deg2)
     // #######################################################################################################
@@ -79,6 +79,11 @@ import time
 from sage.all import *
 from sage.crypto.sboxes import SBox
 import itertools
+import sys
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from dlcore import tables, chains, mzntables
+from dlcore.reduction import reduce_inequalities, describe
 
 # ESPRESO_BIN_PATH = os.path.join(os.environ['SAGE_ROOT'], 'local/bin/espresso')
 ESPRESO_BIN_PATH = os.path.join(os.getcwd(), 'espresso', 'build', 'espresso')
@@ -152,6 +157,7 @@ class SboxAnalyzer(SBox):
 
         super().__init__(lookuptable)
         SboxAnalyzer.sbox_counter += 1
+        self.lut = tables.lookup_table([self[x] for x in range(2**self.input_size())])
         if not os.path.exists(os.path.join(os.getcwd(), 'tmp')):
             os.makedirs(os.path.join(os.getcwd(), 'tmp'))
         self.truth_table_filename = os.path.join(os.getcwd(), 'tmp', 'tt_' + str(SboxAnalyzer.sbox_counter) + '.txt')
@@ -346,6 +352,41 @@ class SboxAnalyzer(SBox):
         sat_clauses = ' & '.join(sat_clauses)
         return (sat_clauses, milp_constraints)
 
+    def reduce_constraints(self, milp_constraints, table="ddt", subtable=None, method="milp", time_limit=600):
+        """
+        Select a smallest subset of the given constraints (e.g., the output of ESPRESSO, or the
+        facets of the convex hull) which still cuts off every point outside the subtable,
+        by solving a set-cover MILP (with a greedy fallback, see dlcore/reduction.py)
+
+        :param milp_constraints list: candidate inequalities over a0, ..., b0, ... (valid for every point of the subtable)
+        :param table str: 'ddt', 'lat' (squared LAT), or 'dlct'
+        :param subtable: entry of the table defining the subtable (None: the star table, i.e., all nonzero entries)
+        :param method str: 'milp' or 'greedy'
+        :param time_limit int: time limit of the set-cover MILP in seconds
+        :return: the reduced list of inequalities
+        """
+
+        if table == "ddt":
+            if self._data_required_for_differential_analysis is None:
+                self._compute_data_for_differential_analysis()
+            values = self.ddt
+        elif table == "lat":
+            if self._data_required_for_linear_analysis is None:
+                self._compute_data_for_linear_analysis()
+            values = self._squared_lat
+        elif table == "dlct":
+            if self._data_required_for_difflin_analysis is None:
+                self._compute_data_for_difflin_analysis()
+            values = self._dlct
+        else:
+            raise ValueError("Invalid value for table! table must be in ['ddt', 'lat', 'dlct'].")
+        values = np.asarray(values)
+        valid = (values != 0) if subtable is None else (values == subtable)
+        placeholders = [f"a{i}" for i in range(self.input_size())] + [f"b{i}" for i in range(self.output_size())]
+        reduction = reduce_inequalities(milp_constraints, placeholders, valid, method=method, time_limit=time_limit)
+        print(describe(reduction))
+        return reduction.inequalities
+
     ###############################################################################################################
     ###############################################################################################################
     ###############################################################################################################
@@ -471,8 +512,8 @@ class SboxAnalyzer(SBox):
         Compute the data required for differential analysis
         """
         
-        self.ddt = self.difference_distribution_table()
-        self._diff_spectrum = set([self.ddt[i][j] for i in range(2**self.input_size()) for j in range(2**self.output_size())]) - {0, 2**self.input_size()}
+        self.ddt = tables.difference_distribution_table(self.lut, self.output_size())
+        self._diff_spectrum = set(tables.spectrum(self.ddt)) - {0, 2**self.input_size()}
         self._diff_spectrum = sorted(list(self._diff_spectrum))
         self._len_diff_spectrum = len(self._diff_spectrum)
         self._diff_weights = [abs(float(log(d/(2**self.input_size()), 2))) for d in self._diff_spectrum]        
@@ -717,10 +758,10 @@ class SboxAnalyzer(SBox):
 
         input_size = self.input_size()
         output_size = self.output_size()
-        self.lat = self.linear_approximation_table(scale='correlation')        
-        self._squared_lat = [[x**2 for x in y] for y in self.lat]
-        self.lat_scaled_by_absolute_correlation = [[2**input_size * lxy for lxy in ly] for ly in self.lat]
-        self._squared_correlation_spectrum = sorted(list(set(flatten(self._squared_lat)) - {0, 1}))
+        self.lat_scaled_by_absolute_correlation = tables.linear_approximation_table(self.lut, output_size, scale='absolute')
+        self.lat = self.lat_scaled_by_absolute_correlation / 2**input_size
+        self._squared_lat = self.lat**2
+        self._squared_correlation_spectrum = sorted(list(set(tables.spectrum(self._squared_lat)) - {0, 1}))
         self._linear_weights = [abs(float(log(x, 2))) for x in self._squared_correlation_spectrum]
         self._len_linear_weights = len(self._linear_weights)
         if self._len_linear_weights > 0:            
@@ -1138,6 +1179,63 @@ class SboxAnalyzer(SBox):
         constraints += f"else ({last_condition})\nendif"
         print(self.variables_mapping)
         return constraints
+
+    def generate_cp_table(self, propagation_dictionary, name, input_variables=None, output_variables=None):
+        """
+        Generates a MiniZinc predicate encoding the deterministic propagation as a table constraint
+        (a compact alternative of the if-elseif chain of generate_cp_constraints, see dlcore/mzntables.py)
+
+        :param dict propagation_dictionary: output of encode_deterministic_differential_behavior or encode_deterministic_linear_behavior
+        :param str name: name of the predicate
+        :param list input_variables: names of the input variables (msb first)
+        :param list output_variables: names of the output variables (msb first)
+        :return: the predicate as a string
+        """
+
+        m = self.input_size()
+        n = self.output_size()
+        a = [f"a{i}" for i in range(m)] if input_variables is None else input_variables
+        b = [f"b{i}" for i in range(n)] if output_variables is None else output_variables
+        if len(a) != m or len(b) != n:
+            raise ValueError(f"The size of input (output) variables should be {m} ({n})")
+        rows = mzntables.deterministic_tuples(propagation_dictionary, m, n, unknown=self.unknown)
+        parameters = [(v, range(self.unknown, self.one + 1)) for v in a + b]
+        return mzntables.table_predicate(name, parameters, rows)
+
+    def generate_cp_star_table(self, name, table="ddt", input_variables=None, output_variables=None):
+        """
+        Generates a MiniZinc predicate encoding the possible transitions of the *-DDT, *-LAT or *-DLCT as a table constraint
+
+        :param str name: name of the predicate
+        :param str table: "ddt", "lat" or "dlct"
+        :param list input_variables: names of the input variables (msb first)
+        :param list output_variables: names of the output variables (msb first)
+        :return: the predicate as a string
+        """
+
+        if table == "ddt":
+            if self._data_required_for_differential_analysis is None:
+                self._compute_data_for_differential_analysis()
+            values = self.ddt
+        elif table == "lat":
+            if self._data_required_for_linear_analysis is None:
+                self._compute_data_for_linear_analysis()
+            values = self.lat
+        elif table == "dlct":
+            if self._data_required_for_difflin_analysis is None:
+                self._compute_data_for_difflin_analysis()
+            values = self._dlct
+        else:
+            raise ValueError("table should be 'ddt', 'lat' or 'dlct'")
+        m = self.input_size()
+        n = self.output_size()
+        a = [f"a{i}" for i in range(m)] if input_variables is None else input_variables
+        b = [f"b{i}" for i in range(n)] if output_variables is None else output_variables
+        if len(a) != m or len(b) != n:
+            raise ValueError(f"The size of input (output) variables should be {m} ({n})")
+        rows = mzntables.star_tuples(values, m, n)
+        parameters = [(v, range(0, 2)) for v in a + b]
+        return mzntables.table_predicate(name, parameters, rows)
     
     def minimized_determinisitc_diff_constraints(self, mode=6):
         """
@@ -1349,25 +1447,11 @@ class SboxAnalyzer(SBox):
     def _compute_data_for_difflin_analysis(self):
         """
         Compute the data required for differential-linear analysis
-        """        
-
-        input_size = self.input_size()
-        output_size = self.output_size()
+        (the DLCT is computed as the Walsh transform of the autocorrelations, see dlcore/tables.py)
+        """
 
-        dlct = [[0 for y in range(2**output_size)] for x in range(2**input_size)]
-        for diff in range(2**input_size):
-            for mask in range(2**output_size):
-                counter_0 = 0
-                counter_1 = 0
-                for data in range(2**input_size):
-                    actual_output_diff = self[data] ^ self[data ^ diff]
-                    if self.dot_product(mask, actual_output_diff) == 0:
-                        counter_0 += 1 
-                    else:
-                        counter_1 += 1
-                dlct[diff][mask] = counter_0 - counter_1
-        self._dlct = dlct
-        self._dlct_spectrum = sorted(list(set(flatten(self._dlct))))
+        self._dlct = tables.differential_linear_connectivity_table(self.lut, self.output_size())
+        self._dlct_spectrum = tables.spectrum(self._dlct)
         self._dlct_weights = [abs(float(log(abs(x), 2))) for x in self._dlct_spectrum if x != 0]
         self._len_dlct_weights = len(self._dlct_weights)
         self._data_required_for_difflin_analysis = "Data for linear analysis are computed and stored in memory."
@@ -1393,49 +1477,20 @@ class SboxAnalyzer(SBox):
             
     def upper_differential_linear_connectivity_table(self):
         """
-        Compute the upper differential-linear connectivity table        
+        Compute the upper differential-linear connectivity table, i.e.,
+        udlct[input_diff][output_diff][output_mask] = (-1)^(output_mask.output_diff) ddt[input_diff][output_diff]
         """
 
-        input_size = self.input_size()
-        output_size = self.output_size()
-        self._upper_differential_linear_connectivity_table = [[[0 for _ in range(2**output_size)] for _ in range(2**output_size)] for _ in range(2**input_size)]        
-        for input_diff in range(2**input_size):
-            for output_diff in range(2**output_size):
-                for output_mask in range(2**output_size):
-                    counter_0 = 0
-                    counter_1 = 0
-                    dotproduct = self.dot_product(output_mask, output_diff)
-                    for data in range(2**input_size):                        
-                        actual_output_diff = self[data] ^ self[data ^ input_diff]
-                        if dotproduct == 0 and actual_output_diff == output_diff:
-                            counter_0 += 1
-                        elif dotproduct == 1 and actual_output_diff == output_diff:
-                            counter_1 += 1
-                    self._upper_differential_linear_connectivity_table[input_diff][output_diff][output_mask] = counter_0 - counter_1
+        self._upper_differential_linear_connectivity_table = tables.upper_differential_linear_connectivity_table(self.lut, self.output_size())
         return self._upper_differential_linear_connectivity_table
 
     def lower_differential_linear_connectivity_table(self):
         """
-        Compute the lower differential-linear connectivity table        
+        Compute the lower differential-linear connectivity table, i.e.,
+        ldlct[input_diff][input_mask][output_mask] = (-1)^(input_mask.input_diff) dlct[input_diff][output_mask]
         """
 
-        input_size = self.input_size()
-        output_size = self.output_size()
-        self._lower_differential_linear_connectivity_table = [[[0 for _ in range(2**output_size)] for _ in range(2**input_size)] for _ in range(2**input_size)]
-        for input_diff in range(2**input_size):
-            for input_mask in range(2**input_size):
-                dotproduct_input = self.dot_product(input_mask, input_diff)
-                for output_mask in range(2**output_size):
-                    counter_0 = 0
-                    counter_1 = 0                    
-                    for data in range(2**input_size):
-                        actual_output_diff = self[data] ^ self[data ^ input_diff]
-                        dotproduct_output = self.dot_product(output_mask, actual_output_diff)
-                        if dotproduct_input ^ dotproduct_output == 0:
-                            counter_0 += 1
-                        elif dotproduct_input ^ dotproduct_output == 1:
-                            counter_1 += 1                        
-                    self._lower_differential_linear_connectivity_table[input_diff][input_mask][output_mask] = counter_0 - counter_1
+        self._lower_differential_linear_connectivity_table = tables.lower_differential_linear_connectivity_table(self.lut, self.output_size())
         return self._lower_differential_linear_connectivity_table
 
     def double_differential_linear_connectivity_table(self):
@@ -1452,13 +1507,8 @@ class SboxAnalyzer(SBox):
         if self._data_required_for_linear_analysis == None:
             self._compute_data_for_linear_analysis()
         dlct = self.differential_linear_connectivity_table()
-        ddt = self.ddt
-        self._ddlct = [[0 for y in range(2**output_size)] for x in range(2**input_size)]
-        for diff in range(2**input_size):
-            for mask in range(2**output_size):
-                for diff_middle in range(2**input_size):
-                    self._ddlct[diff][mask] += ddt[diff][diff_middle] * dlct[diff_middle][mask]
-        self._ddlct_spectrum = sorted(list(set(flatten(self._ddlct))))
+        self._ddlct = chains.connectivity_chain(self.ddt, dlct, 2)
+        self._ddlct_spectrum = tables.spectrum(self._ddlct)
         self._ddlct_weights = [abs(float(log(abs(x), 2))) for x in self._ddlct_spectrum if x != 0]
         self._len_ddlct_weights = len(self._ddlct_weights)   
         return self._ddlct
@@ -1476,31 +1526,16 @@ class SboxAnalyzer(SBox):
             self._compute_data_for_differential_analysis()
         if self._data_required_for_linear_analysis == None:
             self._compute_data_for_linear_analysis()
-        correctness_right = True
-        correctness_left = True
         ddt = self.ddt
         dlct = self.differential_linear_connectivity_table()
         udlct = self.upper_differential_linear_connectivity_table()
         ldlct = self.lower_differential_linear_connectivity_table()
-        squared_lat = [[a**2 for a in column] for column in self.lat_scaled_by_absolute_correlation]
-        for input_diff in range(2**input_size):
-            for output_mask in range(2**output_size):
-                sum_0 = 0
-                for diff_middle in range(2**input_size):                    
-                    for mask_middle in range(2**output_size):
-                        sum_0 += udlct[input_diff][diff_middle][mask_middle] * ldlct[diff_middle][mask_middle][output_mask]
-                sum_0 = sum_0//(2**input_size)
-                sum_1 = 0
-                for diff_middle in range(2**input_size):
-                    sum_1 += ddt[input_diff][diff_middle] * dlct[diff_middle][output_mask]
-                sum_2 = 0
-                for mask_middle in range(2**output_size):
-                    sum_2 += dlct[input_diff][mask_middle] * squared_lat[mask_middle][output_mask]
-                sum_2 = sum_2//(2**input_size)
-                if sum_1 != sum_2:
-                    correctness_right = False
-                if sum_0 != sum_1 and sum_1 == sum_2:
-                    correctness_left = False
+        squared_lat = self.lat_scaled_by_absolute_correlation**2
+        sum_0 = np.tensordot(udlct, ldlct, axes=([1, 2], [0, 1])) // 2**input_size
+        sum_1 = ddt @ dlct
+        sum_2 = (dlct @ squared_lat) // 2**input_size
+        correctness_right = bool(np.all(sum_1 == sum_2))
+        correctness_left = not bool(np.any((sum_0 != sum_1) & (sum_1 == sum_2)))
         if correctness_left and correctness_right:
             print("The Hadipour et al.'s theorem is satisfied.")
             return True
@@ -1745,13 +1780,7 @@ class SboxAnalyzer(SBox):
             self._compute_data_for_differential_analysis()
         if self._data_required_for_linear_analysis == None:
             self._compute_data_for_linear_analysis()
-        ddlct = self.double_differential_linear_connectivity_table()        
-        ddt = self.ddt
-        self._tdlct = [[0 for _ in range(2**output_size)] for _ in range(2**input_size)]
-        for dx in range(2**input_size):
-            for ly in range(2**output_size):
-                for dm in range(2**output_size):
-                    self._tdlct[dx][ly] += ddt[dx][dm] * ddlct[dm][ly]
+        self._tdlct = chains.connectivity_chain(self.ddt, self._dlct, 3)
         return self._tdlct
     
     def _tdlct_to_booleanfunction(self, corr, reverse=1):
@@ -1880,13 +1909,7 @@ class SboxAnalyzer(SBox):
             self._compute_data_for_differential_analysis()
         if self._data_required_for_linear_analysis == None:
             self._compute_data_for_linear_analysis()
-        tdlct = self.triple_differential_linear_connectivity_table()
-        ddt = self.ddt
-        self._qdlct = [[0 for _ in range(2**output_size)] for _ in range(2**input_size)]
-        for dx in range(2**input_size):
-            for ly in range(2**output_size):
-                for dm in range(2**output_size):
-                    self._qdlct[dx][ly] += ddt[dx][dm] * tdlct[dm][ly]
+        self._qdlct = chains.connectivity_chain(self.ddt, self._dlct, 4)
         return self._qdlct
 
     def _qdlct_to_booleanfunction(self, corr, reverse=1):
@@ -2015,13 +2038,7 @@ class SboxAnalyzer(SBox):
             self._compute_data_for_differential_analysis()
         if self._data_required_for_linear_analysis == None:
             self._compute_data_for_linear_analysis()
-        quaddlct = self.quadruple_differential_linear_connectivity_table()
-        ddt = self.ddt
-        self._quindlct = [[0 for _ in range(2**output_size)] for _ in range(2**input_size)]
-        for dx in range(2**input_size):
-            for ly in range(2**output_size):
-                for dm in range(2**output_size):
-                    self._quindlct[dx][ly] += ddt[dx][dm] * quaddlct[dm][ly]
+        self._quindlct = chains.connectivity_chain(self.ddt, self._dlct, 5)
         return self._quindlct
     
     def _quindlct_to_booleanfunction(self, corr, reverse=1):
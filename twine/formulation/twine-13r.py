@@ -25,6 +25,11 @@ SOFTWARE.
 
 from sage.all import *
 from argparse import ArgumentParser, RawTextHelpFormatter
+import os
+import sys
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from dlcore import tables, chains
 
 def doct_product(a, b, n=4):
     """
@@ -36,21 +41,20 @@ def doct_product(a, b, n=4):
         output ^= ((a >> i) & 1) * ((b >> i) & 1)
     return output
 
-def compute_ddt4(sb):
+def compute_ddt(sb):
     """
-    compute DDT4
+    compute DDT
     """
 
     n = sb.input_size()
-    ddt = sb.difference_distribution_table()
-    ddt4 = [[0 for _ in range(2**n)] for _ in range(2**n)]
-    for D1 in range(2**n):
-        for D2 in range(2**n):
-            for D3 in range(2**n):
-                for D4 in range(2**n):
-                    for D5 in range(2**n):
-                        ddt4[D1][D5] += ddt[D1][D2] * ddt[D2][D3] * ddt[D3][D4] * ddt[D4][D5]
-    return ddt4
+    return tables.difference_distribution_table([sb[x] for x in range(2**n)], sb.output_size())
+
+def compute_ddt4(sb):
+    """
+    compute DDT4 = DDT^4
+    """
+
+    return chains.ddt_power(compute_ddt(sb), 4)
 
 def compute_correlation_13r_v0(sb, D=None, L=None):
     """
@@ -119,25 +123,22 @@ def compute_correlation_13r_v2(sb, D=None, L=None):
     sa = SboxAnalyzer(sb)
     n = sa.input_size()
 
-    corr = 0
     ddt4 = compute_ddt4(sa)
-    ddt = sa.difference_distribution_table()
+    ddt = compute_ddt(sa)
     dlct = sa.differential_linear_connectivity_table()
+    # dlct_xor[D6][D7][L] = dlct[D6 ^ D7][L]
+    indices = np.arange(2**n)
+    dlct_xor = np.asarray(dlct)[indices[:, None] ^ indices[None, :]]
+    # corr[D][L] = sum_{D2, D6, D7} ddt[D][D2] * ddt4[D2][D6] * ddt[D][D7] * dlct[D6 ^ D7][L] * dlct[D2][L]
+    inner = np.einsum("dk,jkl->djl", ddt, dlct_xor)
+    table = np.einsum("da,aj,al,djl->dl", ddt, ddt4, np.asarray(dlct), inner)
     if D is not None and L is not None:
-        for D2 in range(2**n):
-            for D6 in range(2**n):
-                for D7 in range(2**n):
-                    corr += ddt[D][D2] * ddt4[D2][D6] * ddt[D][D7] * dlct[D6 ^ D7][L] * dlct[D2][L]
-        corr = corr/(2**(8*n))
+        corr = table[D][L]/(2**(8*n))
         return corr
     else:
         for D in range(2**n):
             for L in range(2**n):
-                for D2 in range(2**n):
-                    for D6 in range(2**n):
-                        for D7 in range(2**n):
-                            corr += ddt[D][D2] * ddt4[D2][D6] * ddt[D][D7] * dlct[D6 ^ D7][L] * dlct[D2][L]
-                corr = corr/(2**(8*n))            
+                corr = table[D][L]/(2**(8*n))
                 if corr > 0:
                     sign = "+"
                 elif corr < 0:
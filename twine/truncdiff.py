@@ -31,6 +31,9 @@ from statistics import mode
 import time
 import os
 from gurobipy import *
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import temporary_path
 
 class WordTwineDiff:
     """
@@ -55,7 +58,7 @@ class WordTwineDiff:
         self.dummy_var = "d"
         self.nrounds = nrounds
         self.milp_variables = []
-        self.lp_file_name = f"twine_{nrounds}r.lp"
+        self.lp_file_name = temporary_path(f"twine_{nrounds}r_", ".lp")
         self.permute_nibbles = [0x5, 0x0, 0x1, 0x4, 0x7, 0xc, 0x3, 0x8, 0xd, 0x6, 0x9, 0x2, 0xf, 0xa, 0xb, 0xe]
 
     @staticmethod
@@ -34,6 +34,11 @@ from truncdiff import WordTwineDiff
 from trunclin import WordTwineLin
 import time
 from gurobipy import *
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import temporary_path
+from dlcore.candidates import configure_pool
 
 class TruncatedDiffLin(WordTwineDiff, WordTwineLin):
     """
@@ -54,7 +59,7 @@ class TruncatedDiffLin(WordTwineDiff, WordTwineLin):
         """
 
         super().__init__()
-        self.lp_file_name = f"warp_{RU}_{RM}_{RL}.lp"
+        self.lp_file_name = temporary_path(f"twine_{RU}_{RM}_{RL}_", ".lp")
         self.RU = RU
         self.RM = RM
         self.RL = RL
@@ -190,9 +195,11 @@ class TruncatedDiffLin(WordTwineDiff, WordTwineLin):
         with open(self.lp_file_name, "w") as lpfile:
             lpfile.write(constraints)
 
-    def find_truncated_difflin_trail(self):
+    def find_truncated_difflin_trail(self, number_of_solutions=1):
         """
         Solve the constructed model minimizing the number of active S-boxes
+
+        :param int number_of_solutions: if larger than 1, collect the best solutions in the solution pool (see dlcore/candidates.py)
         """
 
         self.make_model()
@@ -201,11 +208,7 @@ class TruncatedDiffLin(WordTwineDiff, WordTwineLin):
         self.milp_model.setParam(GRB.Param.OutputFlag, True)
         start_time = time.time()
 
-        # self.milp_model.Params.PoolSearchMode = 2
-        # # Limit number of solutions
-        # self.milp_model.Params.PoolSolutions = 2
-        # # Choose solution number 1
-        # self.milp_model.Params.SolutionNumber = 1
+        configure_pool(self.milp_model, number_of_solutions)
         ###################
         self.milp_model.optimize()
         ###################
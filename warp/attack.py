@@ -30,6 +30,13 @@ or Markov cipher assumption. The tool's primary function is to find some bounds
 for the security of WARP against differential, linear, and differential-linear cryptanalysis.
 """
 
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import output_path, run_directory, run_id, write_summary
+from dlcore.candidates import distinct_solutions, rank_candidates, ranking_table, truncated_trail_key
+from dlcore.warmstart import truncated_zero_bits
+from dlcore.estimator import estimate_correlation, instantiate
 from argparse import ArgumentParser, RawTextHelpFormatter
 from truncdifflin import TruncatedDifflin
 from diff import Diff
@@ -43,6 +50,84 @@ import time
 fixed_golden_value_diff = ["0", "0", "1", "0"]
 fixed_golden_value_linear = ["1", "0", "1", "1"]
 
+def instantiate_upper_trail(upper_trail, RU, time_limit):
+    """
+    Instantiate the truncated upper trail with a differential trail and compute its differential effect
+    (solved in a worker process, concurrently with the lower trail, see dlcore/pipeline.py)
+    """
+
+    params = {"nrounds" : RU,
+              "mode" : 0,
+              "startweight" : 0,
+              "endweight" : 128,
+              "timelimit" : time_limit,
+              "numberoftrails" : 1,
+              "fixedVariables" : {}}
+    for nibble in range(32):
+        if upper_trail[f"x_0"][nibble] == "0":
+            for bit in range(4):
+                params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = "0"
+        if upper_trail[f"x_{RU}"][nibble] == "0":
+            for bit in range(4):
+                params["fixedVariables"][f"x_{RU}_{nibble}_{bit}"] = "0"
+        if upper_trail[f"x_{RU}"][nibble] == "1":
+            pass
+            for bit in range(4):
+                params["fixedVariables"][f"x_{RU}_{nibble}_{bit}"] = fixed_golden_value_diff[bit]
+    # hint the inner rounds to the truncated upper trail, and seed the solver
+    # with a fast instantiation of it (see dlcore/warmstart.py)
+    params["warmstart"] = True
+    params["warmstartzeros"] = [v for r in range(1, RU)
+                                for v in truncated_zero_bits(upper_trail[f"x_{r}"], lambda nibble, bit: f"x_{r}_{nibble}_{bit}", 4)]
+    diff = Diff(params)
+    diff.make_model()
+    diff_upper_trail = diff.solve()
+    params["fixedVariables"] = {"x_0": diff_upper_trail["x_0"], f"x_{RU}": diff_upper_trail[f"x_{RU}"]}
+    params["mode"] = 2
+    diff = Diff(params)
+    diff.make_model()
+    diff_effect_upper = diff.solve()
+    return diff_upper_trail, diff_effect_upper
+
+def instantiate_lower_trail(lower_trail, RM, RL, time_limit):
+    """
+    Instantiate the truncated lower trail with a linear trail and compute its squared correlation
+    (solved in a worker process, concurrently with the upper trail, see dlcore/pipeline.py)
+    """
+
+    params = {"nrounds" : RL,
+              "mode" : 0,
+              "startweight" : 0,
+              "endweight" : 128,
+              "timelimit" : time_limit,
+              "numberoftrails" : 1,
+              "fixedVariables" : {}}        
+    for nibble in range(32):
+        if lower_trail[f"x_{RM}"][nibble] == "0":
+            for bit in range(4):
+                params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = "0"
+        if lower_trail[f"x_{RM + RL}"][nibble] == "0":
+            for bit in range(4):
+                params["fixedVariables"][f"x_{RL}_{nibble}_{bit}"] = "0"
+        if lower_trail[f"x_{RM}"][nibble] == "1":
+            pass
+            for bit in range(4):
+                params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = fixed_golden_value_linear[bit]                    
+    # hint the inner rounds to the truncated lower trail, and seed the solver
+    # with a fast instantiation of it (see dlcore/warmstart.py)
+    params["warmstart"] = True
+    params["warmstartzeros"] = [v for r in range(1, RL)
+                                for v in truncated_zero_bits(lower_trail[f"x_{RM + r}"], lambda nibble, bit: f"x_{r}_{nibble}_{bit}", 4)]
+    lin = Lin(params)
+    lin.make_model()
+    lin_lower_trail = lin.solve()
+    params["fixedVariables"] = {"x_0": lin_lower_trail["x_0"], f"x_{RL}": lin_lower_trail[f"x_{RL}"]}
+    params["mode"] = 2
+    lin = Lin(params)
+    lin.make_model()
+    lin_effect_lower = lin.solve()
+    return lin_lower_trail, lin_effect_lower
+
 def main():
 
     parser = ArgumentParser(description="This tool finds the nearly optimum differential-linear distinguishers for WARP block cipher.\n"
@@ -70,89 +155,55 @@ def main():
     parser.add_argument('-tl', '--timelimit', type=int,
                         help="time limit in seconds")
     parser.add_argument('-ns', '--numofsols', type=int,
-                        help="number of solutions (currently disabled)")
+                        help="number of distinct truncated trails to instantiate and rank")
+    parser.add_argument('-e', '--experiment', type=int,
+                        help="log2 of the number of pairs to evaluate the distinguisher experimentally (0: disabled)")
 
     # Parse command line arguments and construct parameter list.
     args = parser.parse_args()
     params = loadparameters(args)
+    print(f"Run ID: {run_id()}, outputs in {run_directory()}")
     RU, RM, RL = params["RU"], params["RM"], params["RL"]
+    numofsols = params["numofsols"]
     RMU = params["RMU"]
     RML = params["RML"]
     WU, WM, WL = params["WU"], params["WM"], params["WL"]
+    experiment = params["experiment"]
 
     assert(RM > 0)
     tex_content = tex_init()
     start_time = time.time()
     ##############################################################################################
     ##############################################################################################
-    # Step1- Find a truncated differential-linear trail
+    # Step1- Find the numofsols best (pairwise non-equivalent) truncated differential-linear trails
     dl = TruncatedDifflin(RU=RU, RM=RM, RL=RL, RMU=RMU, RML=RML, WU=WU, WM=WM, WL=WL)    
-    dl.find_truncated_difflin_trail()
-    upper_trail, middle_part, lower_trail = dl.parse_solver_output()
+    dl.find_truncated_difflin_trail(number_of_solutions=numofsols)
+    candidates = distinct_solutions(dl.milp_model, dl.parse_solver_output,
+                                    key=lambda trail: truncated_trail_key(trail, RU, RM, RL),
+                                    number_of_solutions=numofsols)
     ##############################################################################################
     ##############################################################################################
-    # Step2- Instantiate the upper/lower truncated trails with real differential/linear trails
-    diff_upper_trail = None
-    diff_effect_upper = 0
-    if RU != 0:
-        time_limit = params["timelimit"]
-        params = {"nrounds" : dl.RU,
-                  "mode" : 0,
-                  "startweight" : 0,
-                  "endweight" : 128,
-                  "timelimit" : time_limit,
-                  "numberoftrails" : 1,
-                  "fixedVariables" : {}}
-        for nibble in range(32):
-            if upper_trail[f"x_0"][nibble] == "0":
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = "0"
-            if upper_trail[f"x_{dl.RU}"][nibble] == "0":
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{dl.RU}_{nibble}_{bit}"] = "0"
-            if upper_trail[f"x_{dl.RU}"][nibble] == "1":
-                pass
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{dl.RU}_{nibble}_{bit}"] = fixed_golden_value_diff[bit]
-        diff = Diff(params)
-        diff.make_model()
-        diff_upper_trail = diff.solve()
-        params["fixedVariables"] = {"x_0": diff_upper_trail["x_0"], f"x_{dl.RU}": diff_upper_trail[f"x_{dl.RU}"]}
-        params["mode"] = 2
-        diff = Diff(params)
-        diff.make_model()
-        diff_effect_upper = diff.solve()
-    ##############################################################################################
-    lin_lower_trail = None
-    lin_effect_lower = 0
-    if RL != 0:
-        time_limit = params["timelimit"]
-        params = {"nrounds" : dl.RL,
-                  "mode" : 0,
-                  "startweight" : 0,
-                  "endweight" : 128,
-                  "timelimit" : time_limit,
-                  "numberoftrails" : 1,
-                  "fixedVariables" : {}}        
-        for nibble in range(32):
-            if lower_trail[f"x_{dl.RM}"][nibble] == "0":
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = "0"
-            if lower_trail[f"x_{dl.RM + dl.RL}"][nibble] == "0":
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{dl.RL}_{nibble}_{bit}"] = "0"
-            if lower_trail[f"x_{dl.RM}"][nibble] == "1":
-                pass
-                for bit in range(4):
-                    params["fixedVariables"][f"x_{0}_{nibble}_{bit}"] = fixed_golden_value_linear[bit]                    
-        lin = Lin(params)
-        lin.make_model()
-        lin_lower_trail = lin.solve()
-        params["fixedVariables"] = {"x_0": lin_lower_trail["x_0"], f"x_{dl.RL}": lin_lower_trail[f"x_{dl.RL}"]}
-        params["mode"] = 2
-        lin = Lin(params)
-        lin.make_model()
-        lin_effect_lower = lin.solve()
+    # Step2- Instantiate the upper/lower truncated trails with real differential/linear trails for every candidate
+    # All branches are independent, and solved concurrently (see dlcore/pipeline.py).
+    # The candidates are ranked by the bounds on the total correlation p*r*q^2
+    def candidate_jobs(candidate):
+        upper_trail, middle_part, lower_trail = candidate
+        jobs = dict()
+        if RU != 0:
+            jobs["upper"] = (instantiate_upper_trail, (upper_trail, RU, params["timelimit"]))
+        if RL != 0:
+            jobs["lower"] = (instantiate_lower_trail, (lower_trail, RM, RL, params["timelimit"]))
+        return jobs
+    def correlation_bounds(candidate, results):
+        total_weight = results.get("upper", (None, 0))[1] + results.get("lower", (None, 0))[1]
+        return (total_weight + (-0.5)*candidate[1]["as"], total_weight + (-1.5)*candidate[1]["as"])
+    ranking = rank_candidates(candidates, candidate_jobs, correlation_bounds)
+    if len(ranking) > 1:
+        print("Ranking of the candidates (log2):")
+        print(ranking_table(ranking, score_names=("upper_bound", "lower_bound")))
+    upper_trail, middle_part, lower_trail = ranking[0].trail
+    diff_upper_trail, diff_effect_upper = ranking[0].results.get("upper", (None, 0))
+    lin_lower_trail, lin_effect_lower = ranking[0].results.get("lower", (None, 0))
     ##############################################################################################
     ##############################################################################################
     elapsed_time = time.time() - start_time
@@ -160,14 +211,14 @@ def main():
     stroutput = "#"*55 + "\n" + "Summary of the results:\n"    
     if diff_upper_trail != None:
         stroutput += "A differential trail for EU:\n"
-        stroutput += diff.print_trail(trail=diff_upper_trail)
+        stroutput += Diff.print_trail(trail=diff_upper_trail)
     stroutput += "-"*55 + "\n"
     mactive_sboxes = middle_part["as"]
     stroutput += f"Sandwich {RM} rounds in the middle with {mactive_sboxes} active S-boxes\n"
     stroutput += "-"*55 + "\n"
     if lin_lower_trail != None:
         stroutput += "A linear trail for EL:\n"
-        stroutput += lin.print_trail(trail=lin_lower_trail)
+        stroutput += Lin.print_trail(trail=lin_lower_trail)
     total_weight = 0
     stroutput += "#"*55 + "\n"
     if diff_effect_upper != 0:
@@ -184,12 +235,32 @@ def main():
     stroutput += "\nTo compute the accurate value of total probability, r should be evaluated experimentally or using the DLCT framework\n"
     stroutput += f"\nNumber of attacked rounds: {RU + RM + RL}"
     stroutput += f"\nConfiguration: RU={RU}, RM={RM}, RL={RL}, RMU={RMU}, RML={RML}, WU={WU}, WM={WM}, WL={WL}"
+    summary = dict()
+    if experiment > 0:
+        # evaluate the whole distinguisher on 2^experiment pairs
+        if diff_upper_trail != None:
+            input_difference = diff_upper_trail["x_0"]
+        else:
+            input_difference = instantiate(upper_trail["x_0"], fixed_golden_value_diff)
+        if lin_lower_trail != None:
+            output_mask = lin_lower_trail[f"x_{RL}"]
+        else:
+            output_mask = instantiate(lower_trail[f"x_{RM + RL}"], fixed_golden_value_linear)
+        estimate = estimate_correlation("warp", input_difference, output_mask, RU + RM + RL, degree=experiment)
+        stroutput += f"\nInput difference: {input_difference}, output mask: {output_mask}\n" + str(estimate)
+        summary = {"experimental_correlation": estimate.correlation,
+                   "experimental_interval": [estimate.lower, estimate.upper], "experiment": experiment}
     print(stroutput)
+    write_summary({"RU": RU, "RM": RM, "RL": RL, "RMU": RMU, "RML": RML, "WU": WU, "WM": WM, "WL": WL, "status": "DONE",
+                   "PU": diff_effect_upper, "CM": mactive_sboxes, "CL": lin_effect_lower,
+                   "lower_bound": lower_bound, "upper_bound": upper_bound,
+                   "candidates": [{"solution": c.index, "upper_bound": c.score[0], "lower_bound": c.score[1]} for c in ranking],
+                   "time": elapsed_time, **summary})
     ##############################################################################################
     ##############################################################################################
     # plot distinguisher
     if diff_upper_trail != None:
-        active_input_bits = diff.flatten_state([[4*i + j for j in range(4)] for i in range(32) if diff_upper_trail["x_0"][i] != "0"])
+        active_input_bits = Diff.flatten_state([[4*i + j for j in range(4)] for i in range(32) if diff_upper_trail["x_0"][i] != "0"])
         tex_content += tikz_mark_input_bits(active_input_bits, color="tugred")
         tex_content += tex_diff_trail(trail=diff_upper_trail, markpattern="markupperpath", direction="->")
     else:
@@ -207,7 +278,7 @@ def main():
                                            upper_crossing_difference=[str(i) for i in range(32) if upper_trail[f"x_{RU + RM}"][i] != "0"],\
                                            markpattern="marklowerpath",\
                                            direction="<-")
-        active_output_bits = lin.flatten_state([[4*i + j for j in range(4)] for i in range(32) if lin_lower_trail[f"x_{RL}"][i] != "0"])
+        active_output_bits = Lin.flatten_state([[4*i + j for j in range(4)] for i in range(32) if lin_lower_trail[f"x_{RL}"][i] != "0"])
         tex_content += tikz_mark_output_bits(active_output_bits, color="tugblue")
     else:
         active_output_bits = []
@@ -219,7 +290,7 @@ def main():
     tex_content += stroutput + "\n"
     tex_content += r"""\end{comment}""" + "\n"
     tex_content += tex_fin(RU + RM + RL)
-    with open("output.tex", "w") as texfile:
+    with open(output_path("output.tex"), "w") as texfile:
         texfile.write(tex_content)
     # print the elapsed time
     print("Elapsed time: %0.02f seconds" % elapsed_time)
@@ -242,7 +313,8 @@ def loadparameters(args):
             "WM" : 2,
             "WL" : 4, # 1.2 or 2
             "timelimit" : 1200,
-            "numofsols" : 1}
+            "numofsols" : 1,
+            "experiment" : 0}
 
     # Check if there is an input file specified
     if args.inputfile:
@@ -291,6 +363,9 @@ def loadparameters(args):
     if args.numofsols != None:
         params["numofsols"] = args.numofsols
 
+    if args.experiment != None:
+        params["experiment"] = args.experiment
+
     return params
 
 if __name__ == "__main__":
@@ -33,6 +33,9 @@ for the security of TWINE against differential and differential-linear cryptanal
 import time
 import os
 from gurobipy import *
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dlcore.runs import temporary_path
 
 class Wordwarpdiff:
     """
@@ -57,7 +60,7 @@ class Wordwarpdiff:
         self.dummy_var = "d"
         self.nrounds = nrounds
         self.milp_variables = []
-        self.lp_file_name = f"warp_{nrounds}r.lp"
+        self.lp_file_name = temporary_path(f"warp_{nrounds}r_", ".lp")
         self.permute_nibbles = [31, 6, 29, 14, 1, 12, 21, 8, 27, 2, 3, 0, 25, 4, 23, 10,
                                 15, 22, 13, 30, 17, 28, 5, 24, 11, 18, 19, 16, 9, 20, 7, 26]
 
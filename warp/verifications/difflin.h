@@ -48,13 +48,32 @@ void convert_hexstr_to_statearray(char hex_str[], int dx[32]);
 // #######################################################################################################
 // #######################################################################################################
 // ############################## User must change only the following lines ##############################
-const int DEG1 = 0;
-const int DEG2 = 20;
-const int NUMBER_OF_EXPERIMENTS = 10;   // Number of independent experiments
-const int NUMBER_OF_ROUNDS = 11;       // Number of rounds
+// Default values, which can be overridden at compile time, e.g., -DDL_ROUNDS=<rounds> (see dlcore/verify.py)
+#ifndef DL_DEG1
+#define DL_DEG1 0
+#endif
+#ifndef DL_DEG2
+#define DL_DEG2 20
+#endif
+#ifndef DL_EXPERIMENTS
+#define DL_EXPERIMENTS 10
+#endif
+#ifndef DL_ROUNDS
+#define DL_ROUNDS 11
+#endif
+#ifndef DL_DP
+#define DL_DP "00000000000000a00000000000000000"
+#endif
+#ifndef DL_LC
+#define DL_LC "00000000000000020000000000000000"
+#endif
+const int DEG1 = DL_DEG1;
+const int DEG2 = DL_DEG2;
+const int NUMBER_OF_EXPERIMENTS = DL_EXPERIMENTS;   // Number of independent experiments
+const int NUMBER_OF_ROUNDS = DL_ROUNDS;       // Number of rounds
 
-char DP_STR[] = "00000000000000a00000000000000000";
-char DC_STR[] = "00000000000000020000000000000000";
+char DP_STR[] = DL_DP;
+char DC_STR[] = DL_LC;
 // #######################################################################################################
 // #######################################################################################################
 